@@ -2,23 +2,23 @@ import sqlite3
 import os
 
 def add_item_columns_to_outcome_questionnaire():
+    # Item answers are stored packed in one 'items' column (see oq_items.py);
+    # the app moves any old item1..item25 columns into it on startup.
     db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'counseling.db')
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
-    for i in range(1, 26):
-        column_name = f'item{i}'
-        try:
-            cursor.execute(f"ALTER TABLE OutcomeQuestionnaire ADD COLUMN {column_name} INTEGER")
-            print(f"Column '{column_name}' added to OutcomeQuestionnaire table successfully.")
-        except sqlite3.OperationalError as e:
-            if f"duplicate column name: {column_name}" in str(e):
-                print(f"Column '{column_name}' already exists in OutcomeQuestionnaire table.")
-            else:
-                print(f"Error adding column '{column_name}': {e}")
+    try:
+        cursor.execute("ALTER TABLE OutcomeQuestionnaire ADD COLUMN items TEXT")
+        print("Column 'items' added to OutcomeQuestionnaire table successfully.")
+    except sqlite3.OperationalError as e:
+        if "duplicate column name: items" in str(e):
+            print("Column 'items' already exists in OutcomeQuestionnaire table.")
+        else:
+            print(f"Error adding column 'items': {e}")
     
     conn.commit()
     conn.close()
 
 if __name__ == '__main__':
-    add_item_columns_to_outcome_questionnaire()
\ No newline at end of file
+    add_item_columns_to_outcome_questionnaire()
@@ -0,0 +1,216 @@
+import atexit
+import os
+import sys
+import sqlite3
+import threading
+import time
+import node_config
+
+DATABASE = 'counseling.db'
+
+# node_config key: refresh an in-memory snapshot every N minutes and run
+# analytics against it. 0 (default) reads the live file through read-only
+# connections instead.
+SNAPSHOT_MINUTES_KEY = 'analytics_snapshot_minutes'
+
+# Pages copied per backup step; the live database is free for writers in between
+BACKUP_PAGES_PER_STEP = 256
+
+def get_db_path():
+    """Same database file as app.get_db_connection (dev and EXE mode)"""
+    try:
+        if getattr(sys, 'frozen', False):
+            base_path = os.path.dirname(sys.executable)
+        else:
+            base_path = os.path.dirname(os.path.abspath(__file__))
+    except:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_path, DATABASE)
+
+def open_readonly(db_path=None):
+    """Read-only URI connection that also refuses writes at the SQL level"""
+    db_path = os.path.abspath(db_path or get_db_path())
+    uri = 'file:' + db_path.replace('\\', '/').replace('?', '%3f').replace('#', '%23') + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True, timeout=10.0, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only = ON")
+    # Larger page cache: these connections live for the whole process
+    conn.execute("PRAGMA cache_size = -16000")
+    return conn
+
+class ChangeWatch:
+    """
+    Tells an in-memory cache whether anyone has committed to the database
+    since it last looked: the routes, the desktop app or another process.
+    PRAGMA data_version moves whenever a different connection commits, so
+    one connection that never writes sees every change. The values only
+    mean something to the connection that read them, hence the one shared
+    connection.
+    """
+
+    def __init__(self, db_path=None):
+        self._db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def version(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = open_readonly(self._db_path)
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            conn, self._conn = self._conn, None
+        if conn is not None:
+            conn.close()
+
+class ReadHandle:
+    """
+    What analytics callers get instead of a fresh connection. It behaves like
+    a sqlite3 connection for reads; close() only releases it, the underlying
+    connection stays open so its page cache stays warm. Use it in a `with`
+    block so it is released even when a query raises.
+    """
+
+    def __init__(self, conn, release=None):
+        self._conn = conn
+        self._release = release
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def execute(self, sql, params=()):
+        return self._conn.execute(sql, params)
+
+    def cursor(self):
+        return self._conn.cursor()
+
+    def close(self):
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+class AnalyticsDB:
+    """Long-lived read-only connections for statistics, reports and exports"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Every thread's live-file connection, by thread, so they can be closed
+        self._connections = {}
+        self._snapshot = None
+        self._snapshot_taken = 0
+        # Reentrant: a read nested inside another read on the same thread
+        # (e.g. a helper opening its own handle) must not wait for itself
+        self._snapshot_lock = threading.RLock()
+
+    def connect(self):
+        """Return a ReadHandle; use it as `with analytics_db.connect() as conn:`"""
+        minutes = self._snapshot_minutes()
+        if minutes > 0:
+            try:
+                return self._snapshot_handle(minutes)
+            except Exception as e:
+                print(f"[ANALYTICS] Snapshot unavailable, reading live database: {e}")
+        return ReadHandle(self._thread_connection())
+
+    def refresh_snapshot(self):
+        """Copy the live database into a fresh in-memory snapshot"""
+        start = time.time()
+        source = open_readonly()
+        try:
+            target = sqlite3.connect(':memory:', check_same_thread=False)
+            source.backup(target, pages=BACKUP_PAGES_PER_STEP, sleep=0.005)
+        finally:
+            source.close()
+        target.row_factory = sqlite3.Row
+        target.execute("PRAGMA query_only = ON")
+        with self._lock:
+            previous, self._snapshot = self._snapshot, target
+            self._snapshot_taken = time.time()
+        if previous is not None:
+            # Wait for any reader still on the old snapshot
+            with self._snapshot_lock:
+                previous.close()
+        print(f"[ANALYTICS] Snapshot refreshed in {time.time() - start:.2f}s")
+
+    def close(self):
+        """Close the snapshot and every thread's connection (process shutdown)"""
+        with self._lock:
+            snapshot, self._snapshot = self._snapshot, None
+            connections, self._connections = list(self._connections.values()), {}
+        if snapshot is not None:
+            with self._snapshot_lock:
+                snapshot.close()
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+    def _thread_connection(self):
+        # sqlite3 connections are cheapest when each thread keeps its own
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = open_readonly()
+            self._local.conn = conn
+            with self._lock:
+                self._connections[threading.current_thread()] = conn
+                finished = [thread for thread in self._connections if not thread.is_alive()]
+                finished = [self._connections.pop(thread) for thread in finished]
+            # Threads that have exited can't release theirs
+            for stale in finished:
+                try:
+                    stale.close()
+                except Exception:
+                    pass
+        return conn
+
+    def _snapshot_handle(self, minutes):
+        depth = getattr(self._local, 'snapshot_depth', 0)
+        if depth == 0:
+            with self._lock:
+                stale = self._snapshot is None or time.time() - self._snapshot_taken > minutes * 60
+            # Never while this thread is already reading the current snapshot:
+            # refreshing closes it
+            if stale:
+                self.refresh_snapshot()
+        # The in-memory snapshot is one shared connection; readers take turns
+        self._snapshot_lock.acquire()
+        try:
+            with self._lock:
+                conn = self._snapshot
+            if conn is None:
+                raise RuntimeError("snapshot closed")
+        except Exception:
+            self._snapshot_lock.release()
+            raise
+        self._local.snapshot_depth = depth + 1
+
+        def release():
+            self._local.snapshot_depth -= 1
+            self._snapshot_lock.release()
+        return ReadHandle(conn, release=release)
+
+    @staticmethod
+    def _snapshot_minutes():
+        try:
+            return float(node_config.load_config().get(SNAPSHOT_MINUTES_KEY, 0) or 0)
+        except (TypeError, ValueError):
+            return 0
+
+analytics_db = AnalyticsDB()
+atexit.register(analytics_db.close)
+
+def get_analytics_connection():
+    """Read-only connection for long aggregate queries (never blocks the workflow routes)"""
+    return analytics_db.connect()
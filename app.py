@@ -9,18 +9,42 @@ import os
 import sys
 from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.utils import secure_filename
-from auto_report_writer import scheduler, toggle_scheduler, manual_generate_report
 import uuid
 import node_config  # Import the new node config utility
-from sync_engine import sync_bp, trigger_sync # Import sync engine
-
-# Initialize Node Config on Startup
-current_node_config = node_config.load_config()
-print(f"--- Node Identity: {current_node_config['node_id']} ({current_node_config['node_role']}) ---")
+from sync_engine import sync_bp, trigger_sync, check_consistency, SYNC_TABLES # Import sync engine
+from queue_service import queue_bp, today_queue
+from scheduling_engine import schedule_bp, slot_index
+import lookup_service
+from lookup_service import lookup_bp, lookup_index
+from profile_service import profile_cache
+import scoring_engine
+import risk_engine
+import oq_items
+import report_rollup
+import report_cache
+import print_service
+import repository
+from analytics_db import get_analytics_connection
+from write_queue import write_queue
+import sync_tombstones
+import sync_versions
+from startup import readiness, wait_for_port
+from static_assets import assets_bp, ensure_built as ensure_static_assets_built
+import template_cache
+# auto_report_writer (python-docx, APScheduler) is imported where reports are made
 
 app = Flask(__name__)
+# Compiled templates persist in app_data/template_cache (seeded by the build)
+template_cache.init_app(app)
 # Register Sync Blueprint
 app.register_blueprint(sync_bp)
+app.register_blueprint(queue_bp)
+app.register_blueprint(schedule_bp)
+app.register_blueprint(assets_bp)
+app.register_blueprint(lookup_bp)
+app.register_blueprint(scoring_engine.scores_bp)
+app.register_blueprint(risk_engine.risk_bp)
+app.register_blueprint(print_service.print_bp)
 
 app.secret_key = 'super_secret_key_for_dev_only'  # Change for production
 app.config['UPLOAD_FOLDER'] = 'uploads'
@@ -138,8 +162,20 @@ def ensure_database_initialized():
     finally:
         _db_initialization_lock = False
 
-# Initialize database when module is loaded
-ensure_database_initialized()
+# Startup work runs once, on first database use or from the warm-up thread - not at import
+@readiness.step
+def announce_node():
+    config = node_config.load_config()
+    print(f"--- Node Identity: {config['node_id']} ({config['node_role']}) ---")
+
+@readiness.step
+def verify_database():
+    ensure_database_initialized()
+
+@readiness.step
+def build_static_assets():
+    # Fingerprinted copies under static/build; no-op unless static/ changed (dev only)
+    ensure_static_assets_built()
 
 @app.context_processor
 def inject_now():
@@ -167,7 +203,8 @@ def resource_path(relative_path):
 
 def get_db_connection():
     """Get database connection - works in both dev and EXE mode"""
-    # Ensure database is initialized first (only once)
+    # Database verified and sync schema in place (only once)
+    readiness.run()
     ensure_database_initialized()
     
     # Get database path
@@ -184,29 +221,37 @@ def get_db_connection():
     db_path = os.path.join(base_path, 'counseling.db')
     
     # Connect with timeout to prevent locking issues
+    # Tables were verified once by the readiness check; routes that hit
+    # 'no such table' still call ensure_database_initialized() themselves
     conn = sqlite3.connect(db_path, timeout=10.0)
     conn.row_factory = sqlite3.Row
-    
-    # Quick verification that Student table exists (most critical table)
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND (name='Student' OR name='student')")
-        if not cursor.fetchone():
-            print("[GET_DB_CONNECTION] Student table missing! Reinitializing...")
-            conn.close()
-            # Force reinitialization
-            global _db_initialized
-            _db_initialized = False
-            ensure_database_initialized()
-            # Reconnect
-            conn = sqlite3.connect(db_path, timeout=10.0)
-            conn.row_factory = sqlite3.Row
-    except Exception as verify_error:
-        print(f"[GET_DB_CONNECTION] Error verifying tables: {verify_error}")
-        # Continue anyway - let the query fail and be caught by route handlers
-    
     return conn
 
+@readiness.step
+def prepare_sync_and_queues():
+    """Sync schema, then seed the live dashboard queue; routes keep it current afterwards"""
+    conn = get_db_connection()
+    try:
+        sync_tombstones.ensure_schema(conn)
+        sync_versions.ensure_schema(conn, SYNC_TABLES)
+        oq_items.ensure_schema(conn)
+        lookup_service.ensure_indexes(conn)
+        scoring_engine.ensure_schema(conn)
+        risk_engine.ensure_schema(conn)
+        report_rollup.ensure_schema(conn)
+        report_cache.ensure_schema(conn)
+        conn.commit()
+        # Score questionnaires added or changed since the last run (all of them the first time)
+        rescored = scoring_engine.refresh(conn)
+        conn.commit()
+        if rescored:
+            print(f"[SCORES] Re-scored assessments of {rescored} students")
+        today_queue.seed(conn)
+        slot_index.build(conn)
+        lookup_index.build(conn)
+    finally:
+        conn.close()
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -233,10 +278,13 @@ def update_node_settings():
     try:
         new_role = request.form.get('node_role')
         peer_ip = request.form.get('peer_ip')
+        peers = [p.strip() for p in request.form.get('peers', '').split(',') if p.strip()]
         
         config = node_config.load_config()
         config['node_role'] = new_role
         config['peer_ip'] = peer_ip
+        config['peers'] = peers
+        config['sync_hub'] = request.form.get('sync_hub', '').strip()
         node_config.save_config(config)
         
         flash('Node settings updated successfully', 'success')
@@ -253,18 +301,15 @@ def set_theme():
     
     try:
         theme = request.form.get('theme', 'default')
-        conn = get_db_connection()
         # Upsert theme setting with sync support
         sys_id = str(uuid.uuid4())
-        conn.execute("""
+        write_queue.execute("""
             INSERT INTO app_settings (setting_name, setting_value, global_id, updated_at) 
             VALUES (?, ?, ?, CURRENT_TIMESTAMP) 
             ON CONFLICT(setting_name) DO UPDATE SET 
                 setting_value=excluded.setting_value, 
                 updated_at=CURRENT_TIMESTAMP
-        """, ('active_theme', theme, sys_id))
-        conn.commit()
-        conn.close()
+        """, ('active_theme', theme, sys_id), label='set_theme').result()
         return jsonify({'status': 'success', 'theme': theme})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -292,6 +337,30 @@ def manual_sync():
         flash(f"Sync failed: {result.get('message')}", 'error')
     return redirect(url_for('admin_settings'))
 
+@app.route('/admin/sync/verify')
+@login_required
+def verify_sync():
+    """Compare hash trees with the peer and repair any rows that diverged"""
+    if session.get('role') != 'Admin':
+        return redirect(url_for('dashboard'))
+    result = check_consistency()
+    if result.get('status') == 'success':
+        if result.get('count'):
+            flash(f"Consistency check repaired {result['count']} records.", 'success')
+        else:
+            flash("Databases are consistent with the peer.", 'success')
+    else:
+        flash(f"Consistency check failed: {result.get('message')}", 'error')
+    return redirect(url_for('admin_settings'))
+
+@app.route('/admin/write_queue')
+@login_required
+def write_queue_stats():
+    """Queue depth and batching metrics of the group-commit writer"""
+    if session.get('role') != 'Admin':
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+    return jsonify(dict(status='success', **write_queue.stats()))
+
 @app.context_processor
 def inject_notifications():
     if not session.get('logged_in'):
@@ -358,12 +427,10 @@ def audit_logs():
 @login_required
 def mark_notification_read(notification_id):
     try:
-        conn = get_db_connection()
         user_id = session.get('user_id')
         # Only allow user to mark their own notifications
-        conn.execute("UPDATE Notification SET is_read = 1 WHERE id = ? AND user_id = ?", (notification_id, user_id))
-        conn.commit()
-        conn.close()
+        write_queue.execute("UPDATE Notification SET is_read = 1 WHERE id = ? AND user_id = ?",
+                            (notification_id, user_id), label='mark_notification_read').result()
         return jsonify({'status': 'success'})
     except Exception as e:
         print(f"[NOTIFICATION] Error marking read: {e}")
@@ -373,21 +440,17 @@ def mark_notification_read(notification_id):
 @login_required
 def mark_all_notifications_read():
     try:
-        conn = get_db_connection()
         user_id = session.get('user_id')
-        conn.execute("UPDATE Notification SET is_read = 1 WHERE user_id = ?", (user_id,))
-        conn.commit()
-        conn.close()
+        write_queue.execute("UPDATE Notification SET is_read = 1 WHERE user_id = ?",
+                            (user_id,), label='mark_all_notifications_read').result()
         return jsonify({'status': 'success'})
     except Exception as e:
         print(f"[NOTIFICATION] Error marking all read: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 def create_notification(user_id, message, link=None, type='in_app', sender_info=None):
-    """Create a notification for a user."""
+    """Create a notification for a user (queued; committed with the next write batch)."""
     try:
-        conn = get_db_connection()
-        
         # Append sender info if provided and accessible
         final_message = message
         if sender_info:
@@ -401,12 +464,10 @@ def create_notification(user_id, message, link=None, type='in_app', sender_info=
              except:
                  pass
              
-        conn.execute(
+        return write_queue.execute(
             "INSERT INTO Notification (user_id, message, link, type) VALUES (?, ?, ?, ?)",
-            (user_id, final_message, link, type)
+            (user_id, final_message, link, type), label='create_notification'
         )
-        conn.commit()
-        conn.close()
     except Exception as e:
         print(f"[NOTIFICATION] Error: {e}")
 
@@ -542,13 +603,10 @@ def login():
         
         # Log the login in audit_logs
         try:
-            conn = get_db_connection()
-            conn.execute(
+            write_queue.execute(
                 "INSERT INTO audit_logs (user_id, action, details, ip_address) VALUES (?, ?, ?, ?)",
-                (user['id'], 'LOGIN', f"User logged in successfully", request.remote_addr)
+                (user['id'], 'LOGIN', f"User logged in successfully", request.remote_addr), label='audit_login'
             )
-            conn.commit()
-            conn.close()
         except Exception as log_error:
             print(f"[LOGIN] Audit log error: {log_error}")
             
@@ -605,12 +663,7 @@ def dashboard():
         if user_role == 'Secretary' or user_role == 'Admin':
             try:
                 # Cases awaiting handover (Secretary's queue) - Show ALL scheduled items
-                pending_action = conn.execute('''
-                    SELECT a.*, s.name as student_name 
-                    FROM Appointment a JOIN Student s ON a.student_id = s.id 
-                    WHERE a.status = 'Scheduled'
-                    ORDER BY a.date ASC, a.time ASC
-                ''').fetchall()
+                pending_action = today_queue.lane('secretary')
                 
                 # Recently sent activity
                 recent_activity = conn.execute('''
@@ -625,23 +678,21 @@ def dashboard():
         elif user_role == 'Counsellor':
             try:
                 # Incoming Case Referrals (Counsellor's queue)
-                pending_action = conn.execute('''
-                    SELECT a.*, s.name as student_name 
-                    FROM Appointment a JOIN Student s ON a.student_id = s.id 
-                    WHERE a.status = 'Sent to Counsellor' OR a.status = 'Checked In'
-                    ORDER BY a.date ASC, a.time ASC
-                ''').fetchall()
+                pending_action = today_queue.lane('counsellor')
                 
                 # Active Sessions for the current Counsellor
-                today_appts = conn.execute('''
-                    SELECT a.*, s.name as student_name 
-                    FROM Appointment a JOIN Student s ON a.student_id = s.id 
-                    WHERE a.status = 'In Session'
-                    ORDER BY a.time ASC
-                ''').fetchall()
+                today_appts = today_queue.lane('in_session')
             except Exception as e:
                 print(f"[DASHBOARD] Counsellor query error: {e}")
 
+        # 3. Students with open risk flags (kept up to date by risk_engine on every write)
+        at_risk = []
+        if user_role in ('Admin', 'Counsellor', 'Counselor'):
+            try:
+                at_risk = risk_engine.at_risk_students(conn, limit=8)
+            except Exception as e:
+                print(f"[DASHBOARD] At-risk list error: {e}")
+
         # Generate greeting
         current_hour = datetime.now().hour
         if current_hour < 12:
@@ -668,6 +719,7 @@ def dashboard():
                                 greeting=greeting, 
                                 pending_action=pending_action,
                                 recent_activity=recent_activity,
+                                at_risk=at_risk,
                                 show_welcome_message=show_welcome_message)
         else:
             # SWITCH TO MODERN DASHBOARD
@@ -678,6 +730,7 @@ def dashboard():
                                 today_appts=today_appts,
                                 pending_action=pending_action,
                                 recent_activity=recent_activity,
+                                at_risk=at_risk,
                                 show_welcome_message=show_welcome_message)
                              
     except Exception as e:
@@ -796,14 +849,21 @@ def update_appt_status(appt_id, new_status):
             
         sql += " WHERE id = ?"
         params.append(appt_id)
-        
-        conn.execute(sql, params)
-        
-        conn.execute(
-            "INSERT INTO audit_logs (user_id, action, details) VALUES (?, ?, ?)",
-            (session.get('user_id'), 'WORKFLOW', f"Moved {student_name} from {current_status} to {clean_status}")
-        )
-        conn.commit()
+        audit = (session.get('user_id'), 'WORKFLOW', f"Moved {student_name} from {current_status} to {clean_status}")
+        
+        def write_transition(write_conn):
+            write_conn.execute(sql, params)
+            write_conn.execute("INSERT INTO audit_logs (user_id, action, details) VALUES (?, ?, ?)", audit)
+        
+        # Status change and audit entry commit together on the writer thread.
+        # Wait for the outcome rather than timing out: the writer resolves
+        # every write (a locked database fails it after the busy timeout),
+        # and a write we gave up on could still commit afterwards.
+        write_queue.submit(write_transition, label='update_appt_status').result()
+        today_queue.refresh(conn, appt_id)
+        slot_index.refresh(conn, appt_id)
+        lookup_index.refresh_appointment(conn, appt_id)
+        profile_cache.invalidate(conn, 'appointment', appt_id)
         conn.close()
         
         # Success Feedback
@@ -1053,8 +1113,9 @@ def admin_settings():
     
     # Convert list of rows to dictionary
     settings = {row['setting_name']: row['setting_value'] for row in settings_rows}
+    risk_rules = settings.get(risk_engine.RULES_SETTING) or json.dumps(risk_engine.DEFAULT_RULES, indent=2)
     
-    return render_template('admin_settings.html', settings=settings)
+    return render_template('admin_settings.html', settings=settings, risk_rules=risk_rules)
 
 @app.route('/admin/settings/update', methods=['POST'])
 @login_required
@@ -1067,7 +1128,10 @@ def admin_update_settings():
         conn = get_db_connection()
         
         # List of settings to update
-        setting_keys = ['system_name', 'logo_url', 'theme_color']
+        setting_keys = ['system_name', 'logo_url', 'theme_color',
+                        'working_hours_start', 'working_hours_end',
+                        'lunch_break_start', 'lunch_break_end', 'appointment_duration_minutes',
+                        'front_desk_capacity']
         
         for key in setting_keys:
             val = request.form.get(key)
@@ -1084,6 +1148,8 @@ def admin_update_settings():
                     cursor.execute("INSERT INTO app_settings (setting_name, setting_value) VALUES (?, ?)", (key, val))
                     
         conn.commit()
+        # Working hours or slot length may have changed
+        slot_index.build(conn)
         conn.close()
         flash("System configuration updated successfully.", "success")
     except Exception as e:
@@ -1138,15 +1204,15 @@ def admin_export_master():
         flash("Export library missing. Please contact support.", "error")
         return redirect(url_for('dashboard'))
 
-    conn = get_db_connection()
-    
     # 1. Fetch Datasets
-    students = conn.execute("SELECT * FROM Student").fetchall()
-    appointments = conn.execute("SELECT * FROM Appointment").fetchall()
-    intake_forms = conn.execute("SELECT * FROM intake_forms").fetchall()
-    users = conn.execute("SELECT id, username, full_name, role, last_login, created_at FROM users").fetchall()
-    
-    conn.close()
+    with get_analytics_connection() as conn:
+        students = conn.execute("SELECT * FROM Student").fetchall()
+        appointments = conn.execute("SELECT * FROM Appointment").fetchall()
+        intake_forms = conn.execute("SELECT * FROM intake_forms").fetchall()
+        questionnaires = conn.execute(
+            "SELECT id, student_id, session_id, age, sex, items, total_score, completion_date, created_at "
+            "FROM OutcomeQuestionnaire").fetchall()
+        users = conn.execute("SELECT id, username, full_name, role, last_login, created_at FROM users").fetchall()
 
     # 2. Create Workbook
     wb = openpyxl.Workbook()
@@ -1201,6 +1267,15 @@ def admin_export_master():
     write_sheet(wb, "Students", students)
     write_sheet(wb, "Appointments", appointments)
     write_sheet(wb, "Intake Records", intake_forms)
+    # One column per item, unpacked from the stored answers
+    oq_columns = ['id', 'student_id', 'session_id', 'age', 'sex'] + list(oq_items.LEGACY_COLUMNS) + \
+                 ['total_score', 'completion_date', 'created_at']
+    oq_rows = []
+    for r in questionnaires:
+        record = dict(r)
+        record.update(zip(oq_items.LEGACY_COLUMNS, oq_items.unpack(record.pop('items'))))
+        oq_rows.append(record)
+    write_sheet(wb, "Outcome Questionnaires", oq_rows, oq_columns)
     write_sheet(wb, "System Users", users)
 
     # 4. Return File
@@ -1255,12 +1330,17 @@ def add_student():
                           programme, contact, parent_contact, hall_of_residence, edit_id))
                     flash('Student updated successfully!', 'success')
                 else:
-                    conn.execute(
+                    cursor = conn.execute(
                         'INSERT INTO Student (name, age, gender, index_number, department, faculty, programme, contact, parent_contact, hall_of_residence) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
                         (name, age if age else None, gender, index_number, department, faculty, programme, contact, parent_contact, hall_of_residence)
                     )
                     flash('Student added successfully!', 'success')
                 conn.commit()
+                if edit_id:
+                    # Queue entries carry the student name
+                    today_queue.refresh_student(conn, int(edit_id))
+                lookup_index.refresh_student(conn, int(edit_id) if edit_id else cursor.lastrowid)
+                profile_cache.invalidate_student(edit_id)
                 return redirect(url_for('students'))
             except sqlite3.IntegrityError:
                 conn.rollback()
@@ -1339,38 +1419,19 @@ def sessions_list():
             flash('Database connection failed. Please restart the application.', 'error')
             return redirect(url_for('dashboard'))
 
-        sessions_raw = []
+        sessions = []
         try:
-            # Get sessions with full details including student, counsellor, and appointment info
-            sessions_raw = conn.execute('''
-                SELECT sess.id, sess.session_type, sess.notes, sess.created_at,
-                       s.id as student_db_id, s.name as student_name,
-                       c.name as Counsellor_name,
-                       a.date, a.time, a.status,
-                       sess.appointment_id
-                FROM session sess
-                LEFT JOIN Appointment a ON sess.appointment_id = a.id
-                LEFT JOIN Student s ON a.student_id = s.id
-                LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
-                ORDER BY sess.created_at DESC
-            ''').fetchall()
+            # Sessions with student, counsellor and appointment info (professional IDs are computed on access)
+            sessions = repository.list_sessions(conn)
         except Exception as e:
             print(f"[SESSIONS] Error getting sessions: {e}")
-            sessions_raw = []
+            sessions = []
         finally:
             try:
                 conn.close()
             except Exception:
                 pass
         
-        # Convert to list and add professional IDs
-        sessions = []
-        for sess in sessions_raw:
-            sess_dict = dict(sess)
-            student_db_id = sess_dict.get('student_db_id', 0)
-            sess_dict['professional_id'] = f"C{student_db_id:03d}" if student_db_id else 'N/A'
-            sessions.append(sess_dict)
-        
         # Create a simple pagination object to prevent template errors
         class SimplePagination:
             has_prev = False
@@ -1419,10 +1480,11 @@ def create_session():
                     appointment_status = appointment['status']
 
                     # Insert new session - use appointment_id as the foreign key
-                    conn.execute('''
+                    cursor = conn.execute('''
                         INSERT INTO session (appointment_id, session_type, notes, outcome, created_at)
                         VALUES (?, ?, ?, ?, ?)
                     ''', (appointment_id, session_type, notes, outcome, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                    risk_engine.evaluate(conn, 'session', cursor.lastrowid)
 
                     # Update appointment status to completed only if it's currently scheduled
                     if appointment_status == 'scheduled':
@@ -1430,6 +1492,9 @@ def create_session():
                                      ('Completed', appointment_id))
 
                     conn.commit()
+                    today_queue.refresh(conn, int(appointment_id))
+                    lookup_index.refresh_appointment(conn, int(appointment_id))
+                    profile_cache.invalidate_student(student_id)
                     flash('Session created successfully!')
                     
                     # Check for follow-up scheduling
@@ -1451,30 +1516,23 @@ def create_session():
                     pass
             return redirect(url_for('create_session'))
 
-        # GET: load appointments for dropdown and potential context
-        appointments = []
+        # GET: students and their appointments come from /api/lookup; only a
+        # preselected appointment (from the Dashboard or Queue) is loaded here
+        selected_appointment = selected_student = None
+        selected_appt_id = request.args.get('appointment_id')
         try:
-            appointments = conn.execute('''
-                SELECT a.id, a.date as date, a.time as time, a.status, s.name as student_name,
-                       c.name as counsellor_name, a.urgency, a.referral_source, a.purpose
-                FROM Appointment a
-                LEFT JOIN Student s ON a.student_id = s.id
-                LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
-                WHERE a.status IN ('scheduled', 'Scheduled', 'In Session', 'Completed', 'completed', 'Sent to Counsellor')
-                ORDER BY a.date DESC, a.time DESC
-            ''').fetchall()
+            if selected_appt_id:
+                selected_appointment, selected_student = lookup_service.selected_appointment(conn, selected_appt_id)
         except Exception as e:
-            print(f"[CREATE_SESSION] Error getting appointments: {e}")
-            appointments = []
+            print(f"[CREATE_SESSION] Error getting appointment: {e}")
         finally:
             try:
                 conn.close()
             except Exception:
                 pass
 
-        # Check if specific appointment_id is passed in args (from Dashboard or Queue)
-        selected_appt_id = request.args.get('appointment_id')
-        return render_template('create_session.html', appointments=appointments, selected_appt_id=selected_appt_id)
+        return render_template('create_session.html', selected_appointment=selected_appointment,
+                               selected_student=selected_student)
     except Exception as e:
         print(f"[CREATE_SESSION] Unexpected error: {e}")
         import traceback
@@ -1522,15 +1580,18 @@ def case_note():
                         WHERE session_id = ?
                     ''', (client_appearance, problems, interventions, recommendations, 
                           next_visit_date, counsellor_signature, session_id))
+                    case_note_id = existing['id']
                 else:
                     # Insert new record
-                    conn.execute('''
+                    cursor = conn.execute('''
                         INSERT INTO CaseManagement 
                         (session_id, client_appearance, problems, interventions, recommendations, 
                          next_visit_date, counsellor_signature, created_at)
                         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                     ''', (session_id, client_appearance, problems, interventions, recommendations,
                           next_visit_date, counsellor_signature, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                    case_note_id = cursor.lastrowid
+                risk_engine.evaluate(conn, 'case_note', case_note_id)
                 
                 conn.commit()
                 flash('Case notes saved successfully!', 'success')
@@ -1548,33 +1609,13 @@ def case_note():
                 except Exception:
                     pass
 
-        # GET request - show form
-        sessions = []
+        # GET request - show form (sessions are picked through /api/lookup)
         try:
-            sessions_raw = conn.execute('''
-                SELECT s.id, st.id as student_db_id, st.name as student_name, s.created_at
-                FROM session s
-                JOIN Appointment a ON s.appointment_id = a.id
-                JOIN Student st ON a.student_id = st.id
-                ORDER BY s.created_at DESC
-            ''').fetchall()
-            # Convert to list and add professional IDs
-            sessions = []
-            for sess in sessions_raw:
-                sess_dict = dict(sess)
-                student_db_id = sess_dict.get('student_db_id', 0)
-                sess_dict['professional_id'] = f"C{student_db_id:03d}"
-                sessions.append(sess_dict)
-        except Exception as e:
-            print(f"[CASE_NOTE] Error getting sessions: {e}")
-            sessions = []
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
+            conn.close()
+        except Exception:
+            pass
 
-        return render_template('case_note.html', sessions=sessions, now=datetime.utcnow())
+        return render_template('case_note.html', now=datetime.utcnow())
     except Exception as e:
         print(f"[CASE_NOTE] Unexpected error: {e}")
         import traceback
@@ -1627,13 +1668,25 @@ def generate_report_manual():
     end_date = request.form.get('end_date')
     
     try:
-        if report_type == 'custom' and start_date and end_date:
-            # Custom date range - modify the generate_report function to accept dates
-            manual_generate_report()  # For now, use manual generation
-            flash('Custom report generation is being prepared. Report generated successfully!', 'success')
+        import auto_report_writer
+        if report_type == 'custom':
+            try:
+                start_day = datetime.strptime(start_date or '', '%Y-%m-%d').date()
+                end_day = datetime.strptime(end_date or '', '%Y-%m-%d').date()
+            except ValueError:
+                flash('Choose a start and an end date for a custom report.', 'error')
+                return redirect(url_for('reports_list'))
+            _path, cached = auto_report_writer.request_report('custom', start_day, end_day)
+        else:
+            if report_type not in auto_report_writer.REPORT_WINDOWS:
+                report_type = 'manual'  # summary / detailed / statistical share the comprehensive report
+            _path, cached = auto_report_writer.request_report(report_type)
+        if cached:
+            flash('Nothing has changed since this report was last generated; the existing report is listed below.', 'info')
         else:
-            manual_generate_report()
             flash('Report generated successfully!', 'success')
+    except ValueError as e:
+        flash(str(e), 'error')
     except Exception as e:
         flash(f'Error generating report: {str(e)}', 'error')
     
@@ -1648,7 +1701,8 @@ def toggle_auto_report():
         enable = data.get('enable', False)
         
         try:
-            toggle_scheduler(enable)
+            import auto_report_writer
+            auto_report_writer.toggle_scheduler(enable)
             return jsonify({
                 'status': 'success',
                 'message': f'Auto report generation {"enabled" if enable else "disabled"} successfully.',
@@ -1660,8 +1714,9 @@ def toggle_auto_report():
                 'message': str(e)
             }), 500
     else:
-        # GET request - return current status
-        is_running = scheduler.running if scheduler else False
+        # GET request - return current status (never started if the module isn't loaded yet)
+        writer = sys.modules.get('auto_report_writer')
+        is_running = bool(writer and writer.scheduler and writer.scheduler.running)
         return jsonify({
             'status': 'success',
             'is_enabled': is_running
@@ -1672,10 +1727,13 @@ def toggle_auto_report():
 def generate_report_now():
     """Manually trigger report generation"""
     try:
-        manual_generate_report()
+        import auto_report_writer
+        _path, cached = auto_report_writer.manual_generate_report()
         return jsonify({
             'status': 'success',
-            'message': 'Report generated successfully! Check the Reports page to view it.'
+            'cached': cached,
+            'message': ('No data has changed since the last report; it is still on the Reports page.' if cached
+                        else 'Report generated successfully! Check the Reports page to view it.')
         })
     except Exception as e:
         return jsonify({
@@ -1723,13 +1781,7 @@ def my_cases():
         
         # 2. Find students who have appointments with this counsellor (Past or Future)
         # We use DISTINCT to avoid duplicates
-        students = conn.execute('''
-            SELECT DISTINCT s.* 
-            FROM Student s
-            JOIN Appointment a ON s.id = a.student_id
-            WHERE a.Counsellor_id = ?
-            ORDER BY a.date DESC
-        ''', (counsellor_id,)).fetchall()
+        students = repository.list_counsellor_students(conn, counsellor_id)
         
         conn.close()
         
@@ -1775,41 +1827,23 @@ def students():
             flash('Database connection failed. Please restart the application.', 'error')
             return redirect(url_for('dashboard'))
 
-        students_raw = []
-        program_rows = []
+        students = []
+        programs = []
         try:
-            # Get all students and their information
-            students_raw = conn.execute('''
-                SELECT s.*, 
-                       COUNT(DISTINCT sess.id) as session_count
-                FROM Student s
-                LEFT JOIN Appointment a ON s.id = a.student_id
-                LEFT JOIN session sess ON a.id = sess.appointment_id
-                GROUP BY s.id
-                ORDER BY s.name
-            ''').fetchall()
+            # Get all students and their session counts
+            students = repository.list_students(conn)
 
-            # Get all unique programs for the filter dropdown (extract as strings, not Row objects)
-            program_rows = conn.execute("SELECT DISTINCT programme FROM Student WHERE programme IS NOT NULL AND programme != '' ORDER BY programme").fetchall()
+            # Get all unique programs for the filter dropdown
+            programs = repository.list_programmes(conn)
         except Exception as e:
             print(f"[STUDENTS] Error getting students: {e}")
-            students_raw = []
-            program_rows = []
+            students = []
+            programs = []
         finally:
             try:
                 conn.close()
             except Exception:
                 pass
-
-        # Convert to list and add professional IDs
-        students = []
-        for student in students_raw:
-            student_dict = dict(student)
-            student_db_id = student_dict.get('id', 0)
-            student_dict['professional_id'] = f"C{student_db_id:03d}"
-            students.append(student_dict)
-
-        programs = [row['programme'] for row in program_rows] if program_rows else []  # Convert Row objects to strings
         
         return render_template('students.html', students=students, programs=programs)
     except Exception as e:
@@ -1829,93 +1863,24 @@ def student_profile(id):
             flash('Database connection failed. Please restart the application.', 'error')
             return redirect(url_for('dashboard'))
 
-        # Get student information
-        student = None
-        sessions = []
-        referrals = []
+        # Student, sessions, referrals and assessment scores come from the
+        # cached profile snapshot; writes that touch this student drop it
+        snapshot = None
         try:
-            student = conn.execute('SELECT * FROM Student WHERE id = ?', (id,)).fetchone()
+            snapshot = profile_cache.get(conn, id)
         except Exception as e:
-            print(f"[STUDENT_PROFILE] Error getting student: {e}")
-
-        if not student:
+            print(f"[STUDENT_PROFILE] Error getting profile: {e}")
+        finally:
             try:
                 conn.close()
             except Exception:
                 pass
+
+        if not snapshot:
             flash('Student not found', 'error')
             return redirect(url_for('students'))
 
-        # Get all sessions for this student
-        try:
-            sessions = conn.execute('''
-                SELECT sess.id, sess.session_type, sess.notes, sess.created_at,
-                       s.name as student_name,
-                       c.name as Counsellor_name,
-                       a.date, a.time, a.status
-                FROM session sess
-                LEFT JOIN Appointment a ON sess.appointment_id = a.id
-                LEFT JOIN Student s ON a.student_id = s.id
-                LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
-                WHERE s.id = ?
-                ORDER BY sess.created_at DESC
-            ''', (id,)).fetchall()
-        except Exception as e:
-            print(f"[STUDENT_PROFILE] Error getting sessions: {e}")
-            sessions = []
-
-        # Get all referrals for this student
-        try:
-            referrals = conn.execute('''
-                SELECT r.id, r.referred_by, r.contact, r.reasons, r.action_taken, r.outcome, r.created_at
-                FROM Referral r
-                JOIN Session sess ON r.session_id = sess.id
-                JOIN Appointment a ON sess.appointment_id = a.id
-                WHERE a.student_id = ?
-                ORDER BY r.created_at DESC
-            ''', (id,)).fetchall()
-        except Exception as e:
-            print(f"[STUDENT_PROFILE] Error getting referrals: {e}")
-            referrals = []
-
-        # Get DASS-21 scores if table exists
-        dass21_scores = []
-        try:
-            dass21_scores = conn.execute('''
-                SELECT depression_score, anxiety_score, stress_score, completion_date, created_at
-                FROM DASS21
-                WHERE student_id = ?
-                ORDER BY created_at DESC
-            ''', (id,)).fetchall()
-        except Exception as e:
-            print(f"[STUDENT_PROFILE] Error getting DASS21 scores: {e}")
-            dass21_scores = []
-
-        # Get OQ-45.2 scores if table exists
-        oq_scores = []
-        try:
-            oq_scores = conn.execute('''
-                SELECT total_score, completion_date, created_at,
-                       (SELECT created_at FROM session WHERE id = OutcomeQuestionnaire.session_id) as session_date
-                FROM OutcomeQuestionnaire
-                WHERE student_id = ?
-                ORDER BY created_at DESC
-            ''', (id,)).fetchall()
-        except Exception as e:
-            print(f"[STUDENT_PROFILE] Error getting OQ scores: {e}")
-            oq_scores = []
-
-        try:
-            conn.close()
-        except Exception:
-            pass
-
-        return render_template('student_profile.html', 
-                             student=student, 
-                             sessions=sessions,
-                             referrals=referrals,
-                             dass21_scores=dass21_scores,
-                             oq_scores=oq_scores)
+        return render_template('student_profile.html', **snapshot.context())
     except Exception as e:
         print(f"[STUDENT_PROFILE] Unexpected error: {e}")
         import traceback
@@ -1926,38 +1891,20 @@ def student_profile(id):
 @app.route('/export_students')
 @login_required
 def export_students():
+    # Get format parameter (default to csv for backward compatibility)
+    export_format = request.args.get('format', 'csv').lower()
+    
+    with get_analytics_connection() as conn:
+        # Rows are written as they come off the cursor instead of being materialized first
+        return _write_students_export(repository.iter_students(conn), export_format)
+
+def _write_students_export(students, export_format):
     import csv
     import io
     from openpyxl import Workbook
     from openpyxl.styles import Font, PatternFill, Alignment
     from openpyxl.utils import get_column_letter
-    
-    # Get format parameter (default to csv for backward compatibility)
-    export_format = request.args.get('format', 'csv').lower()
-    
-    conn = get_db_connection()
-    
-    # Get all students data with professional ID
-    students_raw = conn.execute('''
-        SELECT s.*, 
-               COUNT(DISTINCT sess.id) as session_count
-        FROM Student s
-        LEFT JOIN Appointment a ON s.id = a.student_id
-        LEFT JOIN Session sess ON a.id = sess.appointment_id
-        GROUP BY s.id
-        ORDER BY s.name
-    ''').fetchall()
-    
-    conn.close()
-    
-    # Generate professional IDs
-    students = []
-    for student in students_raw:
-        student_dict = dict(student)
-        student_db_id = student_dict.get('id', 0)
-        student_dict['professional_id'] = f"C{student_db_id:03d}"
-        students.append(student_dict)
-    
+
     if export_format == 'excel':
         # Create Excel workbook
         wb = Workbook()
@@ -1978,18 +1925,18 @@ def export_students():
         
         # Write data rows
         for row_num, student in enumerate(students, 2):
-            ws.cell(row=row_num, column=1, value=student['id'])
-            ws.cell(row=row_num, column=2, value=student['professional_id'])
-            ws.cell(row=row_num, column=3, value=student['name'])
-            ws.cell(row=row_num, column=4, value=student['index_number'] or 'N/A')
-            ws.cell(row=row_num, column=5, value=student.get('age') or 'N/A')
-            ws.cell(row=row_num, column=6, value=student.get('gender') or 'N/A')
+            ws.cell(row=row_num, column=1, value=student.id)
+            ws.cell(row=row_num, column=2, value=student.professional_id)
+            ws.cell(row=row_num, column=3, value=student.name)
+            ws.cell(row=row_num, column=4, value=student.index_number or 'N/A')
+            ws.cell(row=row_num, column=5, value=student.age or 'N/A')
+            ws.cell(row=row_num, column=6, value=student.gender or 'N/A')
             ws.cell(row=row_num, column=7, value=student.get('email') or 'N/A')
-            ws.cell(row=row_num, column=8, value=student['contact'] or 'N/A')
-            ws.cell(row=row_num, column=9, value=student.get('programme') or student.get('program') or 'N/A')
-            ws.cell(row=row_num, column=10, value=student.get('department') or 'N/A')
-            ws.cell(row=row_num, column=11, value=student['session_count'])
-            ws.cell(row=row_num, column=12, value=student['created_at'])
+            ws.cell(row=row_num, column=8, value=student.contact or 'N/A')
+            ws.cell(row=row_num, column=9, value=student.programme or student.program or 'N/A')
+            ws.cell(row=row_num, column=10, value=student.department or 'N/A')
+            ws.cell(row=row_num, column=11, value=student.session_count)
+            ws.cell(row=row_num, column=12, value=student.created_at)
         
         # Auto-adjust column widths
         for col in ws.columns:
@@ -2024,15 +1971,15 @@ def export_students():
         # Write data rows
         for student in students:
             writer.writerow([
-                student['id'],
-                student['professional_id'],
-                student['name'],
-                student['index_number'] or 'N/A',
+                student.id,
+                student.professional_id,
+                student.name,
+                student.index_number or 'N/A',
                 student.get('email') or 'N/A',
-                student['contact'] or 'N/A',
-                student.get('programme') or student.get('program') or 'N/A',
-                student['session_count'],
-                student['created_at']
+                student.contact or 'N/A',
+                student.programme or student.program or 'N/A',
+                student.session_count,
+                student.created_at
             ])
 
         # Prepare response
@@ -2055,22 +2002,19 @@ def export_sessions():
     # Get format parameter (default to csv for backward compatibility)
     export_format = request.args.get('format', 'csv').lower()
     
-    conn = get_db_connection()
-    
     # Get all sessions with full details
-    sessions = conn.execute('''
-        SELECT sess.id, sess.session_type, sess.notes, sess.created_at,
-               s.name as student_name, s.id as student_db_id,
-               c.name as Counsellor_name,
-               a.date, a.time, a.status as appointment_status
-        FROM session sess
-        LEFT JOIN Appointment a ON sess.appointment_id = a.id
-        LEFT JOIN Student s ON a.student_id = s.id
-        LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
-        ORDER BY sess.created_at DESC
-    ''').fetchall()
-    
-    conn.close()
+    with get_analytics_connection() as conn:
+        sessions = conn.execute('''
+            SELECT sess.id, sess.session_type, sess.notes, sess.created_at,
+                   s.name as student_name, s.id as student_db_id,
+                   c.name as Counsellor_name,
+                   a.date, a.time, a.status as appointment_status
+            FROM session sess
+            LEFT JOIN Appointment a ON sess.appointment_id = a.id
+            LEFT JOIN Student s ON a.student_id = s.id
+            LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
+            ORDER BY sess.created_at DESC
+        ''').fetchall()
     
     if export_format == 'excel':
         # Create Excel workbook
@@ -2210,6 +2154,7 @@ def referral():
                     VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''', (session_id, referred_by, contact, reasons, action_taken, outcome, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
                 conn.commit()
+                profile_cache.invalidate(conn, 'session', session_id)
                 flash('Referral created successfully!', 'success')
                 return redirect(url_for('dashboard'))
             except Exception as e:
@@ -2223,32 +2168,8 @@ def referral():
                 except Exception:
                     pass
     
-        # GET request - display referral form
-        conn = get_db_connection()
-        if conn is None:
-            flash('Database connection failed. Please restart the application.', 'error')
-            return redirect(url_for('dashboard'))
-
-        sessions = []
-        try:
-            sessions = conn.execute('''
-                SELECT s.id, s.created_at, st.name as student_name, st.index_number, c.name as Counsellor_name
-                FROM session s
-                JOIN Appointment a ON s.appointment_id = a.id
-                JOIN Student st ON a.student_id = st.id
-                LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
-                ORDER BY s.created_at DESC
-            ''').fetchall()
-        except Exception as e:
-            print(f"[REFERRAL] Error getting sessions: {e}")
-            sessions = []
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
-
-        return render_template('referral.html', sessions=sessions)
+        # GET request - display referral form (sessions are picked through /api/lookup)
+        return render_template('referral.html')
     except Exception as e:
         print(f"[REFERRAL] Unexpected error: {e}")
         import traceback
@@ -2317,21 +2238,18 @@ def export_referrals():
     # Get format parameter (default to csv for backward compatibility)
     export_format = request.args.get('format', 'csv').lower()
     
-    conn = get_db_connection()
-    
     # Get all referrals with full details
-    referrals_raw = conn.execute('''
-        SELECT r.id, r.session_id, r.referred_by, r.contact, r.reasons, 
-               r.action_taken, r.outcome, r.created_at,
-               st.id as student_db_id, st.name as student_name, st.contact as student_contact
-        FROM Referral r
-        JOIN session sess ON r.session_id = sess.id
-        JOIN Appointment a ON sess.appointment_id = a.id
-        JOIN Student st ON a.student_id = st.id
-        ORDER BY r.created_at DESC
-    ''').fetchall()
-    
-    conn.close()
+    with get_analytics_connection() as conn:
+        referrals_raw = conn.execute('''
+            SELECT r.id, r.session_id, r.referred_by, r.contact, r.reasons, 
+                   r.action_taken, r.outcome, r.created_at,
+                   st.id as student_db_id, st.name as student_name, st.contact as student_contact
+            FROM Referral r
+            JOIN session sess ON r.session_id = sess.id
+            JOIN Appointment a ON sess.appointment_id = a.id
+            JOIN Student st ON a.student_id = st.id
+            ORDER BY r.created_at DESC
+        ''').fetchall()
     
     if export_format == 'excel':
         # Create Excel workbook
@@ -2441,15 +2359,16 @@ def outcome_questionnaire():
             age = request.form.get('age')
             sex = request.form.get('sex')
 
-            # Get all 25 item scores
+            # Get all item scores
             item_scores = []
             try:
-                for i in range(1, 26):
+                for i in range(1, oq_items.ITEM_COUNT + 1):
                     score = request.form.get(f'item{i}')
                     if not score or score == '':
                         flash('Please fill in all item scores', 'error')
                         return redirect(url_for('outcome_questionnaire'))
                     item_scores.append(int(score))
+                items = oq_items.pack(item_scores)
             except ValueError:
                 flash('Invalid score values. Please enter numbers only.', 'error')
                 return redirect(url_for('outcome_questionnaire'))
@@ -2459,16 +2378,15 @@ def outcome_questionnaire():
 
             # Insert questionnaire data into database
             try:
-                # Use correct table name and column names (item1, item2, etc. without underscores)
-                conn.execute('''
+                cursor = conn.execute('''
                     INSERT INTO OutcomeQuestionnaire 
-                    (student_id, session_id, age, sex, item1, item2, item3, item4, item5,
-                     item6, item7, item8, item9, item10, item11, item12, item13, item14, item15,
-                     item16, item17, item18, item19, item20, item21, item22, item23, item24, item25,
-                     total_score, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (student_id, session_id, age if age else None, sex if sex else None, *item_scores, total_score, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                    (student_id, session_id, age, sex, items, total_score, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (student_id, session_id, age if age else None, sex if sex else None, items, total_score, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                scoring_engine.refresh_student(conn, student_id)
+                risk_engine.evaluate(conn, 'oq', cursor.lastrowid)
                 conn.commit()
+                profile_cache.invalidate_student(student_id)
                 flash('Outcome questionnaire submitted successfully!', 'success')
                 return redirect(url_for('dashboard'))
             except Exception as e:
@@ -2482,54 +2400,13 @@ def outcome_questionnaire():
                 except Exception:
                     pass
 
-        # GET request - display the form
-        students_raw = []
-        sessions_raw = []
+        # GET request - display the form (student and session come from /api/lookup)
         try:
-            students_raw = conn.execute('SELECT id, name, programme FROM Student ORDER BY name').fetchall()
-            sessions_raw = conn.execute('''
-                SELECT sess.id, sess.created_at, a.student_id, s.id as student_db_id, s.name as student_name
-                FROM session sess
-                LEFT JOIN Appointment a ON sess.appointment_id = a.id
-                LEFT JOIN Student s ON a.student_id = s.id
-                WHERE a.student_id IS NOT NULL
-                ORDER BY sess.created_at DESC
-            ''').fetchall()
-        except Exception as e:
-            print(f"[OUTCOME_QUESTIONNAIRE] Error getting dropdown data: {e}")
-            import traceback
-            traceback.print_exc()
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
-        
-        # Convert students to list
-        students = []
-        for student in students_raw:
-            students.append(dict(student))
-        
-        # Convert sessions to list and format dates
-        sessions = []
-        for sess in sessions_raw:
-            sess_dict = dict(sess)
-            # Format created_at for display
-            if sess_dict.get('created_at'):
-                try:
-                    dt = datetime.strptime(sess_dict['created_at'], '%Y-%m-%d %H:%M:%S')
-                    sess_dict['created_at_formatted'] = dt.strftime('%Y-%m-%d %H:%M')
-                except:
-                    sess_dict['created_at_formatted'] = sess_dict['created_at']
-            else:
-                sess_dict['created_at_formatted'] = 'N/A'
-            
-            # Add professional ID
-            student_db_id = sess_dict.get('student_db_id', 0)
-            sess_dict['professional_id'] = f"C{student_db_id:03d}" if student_db_id else 'N/A'
-            sessions.append(sess_dict)
-        
-        return render_template('outcome_questionnaire.html', students=students, sessions=sessions)
+            conn.close()
+        except Exception:
+            pass
+
+        return render_template('outcome_questionnaire.html')
     except Exception as e:
         print(f"[OUTCOME_QUESTIONNAIRE] Unexpected error: {e}")
         import traceback
@@ -2558,17 +2435,10 @@ def dass21():
             if not student_id or student_id == '':
                 flash('Please select a student', 'error')
                 try:
-                    students_raw = conn.execute('SELECT id, name, programme FROM Student ORDER BY name').fetchall()
-                    students = [dict(s) for s in students_raw]
-                except Exception as e:
-                    print(f"[DASS21] Error getting students: {e}")
-                    students = []
-                finally:
-                    try:
-                        conn.close()
-                    except Exception:
-                        pass
-                return render_template('dass21.html', students=students)
+                    conn.close()
+                except Exception:
+                    pass
+                return render_template('dass21.html')
             
             try:
                 depression_score = float(depression_score)
@@ -2577,17 +2447,10 @@ def dass21():
             except ValueError:
                 flash('Please enter valid numeric scores', 'error')
                 try:
-                    students_raw = conn.execute('SELECT id, name, programme FROM Student ORDER BY name').fetchall()
-                    students = [dict(s) for s in students_raw]
-                except Exception as e:
-                    print(f"[DASS21] Error getting students: {e}")
-                    students = []
-                finally:
-                    try:
-                        conn.close()
-                    except Exception:
-                        pass
-                return render_template('dass21.html', students=students)
+                    conn.close()
+                except Exception:
+                    pass
+                return render_template('dass21.html', selected_student=lookup_service.selected_student(student_id))
             
             # Calculate final scores (multiply by 2)
             final_depression = depression_score * 2
@@ -2596,13 +2459,16 @@ def dass21():
             
             # Insert DASS-21 scores into database
             try:
-                conn.execute('''
+                cursor = conn.execute('''
                     INSERT INTO DASS21 
                     (student_id, depression_score, anxiety_score, stress_score, created_at)
                     VALUES (?, ?, ?, ?, ?)
                 ''', (student_id, depression_score, anxiety_score, stress_score,
                       datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                scoring_engine.refresh_student(conn, student_id)
+                risk_engine.evaluate(conn, 'dass21', cursor.lastrowid)
                 conn.commit()
+                profile_cache.invalidate_student(student_id)
                 flash('DASS-21 scores saved successfully!', 'success')
                 return redirect(url_for('dashboard'))
             except Exception as e:
@@ -2612,42 +2478,23 @@ def dass21():
                 traceback.print_exc()
                 flash(f'Error saving DASS-21 scores: {str(e)}', 'error')
                 try:
-                    students_raw = conn.execute('SELECT id, name, programme FROM Student ORDER BY name').fetchall()
-                    students = [dict(s) for s in students_raw]
-                except Exception as e:
-                    print(f"[DASS21] Error getting students: {e}")
-                    students = []
-                finally:
-                    try:
-                        conn.close()
-                    except Exception:
-                        pass
-                return render_template('dass21.html', students=students)
+                    conn.close()
+                except Exception:
+                    pass
+                return render_template('dass21.html', selected_student=lookup_service.selected_student(student_id))
             finally:
                 try:
                     conn.close()
                 except Exception:
                     pass
         
-        # GET request - display the form
-        students_raw = []
+        # GET request - display the form (students are picked through /api/lookup)
         try:
-            students_raw = conn.execute('SELECT id, name, programme FROM Student ORDER BY name').fetchall()
-        except Exception as e:
-            print(f"[DASS21] Error getting students: {e}")
-            students_raw = []
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
-        
-        # Convert to list
-        students = []
-        for student in students_raw:
-            students.append(dict(student))
-        
-        return render_template('dass21.html', students=students)
+            conn.close()
+        except Exception:
+            pass
+
+        return render_template('dass21.html')
     except Exception as e:
         print(f"[DASS21] Unexpected error: {e}")
         import traceback
@@ -2692,6 +2539,7 @@ def import_csv():
                 
                 elif import_type == 'appointments':
                     # Import appointments data
+                    imported_appointments = []
                     for row in data:
                         # Get student_id from student_name
                         student_name = row.get('student_name', '')
@@ -2701,21 +2549,29 @@ def import_csv():
                         ).fetchone()
                         
                         if student:
-                            conn.execute('''
+                            # No counsellor yet (a user id is not a Counsellor id); assigned like an intake
+                            cursor = conn.execute('''
                                 INSERT INTO Appointment 
-                                (student_id, date, time, purpose, counselor_id, status)
-                                VALUES (?, ?, ?, ?, ?, ?)
+                                (student_id, date, time, purpose, Counsellor_id, status)
+                                VALUES (?, ?, ?, ?, NULL, ?)
                             ''', (
                                 student['id'],
                                 row.get('date', ''),
                                 row.get('time', ''),
                                 row.get('purpose', ''),
-                                session.get('user_id'),
                                 row.get('status', 'scheduled')
                             ))
+                            imported_appointments.append(cursor.lastrowid)
                 
                 conn.commit()
+                if import_type == 'appointments':
+                    # Imported bookings show on the live queue and hold their slots
+                    for appt_id in imported_appointments:
+                        today_queue.refresh(conn, appt_id)
+                        slot_index.refresh(conn, appt_id)
                 conn.close()
+                lookup_index.invalidate()
+                profile_cache.clear()
                 
                 flash(f'Successfully imported {len(data)} {import_type}', 'success')
                 return redirect(url_for('dashboard'))
@@ -2822,28 +2678,50 @@ def intake():
             urgency = request.form.get('urgency')
             referral = request.form.get('referral_source')
             
-            # 3. Create/Check Student
-            # Determine logic: assume New Client per form design, but check index_number to avoid dupes
-            existing_student = conn.execute("SELECT id FROM Student WHERE index_number = ?", (index_number,)).fetchone()
-            
-            if existing_student:
-                student_id = existing_student['id']
-                # Optional: Update contact info if changed
-            else:
+            # 3. Reject malformed or out-of-hours times and double-booking of the
+            # intake slot (Crisis walk-ins are always accepted). The booking lock
+            # is held until the appointment is committed and indexed.
+            with slot_index.booking():
+                if urgency != 'Crisis':
+                    try:
+                        slot_index.validate(None, appt_date, appt_time)
+                    except ValueError as e:
+                        flash(str(e), 'danger')
+                        return redirect(url_for('intake'))
+                conflict_id = slot_index.find_conflict(None, appt_date, appt_time)
+                if conflict_id is not None and urgency != 'Crisis':
+                    suggestion = slot_index.next_free_slot(None, from_date=datetime.strptime(appt_date, '%Y-%m-%d').date())
+                    hint = f" Next free slot: {suggestion['date']} {suggestion['time']}." if suggestion else ""
+                    flash(f'That time is already booked.{hint}', 'danger')
+                    return redirect(url_for('intake'))
+
+                # 4. Create/Check Student
+                # Determine logic: assume New Client per form design, but check index_number to avoid dupes
+                existing_student = conn.execute("SELECT id FROM Student WHERE index_number = ?", (index_number,)).fetchone()
+
+                if existing_student:
+                    student_id = existing_student['id']
+                    # Optional: Update contact info if changed
+                else:
+                    cursor = conn.execute('''
+                        INSERT INTO Student (name, age, gender, index_number, department, 
+                        faculty, programme, contact, parent_contact, hall_of_residence)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (name, age, gender, index_number, department, faculty, programme, contact, parent_contact, hall))
+                    student_id = cursor.lastrowid
+
+                # 5. Create Appointment (The "Intake Record")
                 cursor = conn.execute('''
-                    INSERT INTO Student (name, age, gender, index_number, department, 
-                    faculty, programme, contact, parent_contact, hall_of_residence)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (name, age, gender, index_number, department, faculty, programme, contact, parent_contact, hall))
-                student_id = cursor.lastrowid
-                
-            # 4. Create Appointment (The "Intake Record")
-            conn.execute('''
-                INSERT INTO Appointment (student_id, date, time, purpose, status, urgency, referral_source)
-                VALUES (?, ?, ?, ?, 'Scheduled', ?, ?)
-            ''', (student_id, appt_date, appt_time, purpose, urgency, referral))
-            
-            conn.commit()
+                    INSERT INTO Appointment (student_id, date, time, purpose, status, urgency, referral_source)
+                    VALUES (?, ?, ?, ?, 'Scheduled', ?, ?)
+                ''', (student_id, appt_date, appt_time, purpose, urgency, referral))
+                risk_engine.evaluate(conn, 'appointment', cursor.lastrowid)
+
+                conn.commit()
+                slot_index.refresh(conn, cursor.lastrowid)
+            # Crisis walk-ins must reach the dashboards immediately
+            today_queue.refresh(conn, cursor.lastrowid)
+            lookup_index.refresh_appointment(conn, cursor.lastrowid)
             flash('Student intake registered and appointment scheduled successfully.', 'success')
             return redirect(url_for('dashboard'))
             
@@ -2908,13 +2786,36 @@ def appointment():
                 flash('Student not found. Please check the ID or add the student first.', 'danger')
                 return render_template('appointment.html', students=students, Counsellors=counsellors)
 
-            # Save appointment to database
+            # Reject malformed or out-of-hours times and double-booking of the
+            # counsellor (Crisis cases are always accepted). The booking lock is
+            # held until the appointment is committed and indexed.
             try:
-                conn.execute('''
-                        INSERT INTO Appointment (student_id, date, time, purpose, Counsellor_id, status, urgency, referral_source)
-                    VALUES (?, ?, ?, ?, ?, 'Scheduled', ?, ?)
-                ''', (student_id, appointment_date, appointment_time, purpose, counselor_id, urgency, referral))
-                conn.commit()
+                with slot_index.booking():
+                    if urgency != 'Crisis':
+                        try:
+                            slot_index.validate(counselor_id, appointment_date, appointment_time)
+                        except ValueError as e:
+                            flash(str(e), 'danger')
+                            return render_template('appointment.html', students=students, Counsellors=counsellors,
+                                                   selected_student_id=student_id)
+                    conflict_id = slot_index.find_conflict(counselor_id, appointment_date, appointment_time)
+                    if conflict_id is not None and urgency != 'Crisis':
+                        suggestion = slot_index.next_free_slot(counselor_id, from_date=datetime.strptime(appointment_date, '%Y-%m-%d').date())
+                        hint = f" Next free slot: {suggestion['date']} at {suggestion['time']}." if suggestion else ""
+                        flash(f'The counsellor is already booked at that time.{hint}', 'danger')
+                        return render_template('appointment.html', students=students, Counsellors=counsellors,
+                                               selected_student_id=student_id)
+
+                    # Save appointment to database
+                    cursor = conn.execute('''
+                            INSERT INTO Appointment (student_id, date, time, purpose, Counsellor_id, status, urgency, referral_source)
+                        VALUES (?, ?, ?, ?, ?, 'Scheduled', ?, ?)
+                    ''', (student_id, appointment_date, appointment_time, purpose, counselor_id, urgency, referral))
+                    risk_engine.evaluate(conn, 'appointment', cursor.lastrowid)
+                    conn.commit()
+                    slot_index.refresh(conn, cursor.lastrowid)
+                today_queue.refresh(conn, cursor.lastrowid)
+                lookup_index.refresh_appointment(conn, cursor.lastrowid)
                 flash('Appointment scheduled successfully!', 'success')
                 return redirect(url_for('manage_appointments'))
             except Exception as e:
@@ -3022,6 +2923,10 @@ def update_appointment_status(appointment_id):
             WHERE id = ?
         ''', (new_status, appointment_id))
         conn.commit()
+        today_queue.refresh(conn, appointment_id)
+        slot_index.refresh(conn, appointment_id)
+        lookup_index.refresh_appointment(conn, appointment_id)
+        profile_cache.invalidate(conn, 'appointment', appointment_id)
         
         flash(f'Appointment status updated to {new_status} successfully!', 'success')
     except Exception as e:
@@ -3079,10 +2984,17 @@ def download_report(report_id):
 def delete_report(report_id):
     conn = get_db_connection()
     
-    # Delete report from database
+    # Delete report from database, and its file when it lives in the reports folder
     try:
+        row = conn.execute('SELECT file_path FROM reports WHERE id = ?', (report_id,)).fetchone()
         result = conn.execute('DELETE FROM reports WHERE id = ?', (report_id,)).rowcount
         conn.commit()
+        file_path = report_cache.resolve_path(row['file_path']) if row else None
+        if file_path and os.path.dirname(os.path.abspath(file_path)) == os.path.abspath(report_cache.reports_dir()):
+            try:
+                os.remove(file_path)
+            except OSError as e:
+                print(f"[REPORTS] Could not remove {file_path}: {e}")
         
         if result > 0:
             flash('Report deleted successfully!', 'success')
@@ -3109,35 +3021,17 @@ def delete_student(student_id):
             flash('Student not found', 'error')
             return redirect(url_for('students'))
         
-        # Delete related records first (due to foreign keys)
-        # Delete referrals (through sessions through appointments)
-        conn.execute('''
-            DELETE FROM Referral 
-            WHERE session_id IN (
-                SELECT s.id FROM session s
-                JOIN Appointment a ON s.appointment_id = a.id
-                WHERE a.student_id = ?
-            )
-        ''', (student_id,))
-        
-        # Delete sessions
-        conn.execute('''
-            DELETE FROM session
-            WHERE appointment_id IN (
-                SELECT id FROM Appointment WHERE student_id = ?
-            )
-        ''', (student_id,))
-        
-        # Delete appointments
-        conn.execute('DELETE FROM Appointment WHERE student_id = ?', (student_id,))
-        
-        # Delete assessments
-        conn.execute('DELETE FROM DASS21 WHERE student_id = ?', (student_id,))
-        conn.execute('DELETE FROM OutcomeQuestionnaire WHERE student_id = ?', (student_id,))
-        
-        # Finally delete the student
-        result = conn.execute('DELETE FROM Student WHERE id = ?', (student_id,)).rowcount
+        # Delete the student and everything below it (appointments, sessions,
+        # referrals, case notes, assessments), leaving tombstones for the peer
+        deleted = sync_tombstones.cascade_delete(conn, 'Student', 'id = ?', (student_id,))
+        result = deleted.get('Student', 0)
+        scoring_engine.refresh_student(conn, student_id)
+        risk_engine.forget_student(conn, student_id)
         conn.commit()
+        today_queue.refresh_student(conn, student_id)
+        slot_index.invalidate()
+        lookup_index.refresh_student(conn, student_id)
+        profile_cache.invalidate_student(student_id)
         
         if result > 0:
             flash('Student and all related records deleted successfully!', 'success')
@@ -3164,12 +3058,15 @@ def delete_appointment(appointment_id):
             flash('Appointment not found', 'error')
             return redirect(url_for('manage_appointments'))
         
-        # Delete related sessions first
-        conn.execute('DELETE FROM session WHERE appointment_id = ?', (appointment_id,))
-        
-        # Delete the appointment
-        result = conn.execute('DELETE FROM Appointment WHERE id = ?', (appointment_id,)).rowcount
+        # Delete the appointment with its sessions and their notes/referrals (tombstoned for sync)
+        deleted = sync_tombstones.cascade_delete(conn, 'Appointment', 'id = ?', (appointment_id,))
+        result = deleted.get('Appointment', 0)
+        risk_engine.forget_deleted(conn, appointment['student_id'])
         conn.commit()
+        today_queue.remove(appointment_id)
+        slot_index.remove(appointment_id)
+        lookup_index.refresh_appointment(conn, appointment_id)
+        profile_cache.invalidate(conn, 'appointment', appointment_id)
         
         if result > 0:
             flash('Appointment deleted successfully!', 'success')
@@ -3191,20 +3088,22 @@ def delete_session(session_id):
     
     try:
         # Check if session exists
-        session_record = conn.execute('SELECT * FROM session WHERE id = ?', (session_id,)).fetchone()
+        session_record = conn.execute(
+            'SELECT s.id, a.student_id FROM session s LEFT JOIN Appointment a ON s.appointment_id = a.id '
+            'WHERE s.id = ?', (session_id,)
+        ).fetchone()
         if not session_record:
             flash('Session not found', 'error')
             return redirect(url_for('sessions_list'))
         
-        # Delete related referrals
-        conn.execute('DELETE FROM Referral WHERE session_id = ?', (session_id,))
-        
-        # Delete case management records
-        conn.execute('DELETE FROM CaseManagement WHERE session_id = ?', (session_id,))
-        
-        # Delete the session
-        result = conn.execute('DELETE FROM session WHERE id = ?', (session_id,)).rowcount
+        # Delete the session with its referrals, case notes, feedback and issues (tombstoned for sync)
+        deleted = sync_tombstones.cascade_delete(conn, 'session', 'id = ?', (session_id,))
+        result = deleted.get('session', 0)
+        if session_record['student_id'] is not None:
+            risk_engine.forget_deleted(conn, session_record['student_id'])
         conn.commit()
+        lookup_index.refresh_session(conn, session_id)
+        profile_cache.invalidate(conn, 'session', session_id)
         
         if result > 0:
             flash('Session deleted successfully!', 'success')
@@ -3225,8 +3124,10 @@ def delete_referral(referral_id):
     conn = get_db_connection()
     
     try:
-        result = conn.execute('DELETE FROM Referral WHERE id = ?', (referral_id,)).rowcount
+        deleted = sync_tombstones.cascade_delete(conn, 'Referral', 'id = ?', (referral_id,))
+        result = deleted.get('Referral', 0)
         conn.commit()
+        profile_cache.invalidate(conn, 'referral', referral_id)
         
         if result > 0:
             flash('Referral deleted successfully!', 'success')
@@ -3293,20 +3194,24 @@ def print_session(session_id):
             flash('Database connection failed. Please restart the application.', 'error')
             return redirect(url_for('dashboard'))
     
-    # Get session details with student information
+        # From the student's cached profile; orphaned sessions are read directly
         session_data = None
         try:
-            session_data = conn.execute('''
-                SELECT sess.*, s.name as student_name, 
-                       s.index_number, s.programme, s.contact, s.department,
-                       c.name as Counsellor_name,
-                       a.date, a.time, a.status as appointment_status
-                FROM session sess
-                LEFT JOIN Appointment a ON sess.appointment_id = a.id
-                LEFT JOIN Student s ON a.student_id = s.id
-                LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
-                WHERE sess.id = ?
-            ''', (session_id,)).fetchone()
+            snapshot = profile_cache.for_record(conn, 'session', session_id)
+            if snapshot is not None:
+                session_data = snapshot.print_session(session_id)
+            if session_data is None:
+                session_data = conn.execute('''
+                    SELECT sess.*, s.name as student_name, 
+                           s.index_number, s.programme, s.contact, s.department,
+                           c.name as Counsellor_name,
+                           a.date, a.time, a.status as appointment_status
+                    FROM session sess
+                    LEFT JOIN Appointment a ON sess.appointment_id = a.id
+                    LEFT JOIN Student s ON a.student_id = s.id
+                    LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
+                    WHERE sess.id = ?
+                ''', (session_id,)).fetchone()
         except Exception as e:
             print(f"[PRINT_SESSION] Error getting session: {e}")
         finally:
@@ -3337,42 +3242,18 @@ def print_referral(id):
             flash('Database connection failed. Please restart the application.', 'error')
             return redirect(url_for('dashboard'))
     
-    # Get referral details with student information
+    # Referral details with student information, from the student's cached profile
         referral = None
         student_info = None
         try:
-            referral = conn.execute('''
-                SELECT r.*, s.id as student_db_id, s.name as student_name, 
-                       s.index_number, s.contact as student_contact, s.department as student_department,
-                       sess.created_at as session_date,
-                       a.date as appointment_date, a.time as appointment_time
-                FROM Referral r
-                JOIN session sess ON r.session_id = sess.id
-                JOIN Appointment a ON sess.appointment_id = a.id
-                JOIN Student s ON a.student_id = s.id
-        WHERE r.id = ?
-    ''', (id,)).fetchone()
+            snapshot = profile_cache.for_record(conn, 'referral', id)
+            referral = snapshot.print_referral(id) if snapshot is not None else None
     
-            # Parse reasons from comma-separated string
-            reasons_str = referral['reasons'] or ''
-            referral_reasons_list = [r.strip() for r in reasons_str.split(',') if r.strip()]
-            
-            # Check for "Something Else" and extract text
-            other_reason_text = None
-            if referral_reasons_list:
-                for idx, reason in enumerate(referral_reasons_list):
-                    if reason.startswith('Something Else:'):
-                        other_reason_text = reason.replace('Something Else:', '').strip()
-                        referral_reasons_list[idx] = 'Something Else'  # Replace with just the checkbox name
-                        break
+            # Checked reasons, with the "Something Else" text split out
+            referral_reasons_list, other_reason_text = print_service.referral_reasons(referral['reasons'])
             
-            # Convert to dict for template and add professional ID
+            # Snapshot records are already dicts with the professional ID
             referral_dict = dict(referral) if referral else {}
-            if referral and referral_dict.get('student_db_id'):
-                student_db_id = referral_dict.get('student_db_id', 0)
-                referral_dict['professional_id'] = f"C{student_db_id:03d}"
-            else:
-                referral_dict['professional_id'] = 'N/A'
             referral_dict['referral_reasons_list'] = referral_reasons_list
             referral_dict['other_reason_text'] = other_reason_text
             student_department = referral_dict.get('student_department', 'N/A') if referral else 'N/A'
@@ -3698,7 +3579,7 @@ def statistics():
     """Display comprehensive statistics with charts"""
     try:
         ensure_database_initialized()
-        conn = get_db_connection()
+        conn = get_analytics_connection()
         if conn is None:
             flash('Database connection failed. Please restart the application.', 'error')
             return redirect(url_for('dashboard'))
@@ -3962,20 +3843,46 @@ def handle_exception(e):
 import threading
 import time
 
+def start_background_services():
+    """Called by server.py in the process that serves requests"""
+    readiness.warm_up()
+    threading.Thread(target=template_cache.warm_templates, args=(app,), name='template-warmup', daemon=True).start()
+    sync_thread = threading.Thread(target=run_auto_sync_loop, name='auto-sync', daemon=True)
+    sync_thread.start()
+
 def run_auto_sync_loop():
     """Background thread to auto-sync every 10 seconds"""
     print("--- Auto-Sync Service Started ---")
+    last_consistency_check = time.time()
     while True:
         try:
             # Check if sync is enabled and peer IP is set
             config = node_config.load_config()
-            peer_ip = config.get('peer_ip')  
-            if peer_ip:
+            if node_config.get_sync_targets(config):
                 # Trigger sync silently
                 # We use a slight delay or check to avoid spamming if offline
                 result = trigger_sync()
                 if result.get('status') == 'success' and result.get('count', 0) > 0:
                     print(f"[AUTO-SYNC] Synced {result['count']} records.")
+
+                # Periodic anti-entropy pass: compares hash trees, repairs only diverged rows
+                interval = config.get('consistency_check_interval_seconds', 600)
+                if interval and time.time() - last_consistency_check >= interval:
+                    last_consistency_check = time.time()
+                    check = check_consistency()
+                    if check.get('count'):
+                        print(f"[AUTO-SYNC] Consistency check repaired {check['count']} records.")
+
+                # Tombstones every peer has received are no longer needed
+                if result.get('status') == 'success':
+                    conn = get_db_connection()
+                    try:
+                        purged = sync_tombstones.purge_acknowledged(conn)
+                        conn.commit()
+                    finally:
+                        conn.close()
+                    if purged:
+                        print(f"[AUTO-SYNC] Purged {purged} acknowledged tombstones.")
             
         except Exception as e:
             print(f"[AUTO-SYNC] Error: {e}")
@@ -3984,62 +3891,35 @@ def run_auto_sync_loop():
         time.sleep(10)
 
 if __name__ == '__main__':
-    # Initialize database FIRST before anything else
-    print("Initializing database...")
-    try:
-        # Force database initialization at startup
-        try:
-            if getattr(sys, 'frozen', False):
-                base_path = os.path.dirname(sys.executable)
-            else:
-                base_path = os.path.dirname(os.path.abspath(__file__))
-        except:
-            base_path = os.path.dirname(os.path.abspath(__file__))
-        
-        db_path = os.path.join(base_path, 'counseling.db')
-        
-        # Check and initialize
-        if not os.path.exists(db_path):
-            print(f"Database not found, creating at: {db_path}")
-            import db_setup
-            db_setup.init_db()
-        else:
-            # Verify Appointment table exists
-            test_conn = sqlite3.connect(db_path)
-            cursor = test_conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='Appointment'")
-            if not cursor.fetchone():
-                print("Appointment table missing, reinitializing database...")
-                test_conn.close()
-                import db_setup
-                db_setup.init_db()
-            else:
-                test_conn.close()
-                print("Database check passed - Appointment table exists")
-    except Exception as e:
-        print(f"WARNING: Database initialization issue: {e}")
-        print("Attempting to continue anyway...")
-    
-    # Check if port 5000 is already in use and kill the process if needed
+    # `import app` elsewhere (sync engine, server.py) should get this module,
+    # not load a second copy of it
+    sys.modules.setdefault('app', sys.modules[__name__])
+    import server
+
+    # Host and port come from node_config (server_host / server_port)
+    server_config = node_config.load_config()
+    port = int(server.setting(server_config, 'server_port'))
+
+    # Check if the port is already in use and kill the process if needed
     import socket
     import subprocess
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
-        sock.bind(('127.0.0.1', 5000))
+        sock.bind(('127.0.0.1', port))
         sock.close()
     except OSError as e:
         if e.errno == 10048 or (hasattr(e, 'winerror') and e.winerror == 10048):  # Port already in use
-            print("WARNING: Port 5000 is already in use!")
-            print("Attempting to kill the process using port 5000...")
+            print(f"WARNING: Port {port} is already in use!")
+            print(f"Attempting to kill the process using port {port}...")
             try:
-                # Find process using port 5000
+                # Find process using the port
                 result = subprocess.run(['netstat', '-ano'], capture_output=True, text=True, timeout=5)
                 for line in result.stdout.split('\n'):
-                    if ':5000' in line and 'LISTENING' in line:
+                    if f':{port}' in line and 'LISTENING' in line:
                         parts = line.split()
                         if len(parts) > 4:
                             pid = parts[-1]
-                            print(f"Found process {pid} using port 5000. Killing it...")
+                            print(f"Found process {pid} using port {port}. Killing it...")
                             subprocess.run(['taskkill', '/F', '/PID', pid], 
                                          capture_output=True, timeout=5)
                             import time
@@ -4047,11 +3927,11 @@ if __name__ == '__main__':
                 # Try binding again
                 try:
                     sock2 = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    sock2.bind(('127.0.0.1', 5000))
+                    sock2.bind(('127.0.0.1', port))
                     sock2.close()
-                    print("Port 5000 is now available!")
+                    print(f"Port {port} is now available!")
                 except:
-                    print("ERROR: Could not free port 5000.")
+                    print(f"ERROR: Could not free port {port}.")
                     print("Please manually close other instances or restart your computer.")
                     is_exe = getattr(sys, 'frozen', False)
                     if not is_exe:
@@ -4065,15 +3945,11 @@ if __name__ == '__main__':
                     input("Press Enter to exit...")
                 sys.exit(1)
     
-    # Start Auto-Sync Thread
-    sync_thread = threading.Thread(target=run_auto_sync_loop, daemon=True)
-    sync_thread.start()
-
     # Log available routes for debugging
     print('=' * 60)
     print('AAMUSTED Counselling Management System')
     print('=' * 60)
-    print('Starting server on http://127.0.0.1:5000')
+    print(f'Starting server on http://127.0.0.1:{port}')
     print('Registered routes:')
     for rule in app.url_map.iter_rules():
         if rule.endpoint not in ['static']:
@@ -4086,15 +3962,16 @@ if __name__ == '__main__':
     import threading
     
     def open_browser():
-        import time
-        time.sleep(2.5)  # Wait longer for server to fully start
+        # Open as soon as the server accepts connections and startup work is done
+        wait_for_port('127.0.0.1', port)
+        readiness.run()
         try:
             # Try to open browser
-            webbrowser.open('http://127.0.0.1:5000')
+            webbrowser.open(f'http://127.0.0.1:{port}')
             print("Browser opened automatically!")
         except Exception as e:
             print(f"Could not open browser automatically: {e}")
-            print("Please manually open: http://localhost:5000")
+            print(f"Please manually open: http://localhost:{port}")
     
     # Open browser automatically (only if not in debug mode or forced via Env)
     is_exe = getattr(sys, 'frozen', False) or os.environ.get('AAMUSTED_AUTO_OPEN_BROWSER') == '1'
@@ -4105,14 +3982,15 @@ if __name__ == '__main__':
         print("Server starting... Browser will open automatically.")
     else:
         print("Starting in development mode...")
-        print("Local access: http://localhost:5000")
-        print("Network access: http://<your-ip-address>:5000")
+        print(f"Local access: http://localhost:{port}")
+        print(f"Network access: http://<your-ip-address>:{port}")
     
     print()
     
     try:
-        # Run app (debug=False for production EXE)
-        app.run(debug=not getattr(sys, 'frozen', False), host='0.0.0.0', port=5000, use_reloader=False)
+        # Pooled production server (gunicorn on Linux when installed). It
+        # starts the readiness warm-up and auto-sync in the serving process.
+        server.serve('app:app', port=port, config=server_config)
     except Exception as e:
         print(f"Error starting server: {e}")
         input("Press Enter to exit...")
@@ -1,11 +1,13 @@
 import os
 import sqlite3
+import threading
 from datetime import datetime, timedelta
-from docx import Document
-from docx.shared import Inches, Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.style import WD_STYLE_TYPE
 from apscheduler.schedulers.background import BackgroundScheduler
+import repository
+import report_cache
+import report_rollup
+import report_template
+from analytics_db import get_analytics_connection
 
 # Ensure the reports directory exists (works in both dev and EXE mode)
 import sys
@@ -50,55 +52,26 @@ def format_number(number):
     """Format numbers with commas"""
     return f"{number:,}" if number else "0"
 
-def add_heading_with_style(document, text, level=1):
-    """Add heading with proper formatting"""
-    heading = document.add_heading(text, level)
-    for run in heading.runs:
-        run.font.bold = True
-        if level == 1:
-            run.font.size = Pt(16)
-            run.font.color.rgb = RGBColor(13, 110, 253)  # Primary blue
-        elif level == 2:
-            run.font.size = Pt(14)
-    return heading
+# Report types with a window ending now; 'custom' takes explicit dates
+REPORT_WINDOWS = ('bi-hourly', 'daily', 'monthly', 'manual')
 
-def add_table_with_data(document, headers, rows, title=None):
-    """Add a formatted table to the document"""
-    if title:
-        para = document.add_paragraph(title)
-        para.style = 'Heading 3'
-        for run in para.runs:
-            run.font.bold = True
-            run.font.size = Pt(12)
-    
-    table = document.add_table(rows=1, cols=len(headers))
-    table.style = 'Light Grid Accent 1'
-    
-    # Add headers
-    header_cells = table.rows[0].cells
-    for i, header in enumerate(headers):
-        header_cells[i].text = str(header)
-        for paragraph in header_cells[i].paragraphs:
-            for run in paragraph.runs:
-                run.font.bold = True
-                run.font.size = Pt(10)
-    
-    # Add data rows
-    for row_data in rows:
-        row_cells = table.add_row().cells
-        for i, cell_data in enumerate(row_data):
-            row_cells[i].text = str(cell_data) if cell_data else 'N/A'
-            for paragraph in row_cells[i].paragraphs:
-                for run in paragraph.runs:
-                    run.font.size = Pt(10)
-
-def generate_report(report_type='manual'):
-    """Generate a professional counselling center report following standard report structure"""
-    now = datetime.now()
+def report_window(report_type, now, start_day=None, end_day=None):
+    """(start, end, date range text, period name) of a report; start_day/end_day are dates for 'custom'"""
     end_date = now
 
     # Determine date range
-    if report_type == 'bi-hourly':
+    if report_type == 'custom':
+        if start_day is None or end_day is None:
+            raise ValueError("A custom report needs a start and an end date")
+        if start_day > end_day:
+            raise ValueError("The start date is after the end date")
+        if start_day > now.date():
+            raise ValueError("The start date is in the future")
+        start_date = datetime.combine(start_day, datetime.min.time())
+        end_date = min(datetime.combine(end_day, datetime.max.time().replace(microsecond=0)), now)
+        date_range_str = f"{start_day.strftime('%Y-%m-%d')} - {end_day.strftime('%Y-%m-%d')}"
+        period_name = f"Custom Range ({start_day.strftime('%B %d, %Y')} to {end_day.strftime('%B %d, %Y')})"
+    elif report_type == 'bi-hourly':
         start_date = now - timedelta(hours=2)
         date_range_str = f"{start_date.strftime('%Y-%m-%d %H:%M')} - {end_date.strftime('%Y-%m-%d %H:%M')}"
         period_name = f"Bi-Hourly Report ({date_range_str})"
@@ -114,24 +87,24 @@ def generate_report(report_type='manual'):
         start_date = datetime(2023, 1, 1)
         date_range_str = f"All Data up to {end_date.strftime('%Y-%m-%d %H:%M')}"
         period_name = f"Comprehensive Report (up to {end_date.strftime('%B %Y')})"
+    return start_date, end_date, date_range_str, period_name
 
-    conn = get_db_connection()
+def generate_report(report_type='manual', start_day=None, end_day=None, cache_key=None, now=None):
+    """Generate a professional counselling center report following standard report structure"""
+    now = now or datetime.now()
+    start_date, end_date, date_range_str, period_name = report_window(report_type, now, start_day, end_day)
 
     # === COLLECT DATA ===
-    # Total students
-    total_students = conn.execute('SELECT COUNT(*) as count FROM Student').fetchone()['count']
-    
+    # Closed days come from the per-day rollup; only a partial first day and today are scanned
+    conn = get_db_connection()
+    try:
+        totals = report_rollup.period_totals(conn, start_date, end_date)
+        conn.commit()
+    finally:
+        conn.close()
+
     # Appointments by status
-    appointments_query = """
-        SELECT status, COUNT(*) as count 
-        FROM Appointment 
-        WHERE date BETWEEN ? AND ?
-        GROUP BY status
-    """
-    appointments_data = conn.execute(
-        appointments_query, 
-        (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
-    ).fetchall()
+    appointments_data = [{'status': status, 'count': count} for status, count in totals.appointments.items()]
     
     total_appointments = sum([row['count'] for row in appointments_data])
     completed_appointments = next((row['count'] for row in appointments_data if row['status'].lower() in ('completed', 'complete')), 0)
@@ -140,147 +113,46 @@ def generate_report(report_type='manual'):
     postponed_appointments = next((row['count'] for row in appointments_data if row['status'].lower() in ('postponed', 'postpone')), 0)
     
     # Sessions statistics
-    sessions_query = """
-        SELECT COUNT(*) as count, 
-               COUNT(DISTINCT a.student_id) as unique_students
-        FROM session sess
-        JOIN Appointment a ON sess.appointment_id = a.id
-        WHERE sess.created_at BETWEEN ? AND ?
-    """
-    sessions_result = conn.execute(
-        sessions_query,
-        (start_date.strftime('%Y-%m-%d %H:%M:%S'), end_date.strftime('%Y-%m-%d %H:%M:%S'))
-    ).fetchone()
-    total_sessions = sessions_result['count'] if sessions_result else 0
-    unique_students_served = sessions_result['unique_students'] if sessions_result else 0
+    total_sessions = totals.sessions
+    unique_students_served = totals.unique_students()
     
     # Session types breakdown
-    session_types_query = """
-        SELECT session_type, COUNT(*) as count
-        FROM session
-        WHERE created_at BETWEEN ? AND ?
-        GROUP BY session_type
-    """
-    session_types = conn.execute(
-        session_types_query,
-        (start_date.strftime('%Y-%m-%d %H:%M:%S'), end_date.strftime('%Y-%m-%d %H:%M:%S'))
-    ).fetchall()
+    session_types = [{'session_type': session_type or None, 'count': count}
+                     for session_type, count in totals.session_types.items()]
     
     # Referrals
-    try:
-        referrals_query = "SELECT COUNT(*) as count FROM Referral WHERE created_at BETWEEN ? AND ?"
-        total_referrals = conn.execute(
-            referrals_query,
-            (start_date.strftime('%Y-%m-%d %H:%M:%S'), end_date.strftime('%Y-%m-%d %H:%M:%S'))
-        ).fetchone()['count']
-    except:
-        total_referrals = 0
+    total_referrals = totals.referrals
     
     # Top programmes served
-    programmes_query = """
-        SELECT s.programme, COUNT(DISTINCT a.student_id) as student_count
-        FROM Appointment a
-        JOIN Student s ON a.student_id = s.id
-        WHERE a.date BETWEEN ? AND ?
-        GROUP BY s.programme
-        ORDER BY student_count DESC
-        LIMIT 5
-    """
-    top_programmes = conn.execute(
-        programmes_query,
-        (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
-    ).fetchall()
+    top_programmes = [{'programme': programme, 'student_count': students}
+                      for programme, students in totals.top_programmes(5)]
     
     # Common issues from session notes
-    session_notes_query = "SELECT notes FROM session WHERE created_at BETWEEN ? AND ? AND notes IS NOT NULL AND notes != ''"
-    session_notes = conn.execute(
-        session_notes_query,
-        (start_date.strftime('%Y-%m-%d %H:%M:%S'), end_date.strftime('%Y-%m-%d %H:%M:%S'))
-    ).fetchall()
-    
-    keywords = ['stress', 'anxiety', 'depression', 'academic', 'relationship', 'family', 'career', 'financial', 'health']
-    common_issues = {}
-    for note in session_notes:
-        note_lower = note['notes'].lower()
-        for keyword in keywords:
-            if keyword in note_lower:
-                common_issues[keyword] = common_issues.get(keyword, 0) + 1
+    common_issues = dict(totals.issues)
+    session_notes_count = totals.notes
 
-    # Session notes count
-    session_notes_count = len(session_notes)
+    with get_analytics_connection() as conn:
+        # Total students
+        total_students = repository.count_students(conn)
 
-    conn.close()
+        # Session register for the appendix: one row per session, students by professional ID only
+        session_register = [
+            [created_at, repository.professional_id(student_id), programme or 'Not Specified',
+             session_type or 'Not Specified', status]
+            for created_at, student_id, programme, session_type, _counsellor, status in repository.iter_session_register(
+                conn, start_date.strftime('%Y-%m-%d %H:%M:%S'), end_date.strftime('%Y-%m-%d %H:%M:%S'))
+        ]
 
     # === CREATE DOCUMENT ===
-    document = Document()
-
-    # Set default font
-    style = document.styles['Normal']
-    font = style.font
-    font.name = 'Calibri'
-    font.size = Pt(11)
-
-    # ==========================================
-    # 1. TITLE PAGE
-    # ==========================================
-    # Try to add logo if it exists (works in both dev and EXE mode)
-    import sys
-    try:
-        if getattr(sys, 'frozen', False):
-            # Running as compiled EXE
-            base_path = os.path.dirname(sys.executable)
-        else:
-            # Running as script
-            base_path = os.path.dirname(os.path.abspath(__file__))
-    except:
-        base_path = os.path.dirname(os.path.abspath(__file__))
-    
-    logo_path = os.path.join(base_path, 'aamusted system_logo.png')
-    if os.path.exists(logo_path):
-        try:
-            document.add_picture(logo_path, width=Inches(4))
-            last_paragraph = document.paragraphs[-1]
-            last_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        except:
-            pass
-    
-    # Title
-    title = document.add_heading(f'AAMUSTED Guidance & Counselling Centre: {period_name} Activity Report', 0)
-    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    for run in title.runs:
-        run.font.size = Pt(20)
-        run.font.bold = True
-        run.font.color.rgb = RGBColor(13, 110, 253)
-    
-    document.add_paragraph()  # Blank line
-    
-    # Date of submission
-    date_para = document.add_paragraph(f'Date of Submission: {now.strftime("%B %d, %Y")}')
-    date_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    for run in date_para.runs:
-        run.font.size = Pt(12)
-    
-    # Who the report is for
-    recipient_para = document.add_paragraph('Prepared for: AAMUSTED Administration')
-    recipient_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    for run in recipient_para.runs:
-        run.font.size = Pt(11)
-        run.italic = True
-    
-    # Confidentiality notice
-    conf_para = document.add_paragraph('CONFIDENTIAL - INTERNAL USE ONLY')
-    conf_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    for run in conf_para.runs:
-        run.font.size = Pt(10)
-        run.italic = True
-        run.font.color.rgb = RGBColor(128, 128, 128)
-    
-    document.add_page_break()
+    # Title page, logo and all formatting come from the report template;
+    # only the body is generated here
+    report_title = f"AAMUSTED Guidance & Counselling Centre: {period_name} Activity Report"
+    body = report_template.ReportBody()
 
     # ==========================================
     # 2. EXECUTIVE SUMMARY
     # ==========================================
-    add_heading_with_style(document, 'Executive Summary', 1)
+    body.heading('Executive Summary', 1)
     
     # Calculate completion rate for summary (before using it)
     completion_rate = (completed_appointments / total_appointments * 100) if total_appointments > 0 else 0
@@ -294,55 +166,55 @@ def generate_report(report_type='manual'):
     Recommendations include implementing wellness check-ins, conducting targeted workshops on academic stress management, and expanding peer counselling programs to enhance service capacity.
     """
     
-    document.add_paragraph(executive_summary.strip())
-    document.add_paragraph()  # Blank line
+    body.paragraph(executive_summary.strip())
+    body.paragraph()  # Blank line
     
     # ==========================================
     # 3. INTRODUCTION
     # ==========================================
-    add_heading_with_style(document, '1. Introduction', 1)
+    body.heading('1. Introduction', 1)
     
     # Purpose
-    document.add_paragraph('1.1 Purpose', style='Heading 2')
-    document.add_paragraph(
+    body.heading('1.1 Purpose', 2)
+    body.paragraph(
         f"The purpose of this report is to analyze student engagement with the Guidance & Counselling Centre "
         f"and to present key findings regarding service delivery, student participation, and counselling outcomes "
         f"for the reporting period."
     )
-    document.add_paragraph()
+    body.paragraph()
     
     # Scope
-    document.add_paragraph('1.2 Scope', style='Heading 2')
-    document.add_paragraph(
+    body.heading('1.2 Scope', 2)
+    body.paragraph(
         f"This report covers all counselling activities, appointments, sessions, and referrals from "
         f"{start_date.strftime('%B %d, %Y')} to {end_date.strftime('%B %d, %Y')}. "
         f"The analysis includes quantitative data on service utilization as well as qualitative observations "
         f"derived from session notes and referral patterns."
     )
-    document.add_paragraph()
+    body.paragraph()
     
     # Background
-    document.add_paragraph('1.3 Background', style='Heading 2')
-    document.add_paragraph(
+    body.heading('1.3 Background', 2)
+    body.paragraph(
         "The AAMUSTED Guidance & Counselling Centre provides essential mental health support and counselling services "
         "to students. This report documents the Centre's activities and examines its effectiveness in meeting student needs during "
         "the specified reporting period."
     )
-    document.add_paragraph()
+    body.paragraph()
     
     # ==========================================
     # 4. KEY FINDINGS / DATA
     # ==========================================
-    add_heading_with_style(document, '2. Key Findings', 1)
+    body.heading('2. Key Findings', 1)
     
-    document.add_paragraph(
+    body.paragraph(
         "The following data represents the quantitative findings from the reporting period. "
         "All figures are presented in tables for clarity."
     )
-    document.add_paragraph()
+    body.paragraph()
     
     # 2.1 Appointment Statistics
-    document.add_paragraph('2.1 Appointment Statistics', style='Heading 2')
+    body.heading('2.1 Appointment Statistics', 2)
     appt_headers = ['Metric', 'Count']
     appt_rows = [
         ['Total Student Appointments Facilitated', format_number(total_appointments)],
@@ -351,11 +223,11 @@ def generate_report(report_type='manual'):
         ['Scheduled Appointments', format_number(scheduled_appointments)],
         ['Postponed Sessions', format_number(postponed_appointments)]
     ]
-    add_table_with_data(document, appt_headers, appt_rows)
-    document.add_paragraph()
+    body.table(appt_headers, appt_rows)
+    body.paragraph()
     
     # 2.2 Session Statistics
-    document.add_paragraph('2.2 Session Statistics', style='Heading 2')
+    body.heading('2.2 Session Statistics', 2)
     session_headers = ['Metric', 'Count']
     session_rows = [
         ['Total Sessions Conducted', format_number(total_sessions)],
@@ -363,12 +235,12 @@ def generate_report(report_type='manual'):
         ['Session Notes Available for Analysis', format_number(session_notes_count)],
         ['Formal Referrals Made', format_number(total_referrals)]
     ]
-    add_table_with_data(document, session_headers, session_rows)
-    document.add_paragraph()
+    body.table(session_headers, session_rows)
+    body.paragraph()
     
     # 2.3 Session Types Breakdown
     if session_types:
-        document.add_paragraph('2.3 Session Types Breakdown', style='Heading 2')
+        body.heading('2.3 Session Types Breakdown', 2)
         type_headers = ['Session Type', 'Count', 'Percentage']
         type_rows = []
         for row in session_types:
@@ -378,30 +250,30 @@ def generate_report(report_type='manual'):
                 format_number(row['count']),
                 f"{percentage:.1f}%"
             ])
-        add_table_with_data(document, type_headers, type_rows)
-        document.add_paragraph()
+        body.table(type_headers, type_rows)
+        body.paragraph()
     
     # 2.4 Top Programmes Served
     if top_programmes:
-        document.add_paragraph('2.4 Top Programmes Served', style='Heading 2')
+        body.heading('2.4 Top Programmes Served', 2)
         prog_headers = ['Programme', 'Number of Students']
         prog_rows = [[row['programme'] or 'Not Specified', format_number(row['student_count'])] for row in top_programmes]
-        add_table_with_data(document, prog_headers, prog_rows)
-        document.add_paragraph()
+        body.table(prog_headers, prog_rows)
+        body.paragraph()
     
     # 2.5 Common Issues Identified
     if common_issues:
-        document.add_paragraph('2.5 Common Issues Identified in Session Notes', style='Heading 2')
+        body.heading('2.5 Common Issues Identified in Session Notes', 2)
         issue_headers = ['Issue Category', 'Frequency']
         top_issues = sorted(common_issues.items(), key=lambda x: x[1], reverse=True)[:5]
         issue_rows = [[issue.title(), format_number(count)] for issue, count in top_issues]
-        add_table_with_data(document, issue_headers, issue_rows)
-        document.add_paragraph()
+        body.table(issue_headers, issue_rows)
+        body.paragraph()
     
     # ==========================================
     # 5. ANALYSIS / DISCUSSION
     # ==========================================
-    add_heading_with_style(document, '3. Analysis & Discussion', 1)
+    body.heading('3. Analysis & Discussion', 1)
     
     analysis_text = []
     
@@ -483,19 +355,19 @@ def generate_report(report_type='manual'):
     
     # Add all analysis paragraphs
     for text in analysis_text:
-        document.add_paragraph(text)
-        document.add_paragraph()
+        body.paragraph(text)
+        body.paragraph()
     
     # ==========================================
     # 6. RECOMMENDATIONS
     # ==========================================
-    add_heading_with_style(document, '4. Recommendations', 1)
+    body.heading('4. Recommendations', 1)
     
-    document.add_paragraph(
+    body.paragraph(
         "Based on the analysis presented, the following actions are recommended to further strengthen "
         "the support framework:"
     )
-    document.add_paragraph()
+    body.paragraph()
     
     recommendations = [
         "Implement mid-semester wellness check-ins to provide proactive support and identify students requiring early intervention.",
@@ -507,16 +379,14 @@ def generate_report(report_type='manual'):
     
     # Add recommendations as bulleted list
     for i, rec in enumerate(recommendations, 1):
-        para = document.add_paragraph(f"{i}. {rec}", style='List Bullet')
-        # Ensure proper spacing
-        para.paragraph_format.space_after = Pt(6)
+        body.bullet(f"{i}. {rec}")
     
-    document.add_paragraph()
+    body.paragraph()
     
     # ==========================================
     # 7. CONCLUSION
     # ==========================================
-    add_heading_with_style(document, '5. Conclusion', 1)
+    body.heading('5. Conclusion', 1)
     
     # Calculate completion rate for conclusion (in case it wasn't calculated earlier)
     if 'completion_rate' not in locals():
@@ -533,14 +403,14 @@ def generate_report(report_type='manual'):
     support for the AAMUSTED community.
     """
     
-    document.add_paragraph(conclusion_text.strip())
-    document.add_paragraph()
+    body.paragraph(conclusion_text.strip())
+    body.paragraph()
     
     # ==========================================
     # APPENDICES (Footer Information)
     # ==========================================
-    document.add_page_break()
-    add_heading_with_style(document, 'Appendices', 1)
+    body.page_break()
+    body.heading('Appendices', 1)
     
     appendix_text = f"""
     Report Generation Details:
@@ -552,22 +422,32 @@ def generate_report(report_type='manual'):
     This report was automatically generated by the AAMUSTED Counselling Management System. 
     For questions or additional information, please contact the Guidance & Counselling Centre.
     """
-    document.add_paragraph(appendix_text.strip())
+    body.paragraph(appendix_text.strip())
+
+    if session_register:
+        body.paragraph()
+        body.heading('Session Register', 2)
+        body.table(['Date', 'Student ID', 'Programme', 'Session Type', 'Status'], session_register)
+        body.paragraph()
     
     # === SAVE DOCUMENT ===
-    report_filename = now.strftime("report_%Y-%m-%d_%H-%M%S.docx")
+    if cache_key:
+        report_filename = report_cache.file_name(cache_key, now)
+    else:
+        report_filename = now.strftime("report_%Y-%m-%d_%H-%M%S.docx")
     report_path = os.path.join(REPORTS_DIR, report_filename)
-    document.save(report_path)
+    report_template.load_template().save(report_path,
+        values={'title': report_title, 'submitted': now.strftime("%B %d, %Y")},
+        blocks={'body': body})
     print(f"Report generated: {report_path}")
 
     # === SAVE METADATA TO DATABASE ===
     conn = get_db_connection()
     cursor = conn.cursor()
-    report_title = f"AAMUSTED Guidance & Counselling Centre: {period_name} Activity Report"
     
     cursor.execute(
-        "INSERT INTO reports (title, date_generated, report_type, file_path, summary) VALUES (?, ?, ?, ?, ?)",
-        (report_title, now.strftime('%Y-%m-%d %H:%M:%S'), report_type, report_path, executive_summary.strip())
+        "INSERT INTO reports (title, date_generated, report_type, file_path, summary, cache_key) VALUES (?, ?, ?, ?, ?, ?)",
+        (report_title, now.strftime('%Y-%m-%d %H:%M:%S'), report_type, report_path, executive_summary.strip(), cache_key)
     )
     conn.commit()
     conn.close()
@@ -575,9 +455,84 @@ def generate_report(report_type='manual'):
     
     return report_path
 
+# One report is built at a time, so a double click finds the first one in the cache
+_report_lock = threading.Lock()
+
+def request_report(report_type='manual', start_day=None, end_day=None):
+    """
+    (report path, cached). Returns the existing file when the same report
+    was already made from unchanged data and the same template; otherwise
+    generates it and applies report retention.
+    """
+    with _report_lock:
+        now = datetime.now()
+        start_date, end_date, _range, _name = report_window(report_type, now, start_day, end_day)
+        if report_type == 'custom':
+            span = (start_day.isoformat(), end_day.isoformat(), end_date.strftime('%Y-%m-%d'))
+        elif report_type == 'manual':
+            span = (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        else:
+            # Rolling windows only repeat within the same minute
+            span = (start_date.strftime('%Y-%m-%d %H:%M'), end_date.strftime('%Y-%m-%d %H:%M'))
+        report_template.load_template()  # builds the default template on first use
+        template_stamp = os.path.getmtime(report_template.template_path())
+
+        conn = get_db_connection()
+        try:
+            report_cache.ensure_schema(conn)
+            conn.commit()
+            key = report_cache.cache_key(conn, report_type, span, template_stamp)
+            hit = report_cache.lookup(conn, key)
+        finally:
+            conn.close()
+        if hit is not None:
+            print(f"Report unchanged, reusing: {hit[1]}")
+            return hit[1], True
+
+        report_path = generate_report(report_type, start_day, end_day, cache_key=key, now=now)
+        apply_retention(keep=[report_path])
+        return report_path, False
+
+def apply_retention(keep=()):
+    conn = get_db_connection()
+    try:
+        report_cache.enforce_retention(conn, keep)
+        conn.commit()
+    except Exception as e:
+        print(f"[REPORTS] Retention failed: {e}")
+    finally:
+        conn.close()
+
+def nightly_maintenance():
+    """Close yesterday (and any dirty days) in the report rollup, then apply report retention"""
+    conn = get_db_connection()
+    try:
+        report_rollup.refresh(conn)
+        conn.commit()
+    except Exception as e:
+        print(f"[ROLLUP] Refresh failed: {e}")
+    finally:
+        conn.close()
+    apply_retention()
+
+def scheduled_report(report_type):
+    """Scheduler entry point: a failed run is logged, not raised into APScheduler"""
+    try:
+        request_report(report_type)
+    except Exception as e:
+        print(f"Scheduled {report_type} report failed: {e}")
+
 # Scheduler setup
 scheduler = BackgroundScheduler()
 
+# Jobs run only while the scheduler is switched on (toggle_scheduler). Each
+# report reads closed days from the rollup, so a monthly run costs about as
+# much as a bi-hourly one.
+scheduler.add_job(nightly_maintenance, 'cron', hour=0, minute=5, id='report_maintenance', coalesce=True)
+scheduler.add_job(scheduled_report, 'interval', hours=2, args=['bi-hourly'], id='bi_hourly_report', coalesce=True)
+scheduler.add_job(scheduled_report, 'interval', days=1, args=['daily'], id='daily_report', coalesce=True)
+scheduler.add_job(scheduled_report, 'interval', days=30, args=['monthly'], id='monthly_report', coalesce=True)
+
 def toggle_scheduler(enable):
     """Toggle the auto-report scheduler"""
     if enable:
@@ -590,11 +545,7 @@ def toggle_scheduler(enable):
             print("Auto report scheduler stopped.")
 
 def manual_generate_report():
-    """Manually generate a report"""
-    generate_report('manual')
+    """Manually generate a report (or reuse an unchanged one); returns (path, cached)"""
+    result = request_report('manual')
     print("Manual report generation initiated.")
-
-# Note: Scheduler jobs can be added when needed
-# scheduler.add_job(lambda: generate_report('bi-hourly'), 'interval', hours=2, id='bi_hourly_report')
-# scheduler.add_job(lambda: generate_report('daily'), 'interval', days=1, id='daily_report')
-# scheduler.add_job(lambda: generate_report('monthly'), 'interval', days=30, id='monthly_report')
+    return result
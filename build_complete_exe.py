@@ -95,9 +95,19 @@ def build_complete_executable():
     
     # Static folder (CSS, JS, fonts)
     if os.path.exists('static'):
+        # Fingerprinted + precompressed copies go to static/build and ship with it
+        from static_assets import build_assets
+        build_assets(verbose=False)
         datas.append('static;static')
         print(f"   [OK] Added static/ folder")
     
+    # Precompiled Jinja bytecode; the EXE seeds its on-disk cache from it
+    import app
+    import template_cache
+    template_cache.precompile(app.app)
+    datas.append('template_cache;template_cache')
+    print(f"   [OK] Added precompiled templates")
+    
     # Logo file for reports
     if os.path.exists('aamusted system_logo.png'):
         datas.append('aamusted system_logo.png;.')
@@ -123,6 +133,11 @@ def build_complete_executable():
         'os',
         'sys',
         'functools',
+        'startup',
+        'template_cache',
+        'server',
+        'auto_report_writer',  # imported on first report, not at startup
+        'requests',  # imported on first sync
     ]
     
     # Add report-related imports if available
@@ -133,6 +148,7 @@ def build_complete_executable():
             'docx.shared',
             'docx.enum.text',
             'docx.enum.style',
+            'lxml.etree',  # report template compiler
         ])
         print(f"   [OK] Added python-docx support (for reports)")
     except ImportError:
@@ -299,6 +315,12 @@ def main():
     """Main function"""
     print("\nAAMUSTED COUNSELING SYSTEM - COMPLETE BUILD\n")
     
+    # python build_complete_exe.py --profile-imports: show what slows down startup, don't build
+    if '--profile-imports' in sys.argv:
+        from startup import print_import_profile
+        print_import_profile('app')
+        return
+    
     # Check dependencies
     if not check_dependencies():
         sys.exit(1)
@@ -17,6 +17,15 @@ def build_executable():
         if os.path.exists(folder):
             shutil.rmtree(folder)
     
+    # Fingerprinted + precompressed static files (static/build), shipped with static/
+    from static_assets import build_assets
+    build_assets()
+    
+    # Precompiled Jinja bytecode (template_cache/); the EXE seeds its on-disk cache from it
+    import app
+    import template_cache
+    template_cache.precompile(app.app)
+    
     # PyInstaller arguments
     args = [
         'app.py',  # Main script
@@ -26,6 +35,7 @@ def build_executable():
         '--icon=icon.ico',  # Icon file (create this if needed)
         '--add-data=templates;templates',  # Include templates folder
         '--add-data=static;static',  # Include static folder with Chart.js
+        '--add-data=template_cache;template_cache',  # Precompiled templates
         '--hidden-import=jinja2.ext',  # Include Jinja2 extensions
         '--hidden-import=sqlite3',  # Ensure sqlite3 is included
         '--collect-all=flask',  # Collect all Flask dependencies
@@ -102,6 +112,12 @@ def build_executable():
     return True
 
 if __name__ == "__main__":
+    # python build_exe.py --profile-imports: show what slows down startup, don't build
+    if '--profile-imports' in sys.argv:
+        from startup import print_import_profile
+        print_import_profile('app')
+        sys.exit(0)
+    
     # Check if PyInstaller is available
     try:
         import PyInstaller
@@ -91,7 +91,8 @@ def init_db():
             date_generated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             report_type TEXT,
             file_path TEXT,
-            summary TEXT
+            summary TEXT,
+            cache_key TEXT
         );
 
         -- session table
@@ -140,11 +141,7 @@ def init_db():
             age INTEGER,
             sex TEXT,
 
-            item1 INTEGER, item2 INTEGER, item3 INTEGER, item4 INTEGER, item5 INTEGER,
-            item6 INTEGER, item7 INTEGER, item8 INTEGER, item9 INTEGER, item10 INTEGER,
-            item11 INTEGER, item12 INTEGER, item13 INTEGER, item14 INTEGER, item15 INTEGER,
-            item16 INTEGER, item17 INTEGER, item18 INTEGER, item19 INTEGER, item20 INTEGER,
-            item21 INTEGER, item22 INTEGER, item23 INTEGER, item24 INTEGER, item25 INTEGER,
+            items TEXT,  -- packed answers, see oq_items.py
             total_score INTEGER,
             completion_date DATE,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -8,103 +8,100 @@ import sys
 import os
 import sqlite3
 from datetime import datetime
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, 
-                             QWidget, QTabWidget, QTableWidget, QTableWidgetItem,
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout,
+                             QWidget, QTabWidget, QTableView, QAbstractItemView,
                              QPushButton, QLabel, QLineEdit, QTextEdit, QComboBox,
                              QDateEdit, QTimeEdit, QMessageBox, QGroupBox,
                              QSplitter, QMenuBar, QStatusBar, QDialog, QFormLayout,
                              QDialogButtonBox, QCheckBox, QFileDialog, QInputDialog)
-from PyQt5.QtCore import Qt, QDate, QTime, QTimer
+from PyQt5.QtCore import (Qt, QDate, QTime, QTimer, QAbstractTableModel, QModelIndex,
+                          QObject, QRunnable, QThreadPool, pyqtSignal)
 from PyQt5.QtGui import QIcon, QFont, QPalette, QColor
 from werkzeug.security import generate_password_hash, check_password_hash
+import repository
+
+# Tables the web app needs; if any is missing the database is set up with db_setup
+REQUIRED_TABLES = ['Appointment', 'Student', 'Counsellor', 'session', 'app_settings', 'Referral']
+
+def get_base_path():
+    """Get base path for data files"""
+    try:
+        if getattr(sys, 'frozen', False):
+            return os.path.dirname(sys.executable)
+        return os.path.dirname(os.path.abspath(__file__))
+    except:
+        return os.path.dirname(os.path.abspath(__file__))
+
+class TaskSignals(QObject):
+    done = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+class DbTask(QRunnable):
+    """Runs fn(conn, *args) on a pool thread with a connection of its own"""
+
+    def __init__(self, db, fn, *args):
+        super().__init__()
+        # Kept alive by DatabaseManager until its result is delivered
+        self.setAutoDelete(False)
+        self.db = db
+        self.fn = fn
+        self.args = args
+        self.signals = TaskSignals()
+
+    def run(self):
+        try:
+            conn = self.db.get_connection()
+            try:
+                result = self.fn(conn, *self.args)
+            finally:
+                conn.close()
+        except Exception as e:
+            # Reported to the user by the failed handler on the GUI thread
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.done.emit(result)
 
 class DatabaseManager:
     """Handle all database operations"""
-    
+
     def __init__(self):
-        self.db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'counseling.db')
-        
+        # Same database file and schema as the web app
+        self.db_path = os.path.join(get_base_path(), 'counseling.db')
+        self.pool = QThreadPool.globalInstance()
+        self._tasks = set()
+
     def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
         conn.row_factory = sqlite3.Row
         return conn
-    
-    def init_database(self):
-        """Initialize database if it doesn't exist"""
-        conn = self.get_connection()
-        
-        # Create tables (simplified from original)
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS Student (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                age INTEGER,
-                gender TEXT,
-                programme TEXT,
-                contact TEXT,
-                index_number TEXT UNIQUE,
-                department TEXT,
-                faculty TEXT,
-                parent_contact TEXT,
-                hall_of_residence TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )''')
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS Counsellor (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                contact TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )''')
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS Appointment (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                student_id INTEGER,
-                Counsellor_id INTEGER,
-                date DATE NOT NULL,
-                time TIME NOT NULL,
-                purpose TEXT,
-                status TEXT DEFAULT 'scheduled',
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (student_id) REFERENCES Student (id),
-                FOREIGN KEY (Counsellor_id) REFERENCES Counsellor (id)
-            )''')
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS Session (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                appointment_id INTEGER,
-                session_date DATETIME,
-                notes TEXT,
-                outcome TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (appointment_id) REFERENCES Appointment (id)
-            )''')
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS Referral (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id INTEGER,
-                referred_to TEXT,
-                reason TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (session_id) REFERENCES Session (id)
-            )''')
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS app_settings (
-                setting_name TEXT PRIMARY KEY,
-                setting_value TEXT
-            )''')
-        
-        # Insert sample Counsellors if none exist
-        conn.execute("INSERT OR IGNORE INTO Counsellor (id, name, contact) VALUES (1, 'Dr. Sarah Mensah', '0244-123-456')")
-        conn.execute("INSERT OR IGNORE INTO Counsellor (id, name, contact) VALUES (2, 'Mr. Kwame Asante', '0244-987-654')")
-        conn.execute("INSERT OR IGNORE INTO Counsellor (id, name, contact) VALUES (3, 'Ms. Abena Osei', '0244-555-789')")
-        
-        # Set a default password if not already set
-        conn.execute("INSERT OR IGNORE INTO app_settings (setting_name, setting_value) VALUES (?, ?)",
-                      ('password_hash', generate_password_hash('admin')))
 
-        conn.commit()
-        conn.close()
+    def init_database(self):
+        """Set the database up with the web app's db_setup if it is missing or incomplete"""
+        if os.path.exists(self.db_path):
+            conn = self.get_connection()
+            existing = {row[0].lower() for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            conn.close()
+            if all(table.lower() in existing for table in REQUIRED_TABLES):
+                return
+        import db_setup
+        db_setup.init_db()
+
+    def submit(self, fn, *args, done=None, failed=None):
+        """
+        Run fn(conn, *args) on the worker pool. done(result) or
+        failed(message) is called back on the GUI thread.
+        """
+        task = DbTask(self, fn, *args)
+
+        def finish(callback, value):
+            self._tasks.discard(task)
+            if callback is not None:
+                callback(value)
+
+        task.signals.done.connect(lambda result: finish(done, result))
+        task.signals.failed.connect(lambda message: finish(failed, message))
+        self._tasks.add(task)
+        self.pool.start(task)
 
     def check_password(self, password):
         conn = self.get_connection()
@@ -116,11 +113,127 @@ class DatabaseManager:
 
     def set_password(self, new_password):
         conn = self.get_connection()
-        conn.execute("REPLACE INTO app_settings (setting_name, setting_value) VALUES (?, ?)",
-                     ('password_hash', generate_password_hash(new_password)))
+        password_hash = generate_password_hash(new_password)
+        # Update in place so the row keeps its sync identity
+        cursor = conn.execute(
+            "UPDATE app_settings SET setting_value = ?, updated_at = CURRENT_TIMESTAMP WHERE setting_name = 'password_hash'",
+            (password_hash,))
+        if cursor.rowcount == 0:
+            conn.execute("INSERT INTO app_settings (setting_name, setting_value) VALUES (?, ?)",
+                         ('password_hash', password_hash))
         conn.commit()
         conn.close()
 
+class PagedTableModel(QAbstractTableModel):
+    """
+    Rows from a repository page accessor, read a page at a time as the view
+    scrolls (canFetchMore/fetchMore). Pages are fetched on the worker pool,
+    so opening a tab on a large database never blocks the GUI thread.
+
+    fetch_page(conn, after, limit) returns (rows, after); columns are
+    (header, row index, formatter or None).
+    """
+    load_failed = pyqtSignal(str)
+
+    def __init__(self, db, fetch_page, columns, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.fetch_page = fetch_page
+        self.columns = columns
+        self.rows = []
+        self._after = None
+        self._exhausted = False
+        self._loading = False
+        # Bumped on refresh so pages requested before it are dropped
+        self._generation = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        _header, column, formatter = self.columns[index.column()]
+        value = self.rows[index.row()][column]
+        if value is None:
+            return ''
+        return formatter(value) if formatter else str(value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.columns[section][0]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted and not self._loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._loading = True
+        generation = self._generation
+        self.db.submit(self.fetch_page, self._after, repository.PAGE_SIZE,
+                       done=lambda result: self._page_loaded(generation, result),
+                       failed=lambda message: self._page_failed(generation, message))
+
+    def _page_loaded(self, generation, result):
+        if generation != self._generation:
+            return
+        rows, self._after = result
+        self._loading = False
+        self._exhausted = len(rows) < repository.PAGE_SIZE
+        if rows:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+            self.rows.extend(rows)
+            self.endInsertRows()
+
+    def _page_failed(self, generation, message):
+        if generation != self._generation:
+            return
+        self._loading = False
+        # Stop here; Refresh starts over
+        self._exhausted = True
+        # The view's owner shows it (MainWindow.show_load_error)
+        self.load_failed.emit(message)
+
+    def refresh(self):
+        """Drop the loaded rows and read again from the first page"""
+        self._generation += 1
+        self.beginResetModel()
+        self.rows = []
+        self._after = None
+        self._exhausted = False
+        self._loading = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def row_id(self, row):
+        return self.rows[row][0]
+
+def _date_only(value):
+    return str(value).split(' ')[0]
+
+def _one_line(value):
+    return ' '.join(str(value).split())
+
+def _upcoming_page(conn, after, limit):
+    return repository.list_upcoming_appointments(conn, datetime.now().strftime('%Y-%m-%d')), None
+
+def _dashboard_counts(conn):
+    return (repository.count_students(conn), repository.count_appointments(conn),
+            repository.count_appointments(conn, datetime.now().strftime('%Y-%m-%d')))
+
+# (header, row index, formatter) for each listing's rows; see repository.page_*
+STUDENT_COLUMNS = [('ID', 0, repository.professional_id), ('Name', 2, None), ('Index Number', 3, None),
+                   ('Programme', 4, None), ('Contact', 5, None), ('Department', 6, None)]
+APPOINTMENT_COLUMNS = [('Date', 1, None), ('Time', 2, None), ('Student', 3, None),
+                       ('Counsellor', 4, None), ('Status', 5, None), ('Purpose', 6, None)]
+SESSION_COLUMNS = [('ID', 0, None), ('Date', 1, _date_only), ('Student', 2, None),
+                   ('Notes', 3, _one_line), ('Outcome', 4, _one_line)]
+
 class LoginDialog(QDialog):
     def __init__(self, db_manager, parent=None):
         super().__init__(parent)
@@ -265,6 +378,7 @@ class SessionDialog(QDialog):
         super().__init__(parent)
         self.session_id = session_id
         self.appointment_id = appointment_id
+        self.session_time = None
         self.db = DatabaseManager()
         self.init_ui()
 
@@ -302,18 +416,22 @@ class SessionDialog(QDialog):
 
     def load_session(self):
         conn = self.db.get_connection()
-        session = conn.execute('SELECT * FROM Session WHERE id = ?', (self.session_id,)).fetchone()
+        session = conn.execute('SELECT * FROM session WHERE id = ?', (self.session_id,)).fetchone()
         conn.close()
 
         if session:
-            self.session_date_edit.setDate(QDate.fromString(session['session_date'].split(' ')[0], 'yyyy-MM-dd'))
-            self.notes_edit.setText(session['notes'])
-            self.outcome_edit.setText(session['outcome'])
+            if session['created_at']:
+                self.session_time = str(session['created_at'])[11:19] or None
+                self.session_date_edit.setDate(QDate.fromString(str(session['created_at'])[:10], 'yyyy-MM-dd'))
+            self.notes_edit.setText(session['notes'] or '')
+            self.outcome_edit.setText(session['outcome'] or '')
             self.appointment_id = session['appointment_id']
 
     def get_data(self):
+        # The session date is stored as created_at; an edited session keeps its time of day
+        time_of_day = self.session_time or datetime.now().strftime('%H:%M:%S')
         return {
-            'session_date': self.session_date_edit.date().toString(Qt.ISODate),
+            'created_at': f"{self.session_date_edit.date().toString(Qt.ISODate)} {time_of_day}",
             'notes': self.notes_edit.toPlainText(),
             'outcome': self.outcome_edit.toPlainText(),
             'appointment_id': self.appointment_id
@@ -398,7 +516,7 @@ class MainWindow(QMainWindow):
             QPushButton:hover {
                 background-color: #1976D2;
             }
-            QTableWidget {
+            QTableView {
                 border: 1px solid #ddd;
                 background-color: white;
             }
@@ -450,19 +568,10 @@ class MainWindow(QMainWindow):
         # Stats cards
         stats_layout = QHBoxLayout()
         
-        # Get stats
-        conn = self.db.get_connection()
-        total_students = conn.execute('SELECT COUNT(*) as count FROM Student').fetchone()['count']
-        total_appointments = conn.execute('SELECT COUNT(*) as count FROM Appointment').fetchone()['count']
-        today_appointments = conn.execute(
-            "SELECT COUNT(*) as count FROM Appointment WHERE date = date('now')"
-        ).fetchone()['count']
-        conn.close()
-        
-        # Create stat cards
-        self.create_stat_card(stats_layout, "Total Students", str(total_students))
-        self.create_stat_card(stats_layout, "Total Appointments", str(total_appointments))
-        self.create_stat_card(stats_layout, "Today's Appointments", str(today_appointments))
+        # Create stat cards; the counts fill in once loaded
+        self.stat_labels = [self.create_stat_card(stats_layout, "Total Students", "..."),
+                            self.create_stat_card(stats_layout, "Total Appointments", "..."),
+                            self.create_stat_card(stats_layout, "Today's Appointments", "...")]
         
         layout.addLayout(stats_layout)
         
@@ -471,12 +580,11 @@ class MainWindow(QMainWindow):
         recent_label.setFont(QFont('Arial', 14, QFont.Bold))
         layout.addWidget(recent_label)
         
-        self.recent_table = QTableWidget()
-        self.recent_table.setColumnCount(6)
-        self.recent_table.setHorizontalHeaderLabels(['Date', 'Time', 'Student', 'Counsellor', 'Status', 'Purpose'])
-        self.recent_table.horizontalHeader().setStretchLastSection(True)
+        self.recent_model = PagedTableModel(self.db, _upcoming_page, APPOINTMENT_COLUMNS, self)
+        self.recent_table = self.create_table_view(self.recent_model)
         layout.addWidget(self.recent_table)
         
+        self.load_dashboard_stats()
         self.load_recent_appointments()
         
         widget.setLayout(layout)
@@ -493,6 +601,24 @@ class MainWindow(QMainWindow):
         card_layout.addWidget(value_label)
         card.setLayout(card_layout)
         layout.addWidget(card)
+        return value_label
+
+    def create_table_view(self, model):
+        """Read-only row-selecting view over a PagedTableModel"""
+        view = QTableView()
+        view.setModel(model)
+        view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        view.setWordWrap(False)
+        view.horizontalHeader().setStretchLastSection(True)
+        model.load_failed.connect(self.show_load_error)
+        return view
+
+    def show_load_error(self, message):
+        """A background read failed: say so instead of leaving a half-filled table"""
+        self.status_bar.showMessage(f"Could not load data: {message}")
+        QMessageBox.warning(self, "Could Not Load Data",
+                            f"Some records could not be loaded:\n\n{message}\n\nUse Refresh to try again.")
     
     def create_students_tab(self):
         widget = QWidget()
@@ -514,10 +640,8 @@ class MainWindow(QMainWindow):
         layout.addLayout(toolbar)
         
         # Students table
-        self.students_table = QTableWidget()
-        self.students_table.setColumnCount(6)
-        self.students_table.setHorizontalHeaderLabels(['ID', 'Name', 'Index Number', 'Programme', 'Contact', 'Department'])
-        self.students_table.horizontalHeader().setStretchLastSection(True)
+        self.students_model = PagedTableModel(self.db, repository.page_students, STUDENT_COLUMNS, self)
+        self.students_table = self.create_table_view(self.students_model)
         layout.addWidget(self.students_table)
         
         self.load_students()
@@ -534,6 +658,7 @@ class MainWindow(QMainWindow):
         
         add_button = QPushButton("Add Appointment")
         refresh_button = QPushButton("Refresh")
+        refresh_button.clicked.connect(self.load_appointments)
         
         toolbar.addWidget(add_button)
         toolbar.addWidget(refresh_button)
@@ -542,10 +667,8 @@ class MainWindow(QMainWindow):
         layout.addLayout(toolbar)
         
         # Appointments table
-        self.appointments_table = QTableWidget()
-        self.appointments_table.setColumnCount(6)
-        self.appointments_table.setHorizontalHeaderLabels(['Date', 'Time', 'Student', 'Counsellor', 'Status', 'Purpose'])
-        self.appointments_table.horizontalHeader().setStretchLastSection(True)
+        self.appointments_model = PagedTableModel(self.db, repository.page_appointments, APPOINTMENT_COLUMNS, self)
+        self.appointments_table = self.create_table_view(self.appointments_model)
         layout.addWidget(self.appointments_table)
         
         self.load_appointments()
@@ -573,10 +696,8 @@ class MainWindow(QMainWindow):
         layout.addLayout(toolbar)
 
         # Sessions table
-        self.sessions_table = QTableWidget()
-        self.sessions_table.setColumnCount(5) # ID, Date, Student, Notes, Outcome
-        self.sessions_table.setHorizontalHeaderLabels(['ID', 'Date', 'Student', 'Notes', 'Outcome'])
-        self.sessions_table.horizontalHeader().setStretchLastSection(True)
+        self.sessions_model = PagedTableModel(self.db, repository.page_sessions, SESSION_COLUMNS, self)
+        self.sessions_table = self.create_table_view(self.sessions_model)
         layout.addWidget(self.sessions_table)
 
         self.sessions_table.doubleClicked.connect(self.edit_session)
@@ -598,7 +719,7 @@ class MainWindow(QMainWindow):
                 a.purpose
             FROM Appointment a
             JOIN Student s ON a.student_id = s.id
-            WHERE a.status = 'scheduled' OR a.status = 'completed'
+            WHERE lower(a.status) IN ('scheduled', 'completed')
             ORDER BY a.date DESC, a.time DESC
         ''').fetchall()
         conn.close()
@@ -619,8 +740,8 @@ class MainWindow(QMainWindow):
             if dialog.exec_() == QDialog.Accepted:
                 data = dialog.get_data()
                 conn = self.db.get_connection()
-                conn.execute("INSERT INTO Session (session_date, notes, outcome, appointment_id) VALUES (?, ?, ?, ?)",
-                             (data['session_date'], data['notes'], data['outcome'], selected_appointment_id))
+                conn.execute("INSERT INTO session (created_at, notes, outcome, appointment_id) VALUES (?, ?, ?, ?)",
+                             (data['created_at'], data['notes'], data['outcome'], selected_appointment_id))
                 conn.commit()
                 conn.close()
                 QMessageBox.information(self, "Success", "Session added successfully.")
@@ -632,102 +753,38 @@ class MainWindow(QMainWindow):
                 # conn.close()
                 # self.load_appointments()
 
-    def edit_session(self):
-        selected_row = self.sessions_table.currentRow()
-        if selected_row >= 0:
-            session_id = int(self.sessions_table.item(selected_row, 0).text())
+    def edit_session(self, index=None):
+        row = index.row() if index is not None else self.sessions_table.currentIndex().row()
+        if row >= 0:
+            session_id = self.sessions_model.row_id(row)
             dialog = SessionDialog(self, session_id=session_id)
             if dialog.exec_() == QDialog.Accepted:
                 data = dialog.get_data()
                 conn = self.db.get_connection()
-                conn.execute("UPDATE Session SET session_date = ?, notes = ?, outcome = ? WHERE id = ?",
-                             (data['session_date'], data['notes'], data['outcome'], session_id))
+                conn.execute("UPDATE session SET created_at = ?, notes = ?, outcome = ? WHERE id = ?",
+                             (data['created_at'], data['notes'], data['outcome'], session_id))
                 conn.commit()
                 conn.close()
                 QMessageBox.information(self, "Success", "Session updated successfully.")
                 self.load_sessions()
 
     def load_sessions(self):
-        conn = self.db.get_connection()
-        sessions = conn.execute('''
-            SELECT
-                s.id,
-                s.created_at AS session_date,
-                st.name AS student_name,
-                s.notes,
-                s.outcome
-            FROM Session s
-            JOIN Appointment a ON s.appointment_id = a.id
-            JOIN Student st ON a.student_id = st.id
-            ORDER BY s.session_date DESC
-        ''').fetchall()
-        conn.close()
-
-        self.sessions_table.setRowCount(len(sessions))
-        for row, session in enumerate(sessions):
-            self.sessions_table.setItem(row, 0, QTableWidgetItem(str(session['id'])))
-            self.sessions_table.setItem(row, 1, QTableWidgetItem(session['session_date'].split(' ')[0]))
-            self.sessions_table.setItem(row, 2, QTableWidgetItem(session['student_name']))
-            self.sessions_table.setItem(row, 3, QTableWidgetItem(session['notes']))
-            self.sessions_table.setItem(row, 4, QTableWidgetItem(session['outcome']))
-            for col in range(5):
-                self.sessions_table.item(row, col).setFlags(self.sessions_table.item(row, col).flags() & ~Qt.ItemIsEditable)
-        
-        widget.setLayout(layout)
-        return widget
+        self.sessions_model.refresh()
     
     def load_students(self):
-        conn = self.db.get_connection()
-        students = conn.execute('''
-            SELECT id, name, index_number, programme, contact, department 
-            FROM Student ORDER BY created_at DESC
-        ''').fetchall()
-        conn.close()
-        
-        self.students_table.setRowCount(len(students))
-        for row, student in enumerate(students):
-            for col, value in enumerate(student):
-                item = QTableWidgetItem(str(value))
-                item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-                self.students_table.setItem(row, col, item)
+        self.students_model.refresh()
     
     def load_appointments(self):
-        conn = self.db.get_connection()
-        appointments = conn.execute('''
-            SELECT a.date, a.time, s.name as student_name, c.name as Counsellor_name, a.status, a.purpose
-            FROM Appointment a
-            JOIN Student s ON a.student_id = s.id
-            JOIN Counsellor c ON a.Counsellor_id = c.id
-            ORDER BY a.date DESC, a.time DESC
-        ''').fetchall()
-        conn.close()
-        
-        self.appointments_table.setRowCount(len(appointments))
-        for row, appointment in enumerate(appointments):
-            for col, value in enumerate(appointment):
-                item = QTableWidgetItem(str(value))
-                item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-                self.appointments_table.setItem(row, col, item)
+        self.appointments_model.refresh()
     
     def load_recent_appointments(self):
-        conn = self.db.get_connection()
-        appointments = conn.execute('''
-            SELECT a.date, a.time, s.name as student_name, c.name as Counsellor_name, a.status, a.purpose
-            FROM Appointment a
-            JOIN Student s ON a.student_id = s.id
-            JOIN Counsellor c ON a.Counsellor_id = c.id
-            WHERE a.date >= date('now')
-            ORDER BY a.date, a.time
-            LIMIT 10
-        ''').fetchall()
-        conn.close()
-        
-        self.recent_table.setRowCount(len(appointments))
-        for row, appointment in enumerate(appointments):
-            for col, value in enumerate(appointment):
-                item = QTableWidgetItem(str(value))
-                item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-                self.recent_table.setItem(row, col, item)
+        self.recent_model.refresh()
+
+    def load_dashboard_stats(self):
+        def show(counts):
+            for label, count in zip(self.stat_labels, counts):
+                label.setText(str(count))
+        self.db.submit(_dashboard_counts, done=show, failed=self.show_load_error)
     
     def add_student(self):
         dialog = StudentDialog(self)
@@ -744,6 +801,7 @@ class MainWindow(QMainWindow):
             conn.commit()
             conn.close()
             self.load_students()
+            self.load_dashboard_stats()
             self.load_recent_appointments()
     
     def show_about(self):
@@ -0,0 +1,344 @@
+import bisect
+import threading
+from datetime import datetime
+from flask import Blueprint, request, jsonify, session
+import repository
+from analytics_db import ChangeWatch
+
+# Create Blueprint
+lookup_bp = Blueprint('lookup', __name__, url_prefix='/api/lookup')
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+RECENT_LIMIT = 20  # sessions / appointments listed for one student
+
+# Appointments a session can be recorded against (the create-session picker)
+SESSION_READY_STATUSES = ('scheduled', 'Scheduled', 'In Session', 'Completed', 'completed', 'Sent to Counsellor')
+
+STUDENT_SELECT = 'SELECT id, name, index_number, programme FROM Student'
+
+SESSION_SELECT = '''
+    SELECT s.id, s.appointment_id, s.created_at, a.student_id, c.name as counsellor_name
+    FROM session s
+    JOIN Appointment a ON s.appointment_id = a.id
+    LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
+'''
+
+APPOINTMENT_SELECT = '''
+    SELECT a.id, a.student_id, a.date, a.time, a.status, a.urgency, a.referral_source, a.purpose,
+           c.name as counsellor_name
+    FROM Appointment a
+    LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
+'''
+
+READY_APPOINTMENTS = APPOINTMENT_SELECT + f" WHERE a.status IN ({', '.join(['?'] * len(SESSION_READY_STATUSES))})"
+
+def get_db_connection():
+    # Helper to get DB connection (reused logic)
+    import app
+    return app.get_db_connection()
+
+def ensure_indexes(conn):
+    """Per-student refreshes look rows up by these columns"""
+    conn.executescript('''
+        CREATE INDEX IF NOT EXISTS idx_appointment_student ON Appointment(student_id);
+        CREATE INDEX IF NOT EXISTS idx_session_appointment ON session(appointment_id);
+    ''')
+
+def search_keys(student):
+    """Lower-case prefixes a student can be found by"""
+    name = ' '.join((student.get('name') or '').lower().split())
+    keys = set(name.split())
+    if name:
+        keys.add(name)
+    if student.get('index_number'):
+        keys.add(str(student['index_number']).lower())
+    keys.add(repository.professional_id(student['id']).lower())
+    return keys
+
+class LookupIndex:
+    """
+    Sorted-array prefix index over students (name words, index number,
+    professional ID) plus each student's recent sessions and appointments.
+    The form pickers search it through /api/lookup instead of rendering
+    every row; routes and sync merges refresh one student at a time.
+    Writes made elsewhere (the desktop app, imports, other processes) are
+    caught by the database's data version: when it has moved since the
+    last build, the next read rebuilds the index.
+    """
+
+    def __init__(self, watch=None):
+        self._keys = []           # sorted [(key, student_id)]
+        self._students = {}       # student_id -> row dict
+        self._sessions = {}       # student_id -> sorted [(created_at, session_id)]
+        self._appointments = {}   # student_id -> sorted [(date, time, appt_id)]
+        self._session_rows = {}   # session_id -> row dict
+        self._appt_rows = {}      # appt_id -> row dict
+        self._built = False
+        self._watch = watch or ChangeWatch()
+        self._data_version = None
+        self._lock = threading.RLock()
+
+    def build(self, conn):
+        """(Re)load every student, session and session-ready appointment"""
+        # Taken first, so a commit landing mid-build triggers another rebuild
+        data_version = self._watch.version()
+        students = conn.execute(STUDENT_SELECT).fetchall()
+        sessions = conn.execute(SESSION_SELECT).fetchall()
+        appointments = conn.execute(READY_APPOINTMENTS, SESSION_READY_STATUSES).fetchall()
+        with self._lock:
+            self._students = {row['id']: dict(row) for row in students}
+            self._keys = sorted((key, sid) for sid, row in self._students.items() for key in search_keys(row))
+            self._sessions, self._session_rows = {}, {}
+            for row in sessions:
+                self._add_session(dict(row))
+            self._appointments, self._appt_rows = {}, {}
+            for row in appointments:
+                self._add_appointment(dict(row))
+            self._data_version = data_version
+            self._built = True
+        print(f"[LOOKUP] Indexed {len(students)} students, {len(sessions)} sessions")
+
+    def ensure_built(self, conn=None):
+        if self._built and self._watch.version() == self._data_version:
+            return
+        if conn is not None:
+            self.build(conn)
+            return
+        conn = get_db_connection()
+        try:
+            self.build(conn)
+        finally:
+            conn.close()
+
+    def invalidate(self):
+        """Force a rebuild on next use (bulk imports, snapshot adoption)"""
+        self._built = False
+
+    # ---------- Refresh ----------
+
+    def refresh_student(self, conn, student_id):
+        """Re-read a student with their sessions and appointments (or drop them if deleted)"""
+        if not self._built:
+            return  # the first search builds everything
+        student = conn.execute(STUDENT_SELECT + ' WHERE id = ?', (student_id,)).fetchone()
+        sessions = conn.execute(SESSION_SELECT + ' WHERE a.student_id = ?', (student_id,)).fetchall()
+        appointments = conn.execute(
+            READY_APPOINTMENTS + ' AND a.student_id = ?', SESSION_READY_STATUSES + (student_id,)
+        ).fetchall()
+        with self._lock:
+            self._remove_student(student_id)
+            if student is None:
+                return
+            row = dict(student)
+            self._students[student_id] = row
+            for key in search_keys(row):
+                bisect.insort(self._keys, (key, student_id))
+            for session_row in sessions:
+                self._add_session(dict(session_row))
+            for appt_row in appointments:
+                self._add_appointment(dict(appt_row))
+
+    def refresh_appointment(self, conn, appt_id):
+        """After an appointment was written or deleted"""
+        row = conn.execute("SELECT student_id FROM Appointment WHERE id = ?", (appt_id,)).fetchone()
+        owners = {row['student_id']} if row is not None else set()
+        with self._lock:
+            known = self._appt_rows.get(appt_id)
+            if known:
+                owners.add(known['student_id'])
+            owners.update(s['student_id'] for s in self._session_rows.values() if s['appointment_id'] == appt_id)
+        for student_id in owners:
+            self.refresh_student(conn, student_id)
+
+    def refresh_session(self, conn, session_id):
+        """After a session was written or deleted"""
+        row = conn.execute(
+            "SELECT a.student_id FROM session s JOIN Appointment a ON s.appointment_id = a.id WHERE s.id = ?",
+            (session_id,)
+        ).fetchone()
+        owners = {row['student_id']} if row is not None else set()
+        with self._lock:
+            known = self._session_rows.get(session_id)
+            if known:
+                owners.add(known['student_id'])
+        for student_id in owners:
+            self.refresh_student(conn, student_id)
+
+    def apply_sync_changes(self, conn, changes):
+        """Refresh every student a sync merge touched"""
+        lookups = (
+            ('Student', "SELECT id AS student_id FROM Student WHERE global_id = ?"),
+            ('Appointment', "SELECT student_id FROM Appointment WHERE global_id = ?"),
+            ('session', "SELECT a.student_id FROM session s JOIN Appointment a ON s.appointment_id = a.id "
+                        "WHERE s.global_id = ?"),
+        )
+        owners = set()
+        for table, sql in lookups:
+            for record in changes.get(table, []):
+                row = conn.execute(sql, (record.get('global_id'),)).fetchone()
+                if row is not None and row['student_id'] is not None:
+                    owners.add(row['student_id'])
+        for student_id in owners:
+            self.refresh_student(conn, student_id)
+
+    # ---------- Queries ----------
+
+    def search(self, text, limit=DEFAULT_LIMIT):
+        """Students matching every word of text as a prefix, ordered by name"""
+        terms = (text or '').lower().split()
+        if not terms:
+            return []
+        self.ensure_built()
+        # Scan the narrowest range (longest term), then check the other words
+        probe = max(terms, key=len)
+        with self._lock:
+            i = bisect.bisect_left(self._keys, (probe,))
+            candidates = set()
+            while i < len(self._keys) and self._keys[i][0].startswith(probe):
+                candidates.add(self._keys[i][1])
+                i += 1
+            matches = []
+            for student_id in candidates:
+                row = self._students[student_id]
+                keys = search_keys(row)
+                if all(any(key.startswith(term) for key in keys) for term in terms):
+                    matches.append(row)
+        matches.sort(key=lambda r: ((r.get('name') or '').lower(), r['id']))
+        return matches[:limit]
+
+    def student(self, student_id):
+        self.ensure_built()
+        return self._students.get(student_id)
+
+    def recent_sessions(self, student_id, limit=RECENT_LIMIT):
+        """Newest first"""
+        self.ensure_built()
+        with self._lock:
+            ordered = self._sessions.get(student_id, [])
+            return [self._session_rows[sid] for _, sid in reversed(ordered[-limit:])]
+
+    def recent_appointments(self, student_id, limit=RECENT_LIMIT):
+        """Session-ready appointments, newest first"""
+        self.ensure_built()
+        with self._lock:
+            ordered = self._appointments.get(student_id, [])
+            return [self._appt_rows[aid] for _, _, aid in reversed(ordered[-limit:])]
+
+    # ---------- Internals (caller holds the lock) ----------
+
+    def _add_session(self, row):
+        self._session_rows[row['id']] = row
+        bisect.insort(self._sessions.setdefault(row['student_id'], []), (row['created_at'] or '', row['id']))
+
+    def _add_appointment(self, row):
+        self._appt_rows[row['id']] = row
+        bisect.insort(self._appointments.setdefault(row['student_id'], []),
+                      (row['date'] or '', row['time'] or '', row['id']))
+
+    def _remove_student(self, student_id):
+        row = self._students.pop(student_id, None)
+        if row is not None:
+            for key in search_keys(row):
+                i = bisect.bisect_left(self._keys, (key, student_id))
+                if i < len(self._keys) and self._keys[i] == (key, student_id):
+                    del self._keys[i]
+        for _, session_id in self._sessions.pop(student_id, []):
+            self._session_rows.pop(session_id, None)
+        for _, _, appt_id in self._appointments.pop(student_id, []):
+            self._appt_rows.pop(appt_id, None)
+
+lookup_index = LookupIndex()
+
+def format_timestamp(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d %H:%M')
+    except (TypeError, ValueError):
+        return value or 'N/A'
+
+def serialize_student(row):
+    pid = repository.professional_id(row['id'])
+    return {
+        'id': row['id'],
+        'name': row.get('name'),
+        'index_number': row.get('index_number'),
+        'programme': row.get('programme'),
+        'professional_id': pid,
+        'label': f"{row.get('name') or 'N/A'} - {row.get('programme') or 'N/A'} ({pid})",
+    }
+
+def serialize_session(row):
+    created = format_timestamp(row.get('created_at'))
+    counsellor = row.get('counsellor_name')
+    return {
+        'id': row['id'],
+        'student_id': row['student_id'],
+        'appointment_id': row['appointment_id'],
+        'created_at': created,
+        'counsellor_name': counsellor,
+        'label': f"{created}{' - ' + counsellor if counsellor else ''}",
+    }
+
+def serialize_appointment(row):
+    return {
+        'id': row['id'],
+        'student_id': row['student_id'],
+        'date': row.get('date'),
+        'time': row.get('time'),
+        'status': row.get('status'),
+        'urgency': row.get('urgency') or 'Normal',
+        'referral_source': row.get('referral_source') or 'Self',
+        'purpose': row.get('purpose'),
+        'counsellor_name': row.get('counsellor_name'),
+        'label': f"{row.get('date')} @ {row.get('time')} ({row.get('status')})",
+    }
+
+def selected_student(student_id):
+    """Serialized student for a form that opens with one already chosen"""
+    try:
+        row = lookup_index.student(int(student_id))
+    except (TypeError, ValueError):
+        return None
+    return serialize_student(row) if row else None
+
+def selected_appointment(conn, appt_id):
+    """(appointment, student) for a form opened from the dashboard, whatever its status"""
+    row = conn.execute(APPOINTMENT_SELECT + ' WHERE a.id = ?', (appt_id,)).fetchone()
+    if row is None:
+        return None, None
+    return serialize_appointment(dict(row)), selected_student(row['student_id'])
+
+def requested_limit(default):
+    try:
+        return max(1, min(int(request.args.get('limit', default)), MAX_LIMIT))
+    except ValueError:
+        return default
+
+# ==========================================
+# API ENDPOINTS
+# ==========================================
+
+@lookup_bp.route('/students', methods=['GET'])
+def lookup_students():
+    """Typeahead: ?q= name words, index number or professional ID (C007)"""
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+
+    rows = lookup_index.search(request.args.get('q', ''), requested_limit(DEFAULT_LIMIT))
+    return jsonify({'status': 'success', 'items': [serialize_student(r) for r in rows]})
+
+@lookup_bp.route('/students/<int:student_id>/sessions', methods=['GET'])
+def lookup_student_sessions(student_id):
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+
+    rows = lookup_index.recent_sessions(student_id, requested_limit(RECENT_LIMIT))
+    return jsonify({'status': 'success', 'items': [serialize_session(r) for r in rows]})
+
+@lookup_bp.route('/students/<int:student_id>/appointments', methods=['GET'])
+def lookup_student_appointments(student_id):
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+
+    rows = lookup_index.recent_appointments(student_id, requested_limit(RECENT_LIMIT))
+    return jsonify({'status': 'success', 'items': [serialize_appointment(r) for r in rows]})
@@ -35,8 +35,32 @@ def create_default_config():
         "node_id": f"NODE_{str(uuid.uuid4())[:8].upper()}",
         "node_role": "Unassigned", # e.g., 'SECRETARY', 'COUNSELLOR'
         "peer_ip": "", # Manual IP entry for the 'other' machine
+        "peers": [], # Further machines to sync with directly (mesh)
+        "sync_hub": "", # If set, sync only with this machine; it relays everyone's changes
         "sync_enabled": True,
-        "sync_interval_seconds": 60
+        "sync_interval_seconds": 60,
+        "analytics_snapshot_minutes": 0, # 0 = read the live database read-only
+        "write_batch_window_ms": 5,
+        "write_batch_max": 100,
+        "consistency_check_interval_seconds": 600,
+        "snapshot_bootstrap": True, # fresh nodes adopt a peer snapshot instead of a full JSON pull
+        "peer_port": 5000,
+        "sync_connect_timeout": 3,
+        "sync_read_timeout": 15,
+        "sync_retries": 3,
+        "sync_pull_workers": 4, # tables pulled from the peer concurrently
+        "sync_page_size": 2000, # change log entries per pull/push request
+        "server_host": "0.0.0.0",
+        "server_port": 5000,
+        "server_workers": 1, # gunicorn processes (Linux); must stay 1, the live queue is per process
+        "server_threads": 16, # requests handled at once
+        "server_backlog": 64, # requests waiting for a thread; beyond this clients get a 503
+        "server_keepalive_seconds": 5,
+        "server_timeout_seconds": 60,
+        "server_graceful_seconds": 15, # shutdown/reload waits this long for in-flight requests
+        "server_max_streams": 4, # live dashboard streams (each holds a server thread)
+        "server_stream_seconds": 300, # streams are recycled; the browser reconnects
+        "profile_cache_size": 128 # student profiles kept in memory (0 disables the cache)
     }
     save_config(config)
     return config
@@ -44,8 +68,12 @@ def create_default_config():
 def save_config(config):
     config_path = get_config_path()
     try:
-        with open(config_path, 'w') as f:
+        # Write then swap, so a concurrent load never sees a half-written file
+        # (and falls back to a fresh config with a new node id)
+        temp_path = f"{config_path}.tmp"
+        with open(temp_path, 'w') as f:
             json.dump(config, f, indent=4)
+        os.replace(temp_path, config_path)
         print(f"Config saved to {config_path}")
     except Exception as e:
         print(f"Error saving config: {e}")
@@ -57,3 +85,16 @@ def get_node_id():
 def get_peer_ip():
     config = load_config()
     return config.get('peer_ip')
+
+def get_sync_targets(config=None):
+    """Machines this node syncs with: the hub alone, or every configured peer"""
+    config = config or load_config()
+    hub = (config.get('sync_hub') or '').strip()
+    if hub:
+        return [hub]
+    targets = []
+    for address in [config.get('peer_ip')] + list(config.get('peers') or []):
+        address = (address or '').strip()
+        if address and address not in targets:
+            targets.append(address)
+    return targets
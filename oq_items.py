@@ -0,0 +1,119 @@
+"""
+Packed storage for outcome questionnaire item responses.
+
+OutcomeQuestionnaire keeps the answers in one fixed-width TEXT column,
+`items`: one character per item in order, '0'-'4' for the answer and '-'
+for an item left blank. A row with no item data at all stores NULL. The
+column goes over sync as an ordinary string, and widening the form to the
+full 45-item OQ needs no schema change.
+
+The OutcomeQuestionnaireItems view unpacks it back into item1..itemN
+columns for reports and scripts written against the old layout.
+"""
+
+import sqlite3
+import sync_versions
+
+ITEM_COUNT = 25        # items on the current form
+MAX_ITEMS = 45         # widest packed value accepted (full OQ-45)
+MAX_ANSWER = 4         # 0 = Never ... 4 = Almost Always
+MISSING = '-'
+
+TABLE = 'OutcomeQuestionnaire'
+VIEW = 'OutcomeQuestionnaireItems'
+
+# item1..item25 columns of the old layout (add_item_columns.py)
+LEGACY_COLUMNS = tuple(f'item{i}' for i in range(1, ITEM_COUNT + 1))
+
+_ANSWERS = frozenset(str(value) for value in range(MAX_ANSWER + 1))
+
+def pack(values):
+    """Item answers (ints or None) -> packed string; None when nothing was answered"""
+    values = list(values)
+    if len(values) > MAX_ITEMS:
+        raise ValueError(f"At most {MAX_ITEMS} items, got {len(values)}")
+    chars = []
+    for value in values:
+        if value is None or value == '':
+            chars.append(MISSING)
+            continue
+        answer = int(value)
+        if answer != float(value) or not 0 <= answer <= MAX_ANSWER:
+            raise ValueError(f"Item answers are whole numbers 0-{MAX_ANSWER}, got {value!r}")
+        chars.append(str(answer))
+    packed = ''.join(chars)
+    return None if packed.strip(MISSING) == '' else packed
+
+def unpack(packed, count=ITEM_COUNT):
+    """Packed string -> list of count answers (None where blank or past the end)"""
+    packed = packed or ''
+    return [int(char) if char in _ANSWERS else None for char in packed[:count].ljust(count, MISSING)]
+
+def is_complete(packed, count=ITEM_COUNT):
+    return packed is not None and len(packed) == count and MISSING not in packed
+
+def total(packed, count=ITEM_COUNT):
+    """Sum of the answers of a complete questionnaire, None otherwise"""
+    if not is_complete(packed, count):
+        return None
+    return sum(map(int, packed))
+
+def item_columns_sql(alias='o', count=ITEM_COUNT):
+    """SELECT list unpacking alias.items into item1..itemN"""
+    return ', '.join(f"CAST(NULLIF(trim(substr({alias}.items, {i}, 1), '{MISSING}'), '') AS INTEGER) AS item{i}"
+                     for i in range(1, count + 1))
+
+def pack_sql(columns=LEGACY_COLUMNS, prefix=''):
+    """SQL expression packing the old itemN columns (NULL when all are empty)"""
+    parts = [f"CASE WHEN {prefix}{column} BETWEEN 0 AND {MAX_ANSWER} THEN CAST({prefix}{column} AS INTEGER) "
+             f"ELSE '{MISSING}' END" for column in columns]
+    return f"NULLIF({' || '.join(parts)}, '{MISSING * len(columns)}')"
+
+def upgrade_record(record):
+    """A synced record from a peer still on the old layout, with its items packed"""
+    if 'items' in record or not any(column in record for column in LEGACY_COLUMNS):
+        return record
+    upgraded = {k: v for k, v in record.items() if k not in LEGACY_COLUMNS}
+    try:
+        upgraded['items'] = pack(record.get(column) for column in LEGACY_COLUMNS)
+    except (TypeError, ValueError):
+        upgraded['items'] = None  # total_score still carries the result
+    return upgraded
+
+def ensure_schema(conn):
+    """
+    Add the packed column, move answers out of the old itemN columns and
+    drop them, then (re)create the compatibility view. Needs the sync
+    schema in place; the caller commits.
+    """
+    existing = [r[1] for r in conn.execute(f"PRAGMA table_info({TABLE})")]
+    if not existing:
+        return 0
+    if 'items' not in existing:
+        conn.execute(f"ALTER TABLE {TABLE} ADD COLUMN items TEXT")
+    legacy = [column for column in LEGACY_COLUMNS if column in existing]
+    moved = 0
+    if legacy:
+        # Same answers in a different shape: leave versions alone
+        sync_versions.begin_merge(conn, None)
+        try:
+            moved = conn.execute(f"UPDATE {TABLE} SET items = {pack_sql(legacy)} "
+                                 f"WHERE items IS NULL AND ({' OR '.join(f'{c} IS NOT NULL' for c in legacy)})"
+                                 ).rowcount
+            for column in legacy:
+                try:
+                    conn.execute(f"ALTER TABLE {TABLE} DROP COLUMN {column}")
+                except sqlite3.OperationalError:
+                    # SQLite before 3.35 can't drop columns; at least stop storing the values twice
+                    conn.execute(f"UPDATE {TABLE} SET {column} = NULL WHERE {column} IS NOT NULL")
+        finally:
+            sync_versions.end_merge(conn)
+        if moved:
+            print(f"[OQ] Packed item answers of {moved} questionnaires")
+    conn.executescript(f'''
+        DROP VIEW IF EXISTS {VIEW};
+        CREATE VIEW {VIEW} AS
+        SELECT o.*, {item_columns_sql('o')}
+        FROM {TABLE} o;
+    ''')
+    return moved
@@ -0,0 +1,687 @@
+"""
+Batch printing of case files.
+
+A print job gathers every printable document for a student, a date range
+or an explicit selection and renders them into one HTML bundle (or a PDF
+when weasyprint is installed) with a page break between documents.
+
+All records of a kind are read with one query, and the students they
+belong to with one more, instead of one lookup per document. The per-record
+print templates are reused unchanged: each rendered page is split into its
+styles and its body, the styles are scoped to the document type so the
+templates' class names don't collide in one page, and the body is cached
+under the updated_at and version vector of the record and of the student
+it shows: updated_at only has one-second resolution, the vector's counter
+moves on every write. Printing the same file again only re-renders what
+changed since.
+
+Jobs run one at a time on a background thread; the batch page polls
+their progress.
+"""
+
+import re
+import uuid
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from flask import Blueprint, request, jsonify, session, render_template, make_response, current_app, redirect, url_for
+from markupsafe import Markup
+import node_config
+import repository
+
+try:
+    import weasyprint
+except ImportError:
+    weasyprint = None  # HTML bundles only (the browser can still save them as PDF)
+
+print_bp = Blueprint('print_batch', __name__)
+
+PRINT_ROLES = ('Admin', 'Counsellor', 'Counselor')
+
+# node_config key (default used when absent): MB of rendered documents kept in memory
+CACHE_MB_KEY = 'print_cache_mb'
+DEFAULT_CACHE_MB = 32
+
+MAX_DOCUMENTS = 2000            # per job
+JOB_TTL_SECONDS = 3600          # finished bundles stay downloadable this long
+MAX_JOBS = 10                   # ... and no more than this many are kept
+IN_CHUNK = 500                  # ids per IN (...) list
+
+class DocumentKind:
+    """
+    One printable record type: the template that prints it, the query that
+    reads it with its owner, date and cache stamp, and the template context.
+    """
+    __slots__ = ('name', 'label', 'template', 'select', 'id_column', 'owner_column', 'date_column', 'context',
+                 'cacheable')
+
+    def __init__(self, name, label, template, select, id_column, owner_column, date_column, context,
+                 cacheable=True):
+        self.name = name
+        self.label = label
+        self.template = template
+        self.select = select
+        self.id_column = id_column
+        self.owner_column = owner_column
+        self.date_column = date_column
+        self.context = context
+        self.cacheable = cacheable
+
+def _student_fields(student):
+    student = student or {}
+    return {
+        'student_db_id': student.get('id'),
+        'student_name': student.get('name'),
+        'index_number': student.get('index_number'),
+        'programme': student.get('programme'),
+        'contact': student.get('contact'),
+        'department': student.get('department'),
+        'professional_id': repository.professional_id(student.get('id')),
+    }
+
+def referral_reasons(reasons):
+    """Checked reasons of a referral and the text of 'Something Else', as print_referral.html shows them"""
+    reasons_list = [r.strip() for r in (reasons or '').split(',') if r.strip()]
+    other_reason_text = None
+    for idx, reason in enumerate(reasons_list):
+        if reason.startswith('Something Else:'):
+            other_reason_text = reason.replace('Something Else:', '').strip()
+            reasons_list[idx] = 'Something Else'  # Replace with just the checkbox name
+            break
+    return reasons_list, other_reason_text
+
+def _session_context(record, student, now):
+    fields = _student_fields(student)
+    data = dict(record, student_name=fields['student_name'], index_number=fields['index_number'],
+                programme=fields['programme'], contact=fields['contact'], department=fields['department'])
+    return {'session_data': data}
+
+def _referral_context(record, student, now):
+    fields = _student_fields(student)
+    referral = dict(record, student_db_id=fields['student_db_id'], student_name=fields['student_name'],
+                    index_number=fields['index_number'], student_contact=fields['contact'],
+                    student_department=fields['department'], professional_id=fields['professional_id'])
+    reasons_list, other_reason_text = referral_reasons(referral.get('reasons'))
+    referral['referral_reasons_list'] = reasons_list
+    referral['other_reason_text'] = other_reason_text
+    return {'referral': referral, 'referral_reasons_list': reasons_list, 'other_reason_text': other_reason_text,
+            'student_department': referral['student_department'] or 'N/A'}
+
+def _case_note_context(record, student, now):
+    return {'case': dict(record, **_student_fields(student))}
+
+def _dass21_context(record, student, now):
+    dass21 = dict(record, **_student_fields(student))
+    for scale in ('depression', 'anxiety', 'stress'):
+        dass21[f'final_{scale}'] = (dass21.get(f'{scale}_score', 0) or 0) * 2
+    return {'dass21': dass21}
+
+def _report_context(record, student, now):
+    return {'report': dict(record), 'now': now}
+
+# Bundle order within a student's file
+KINDS = OrderedDict((kind.name, kind) for kind in (
+    DocumentKind('session', 'Session Report', 'print_session.html', '''
+        SELECT sess.*, a.student_id AS owner_id, sess.created_at AS doc_date,
+               a.date, a.time, a.status AS appointment_status, c.name AS Counsellor_name,
+               printf('%s|%s|%s|%s|%s', sess.updated_at, sess.version_vector, a.updated_at, a.version_vector,
+                      c.name) AS stamp
+        FROM session sess
+        LEFT JOIN Appointment a ON sess.appointment_id = a.id
+        LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
+    ''', 'sess.id', 'a.student_id', 'sess.created_at', _session_context),
+    DocumentKind('case_note', 'Case Note', 'print_case_note.html', '''
+        SELECT cm.*, a.student_id AS owner_id, cm.created_at AS doc_date, sess.created_at AS session_date,
+               printf('%s|%s|%s|%s', cm.updated_at, cm.version_vector, sess.updated_at, sess.version_vector) AS stamp
+        FROM CaseManagement cm
+        JOIN session sess ON cm.session_id = sess.id
+        LEFT JOIN Appointment a ON sess.appointment_id = a.id
+    ''', 'cm.id', 'a.student_id', 'cm.created_at', _case_note_context),
+    DocumentKind('referral', 'Referral', 'print_referral.html', '''
+        SELECT r.*, a.student_id AS owner_id, r.created_at AS doc_date, sess.created_at AS session_date,
+               a.date AS appointment_date, a.time AS appointment_time,
+               printf('%s|%s|%s|%s', r.updated_at, r.version_vector, a.updated_at, a.version_vector) AS stamp
+        FROM Referral r
+        JOIN session sess ON r.session_id = sess.id
+        LEFT JOIN Appointment a ON sess.appointment_id = a.id
+    ''', 'r.id', 'a.student_id', 'r.created_at', _referral_context),
+    DocumentKind('dass21', 'DASS-21 Assessment', 'print_dass21.html', '''
+        SELECT d.*, d.student_id AS owner_id, d.created_at AS doc_date,
+               printf('%s|%s', d.updated_at, d.version_vector) AS stamp
+        FROM DASS21 d
+    ''', 'd.id', 'd.student_id', 'd.created_at', _dass21_context),
+    # Reports print the time they were printed, so they are always rendered fresh
+    DocumentKind('report', 'Activity Report', 'print_report.html', '''
+        SELECT rp.*, NULL AS owner_id, rp.date_generated AS doc_date, rp.date_generated AS stamp
+        FROM reports rp
+    ''', 'rp.id', None, 'rp.date_generated', _report_context, cacheable=False),
+))
+
+# ---------- Selecting documents ----------
+
+def parse_spec(data):
+    """
+    Normalize a job request. Any combination of:
+      student_id             - that student's file
+      date_from, date_to     - documents created in the range (YYYY-MM-DD, inclusive)
+      kinds                  - only these kinds (default all; reports need a date range or selection)
+      documents              - explicit selection, ["dass21:12", ...] or [{"kind": ..., "id": ...}]
+    Raises ValueError when the request selects nothing or is malformed.
+    """
+    data = data or {}
+    if not isinstance(data, dict):
+        raise ValueError('The print request must be a JSON object')
+    spec = {}
+    student_id = data.get('student_id')
+    if student_id not in (None, ''):
+        spec['student_id'] = _positive_id(student_id, 'student_id')
+    for key in ('date_from', 'date_to'):
+        value = str(data.get(key) or '').strip()
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise ValueError(f"{key} must be a date (YYYY-MM-DD), got {value!r}")
+            spec[key] = value
+    if spec.get('date_from', '') > spec.get('date_to', '9999'):
+        raise ValueError('date_from must not be after date_to')
+    kinds = data.get('kinds') or []
+    if isinstance(kinds, str):
+        kinds = [k for k in kinds.split(',') if k]
+    if not isinstance(kinds, list):
+        raise ValueError('kinds must be a list of document types')
+    unknown = [str(k) for k in kinds if k not in KINDS]
+    if unknown:
+        raise ValueError(f"Unknown document type: {', '.join(unknown)}")
+    if kinds:
+        spec['kinds'] = [k for k in KINDS if k in kinds]
+
+    items = data.get('documents') or []
+    if not isinstance(items, list):
+        raise ValueError('documents must be a list such as ["dass21:12"]')
+    documents = []
+    for item in items:
+        if isinstance(item, dict):
+            kind, record_id = item.get('kind'), item.get('id')
+        elif ':' in str(item):
+            kind, record_id = str(item).split(':', 1)
+        else:
+            raise ValueError(f"Documents are given as kind:id (e.g. dass21:12), got {item!r}")
+        if kind not in KINDS:
+            raise ValueError(f"Unknown document type: {kind}")
+        documents.append((kind, _positive_id(record_id, f'{kind} id')))
+    if documents:
+        spec['documents'] = documents
+    if not ('student_id' in spec or 'date_from' in spec or 'date_to' in spec or documents):
+        raise ValueError('Choose a student, a date range or documents to print')
+    return spec
+
+def _positive_id(value, name):
+    try:
+        number = int(str(value).strip())
+    except ValueError:
+        number = 0
+    if number <= 0:
+        raise ValueError(f"{name} must be a record number, got {value!r}")
+    return number
+
+def _kind_query(kind, spec):
+    """SQL and parameters for the records of one kind the spec selects (None if it selects none)"""
+    clauses, params = [], []
+    if 'documents' in spec:
+        ids = [record_id for name, record_id in spec['documents'] if name == kind.name]
+        if not ids:
+            return None
+        clauses.append(f"{kind.id_column} IN ({', '.join(['?'] * len(ids))})")
+        params.extend(ids)
+    else:
+        if kind.name not in spec.get('kinds', KINDS):
+            return None
+        if 'student_id' in spec:
+            if kind.owner_column is None:
+                return None
+            clauses.append(f"{kind.owner_column} = ?")
+            params.append(spec['student_id'])
+    if 'date_from' in spec:
+        clauses.append(f"date({kind.date_column}) >= ?")
+        params.append(spec['date_from'])
+    if 'date_to' in spec:
+        clauses.append(f"date({kind.date_column}) <= ?")
+        params.append(spec['date_to'])
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+    return kind.select + where, params
+
+def prefetch(conn, spec):
+    """
+    Every selected record with its student, in bundle order:
+    [(kind, record dict, student dict or None)]. One query per kind plus
+    one for all the students.
+    """
+    records = []
+    for kind in KINDS.values():
+        query = _kind_query(kind, spec)
+        if query is None:
+            continue
+        sql, params = query
+        records.extend((kind, dict(row)) for row in conn.execute(sql, params))
+        if len(records) > MAX_DOCUMENTS:
+            raise ValueError(f"More than {MAX_DOCUMENTS} documents selected; narrow the selection")
+
+    owner_ids = sorted({record['owner_id'] for _, record in records if record['owner_id'] is not None})
+    students = {}
+    for start in range(0, len(owner_ids), IN_CHUNK):
+        chunk = owner_ids[start:start + IN_CHUNK]
+        for row in conn.execute(f"SELECT * FROM Student WHERE id IN ({', '.join(['?'] * len(chunk))})", chunk):
+            students[row['id']] = dict(row)
+
+    order = {name: i for i, name in enumerate(KINDS)}
+    documents = [(kind, record, students.get(record['owner_id'])) for kind, record in records]
+    # Student files together (reports last), each in date order
+    documents.sort(key=lambda d: (d[2] is None, (d[2] or {}).get('name') or '', d[1]['owner_id'] or 0,
+                                  str(d[1]['doc_date'] or ''), order[d[0].name], d[1]['id']))
+    return documents
+
+def describe(documents):
+    """JSON-able list of what a spec selects (the batch page shows it for picking)"""
+    return [{
+        'key': f"{kind.name}:{record['id']}",
+        'kind': kind.name,
+        'label': kind.label,
+        'id': record['id'],
+        'date': record['doc_date'],
+        'student_id': record['owner_id'],
+        'student_name': (student or {}).get('name'),
+        'professional_id': repository.professional_id(record['owner_id']),
+    } for kind, record, student in documents]
+
+# ---------- Rendering ----------
+
+_STYLE_RE = re.compile(r'<style[^>]*>(.*?)</style>', re.S | re.I)
+_LINK_RE = re.compile(r'<link\b[^>]*>', re.I)
+_BODY_RE = re.compile(r'<body([^>]*)>(.*)</body>', re.S | re.I)
+_SCRIPT_RE = re.compile(r'<script\b.*?</script>', re.S | re.I)
+_CLASS_RE = re.compile(r'class\s*=\s*"([^"]*)"', re.I)
+_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+
+def split_page(html):
+    """A rendered print page -> (stylesheet links, inline CSS, body classes, body without scripts)"""
+    links = [link for link in _LINK_RE.findall(html) if 'stylesheet' in link.lower()]
+    css = '\n'.join(_STYLE_RE.findall(html))
+    body = _BODY_RE.search(html)
+    if body is None:
+        return links, css, '', _SCRIPT_RE.sub('', html)
+    classes = _CLASS_RE.search(body.group(1))
+    return links, css, classes.group(1) if classes else '', _SCRIPT_RE.sub('', body.group(2))
+
+def _scope_selector(selector, scope):
+    selector = selector.strip()
+    for root in ('html', 'body', ':root'):
+        if selector == root:
+            return scope
+        if selector.startswith(root + ' ') or selector.startswith(root + '>'):
+            return scope + selector[len(root):]
+    return f"{scope} {selector}"
+
+def scope_css(css, scope):
+    """
+    Prefix every rule of a stylesheet with `scope` so it only applies inside
+    that document (html/body/:root rules apply to the scope element itself).
+    @media and @supports blocks are scoped inside; other at-rules are kept.
+    """
+    css = _COMMENT_RE.sub('', css)
+    out = []
+    i = 0
+    while True:
+        brace = css.find('{', i)
+        if brace < 0:
+            break
+        prelude = css[i:brace].strip()
+        depth, j = 1, brace + 1
+        while j < len(css) and depth:
+            if css[j] == '{':
+                depth += 1
+            elif css[j] == '}':
+                depth -= 1
+            j += 1
+        block = css[brace + 1:j - 1]
+        if prelude.startswith('@media') or prelude.startswith('@supports'):
+            out.append(f"{prelude} {{\n{scope_css(block, scope)}\n}}")
+        elif prelude.startswith('@'):
+            out.append(f"{prelude} {{{block}}}")
+        elif prelude:
+            selectors = ', '.join(_scope_selector(s, scope) for s in prelude.split(',') if s.strip())
+            out.append(f"{selectors} {{{block}}}")
+        i = j
+    return '\n'.join(out)
+
+class FragmentCache:
+    """
+    Rendered document bodies, LRU within a byte budget. An entry is only
+    used while the stamp (updated_at and version vector of the record and
+    its student) still matches, so edits and synced changes never print
+    stale text.
+    """
+
+    def __init__(self):
+        self._fragments = OrderedDict()  # (kind, id) -> (stamp, html)
+        self._heads = {}                 # kind -> (links, scoped css, body classes)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind, record_id, stamp):
+        with self._lock:
+            entry = self._fragments.get((kind, record_id))
+            if entry is None or entry[0] != stamp or kind not in self._heads:
+                self.misses += 1
+                return None
+            self._fragments.move_to_end((kind, record_id))
+            self.hits += 1
+            return entry[1]
+
+    def put(self, kind, record_id, stamp, html):
+        limit = self._limit()
+        with self._lock:
+            old = self._fragments.pop((kind, record_id), None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            if len(html) > limit:
+                return
+            self._fragments[(kind, record_id)] = (stamp, html)
+            self._bytes += len(html)
+            while self._bytes > limit and self._fragments:
+                _, (_, dropped) = self._fragments.popitem(last=False)
+                self._bytes -= len(dropped)
+
+    def head(self, kind):
+        with self._lock:
+            return self._heads.get(kind)
+
+    def set_head(self, kind, head):
+        with self._lock:
+            self._heads[kind] = head
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+            self._heads.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'cached': len(self._fragments), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+    def _limit(self):
+        try:
+            return int(float(node_config.load_config().get(CACHE_MB_KEY, DEFAULT_CACHE_MB)) * 1024 * 1024)
+        except (TypeError, ValueError):
+            return DEFAULT_CACHE_MB * 1024 * 1024
+
+fragment_cache = FragmentCache()
+
+def render_document(kind, record, student, now):
+    """Body HTML of one document, from the cache when the record hasn't changed"""
+    owner = student or {}
+    stamp = f"{record.get('stamp')}|{owner.get('updated_at')}|{owner.get('version_vector')}"
+    if kind.cacheable:
+        html = fragment_cache.get(kind.name, record['id'], stamp)
+        if html is not None:
+            return html, True
+    page = render_template(kind.template, **kind.context(record, student, now))
+    links, css, classes, body = split_page(page)
+    if fragment_cache.head(kind.name) is None:
+        fragment_cache.set_head(kind.name, (links, scope_css(css, f'.doc-{kind.name}'), classes))
+    if kind.cacheable:
+        fragment_cache.put(kind.name, record['id'], stamp, body)
+    return body, False
+
+def build_bundle(conn, spec, now=None, progress=None):
+    """
+    (title, the whole bundle as one HTML page). progress(done, total,
+    cached) is called after every document.
+    """
+    now = now or datetime.now()
+    documents = prefetch(conn, spec)
+    total = len(documents)
+    if progress:
+        progress(0, total, 0)
+    sections, cached = [], 0
+    for done, (kind, record, student) in enumerate(documents, 1):
+        body, hit = render_document(kind, record, student, now)
+        cached += hit
+        sections.append({'kind': kind.name, 'label': kind.label, 'html': Markup(body),
+                         'student_name': (student or {}).get('name'),
+                         'classes': fragment_cache.head(kind.name)[2]})
+        if progress:
+            progress(done, total, cached)
+
+    links, styles = [], []
+    for name in KINDS:
+        head = fragment_cache.head(name)
+        if head is None or not any(s['kind'] == name for s in sections):
+            continue
+        links.extend(link for link in head[0] if link not in links)
+        styles.append(head[1])
+    title = bundle_title(spec, documents)
+    return title, render_template('print_bundle.html', sections=sections, links=[Markup(l) for l in links],
+                                  styles=Markup('\n'.join(styles)), title=title,
+                                  generated_at=now.strftime('%Y-%m-%d %H:%M'))
+
+def bundle_title(spec, documents):
+    if 'student_id' in spec:
+        student = next((s for _, _, s in documents if s), None)
+        name = (student or {}).get('name') or repository.professional_id(spec['student_id'])
+        title = f"Case File - {name}"
+    elif 'documents' in spec:
+        title = f"Selected Documents ({len(documents)})"
+    else:
+        title = 'Case Files'
+    if 'date_from' in spec or 'date_to' in spec:
+        title += f" ({spec.get('date_from', '...')} to {spec.get('date_to', '...')})"
+    return title
+
+# ---------- Jobs ----------
+
+class PrintJob:
+    __slots__ = ('id', 'owner', 'spec', 'format', 'status', 'total', 'done', 'cached', 'message', 'title',
+                 'created_at', 'finished_at', 'result', 'base_url')
+
+    def __init__(self, owner, spec, output_format, base_url):
+        self.id = uuid.uuid4().hex[:12]
+        self.owner = owner
+        self.spec = spec
+        self.format = output_format
+        self.status = 'queued'
+        self.total = 0
+        self.done = 0
+        self.cached = 0
+        self.message = None
+        self.title = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.result = None
+        self.base_url = base_url
+
+    def progress(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'done': self.done,
+            'cached': self.cached,
+            'percent': round(100 * self.done / self.total) if self.total else (100 if self.status == 'done' else 0),
+            'message': self.message,
+            'title': self.title,
+            'format': self.format,
+        }
+
+class PrintJobs:
+    """Queued print jobs and the one thread that renders them"""
+
+    def __init__(self):
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def submit(self, app, owner, spec, output_format='html', base_url='/'):
+        job = PrintJob(owner, spec, output_format, base_url)
+        with self._lock:
+            self._expire()
+            self._jobs[job.id] = job
+        self._queue.put((app, job))
+        self._ensure_started()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _expire(self):
+        cutoff = time.time() - JOB_TTL_SECONDS
+        finished = [j for j in self._jobs.values() if j.finished_at is not None]
+        for job in finished:
+            if job.finished_at < cutoff or len(self._jobs) > MAX_JOBS:
+                self._jobs.pop(job.id, None)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='print-jobs', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            app, job = self._queue.get()
+            self._render(app, job)
+
+    def _render(self, app, job):
+        job.status = 'running'
+        started = time.perf_counter()
+        conn = None
+        try:
+            # Templates use url_for and asset_url, which need a request
+            with app.test_request_context('/', base_url=job.base_url):
+                conn = get_db_connection()
+
+                def progress(done, total, cached):
+                    job.done, job.total, job.cached = done, total, cached
+
+                job.title, html = build_bundle(conn, job.spec, progress=progress)
+                if job.format == 'pdf':
+                    job.result = weasyprint.HTML(string=html, base_url=job.base_url).write_pdf()
+                else:
+                    job.result = html.encode('utf-8')
+            job.status = 'done'
+            print(f"[PRINT] Job {job.id}: {job.total} documents ({job.cached} cached) "
+                  f"in {(time.perf_counter() - started) * 1000:.0f}ms")
+        except Exception as e:
+            job.status = 'error'
+            job.message = str(e)
+            print(f"[PRINT] Job {job.id} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+print_jobs = PrintJobs()
+
+# ---------- Routes ----------
+
+def get_db_connection():
+    # Helper to get DB connection (reused logic)
+    import app
+    return app.get_db_connection()
+
+def _authorized():
+    return session.get('logged_in') and session.get('role') in PRINT_ROLES
+
+def _own_job(job_id):
+    job = print_jobs.get(job_id)
+    if job is None or (job.owner != session.get('username') and session.get('role') != 'Admin'):
+        return None
+    return job
+
+@print_bp.route('/print_batch', methods=['GET'])
+def batch_page():
+    """Pick a student, dates or documents and build a printable bundle"""
+    if not session.get('logged_in'):
+        return redirect(url_for('welcome'))
+    kinds = [{'name': kind.name, 'label': kind.label} for kind in KINDS.values()]
+    return render_template('print_batch.html', kinds=kinds, pdf_available=weasyprint is not None,
+                           student_id=request.args.get('student_id', type=int),
+                           student_name=request.args.get('student_name', ''))
+
+@print_bp.route('/api/print/documents', methods=['GET'])
+def list_documents():
+    """What a selection would print (query string takes the same fields as a job)"""
+    if not _authorized():
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    try:
+        spec = parse_spec(request.args.to_dict())
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    conn = get_db_connection()
+    try:
+        return jsonify({'status': 'success', 'items': describe(prefetch(conn, spec))})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    finally:
+        conn.close()
+
+@print_bp.route('/api/print/jobs', methods=['POST'])
+def start_job():
+    if not _authorized():
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    data = request.get_json(silent=True) or request.form.to_dict()
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': 'The print request must be a JSON object'}), 400
+    if 'documents' in request.form:
+        data['documents'] = request.form.getlist('documents')
+    output_format = data.get('format') or 'html'
+    if output_format not in ('html', 'pdf'):
+        return jsonify({'status': 'error', 'message': 'Format must be html or pdf'}), 400
+    if output_format == 'pdf' and weasyprint is None:
+        return jsonify({'status': 'error',
+                        'message': "PDF output needs weasyprint installed; print the HTML bundle to PDF instead"}), 400
+    try:
+        spec = parse_spec(data)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    job = print_jobs.submit(current_app._get_current_object(), session.get('username'), spec, output_format,
+                            request.host_url)
+    return jsonify(dict(job.progress(), status_url=f'/api/print/jobs/{job.id}')), 202
+
+@print_bp.route('/api/print/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    if not _authorized():
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    job = _own_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Print job not found'}), 404
+    return jsonify(job.progress())
+
+@print_bp.route('/api/print/jobs/<job_id>/bundle', methods=['GET'])
+def job_bundle(job_id):
+    if not _authorized():
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    job = _own_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Print job not found'}), 404
+    if job.status != 'done':
+        return jsonify(job.progress()), 409
+    response = make_response(job.result)
+    if job.format == 'pdf':
+        response.headers['Content-Type'] = 'application/pdf'
+        response.headers['Content-Disposition'] = f'inline; filename=case_files_{job.id}.pdf'
+    else:
+        response.headers['Content-Type'] = 'text/html; charset=utf-8'
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
@@ -0,0 +1,258 @@
+import threading
+from collections import OrderedDict
+import node_config
+import repository
+import scoring_engine
+from analytics_db import ChangeWatch
+
+# node_config key (default used when absent): student profiles kept in memory
+CACHE_SIZE_KEY = 'profile_cache_size'
+DEFAULT_CACHE_SIZE = 128
+
+# Columns of the timeline query; each kind of record fills the ones it has
+TIMELINE_COLUMNS = (
+    'id', 'created_at', 'session_id', 'appointment_id', 'session_type', 'notes', 'outcome',
+    'date', 'time', 'status', 'counsellor_name', 'referred_by', 'contact', 'reasons', 'action_taken',
+    'depression_score', 'anxiety_score', 'stress_score', 'total_score', 'completion_date', 'session_date',
+)
+
+def _branch(kind, source, **columns):
+    values = ', '.join(f"{columns.get(name, 'NULL')} AS {name}" for name in TIMELINE_COLUMNS)
+    return f"SELECT '{kind}' AS kind, {values} {source}"
+
+# Everything hanging off one student in a single statement, newest first
+TIMELINE = repository.Query('profile_timeline', '''
+    WITH sess AS (
+        SELECT s.id, s.appointment_id, s.session_type, s.notes, s.outcome, s.created_at,
+               a.date, a.time, a.status, c.name AS counsellor_name
+        FROM Appointment a
+        JOIN session s ON s.appointment_id = a.id
+        LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
+        WHERE a.student_id = :student_id
+    )
+''' + '\nUNION ALL\n'.join([
+    _branch('session', 'FROM sess',
+            id='id', created_at='created_at', session_id='id', appointment_id='appointment_id',
+            session_type='session_type', notes='notes', outcome='outcome', date='date', time='time',
+            status='status', counsellor_name='counsellor_name'),
+    _branch('referral', 'FROM Referral r JOIN sess ON r.session_id = sess.id',
+            id='r.id', created_at='r.created_at', session_id='r.session_id', outcome='r.outcome',
+            date='sess.date', time='sess.time', referred_by='r.referred_by', contact='r.contact',
+            reasons='r.reasons', action_taken='r.action_taken', session_date='sess.created_at'),
+    _branch('dass21', 'FROM DASS21 d WHERE d.student_id = :student_id',
+            id='d.id', created_at='d.created_at', depression_score='d.depression_score',
+            anxiety_score='d.anxiety_score', stress_score='d.stress_score', completion_date='d.completion_date'),
+    _branch('oq', 'FROM OutcomeQuestionnaire o LEFT JOIN session os ON os.id = o.session_id '
+                  'WHERE o.student_id = :student_id',
+            id='o.id', created_at='o.created_at', session_id='o.session_id', total_score='o.total_score',
+            completion_date='o.completion_date', session_date='os.created_at'),
+]) + ' ORDER BY created_at DESC, id DESC')
+
+STUDENT = repository.Query('profile_student', 'SELECT * FROM Student WHERE id = ?')
+
+# Which timeline columns each list on the profile carries (and under what name)
+FIELDS = {
+    'session': ('id', 'appointment_id', 'session_type', 'notes', 'outcome', 'created_at', 'date', 'time',
+                'status', ('Counsellor_name', 'counsellor_name')),
+    'referral': ('id', 'session_id', 'referred_by', 'contact', 'reasons', 'action_taken', 'outcome',
+                 'created_at', 'session_date', ('appointment_date', 'date'), ('appointment_time', 'time')),
+    'dass21': ('id', 'depression_score', 'anxiety_score', 'stress_score', 'completion_date', 'created_at'),
+    'oq': ('id', 'session_id', 'total_score', 'completion_date', 'created_at', 'session_date'),
+}
+
+OWNER_QUERIES = {
+    'session': "SELECT a.student_id FROM session s JOIN Appointment a ON s.appointment_id = a.id "
+               "WHERE s.id = ?",
+    'referral': "SELECT a.student_id FROM Referral r JOIN session s ON r.session_id = s.id "
+                "JOIN Appointment a ON s.appointment_id = a.id WHERE r.id = ?",
+    'appointment': "SELECT student_id FROM Appointment WHERE id = ?",
+}
+
+# Tables whose sync changes can alter a profile, and how to find the student
+SYNC_OWNERS = {
+    'Student': "SELECT id FROM Student WHERE global_id = ?",
+    'Appointment': "SELECT student_id FROM Appointment WHERE global_id = ?",
+    'session': "SELECT a.student_id FROM session s JOIN Appointment a ON s.appointment_id = a.id "
+               "WHERE s.global_id = ?",
+    'Referral': "SELECT a.student_id FROM Referral r JOIN session s ON r.session_id = s.id "
+                "JOIN Appointment a ON s.appointment_id = a.id WHERE r.global_id = ?",
+    'DASS21': "SELECT student_id FROM DASS21 WHERE global_id = ?",
+    'OutcomeQuestionnaire': "SELECT student_id FROM OutcomeQuestionnaire WHERE global_id = ?",
+}
+
+def _pick(row, fields):
+    record = {}
+    for field in fields:
+        name, column = field if isinstance(field, tuple) else (field, field)
+        record[name] = row[column]
+    return record
+
+class ProfileSnapshot:
+    """Everything the profile page and its print views show for one student"""
+
+    __slots__ = ('student', 'sessions', 'referrals', 'dass21_scores', 'oq_scores', '_sessions_by_id',
+                 '_referrals_by_id')
+
+    def __init__(self, student, rows):
+        self.student = dict(student, professional_id=repository.professional_id(student['id']))
+        lists = {kind: [] for kind in FIELDS}
+        for row in rows:
+            lists[row['kind']].append(_pick(row, FIELDS[row['kind']]))
+        for record in lists['session']:
+            record['student_name'] = self.student['name']
+        self.sessions = lists['session']
+        self.referrals = lists['referral']
+        self.dass21_scores = lists['dass21']
+        self.oq_scores = lists['oq']
+        scoring_engine.annotate(self.dass21_scores, self.oq_scores)
+        self._sessions_by_id = {s['id']: s for s in self.sessions}
+        self._referrals_by_id = {r['id']: r for r in self.referrals}
+
+    def context(self):
+        """Template variables for student_profile.html"""
+        return {
+            'student': self.student,
+            'sessions': self.sessions,
+            'referrals': self.referrals,
+            'dass21_scores': self.dass21_scores,
+            'oq_scores': self.oq_scores,
+        }
+
+    def has(self, kind, record_id):
+        if kind == 'session':
+            return record_id in self._sessions_by_id
+        if kind == 'referral':
+            return record_id in self._referrals_by_id
+        if kind == 'appointment':
+            return any(s['appointment_id'] == record_id for s in self.sessions)
+        return False
+
+    def print_session(self, session_id):
+        """A session with the student details print_session.html shows"""
+        record = self._sessions_by_id.get(session_id)
+        if record is None:
+            return None
+        student = self.student
+        return dict(record, index_number=student.get('index_number'), programme=student.get('programme'),
+                    contact=student.get('contact'), department=student.get('department'),
+                    appointment_status=record['status'])
+
+    def print_referral(self, referral_id):
+        """A referral with the student details print_referral.html shows"""
+        record = self._referrals_by_id.get(referral_id)
+        if record is None:
+            return None
+        student = self.student
+        return dict(record, student_db_id=student['id'], student_name=student.get('name'),
+                    index_number=student.get('index_number'), student_contact=student.get('contact'),
+                    student_department=student.get('department'), professional_id=student['professional_id'])
+
+def build_snapshot(conn, student_id):
+    """Read a student's profile from the database; None if there is no such student"""
+    student = STUDENT.iter(conn, (student_id,)).fetchone()
+    if student is None:
+        return None
+    rows = TIMELINE.all(conn, {'student_id': student_id})
+    return ProfileSnapshot(student, rows)
+
+class ProfileCache:
+    """
+    LRU of assembled student profiles. Anything that writes a session,
+    referral, assessment or the student itself drops that student's entry;
+    the next view rebuilds it with one timeline query. Snapshots are only
+    served while the database's data version is the one they were read
+    at, so writes no route told us about (desktop app, other processes)
+    empty the cache too.
+    """
+
+    def __init__(self, watch=None):
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0  # bumped by every invalidation
+        self._watch = watch or ChangeWatch()
+        self._data_version = None  # what the cached snapshots were read at
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conn, student_id):
+        data_version = self._watch.version()
+        with self._lock:
+            if data_version != self._data_version:
+                self._version += 1
+                self._snapshots.clear()
+                self._data_version = data_version
+            snapshot = self._snapshots.get(student_id)
+            if snapshot is not None:
+                self._snapshots.move_to_end(student_id)
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+            version = self._version
+        snapshot = build_snapshot(conn, student_id)
+        if snapshot is None:
+            return None
+        limit = self._limit()
+        with self._lock:
+            # Skip the store if something was invalidated while we were reading
+            if version == self._version and limit > 0:
+                self._snapshots[student_id] = snapshot
+                while len(self._snapshots) > limit:
+                    self._snapshots.popitem(last=False)
+        return snapshot
+
+    def invalidate_student(self, student_id):
+        if student_id in (None, ''):
+            return
+        with self._lock:
+            self._version += 1
+            self._snapshots.pop(int(student_id), None)
+
+    def for_record(self, conn, kind, record_id):
+        """Snapshot of the student a session, referral or appointment belongs to (None if orphaned)"""
+        record_id = int(record_id)
+        for student_id, snapshot in self._cached():
+            if snapshot.has(kind, record_id):
+                return self.get(conn, student_id)
+        row = conn.execute(OWNER_QUERIES[kind], (record_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return self.get(conn, row[0])
+
+    def invalidate(self, conn, kind, record_id):
+        """Drop the profile a session, referral or appointment belongs to (also after it was deleted)"""
+        record_id = int(record_id)
+        owners = {student_id for student_id, snapshot in self._cached() if snapshot.has(kind, record_id)}
+        row = conn.execute(OWNER_QUERIES[kind], (record_id,)).fetchone()
+        if row is not None:
+            owners.add(row[0])
+        for student_id in owners:
+            self.invalidate_student(student_id)
+
+    def apply_sync_changes(self, conn, changes):
+        """Drop every profile a sync merge touched"""
+        for table, sql in SYNC_OWNERS.items():
+            for record in changes.get(table, []):
+                row = conn.execute(sql, (record.get('global_id'),)).fetchone()
+                if row is not None:
+                    self.invalidate_student(row[0])
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._snapshots.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'cached': len(self._snapshots), 'hits': self.hits, 'misses': self.misses}
+
+    def _cached(self):
+        with self._lock:
+            return list(self._snapshots.items())
+
+    def _limit(self):
+        try:
+            return int(node_config.load_config().get(CACHE_SIZE_KEY, DEFAULT_CACHE_SIZE))
+        except (TypeError, ValueError):
+            return DEFAULT_CACHE_SIZE
+
+profile_cache = ProfileCache()
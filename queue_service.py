@@ -0,0 +1,239 @@
+import json
+import time
+import threading
+from flask import Blueprint, Response, request, jsonify, session
+import node_config
+
+# Create Blueprint
+queue_bp = Blueprint('queue', __name__, url_prefix='/api/queue')
+
+# Statuses that keep an appointment on one of the live dashboards
+ACTIVE_STATUSES = ('Scheduled', 'Checked In', 'Sent to Counsellor', 'In Session')
+
+# Which statuses each dashboard lane shows
+LANES = {
+    'secretary': ('Scheduled',),
+    'counsellor': ('Sent to Counsellor', 'Checked In'),
+    'in_session': ('In Session',),
+}
+
+# Lower rank = surfaces first
+URGENCY_RANK = {'crisis': 0, 'urgent': 1, 'normal': 2}
+
+# node_config keys (defaults used when absent). Every open stream holds one
+# server thread, so they are capped and recycled; EventSource reconnects.
+STREAM_LIMIT_KEY = 'server_max_streams'       # concurrent dashboard streams
+STREAM_SECONDS_KEY = 'server_stream_seconds'  # a stream closes after this long
+
+DEFAULT_STREAM_LIMIT = 4
+DEFAULT_STREAM_SECONDS = 300
+STREAM_RETRY_MS = 2000
+
+_open_streams = 0
+_streams_lock = threading.Lock()
+
+QUEUE_SELECT = '''
+    SELECT a.*, s.name as student_name
+    FROM Appointment a JOIN Student s ON a.student_id = s.id
+'''
+
+def get_db_connection():
+    # Helper to get DB connection (reused logic)
+    import app
+    return app.get_db_connection()
+
+def sort_key(entry):
+    """Urgency first, then longest wait, then appointment slot"""
+    urgency = URGENCY_RANK.get((entry.get('urgency') or 'normal').lower(), 2)
+    # Waiting only starts once the student is at the office
+    wait_start = entry.get('sent_to_counsellor_at') or entry.get('checked_in_at') or '9999-12-31'
+    return (urgency, wait_start, entry.get('date') or '', entry.get('time') or '', entry['id'])
+
+class TodayQueue:
+    """
+    In-memory view of every active appointment, kept current by the
+    workflow routes and sync merges instead of re-querying on each request.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lanes = {}
+        self._version = 0
+        self._seeded = False
+        self._changed = threading.Condition()
+
+    @property
+    def version(self):
+        return self._version
+
+    def seed(self, conn):
+        """Load all active appointments from the database"""
+        placeholders = ', '.join(['?'] * len(ACTIVE_STATUSES))
+        rows = conn.execute(
+            QUEUE_SELECT + f" WHERE a.status IN ({placeholders})", ACTIVE_STATUSES
+        ).fetchall()
+        with self._changed:
+            self._entries = {row['id']: dict(row) for row in rows}
+            self._seeded = True
+            self._publish()
+        print(f"[QUEUE] Seeded with {len(rows)} active appointments")
+
+    def ensure_seeded(self):
+        if self._seeded:
+            return
+        conn = get_db_connection()
+        try:
+            self.seed(conn)
+        finally:
+            conn.close()
+
+    def refresh(self, conn, appt_id):
+        """Re-read a single appointment after it was written"""
+        row = conn.execute(QUEUE_SELECT + " WHERE a.id = ?", (appt_id,)).fetchone()
+        with self._changed:
+            if row is not None and row['status'] in ACTIVE_STATUSES:
+                self._entries[row['id']] = dict(row)
+            elif self._entries.pop(appt_id, None) is None:
+                return
+            self._publish()
+
+    def refresh_student(self, conn, student_id):
+        """Re-read every appointment of a student (e.g. after a rename or delete)"""
+        ids = {row['id'] for row in conn.execute(
+            "SELECT id FROM Appointment WHERE student_id = ?", (student_id,)
+        ).fetchall()}
+        with self._changed:
+            ids.update(k for k, v in self._entries.items() if v.get('student_id') == student_id)
+        for appt_id in ids:
+            self.refresh(conn, appt_id)
+
+    def refresh_global_ids(self, conn, global_ids):
+        """Re-read appointments that arrived through a sync merge"""
+        for global_id in global_ids:
+            row = conn.execute("SELECT id FROM Appointment WHERE global_id = ?", (global_id,)).fetchone()
+            if row is not None:
+                self.refresh(conn, row['id'])
+
+    def apply_sync_changes(self, conn, changes):
+        """Refresh whatever a sync merge touched"""
+        self.refresh_global_ids(conn, [r.get('global_id') for r in changes.get('Appointment', [])])
+        for record in changes.get('Student', []):
+            row = conn.execute("SELECT id FROM Student WHERE global_id = ?", (record.get('global_id'),)).fetchone()
+            if row is not None:
+                self.refresh_student(conn, row['id'])
+
+    def remove(self, appt_id):
+        with self._changed:
+            if self._entries.pop(appt_id, None) is not None:
+                self._publish()
+
+    def lane(self, name):
+        """Ordered entries for a dashboard lane (a shared, read-only list)"""
+        self.ensure_seeded()
+        return self._lanes.get(name, [])
+
+    def wait_for_change(self, since_version, timeout):
+        """Block until the queue moves past since_version or the timeout expires"""
+        with self._changed:
+            self._changed.wait_for(lambda: self._version != since_version, timeout=timeout)
+            return self._version
+
+    def _publish(self):
+        # Caller holds the lock. Rebuild the ordered lanes once per write so
+        # readers never sort.
+        ordered = sorted(self._entries.values(), key=sort_key)
+        self._lanes = {
+            name: [e for e in ordered if e['status'] in statuses]
+            for name, statuses in LANES.items()
+        }
+        self._version += 1
+        self._changed.notify_all()
+
+today_queue = TodayQueue()
+
+def lane_for_role(role):
+    if role in ('Counsellor', 'Counselor'):
+        return 'counsellor'
+    return 'secretary'
+
+def serialize_entry(entry):
+    return {
+        'id': entry['id'],
+        'student_id': entry.get('student_id'),
+        'student_name': entry.get('student_name'),
+        'date': entry.get('date'),
+        'time': entry.get('time'),
+        'status': entry.get('status'),
+        'urgency': entry.get('urgency') or 'Normal',
+        'purpose': entry.get('purpose'),
+        'checked_in_at': entry.get('checked_in_at'),
+        'sent_to_counsellor_at': entry.get('sent_to_counsellor_at'),
+    }
+
+def lane_payload(lane_name):
+    return {
+        'lane': lane_name,
+        'version': today_queue.version,
+        'items': [serialize_entry(e) for e in today_queue.lane(lane_name)],
+    }
+
+# ==========================================
+# API ENDPOINTS
+# ==========================================
+
+@queue_bp.route('', methods=['GET'])
+def get_queue():
+    """Current ordered queue for the caller's dashboard lane"""
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+
+    lane_name = request.args.get('lane') or lane_for_role(session.get('role'))
+    if lane_name not in LANES:
+        return jsonify({'status': 'error', 'message': f'Unknown lane: {lane_name}'}), 400
+    return jsonify(dict(status='success', **lane_payload(lane_name)))
+
+@queue_bp.route('/stream', methods=['GET'])
+def stream_queue():
+    """Server-sent events: pushes the lane every time the queue changes"""
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+
+    lane_name = request.args.get('lane') or lane_for_role(session.get('role'))
+    if lane_name not in LANES:
+        return jsonify({'status': 'error', 'message': f'Unknown lane: {lane_name}'}), 400
+    today_queue.ensure_seeded()
+
+    global _open_streams
+    config = node_config.load_config()
+    limit = int(config.get(STREAM_LIMIT_KEY, DEFAULT_STREAM_LIMIT))
+    lifetime = float(config.get(STREAM_SECONDS_KEY, DEFAULT_STREAM_SECONDS))
+    with _streams_lock:
+        if _open_streams >= limit:
+            # The dashboard still works, it just stops updating live
+            return jsonify({'status': 'error', 'message': 'Too many live dashboards open'}), 503
+        _open_streams += 1
+
+    def release():
+        global _open_streams
+        with _streams_lock:
+            _open_streams -= 1
+
+    def events():
+        version = None
+        # Tell the browser how soon to reconnect once we close the stream
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        closes_at = time.monotonic() + lifetime
+        while time.monotonic() < closes_at:
+            if version != today_queue.version:
+                payload = lane_payload(lane_name)
+                version = payload['version']
+                yield f"event: queue\ndata: {json.dumps(payload)}\n\n"
+            else:
+                # Heartbeat keeps proxies and the browser from dropping us
+                yield ": keep-alive\n\n"
+            today_queue.wait_for_change(version, timeout=min(15, max(closes_at - time.monotonic(), 0)))
+
+    response = Response(events(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(release)
+    return response
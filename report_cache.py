@@ -0,0 +1,199 @@
+"""
+Cache and retention for generated report files.
+
+A report is identified by what it was built from: its type, the window
+it covers, the report data version (report_rollup) and the template it
+was rendered with. The hash of those is stored on the reports row as
+cache_key and names the file, so asking again for the same report while
+nothing it counts has changed returns the existing file instead of
+writing another one.
+
+Retention keeps the cached reports in app_data/reports within a size
+and an age limit (node_config keys below), dropping the least recently
+used files first, and clears out cached rows whose file is gone and
+cached report files no row refers to. Reports written before the cache
+(and their rows) are history and are never touched.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import node_config
+import report_rollup
+
+# node_config keys (defaults used when absent); 0 turns a limit off
+MAX_MB_KEY = 'reports_max_mb'
+MAX_AGE_DAYS_KEY = 'reports_max_age_days'
+DEFAULT_MAX_MB = 200
+DEFAULT_MAX_AGE_DAYS = 365
+
+# Bump when generate_report's output changes for the same inputs
+REPORT_FORMAT = 1
+
+FILE_PREFIX = 'report_'
+FILE_SUFFIX = '.docx'
+
+# Names file_name() gives; only these files and their rows are ever removed, never older or hand-placed reports
+CACHED_FILE = re.compile(r'report_\d{4}-\d{2}-\d{2}_[0-9a-f]{16}\.docx')
+
+# Files younger than this are never treated as orphans: their row may not be written yet
+ORPHAN_GRACE_SECONDS = 600
+
+def get_base_path():
+    """Get base path for data files"""
+    try:
+        if getattr(sys, 'frozen', False):
+            return os.path.dirname(sys.executable)
+        return os.path.dirname(os.path.abspath(__file__))
+    except:
+        return os.path.dirname(os.path.abspath(__file__))
+
+def reports_dir():
+    return os.path.join(get_base_path(), 'app_data', 'reports')
+
+def ensure_schema(conn):
+    """cache_key on reports (older databases lack it). The caller commits."""
+    columns = [r[1] for r in conn.execute("PRAGMA table_info(reports)")]
+    if not columns:
+        return
+    if 'cache_key' not in columns:
+        conn.execute("ALTER TABLE reports ADD COLUMN cache_key TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_cache_key ON reports(cache_key)")
+
+# ==========================================
+# LOOKUP
+# ==========================================
+
+def cache_key(conn, report_type, span, template_stamp=None):
+    """Hash of everything a report's content depends on; span is the (start, end) it covers as strings"""
+    parts = [REPORT_FORMAT, report_type, list(span), report_rollup.data_version(conn), template_stamp]
+    return hashlib.sha256(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+
+def file_name(key, generated_at):
+    return f"{FILE_PREFIX}{generated_at.strftime('%Y-%m-%d')}_{key[:16]}{FILE_SUFFIX}"
+
+def resolve_path(file_path):
+    """
+    The file a reports row points at, or None. Rows store absolute paths;
+    if the install has moved, the file is looked up by name in the
+    current reports directory.
+    """
+    if not file_path:
+        return None
+    if os.path.exists(file_path):
+        return file_path
+    local = os.path.join(reports_dir(), os.path.basename(file_path.replace('\\', '/')))
+    return local if os.path.exists(local) else None
+
+def lookup(conn, key):
+    """(report id, path) of a cached report for this key, or None. Marks the file as recently used."""
+    for report_id, file_path in conn.execute(
+            "SELECT id, file_path FROM reports WHERE cache_key = ? ORDER BY id DESC", (key,)).fetchall():
+        path = resolve_path(file_path)
+        if path is not None:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return report_id, path
+    return None
+
+# ==========================================
+# RETENTION
+# ==========================================
+
+def _limits():
+    config = node_config.load_config()
+    try:
+        max_bytes = int(float(config.get(MAX_MB_KEY, DEFAULT_MAX_MB)) * 1024 * 1024)
+    except (TypeError, ValueError):
+        max_bytes = DEFAULT_MAX_MB * 1024 * 1024
+    try:
+        max_age = float(config.get(MAX_AGE_DAYS_KEY, DEFAULT_MAX_AGE_DAYS)) * 86400
+    except (TypeError, ValueError):
+        max_age = DEFAULT_MAX_AGE_DAYS * 86400
+    return max_bytes, max_age
+
+def _is_cached(file_path):
+    """True for a path named by file_name(); rows may hold Windows paths from another install"""
+    return bool(file_path) and CACHED_FILE.fullmatch(os.path.basename(file_path.replace('\\', '/'))) is not None
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+def enforce_retention(conn, keep=()):
+    """
+    Drop cached rows without a file and cached report files without a
+    row, then cached files (and their rows) past the age limit, then the
+    least recently used until the cached files fit the size limit. Only
+    cache-named reports are considered; paths in `keep` are never
+    removed. Returns counts; the caller commits.
+    """
+    directory = reports_dir()
+    keep = {os.path.abspath(path) for path in keep if path}
+    max_bytes, max_age = _limits()
+    now = time.time()
+    counts = {'rows': 0, 'orphans': 0, 'expired': 0, 'evicted': 0}
+
+    # path -> [row ids]
+    referenced = {}
+    for report_id, file_path in conn.execute("SELECT id, file_path FROM reports").fetchall():
+        if not _is_cached(file_path):
+            continue
+        path = resolve_path(file_path)
+        if path is None:
+            conn.execute("DELETE FROM reports WHERE id = ?", (report_id,))
+            counts['rows'] += 1
+        else:
+            referenced.setdefault(os.path.abspath(path), []).append(report_id)
+
+    files = []
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if not CACHED_FILE.fullmatch(name):
+                continue
+            path = os.path.abspath(os.path.join(directory, name))
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if path not in referenced:
+                if path not in keep and now - stat.st_mtime > ORPHAN_GRACE_SECONDS and _remove(path):
+                    counts['orphans'] += 1
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+    def drop(path):
+        if not _remove(path):
+            return False
+        for report_id in referenced.get(path, []):
+            conn.execute("DELETE FROM reports WHERE id = ?", (report_id,))
+        return True
+
+    files.sort()  # least recently used first
+    remaining = []
+    for mtime, size, path in files:
+        if max_age and path not in keep and now - mtime > max_age and drop(path):
+            counts['expired'] += 1
+        else:
+            remaining.append((mtime, size, path))
+
+    total = sum(size for _mtime, size, _path in remaining)
+    for mtime, size, path in remaining:
+        if not max_bytes or total <= max_bytes:
+            break
+        if path not in keep and drop(path):
+            total -= size
+            counts['evicted'] += 1
+
+    if any(counts.values()):
+        print(f"[REPORTS] Retention: {counts['rows']} rows without files, {counts['orphans']} orphan files, "
+              f"{counts['expired']} expired, {counts['evicted']} evicted for space")
+    return counts
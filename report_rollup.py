@@ -0,0 +1,488 @@
+"""
+Per-day aggregates behind the activity reports.
+
+ReportRollupDay holds, for every closed day (before today), the figures a
+report is built from: appointments by status, sessions by type, referrals,
+session-note keyword hits, and per programme the students seen. Distinct
+student counts are kept as mergeable sketches, so any window's unique
+students come from combining day sketches rather than rescanning
+sessions. A report window is composed from the closed days in it plus
+live queries for a partial first day and for today.
+
+Triggers on Appointment, session, Referral and Student note every day a
+write touches (old and new dates, local edits and sync merges alike) in
+ReportRollupDirty; refresh() recomputes just those days and any days
+that have closed since the last run. The same triggers bump a data
+version, so a cached report can tell whether anything it counted has
+changed since. The tables are derived and never synced.
+"""
+
+import hashlib
+import heapq
+import sqlite3
+import struct
+import threading
+from datetime import date, datetime, time, timedelta
+
+ISSUE_KEYWORDS = ('stress', 'anxiety', 'depression', 'academic', 'relationship', 'family', 'career',
+                  'financial', 'health')
+
+# Bump when a metric's definition changes: stored days are then rebuilt
+ROLLUP_VERSION = 1
+DEFINITION = f"{ROLLUP_VERSION}:{','.join(ISSUE_KEYWORDS)}"
+
+# Metrics counted by Appointment.date (whole days); the rest go by created_at
+APPOINTMENT_METRICS = ('appointments', 'programme')
+EVENT_METRICS = ('sessions', 'session_type', 'referrals', 'notes', 'issue')
+
+# Smallest hashes kept per sketch: counts are exact up to this many students
+SKETCH_SIZE = 256
+
+DAY_FORMAT = '%Y-%m-%d'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_refresh_lock = threading.Lock()
+
+# ==========================================
+# DISTINCT SKETCH
+# ==========================================
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+
+class DistinctSketch:
+    """
+    K-minimum-values sketch of distinct ids. Exact while it has seen fewer
+    than SKETCH_SIZE ids, an estimate after that; the union of two sketches
+    is the sketch of the union, so days merge into any window.
+    """
+    __slots__ = ('hashes',)
+
+    def __init__(self, hashes=()):
+        self.hashes = set(hashes)
+
+    def add(self, value):
+        if value is None:
+            return
+        self.hashes.add(_hash(value))
+        if len(self.hashes) > 2 * SKETCH_SIZE:
+            self._trim()
+
+    def merge(self, other):
+        self.hashes |= other.hashes
+        if len(self.hashes) > 2 * SKETCH_SIZE:
+            self._trim()
+
+    def _trim(self):
+        if len(self.hashes) > SKETCH_SIZE:
+            self.hashes = set(heapq.nsmallest(SKETCH_SIZE, self.hashes))
+
+    def estimate(self):
+        self._trim()
+        if len(self.hashes) < SKETCH_SIZE:
+            return len(self.hashes)
+        kth = max(self.hashes) + 1
+        return int(round((SKETCH_SIZE - 1) * 2 ** 64 / kth))
+
+    def pack(self):
+        self._trim()
+        return struct.pack(f'>{len(self.hashes)}Q', *sorted(self.hashes))
+
+    @classmethod
+    def unpack(cls, blob):
+        blob = bytes(blob or b'')
+        return cls(struct.unpack(f'>{len(blob) // 8}Q', blob[:len(blob) // 8 * 8]))
+
+# ==========================================
+# TOTALS
+# ==========================================
+
+class PeriodTotals:
+    """Report figures for a day or any union of days"""
+    __slots__ = ('appointments', 'session_types', 'sessions', 'students', 'referrals', 'notes', 'issues',
+                 'programmes')
+
+    def __init__(self):
+        self.appointments = {}    # status -> appointments
+        self.session_types = {}   # session type ('' when unset) -> sessions
+        self.sessions = 0         # sessions linked to an appointment
+        self.students = DistinctSketch()
+        self.referrals = 0
+        self.notes = 0            # non-empty session notes
+        self.issues = {}          # keyword -> notes mentioning it
+        self.programmes = {}      # programme ('' when unset) -> [appointments, DistinctSketch]
+
+    def _programme(self, programme):
+        entry = self.programmes.get(programme)
+        if entry is None:
+            entry = self.programmes[programme] = [0, DistinctSketch()]
+        return entry
+
+    def merge(self, other):
+        for status, count in other.appointments.items():
+            self.appointments[status] = self.appointments.get(status, 0) + count
+        for session_type, count in other.session_types.items():
+            self.session_types[session_type] = self.session_types.get(session_type, 0) + count
+        self.sessions += other.sessions
+        self.students.merge(other.students)
+        self.referrals += other.referrals
+        self.notes += other.notes
+        for keyword, count in other.issues.items():
+            self.issues[keyword] = self.issues.get(keyword, 0) + count
+        for programme, (count, sketch) in other.programmes.items():
+            entry = self._programme(programme)
+            entry[0] += count
+            entry[1].merge(sketch)
+        return self
+
+    def add_row(self, metric, key, count, sketch):
+        """Fold in one stored ReportRollupDay row"""
+        if metric == 'appointments':
+            self.appointments[key] = self.appointments.get(key, 0) + count
+        elif metric == 'session_type':
+            self.session_types[key] = self.session_types.get(key, 0) + count
+        elif metric == 'sessions':
+            self.sessions += count
+            self.students.merge(DistinctSketch.unpack(sketch))
+        elif metric == 'referrals':
+            self.referrals += count
+        elif metric == 'notes':
+            self.notes += count
+        elif metric == 'issue':
+            self.issues[key] = self.issues.get(key, 0) + count
+        elif metric == 'programme':
+            entry = self._programme(key)
+            entry[0] += count
+            entry[1].merge(DistinctSketch.unpack(sketch))
+
+    def rows(self, day):
+        """(day, metric, key, count, sketch) rows to store for this day"""
+        rows = [(day, 'appointments', status, count, None) for status, count in self.appointments.items()]
+        rows += [(day, 'session_type', session_type, count, None) for session_type, count in self.session_types.items()]
+        if self.sessions:
+            rows.append((day, 'sessions', '', self.sessions, self.students.pack()))
+        if self.referrals:
+            rows.append((day, 'referrals', '', self.referrals, None))
+        if self.notes:
+            rows.append((day, 'notes', '', self.notes, None))
+        rows += [(day, 'issue', keyword, count, None) for keyword, count in self.issues.items()]
+        rows += [(day, 'programme', programme, count, sketch.pack())
+                 for programme, (count, sketch) in self.programmes.items()]
+        return rows
+
+    def unique_students(self):
+        return self.students.estimate()
+
+    def top_programmes(self, limit=5):
+        """[(programme or None, distinct students)], most students first"""
+        ranked = sorted(((programme or None, sketch.estimate()) for programme, (_count, sketch)
+                         in self.programmes.items()), key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+# ==========================================
+# SCHEMA
+# ==========================================
+
+def _mark(day_expr):
+    # NOT EXISTS rather than OR IGNORE: an outer statement's conflict clause would override ours
+    return (f"INSERT INTO ReportRollupDirty (day) SELECT substr({day_expr}, 1, 10) "
+            f"WHERE {day_expr} IS NOT NULL AND NOT EXISTS "
+            f"(SELECT 1 FROM ReportRollupDirty WHERE day = substr({day_expr}, 1, 10));")
+
+# Every write to a source table moves the data version on
+_BUMP = "UPDATE ReportRollupState SET value = CAST(value AS INTEGER) + 1 WHERE name = 'data_version';"
+
+def _mark_select(select):
+    return (f"INSERT INTO ReportRollupDirty (day) SELECT DISTINCT d FROM ({select}) "
+            f"WHERE d IS NOT NULL AND d NOT IN (SELECT day FROM ReportRollupDirty);")
+
+# table -> day column of its rows
+DAY_COLUMNS = {'Appointment': 'date', 'session': 'created_at', 'Referral': 'created_at'}
+
+def ensure_schema(conn):
+    """Rollup tables, the indexes the day queries use, and the dirty-day triggers. The caller commits."""
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS ReportRollupDay (
+            day TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            key TEXT NOT NULL DEFAULT '',
+            count INTEGER NOT NULL,
+            sketch BLOB,
+            PRIMARY KEY (day, metric, key)
+        );
+        CREATE TABLE IF NOT EXISTS ReportRollupDirty (day TEXT PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS ReportRollupState (name TEXT PRIMARY KEY, value TEXT);
+        INSERT OR IGNORE INTO ReportRollupState (name, value) VALUES ('data_version', '0');
+
+        CREATE INDEX IF NOT EXISTS idx_appointment_date ON Appointment(date);
+        CREATE INDEX IF NOT EXISTS idx_session_created_at ON session(created_at);
+    ''')
+    # SQLite names are case-insensitive (older databases have 'Session')
+    tables = {r[0].lower() for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if 'referral' in tables:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_referral_created_at ON Referral(created_at)")
+
+    for table, column in DAY_COLUMNS.items():
+        if table.lower() not in tables:
+            continue
+        extra_new = extra_old = ''
+        if table == 'Appointment':
+            # Unique students per day come from the appointment's student
+            extra_new = _mark_select("SELECT substr(created_at, 1, 10) AS d FROM session WHERE appointment_id = NEW.id")
+            extra_old = _mark_select("SELECT substr(created_at, 1, 10) AS d FROM session WHERE appointment_id = OLD.id")
+        conn.executescript(f'''
+            DROP TRIGGER IF EXISTS report_rollup_insert_{table};
+            DROP TRIGGER IF EXISTS report_rollup_update_{table};
+            DROP TRIGGER IF EXISTS report_rollup_delete_{table};
+
+            CREATE TRIGGER report_rollup_insert_{table} AFTER INSERT ON {table}
+            BEGIN {_mark(f'NEW.{column}')} {_BUMP}
+            END;
+
+            CREATE TRIGGER report_rollup_update_{table} AFTER UPDATE ON {table}
+            BEGIN {_mark(f'OLD.{column}')} {_mark(f'NEW.{column}')} {extra_new} {_BUMP}
+            END;
+
+            CREATE TRIGGER report_rollup_delete_{table} AFTER DELETE ON {table}
+            BEGIN {_mark(f'OLD.{column}')} {extra_old} {_BUMP}
+            END;
+        ''')
+    if 'student' in tables:
+        conn.executescript(f'''
+            DROP TRIGGER IF EXISTS report_rollup_update_Student;
+            CREATE TRIGGER report_rollup_update_Student AFTER UPDATE OF programme ON Student
+            WHEN OLD.programme IS NOT NEW.programme
+            BEGIN {_mark_select("SELECT substr(date, 1, 10) AS d FROM Appointment WHERE student_id = NEW.id")} {_BUMP}
+            END;
+        ''')
+
+# ==========================================
+# AGGREGATION FROM THE RAW TABLES
+# ==========================================
+
+APPOINTMENT_STATUS = '''
+    SELECT substr(date, 1, 10), COALESCE(status, ''), COUNT(*) FROM Appointment
+    WHERE date BETWEEN ? AND ?
+    GROUP BY 1, 2
+'''
+
+APPOINTMENT_PROGRAMMES = '''
+    SELECT substr(a.date, 1, 10), COALESCE(s.programme, ''), a.student_id
+    FROM Appointment a
+    JOIN Student s ON a.student_id = s.id
+    WHERE a.date BETWEEN ? AND ?
+'''
+
+SESSION_STUDENTS = '''
+    SELECT substr(sess.created_at, 1, 10), a.student_id
+    FROM session sess
+    JOIN Appointment a ON sess.appointment_id = a.id
+    WHERE sess.created_at BETWEEN ? AND ?
+'''
+
+SESSION_TYPES = '''
+    SELECT substr(created_at, 1, 10), COALESCE(session_type, ''), COUNT(*) FROM session
+    WHERE created_at BETWEEN ? AND ?
+    GROUP BY 1, 2
+'''
+
+REFERRALS = '''
+    SELECT substr(created_at, 1, 10), COUNT(*) FROM Referral
+    WHERE created_at BETWEEN ? AND ?
+    GROUP BY 1
+'''
+
+SESSION_NOTES = '''
+    SELECT substr(created_at, 1, 10), notes FROM session
+    WHERE created_at BETWEEN ? AND ? AND notes IS NOT NULL AND notes != ''
+'''
+
+def aggregate(conn, events=None, days=None):
+    """
+    {day: PeriodTotals} straight from the raw tables. `events` is an
+    inclusive (from, to) timestamp range for sessions, referrals and notes;
+    `days` an inclusive (from, to) date range for appointments. Either may
+    be None to leave that half out.
+    """
+    per_day = {}
+
+    def totals(day):
+        entry = per_day.get(day)
+        if entry is None:
+            entry = per_day[day] = PeriodTotals()
+        return entry
+
+    if days is not None:
+        for day, status, count in conn.execute(APPOINTMENT_STATUS, days):
+            counts = totals(day).appointments
+            counts[status] = counts.get(status, 0) + count
+        for day, programme, student_id in conn.execute(APPOINTMENT_PROGRAMMES, days):
+            entry = totals(day)._programme(programme)
+            entry[0] += 1
+            entry[1].add(student_id)
+
+    if events is not None:
+        for day, student_id in conn.execute(SESSION_STUDENTS, events):
+            entry = totals(day)
+            entry.sessions += 1
+            entry.students.add(student_id)
+        for day, session_type, count in conn.execute(SESSION_TYPES, events):
+            counts = totals(day).session_types
+            counts[session_type] = counts.get(session_type, 0) + count
+        try:
+            for day, count in conn.execute(REFERRALS, events):
+                totals(day).referrals += count
+        except sqlite3.OperationalError:
+            pass  # no Referral table on this database
+        for day, note in conn.execute(SESSION_NOTES, events):
+            entry = totals(day)
+            entry.notes += 1
+            note_lower = note.lower()
+            for keyword in ISSUE_KEYWORDS:
+                if keyword in note_lower:
+                    entry.issues[keyword] = entry.issues.get(keyword, 0) + 1
+    return per_day
+
+# ==========================================
+# ROLLUP MAINTENANCE
+# ==========================================
+
+def _parse_day(value):
+    try:
+        return datetime.strptime(value, DAY_FORMAT).date()
+    except (TypeError, ValueError):
+        return None
+
+def _runs(days):
+    """Sorted dates -> [(first, last)] of consecutive days"""
+    runs = []
+    for day in sorted(days):
+        if runs and day == runs[-1][1] + timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return runs
+
+def _earliest_day(conn):
+    candidates = []
+    for table, column in DAY_COLUMNS.items():
+        try:
+            value = conn.execute(f"SELECT MIN(substr({column}, 1, 10)) FROM {table}").fetchone()[0]
+        except sqlite3.OperationalError:
+            continue
+        day = _parse_day(value)
+        if day is not None:
+            candidates.append(day)
+    return min(candidates) if candidates else None
+
+def roll_up(conn, first, last):
+    """Recompute the stored days first..last (dates, inclusive)"""
+    first_day, last_day = first.strftime(DAY_FORMAT), last.strftime(DAY_FORMAT)
+    per_day = aggregate(conn, events=(f'{first_day} 00:00:00', f'{last_day} 23:59:59.999999'),
+                        days=(first_day, last_day))
+    conn.execute("DELETE FROM ReportRollupDay WHERE day BETWEEN ? AND ?", (first_day, last_day))
+    rows = [row for day, totals in per_day.items() for row in totals.rows(day)]
+    conn.executemany("INSERT INTO ReportRollupDay (day, metric, key, count, sketch) VALUES (?, ?, ?, ?, ?)", rows)
+    return len(per_day)
+
+def refresh(conn, today=None):
+    """
+    Bring the stored days up to date: everything on first use or after a
+    definition change, otherwise only dirty days and days closed since the
+    last run. Returns the number of days recomputed. The caller commits.
+    """
+    today = today or date.today()
+    yesterday = today - timedelta(days=1)
+    with _refresh_lock:
+        state = dict(conn.execute("SELECT name, value FROM ReportRollupState").fetchall())
+        closed_through = _parse_day(state.get('closed_through'))
+        if state.get('definition') != DEFINITION or closed_through is None:
+            conn.execute("DELETE FROM ReportRollupDay")
+            earliest = _earliest_day(conn)
+            runs = [[earliest, yesterday]] if earliest is not None and earliest <= yesterday else []
+        else:
+            days = set()
+            for (value,) in conn.execute("SELECT day FROM ReportRollupDirty WHERE day <= ?",
+                                         (yesterday.strftime(DAY_FORMAT),)):
+                day = _parse_day(value)
+                if day is not None and day <= closed_through:
+                    days.add(day)
+            runs = _runs(days)
+            if closed_through < yesterday:
+                # Days that were still live at the last refresh
+                runs.append([closed_through + timedelta(days=1), yesterday])
+
+        recomputed = 0
+        for first, last in runs:
+            roll_up(conn, first, last)
+            recomputed += (last - first).days + 1
+        conn.execute("DELETE FROM ReportRollupDirty WHERE day <= ?", (yesterday.strftime(DAY_FORMAT),))
+        conn.executemany("INSERT OR REPLACE INTO ReportRollupState (name, value) VALUES (?, ?)",
+                         [('definition', DEFINITION), ('closed_through', yesterday.strftime(DAY_FORMAT))])
+        if recomputed:
+            print(f"[ROLLUP] Recomputed {recomputed} report days through {yesterday.strftime(DAY_FORMAT)}")
+        return recomputed
+
+def rebuild(conn):
+    conn.execute("DELETE FROM ReportRollupState WHERE name != 'data_version'")
+    return refresh(conn)
+
+def data_version(conn):
+    """Counter moved on by every write the reports read from"""
+    row = conn.execute("SELECT value FROM ReportRollupState WHERE name = 'data_version'").fetchone()
+    return int(row[0]) if row and row[0] is not None else 0
+
+# ==========================================
+# REPORT WINDOWS
+# ==========================================
+
+def _stored(conn, first, last, metrics):
+    totals = PeriodTotals()
+    placeholders = ', '.join('?' * len(metrics))
+    for metric, key, count, sketch in conn.execute(
+            f"SELECT metric, key, count, sketch FROM ReportRollupDay "
+            f"WHERE day BETWEEN ? AND ? AND metric IN ({placeholders})",
+            (first.strftime(DAY_FORMAT), last.strftime(DAY_FORMAT)) + tuple(metrics)):
+        totals.add_row(metric, key, count, sketch)
+    return totals
+
+def _live(conn, events=None, days=None):
+    totals = PeriodTotals()
+    for day_totals in aggregate(conn, events=events, days=days).values():
+        totals.merge(day_totals)
+    return totals
+
+def period_totals(conn, start, end, today=None):
+    """
+    PeriodTotals for start..end (datetimes, inclusive), matching a scan of
+    the raw tables: appointments by calendar day, everything else by
+    timestamp. Closed days come from the rollup (refreshed first), a
+    partial first day and today are queried live. The caller commits.
+    """
+    today = today or date.today()
+    yesterday = today - timedelta(days=1)
+    refresh(conn, today)
+    totals = PeriodTotals()
+
+    # Appointments: whole days
+    first, last = start.date(), end.date()
+    if first <= min(last, yesterday):
+        totals.merge(_stored(conn, first, min(last, yesterday), APPOINTMENT_METRICS))
+    if max(first, today) <= last:
+        totals.merge(_live(conn, days=(max(first, today).strftime(DAY_FORMAT), last.strftime(DAY_FORMAT))))
+
+    # Sessions, referrals, notes: whole days in the middle, partial edges live
+    first = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+    last = end.date() if end.time() >= time(23, 59, 59) else end.date() - timedelta(days=1)
+    last = min(last, yesterday)
+    start_ts, end_ts = start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT)
+    if first > last:
+        totals.merge(_live(conn, events=(start_ts, end_ts)))
+        return totals
+    totals.merge(_stored(conn, first, last, EVENT_METRICS))
+    if start.date() < first:
+        totals.merge(_live(conn, events=(start_ts, f'{start.strftime(DAY_FORMAT)} 23:59:59.999999')))
+    after = last + timedelta(days=1)
+    if datetime.combine(after, time.min) <= end:
+        totals.merge(_live(conn, events=(f'{after.strftime(DAY_FORMAT)} 00:00:00', end_ts)))
+    return totals
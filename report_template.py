@@ -0,0 +1,319 @@
+"""
+Template-based .docx rendering for generated reports.
+
+Reports start from a pre-styled template (app_data/report_template.docx).
+The first time it is needed a default one is built with python-docx: the
+logo, the title page and every font, size and colour live in its styles,
+so staff can restyle reports in Word without touching code. Placeholders
+are written as {{name}} anywhere in the body text; a paragraph holding
+nothing but {{body}} is where the generated content goes.
+
+The template is read and compiled once (per file modification time):
+every part except word/document.xml - styles, numbering, the embedded
+logo - is kept as ready-to-write bytes, and the document body is split
+around its placeholders. Rendering a report is then string assembly plus
+one zip write. Tables are emitted as whole <w:tbl> fragments rather than
+built cell by cell, so a register with thousands of rows stays cheap.
+"""
+
+import io
+import os
+import re
+import sys
+import threading
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+TEMPLATE_NAME = 'report_template.docx'
+LOGO_NAME = 'aamusted system_logo.png'
+
+DOCUMENT_PART = 'word/document.xml'
+
+# Style ids referenced by generated content (present in the default template)
+HEADING_STYLES = {0: 'Title', 1: 'Heading1', 2: 'Heading2', 3: 'Heading3'}
+BULLET_STYLE = 'ListBullet'
+TABLE_STYLE = 'LightGrid-Accent1'
+TABLE_TEXT_STYLE = 'TableText'
+
+# Usable width of a Letter page with the default 1.25" side margins, in twips
+TEXT_WIDTH = 8640
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+_W = '{%s}' % W_NS
+_XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+_PLACEHOLDER = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+_SLOT = re.compile(r'<!--slot:(\w*)-->(.*?)<!--/slot-->', re.S)
+# Characters XML 1.0 can't carry (stray control codes in notes)
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+def get_base_path():
+    """Get base path for data files"""
+    try:
+        if getattr(sys, 'frozen', False):
+            return os.path.dirname(sys.executable)
+        return os.path.dirname(os.path.abspath(__file__))
+    except:
+        return os.path.dirname(os.path.abspath(__file__))
+
+def template_path():
+    return os.path.join(get_base_path(), 'app_data', TEMPLATE_NAME)
+
+# ==========================================
+# DEFAULT TEMPLATE
+# ==========================================
+
+def build_default_template(path):
+    """Write the stock report template (styles, title page, {{body}} slot)"""
+    from docx import Document
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Inches, Pt, RGBColor
+
+    primary = RGBColor(13, 110, 253)
+    document = Document()
+    styles = document.styles
+
+    styles['Normal'].font.name = 'Calibri'
+    styles['Normal'].font.size = Pt(11)
+
+    title = styles['Title']
+    title.font.size = Pt(20)
+    title.font.bold = True
+    title.font.color.rgb = primary
+    title.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    for name, size, color in (('Heading 1', 16, primary), ('Heading 2', 14, None), ('Heading 3', 12, None)):
+        heading = styles[name]
+        heading.font.bold = True
+        heading.font.size = Pt(size)
+        if color is not None:
+            heading.font.color.rgb = color
+
+    styles['List Bullet'].paragraph_format.space_after = Pt(6)
+
+    table_text = styles.add_style('Table Text', WD_STYLE_TYPE.PARAGRAPH)
+    table_text.base_style = styles['Normal']
+    table_text.font.size = Pt(10)
+    table_text.paragraph_format.space_after = Pt(0)
+
+    # Title page
+    logo_path = os.path.join(get_base_path(), LOGO_NAME)
+    if os.path.exists(logo_path):
+        try:
+            document.add_picture(logo_path, width=Inches(4))
+            document.paragraphs[-1].alignment = WD_ALIGN_PARAGRAPH.CENTER
+        except:
+            pass
+
+    document.add_paragraph('{{title}}', style='Title')
+    document.add_paragraph()
+
+    def centred(text, size, italic=False, color=None):
+        paragraph = document.add_paragraph()
+        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        run = paragraph.add_run(text)
+        run.font.size = Pt(size)
+        run.italic = italic
+        if color is not None:
+            run.font.color.rgb = color
+
+    centred('Date of Submission: {{submitted}}', 12)
+    centred('Prepared for: AAMUSTED Administration', 11, italic=True)
+    centred('CONFIDENTIAL - INTERNAL USE ONLY', 10, italic=True, color=RGBColor(128, 128, 128))
+    document.add_page_break()
+
+    document.add_paragraph('{{body}}')
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    document.save(path)
+    print(f"[REPORT] Created report template: {path}")
+
+# ==========================================
+# COMPILED TEMPLATE
+# ==========================================
+
+class ReportTemplate:
+    """
+    A template .docx read once: the untouched parts as bytes and the body
+    as static XML interleaved with placeholder paragraphs.
+    """
+
+    def __init__(self, data):
+        from lxml import etree
+
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            # Keep the template's order and compression ([Content_Types].xml first, media stored)
+            self.parts = [(info, archive.read(info)) for info in archive.infolist()]
+        document = next((content for info, content in self.parts if info.filename == DOCUMENT_PART), None)
+        if document is None:
+            raise ValueError("Report template has no word/document.xml")
+
+        root = etree.fromstring(document)
+        for paragraph in list(root.iter(_W + 'p')):
+            text = self._collapse(paragraph)
+            if text is None:
+                continue
+            whole = _PLACEHOLDER.fullmatch(text.strip())
+            paragraph.addprevious(etree.Comment(f"slot:{whole.group(1) if whole else ''}"))
+            paragraph.addnext(etree.Comment('/slot'))
+        xml = etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True).decode('utf-8')
+
+        # [static, (block name or '', paragraph xml), static, ...]
+        self.segments = []
+        position = 0
+        for match in _SLOT.finditer(xml):
+            self.segments.append(xml[position:match.start()])
+            self.segments.append((match.group(1), match.group(2)))
+            position = match.end()
+        self.segments.append(xml[position:])
+        self.placeholders = sorted({name for segment in self.segments if isinstance(segment, tuple)
+                                    for name in _PLACEHOLDER.findall(segment[1])})
+
+    @staticmethod
+    def _collapse(paragraph):
+        """
+        Word splits text into runs wherever editing history says so, which
+        can cut {{name}} in pieces. Merge a placeholder paragraph's text into
+        its first run (keeping that run's formatting) and return the text;
+        None for paragraphs without placeholders.
+        """
+        texts = [t for run in paragraph.findall(_W + 'r') for t in run.findall(_W + 't')]
+        text = ''.join(t.text or '' for t in texts)
+        if '{{' not in text or not _PLACEHOLDER.search(text):
+            return None
+        first = texts[0]
+        first.text = text
+        first.set(_XML_SPACE, 'preserve')
+        for t in texts[1:]:
+            run = t.getparent()
+            run.remove(t)
+            if all(child.tag == _W + 'rPr' for child in run):
+                paragraph.remove(run)
+        return text
+
+    def render_document(self, values, blocks):
+        """word/document.xml for these placeholder values and block contents"""
+        def substitute(match):
+            return _text(values.get(match.group(1), ''))
+
+        out = []
+        for segment in self.segments:
+            if isinstance(segment, str):
+                out.append(segment)
+            elif segment[0] and segment[0] in blocks:
+                out.append(blocks[segment[0]])
+            else:
+                out.append(_PLACEHOLDER.sub(substitute, segment[1]))
+        return ''.join(out).encode('utf-8')
+
+    def render(self, values=None, blocks=None):
+        """The finished .docx as bytes"""
+        values = values or {}
+        blocks = {name: str(body) for name, body in (blocks or {}).items()}
+        stamp = datetime.now().timetuple()[:6]
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for info, content in self.parts:
+                if info.filename == DOCUMENT_PART:
+                    part = zipfile.ZipInfo(DOCUMENT_PART, date_time=stamp)
+                    part.compress_type = zipfile.ZIP_DEFLATED
+                    archive.writestr(part, self.render_document(values, blocks))
+                else:
+                    archive.writestr(info, content)
+        return buffer.getvalue()
+
+    def save(self, path, values=None, blocks=None):
+        data = self.render(values, blocks)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def load_template(path=None):
+    """The compiled template, rebuilt only when the file changes"""
+    path = path or template_path()
+    with _cache_lock:
+        if not os.path.exists(path):
+            build_default_template(path)
+        mtime = os.path.getmtime(path)
+        cached = _cache.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'rb') as f:
+                cached = (mtime, ReportTemplate(f.read()))
+            _cache[path] = cached
+        return cached[1]
+
+# ==========================================
+# CONTENT FRAGMENTS
+# ==========================================
+
+def _text(value):
+    return escape(_INVALID_XML.sub('', str(value)))
+
+def _runs(text, run_props=''):
+    """Run XML for text; newlines become line breaks and tabs become tabs"""
+    lines = []
+    for line in str(text).split('\n'):
+        parts = [f'<w:t xml:space="preserve">{_text(part)}</w:t>' if part else '' for part in line.split('\t')]
+        lines.append('<w:tab/>'.join(parts))
+    return f'<w:r>{run_props}{"<w:br/>".join(lines)}</w:r>' if text != '' else ''
+
+def _paragraph(text='', style=None):
+    props = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+    return f'<w:p>{props}{_runs(text)}</w:p>'
+
+class ReportBody:
+    """
+    Generated report content as WordprocessingML fragments, in order.
+    Formatting comes from the template's styles, so no run carries its own.
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def heading(self, text, level=1):
+        self.parts.append(_paragraph(text, HEADING_STYLES.get(level, HEADING_STYLES[3])))
+
+    def paragraph(self, text='', style=None):
+        self.parts.append(_paragraph(text, style))
+
+    def bullet(self, text):
+        self.parts.append(_paragraph(text, BULLET_STYLE))
+
+    def page_break(self):
+        self.parts.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+
+    def table(self, headers, rows, title=None, widths=None):
+        """
+        Whole <w:tbl> built in one pass. rows may be any iterable (a cursor
+        is fine); empty cells print as N/A. The header row repeats on
+        every page.
+        """
+        if title:
+            self.heading(title, 3)
+        columns = len(headers)
+        widths = widths or [TEXT_WIDTH // columns] * columns
+        cells = [f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="dxa"/></w:tcPr>'
+                 f'<w:p><w:pPr><w:pStyle w:val="{TABLE_TEXT_STYLE}"/></w:pPr>' for width in widths]
+        cell_end = '</w:p></w:tc>'
+
+        def row_xml(values, props=''):
+            return ''.join([f'<w:tr>{props}'] +
+                           [f'{cells[i]}{_runs(value)}{cell_end}' for i, value in enumerate(values[:columns])] +
+                           ['</w:tr>'])
+
+        grid = ''.join(f'<w:gridCol w:w="{width}"/>' for width in widths)
+        out = [f'<w:tbl><w:tblPr><w:tblStyle w:val="{TABLE_STYLE}"/><w:tblW w:w="0" w:type="auto"/>'
+               f'<w:tblLook w:val="04A0" w:firstRow="1" w:lastRow="0" w:firstColumn="1" w:lastColumn="0" '
+               f'w:noHBand="0" w:noVBand="1"/></w:tblPr><w:tblGrid>{grid}</w:tblGrid>',
+               row_xml([str(header) for header in headers], '<w:trPr><w:tblHeader/></w:trPr>')]
+        out.extend(row_xml([str(value) if value else 'N/A' for value in row]) for row in rows)
+        out.append('</w:tbl>')
+        self.parts.append(''.join(out))
+
+    def __str__(self):
+        return ''.join(self.parts)
@@ -0,0 +1,293 @@
+def professional_id(db_id):
+    """Display ID used on lists, exports and printouts (e.g. C007)"""
+    return f"C{db_id:03d}" if db_id else 'N/A'
+
+class Query:
+    """
+    A named SQL statement shared by every caller. sqlite3 caches compiled
+    statements per connection keyed on the SQL text, so keeping one string
+    per query means repeated executions skip the parse/prepare step.
+    """
+    __slots__ = ('name', 'sql')
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = ' '.join(sql.split())
+
+    def iter(self, conn, params=(), record=None):
+        """Lazily yield rows (or records) straight off the cursor"""
+        cursor = conn.cursor()
+        if record is not None:
+            # Plain tuples are cheaper than sqlite3.Row; the record names the columns
+            cursor.row_factory = None
+        cursor.execute(self.sql, params)
+        if record is None:
+            return cursor
+        return (record(*row) for row in cursor)
+
+    def all(self, conn, params=(), record=None):
+        return list(self.iter(conn, params, record))
+
+    def scalar(self, conn, params=(), default=0):
+        row = conn.execute(self.sql, params).fetchone()
+        return row[0] if row is not None and row[0] is not None else default
+
+PAGE_SIZE = 200
+
+# Largest SQLite rowid; the "before" bound when entering the NULL tail of a listing
+MAX_ROWID = (1 << 63) - 1
+
+class PageQuery:
+    """
+    A listing read one page at a time, newest first, by keyset: each page
+    continues below the (sort columns, id) of the previous page's last row
+    instead of using OFFSET, so with an index on the sort column the
+    hundredth page costs the same as the first.
+
+    Rows are (id, *sort values, *columns). Rows whose leading sort value is
+    NULL come last, by id; later sort columns must be NOT NULL.
+    """
+    __slots__ = ('sort_width', 'first', 'after', 'null_tail')
+
+    def __init__(self, name, columns, source, sort, id_column):
+        self.sort_width = len(sort)
+        select = f"SELECT {id_column}, {', '.join(sort)}, {columns} {source}"
+        order = f"ORDER BY {' DESC, '.join(sort)} DESC, {id_column} DESC LIMIT ?"
+        key = f"({', '.join(sort)}, {id_column})"
+        bound = f"({', '.join('?' * (len(sort) + 1))})"
+        self.first = Query(f'{name}_first', f"{select} {order}")
+        self.after = Query(f'{name}_after', f"{select} WHERE {key} < {bound} {order}")
+        self.null_tail = Query(f'{name}_null_tail', f'''
+            {select} WHERE {sort[0]} IS NULL AND {id_column} < ?
+            ORDER BY {id_column} DESC LIMIT ?
+        ''')
+
+    def key(self, row):
+        return tuple(row[1:1 + self.sort_width]) + (row[0],)
+
+    def page(self, conn, after=None, limit=PAGE_SIZE):
+        """(rows, key of the last row); pass that key back as `after` for the next page"""
+        def fetch(query, params):
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            return cursor.execute(query.sql, params).fetchall()
+
+        if after is None:
+            rows = fetch(self.first, (limit,))
+        elif after[0] is None:
+            rows = fetch(self.null_tail, (after[-1], limit))
+        else:
+            rows = fetch(self.after, tuple(after) + (limit,))
+            # Row-value comparison skips NULL sort values; they follow the last dated row
+            if len(rows) < limit:
+                rows += fetch(self.null_tail, (MAX_ROWID, limit - len(rows)))
+        return rows, (self.key(rows[-1]) if rows else after)
+
+class Record:
+    """
+    Compact read-only row. Supports attribute access (templates), item
+    access and .get() (older dict-style code) without a per-row dict.
+    """
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self.__slots__
+
+    def as_dict(self):
+        return {name: getattr(self, name, None) for name in self.__slots__}
+
+class StudentRecord(Record):
+    __slots__ = ('id', 'name', 'age', 'gender', 'contact', 'index_number', 'department',
+                 'faculty', 'programme', 'program', 'parent_contact', 'hall_of_residence',
+                 'created_at', 'session_count')
+
+    @property
+    def professional_id(self):
+        return professional_id(self.id)
+
+class SessionRecord(Record):
+    __slots__ = ('id', 'session_type', 'notes', 'created_at', 'student_db_id', 'student_name',
+                 'Counsellor_name', 'date', 'time', 'status', 'appointment_id')
+
+    @property
+    def professional_id(self):
+        return professional_id(self.student_db_id)
+
+# ==========================================
+# QUERIES
+# ==========================================
+
+# Older databases still carry the pre-rename `program` column, which some
+# students only have filled in; databases built by db_setup don't have it
+STUDENT_COLUMNS = '''
+    s.id, s.name, s.age, s.gender, s.contact, s.index_number, s.department,
+    s.faculty, s.programme, {program} AS program, s.parent_contact, s.hall_of_residence, s.created_at
+'''
+
+def _student_queries(name, sql):
+    """The query with and without the legacy program column, keyed by whether it exists"""
+    return {legacy: Query(name, sql.replace('{columns}', STUDENT_COLUMNS.format(program='s.program' if legacy else 'NULL')))
+            for legacy in (True, False)}
+
+STUDENTS_WITH_SESSION_COUNT = _student_queries('students_with_session_count', '''
+    SELECT {columns},
+           COUNT(DISTINCT sess.id) as session_count
+    FROM Student s
+    LEFT JOIN Appointment a ON s.id = a.student_id
+    LEFT JOIN session sess ON a.id = sess.appointment_id
+    GROUP BY s.id
+    ORDER BY s.name
+''')
+
+STUDENTS_FOR_COUNSELLOR = _student_queries('students_for_counsellor', '''
+    SELECT {columns},
+           (SELECT COUNT(DISTINCT sess.id)
+            FROM Appointment a2 JOIN session sess ON a2.id = sess.appointment_id
+            WHERE a2.student_id = s.id) as session_count
+    FROM Student s
+    JOIN Appointment a ON s.id = a.student_id
+    WHERE a.Counsellor_id = ?
+    GROUP BY s.id
+    ORDER BY MAX(a.date) DESC
+''')
+
+PROGRAMMES = Query('programmes', '''
+    SELECT DISTINCT programme FROM Student
+    WHERE programme IS NOT NULL AND programme != ''
+    ORDER BY programme
+''')
+
+SESSIONS_DETAILED = Query('sessions_detailed', '''
+    SELECT sess.id, sess.session_type, sess.notes, sess.created_at,
+           s.id as student_db_id, s.name as student_name,
+           c.name as Counsellor_name,
+           a.date, a.time, a.status,
+           sess.appointment_id
+    FROM session sess
+    LEFT JOIN Appointment a ON sess.appointment_id = a.id
+    LEFT JOIN Student s ON a.student_id = s.id
+    LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
+    ORDER BY sess.created_at DESC
+''')
+
+COUNT_STUDENTS = Query('count_students', 'SELECT COUNT(*) FROM Student')
+
+COUNT_APPOINTMENTS = Query('count_appointments', 'SELECT COUNT(*) FROM Appointment')
+
+COUNT_APPOINTMENTS_ON = Query('count_appointments_on', 'SELECT COUNT(*) FROM Appointment WHERE date = ?')
+
+APPOINTMENT_SOURCE = '''
+    FROM Appointment a
+    LEFT JOIN Student s ON a.student_id = s.id
+    LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
+'''
+
+UPCOMING_APPOINTMENTS = Query('upcoming_appointments', f'''
+    SELECT a.id, a.date, a.time, s.name, c.name, a.status, a.purpose
+    {APPOINTMENT_SOURCE}
+    WHERE a.date >= ?
+    ORDER BY a.date, a.time
+    LIMIT ?
+''')
+
+# Paged listings (desktop client)
+
+STUDENT_PAGES = PageQuery('student_pages',
+                          's.name, s.index_number, s.programme, s.contact, s.department',
+                          'FROM Student s', ('s.created_at',), 's.id')
+
+APPOINTMENT_PAGES = PageQuery('appointment_pages', 's.name, c.name, a.status, a.purpose',
+                              APPOINTMENT_SOURCE, ('a.date', 'a.time'), 'a.id')
+
+# Notes are cut to a preview; the full text is read when a session is opened
+SESSION_PAGES = PageQuery('session_pages', 's.name, substr(sess.notes, 1, 200), sess.outcome', '''
+    FROM session sess
+    LEFT JOIN Appointment a ON sess.appointment_id = a.id
+    LEFT JOIN Student s ON a.student_id = s.id
+''', ('sess.created_at',), 'sess.id')
+
+SESSION_NOTES_BETWEEN = Query('session_notes_between', '''
+    SELECT notes FROM session
+    WHERE created_at BETWEEN ? AND ? AND notes IS NOT NULL AND notes != ''
+''')
+
+SESSION_REGISTER_BETWEEN = Query('session_register_between', '''
+    SELECT sess.created_at, s.id, s.programme, sess.session_type, c.name, a.status
+    FROM session sess
+    LEFT JOIN Appointment a ON sess.appointment_id = a.id
+    LEFT JOIN Student s ON a.student_id = s.id
+    LEFT JOIN Counsellor c ON a.Counsellor_id = c.id
+    WHERE sess.created_at BETWEEN ? AND ?
+    ORDER BY sess.created_at
+''')
+
+# ==========================================
+# ACCESSORS
+# ==========================================
+
+def has_legacy_program(conn):
+    return any(row[1] == 'program' for row in conn.execute("PRAGMA table_info(Student)"))
+
+def iter_students(conn):
+    """Every student with their session count, ordered by name"""
+    return STUDENTS_WITH_SESSION_COUNT[has_legacy_program(conn)].iter(conn, record=StudentRecord)
+
+def list_students(conn):
+    return list(iter_students(conn))
+
+def list_counsellor_students(conn, counsellor_id):
+    """Students who have (or had) an appointment with this counsellor"""
+    return STUDENTS_FOR_COUNSELLOR[has_legacy_program(conn)].all(conn, (counsellor_id,), record=StudentRecord)
+
+def list_programmes(conn):
+    return [row[0] for row in PROGRAMMES.iter(conn)]
+
+def list_sessions(conn):
+    """All sessions with student, counsellor and appointment details, newest first"""
+    return SESSIONS_DETAILED.all(conn, record=SessionRecord)
+
+def count_students(conn):
+    return COUNT_STUDENTS.scalar(conn)
+
+def count_appointments(conn, on=None):
+    """All appointments, or those on one day ('YYYY-MM-DD')"""
+    if on is None:
+        return COUNT_APPOINTMENTS.scalar(conn)
+    return COUNT_APPOINTMENTS_ON.scalar(conn, (on,))
+
+def list_upcoming_appointments(conn, today, limit=10):
+    """(id, date, time, student, counsellor, status, purpose) from today on, soonest first"""
+    return [tuple(row) for row in UPCOMING_APPOINTMENTS.iter(conn, (today, limit))]
+
+def page_students(conn, after=None, limit=PAGE_SIZE):
+    """(id, created_at, name, index_number, programme, contact, department) rows, newest first"""
+    return STUDENT_PAGES.page(conn, after, limit)
+
+def page_appointments(conn, after=None, limit=PAGE_SIZE):
+    """(id, date, time, student, counsellor, status, purpose) rows, latest first"""
+    return APPOINTMENT_PAGES.page(conn, after, limit)
+
+def page_sessions(conn, after=None, limit=PAGE_SIZE):
+    """(id, created_at, student, notes preview, outcome) rows, newest first"""
+    return SESSION_PAGES.page(conn, after, limit)
+
+def iter_session_notes(conn, start, end):
+    """Non-empty session notes written between two timestamps"""
+    return (row[0] for row in SESSION_NOTES_BETWEEN.iter(conn, (start, end)))
+
+def iter_session_register(conn, start, end):
+    """(created_at, student_db_id, programme, session_type, counsellor, status) per session, oldest first"""
+    return (tuple(row) for row in SESSION_REGISTER_BETWEEN.iter(conn, (start, end)))
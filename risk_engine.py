@@ -0,0 +1,580 @@
+"""
+Risk flags raised as records are written.
+
+Every DASS-21, outcome questionnaire, appointment, session and case note
+is checked against the risk rules in the same transaction that saves it.
+A match becomes a RiskFlag row (once per rule and record) and, for new
+flags, a Notification for the counselling staff. AtRiskStudent is the
+materialized list of students with open flags: it is updated with every
+flag, so the dashboard reads it directly instead of scanning assessments.
+
+Each check reads the one record that was written (and the scores
+scoring_engine already stored for it), so the work per write does not
+grow with the history. backfill() runs the same rules over existing
+records without sending notifications.
+
+    python risk_engine.py --backfill
+"""
+
+import json
+import re
+import threading
+from datetime import datetime
+from flask import Blueprint, request, jsonify, session, flash, redirect, url_for
+import scoring_engine
+
+risk_bp = Blueprint('risk', __name__, url_prefix='/api/risk')
+
+# app_settings row holding the rules as JSON (synced, so every node applies the same rules)
+RULES_SETTING = 'risk_rules'
+
+SEVERITIES = {'low': 1, 'medium': 2, 'high': 3}
+SEVERITY_RANK = ('CASE severity '
+                 + ' '.join(f"WHEN '{name}' THEN {rank}" for name, rank in SEVERITIES.items())
+                 + ' ELSE 0 END')
+RULE_TYPES = ('threshold', 'delta', 'urgency', 'keyword')
+TEXT_SOURCES = ('session', 'case_note')
+
+# Roles told about new flags
+NOTIFY_ROLES = ('Admin', 'Counsellor', 'Counselor')
+
+# Keyword rules look at no more than this much of a note
+MAX_TEXT_CHARS = 20000
+
+BACKFILL_BATCH = 500
+
+DEFAULT_RULES = [
+    {'id': 'dass_depression_severe', 'type': 'threshold', 'scale': 'depression', 'min_band': 'Severe',
+     'severity': 'high'},
+    {'id': 'dass_anxiety_severe', 'type': 'threshold', 'scale': 'anxiety', 'min_band': 'Severe',
+     'severity': 'high'},
+    {'id': 'dass_stress_severe', 'type': 'threshold', 'scale': 'stress', 'min_band': 'Severe',
+     'severity': 'medium'},
+    {'id': 'oq_clinical', 'type': 'threshold', 'scale': 'oq_total', 'min_band': 'Clinical', 'severity': 'medium'},
+    {'id': 'reliable_deterioration', 'type': 'delta', 'scale': '*', 'reliable': True, 'severity': 'medium'},
+    {'id': 'crisis_urgency', 'type': 'urgency', 'values': ['Crisis'], 'severity': 'high'},
+    {'id': 'urgent_urgency', 'type': 'urgency', 'values': ['Urgent'], 'severity': 'medium', 'notify': False},
+    {'id': 'risk_keywords', 'type': 'keyword', 'severity': 'high',
+     'keywords': ['suicide', 'suicidal', 'kill myself', 'end my life', 'self-harm', 'self harm', 'cutting',
+                  'overdose', 'hopeless', 'want to die', 'abuse', 'assault']},
+]
+
+SCALE_TITLES = {
+    'depression': 'DASS-21 depression',
+    'anxiety': 'DASS-21 anxiety',
+    'stress': 'DASS-21 stress',
+    'oq_total': 'OQ total',
+}
+
+def ensure_schema(conn):
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS RiskFlag (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            rule_id TEXT NOT NULL,
+            source TEXT NOT NULL,
+            source_id INTEGER NOT NULL,
+            severity TEXT NOT NULL,
+            detail TEXT,
+            raised_at TIMESTAMP NOT NULL,
+            resolved_at TIMESTAMP,
+            resolved_by TEXT,
+            UNIQUE (rule_id, source, source_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_risk_flag_student ON RiskFlag(student_id, resolved_at);
+
+        CREATE TABLE IF NOT EXISTS AtRiskStudent (
+            student_id INTEGER PRIMARY KEY,
+            severity TEXT NOT NULL,
+            severity_rank INTEGER NOT NULL,
+            open_flags INTEGER NOT NULL,
+            last_raised_at TIMESTAMP,
+            last_detail TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_at_risk_order ON AtRiskStudent(severity_rank DESC, last_raised_at DESC);
+    ''')
+
+# ---------- Rules ----------
+
+class Rule:
+    __slots__ = ('id', 'type', 'severity', 'notify', 'scales', 'min_score', 'min_rank', 'min_change',
+                 'reliable', 'values', 'pattern', 'sources')
+
+    def __init__(self, spec):
+        self.id = spec['id']
+        self.type = spec['type']
+        self.severity = spec.get('severity', 'medium')
+        self.notify = spec.get('notify', True)
+        scale = spec.get('scale', '*')
+        if scale == '*':
+            self.scales = tuple(scoring_engine.SCALES_BY_NAME)
+        else:
+            self.scales = (scale,) if isinstance(scale, str) else tuple(scale)
+        self.min_score = spec.get('min_score')
+        # Band name -> rank per scale ("Severe" is a DASS band, "Clinical" an OQ one)
+        self.min_rank = {}
+        if spec.get('min_band'):
+            for name in self.scales:
+                labels = scoring_engine.SCALES_BY_NAME[name].labels
+                if spec['min_band'] in labels:
+                    self.min_rank[name] = labels.index(spec['min_band'])
+        self.min_change = spec.get('min_change')
+        self.reliable = bool(spec.get('reliable'))
+        self.values = {str(v).lower() for v in spec.get('values', [])}
+        keywords = [k for k in spec.get('keywords', []) if str(k).strip()]
+        self.pattern = re.compile(r'\b(?:' + '|'.join(re.escape(str(k).strip()) for k in keywords) + r')\b',
+                                  re.IGNORECASE) if keywords else None
+        self.sources = tuple(spec.get('sources', TEXT_SOURCES))
+
+def validate_rules(specs):
+    """Raise ValueError describing the first problem; returns the compiled rules"""
+    if not isinstance(specs, list):
+        raise ValueError("Rules must be a JSON list")
+    seen = set()
+    for spec in specs:
+        if not isinstance(spec, dict) or not spec.get('id'):
+            raise ValueError("Every rule needs an id")
+        if spec['id'] in seen:
+            raise ValueError(f"Duplicate rule id: {spec['id']}")
+        seen.add(spec['id'])
+        if spec.get('type') not in RULE_TYPES:
+            raise ValueError(f"{spec['id']}: type must be one of {', '.join(RULE_TYPES)}")
+        if spec.get('severity', 'medium') not in SEVERITIES:
+            raise ValueError(f"{spec['id']}: severity must be one of {', '.join(SEVERITIES)}")
+        scales = spec.get('scale', '*')
+        for name in ([] if scales == '*' else [scales] if isinstance(scales, str) else scales):
+            if name not in scoring_engine.SCALES_BY_NAME:
+                raise ValueError(f"{spec['id']}: unknown scale {name}")
+        if spec['type'] == 'threshold' and spec.get('min_score') is None and not spec.get('min_band'):
+            raise ValueError(f"{spec['id']}: threshold rules need min_score or min_band")
+        if spec['type'] == 'delta' and spec.get('min_change') is None and not spec.get('reliable'):
+            raise ValueError(f"{spec['id']}: delta rules need min_change or reliable")
+        if spec['type'] == 'urgency' and not spec.get('values'):
+            raise ValueError(f"{spec['id']}: urgency rules need values")
+        if spec['type'] == 'keyword' and not spec.get('keywords'):
+            raise ValueError(f"{spec['id']}: keyword rules need keywords")
+    return [Rule(spec) for spec in specs if spec.get('enabled', True)]
+
+class RuleSet:
+    """The rules from app_settings, compiled once per change of the stored JSON"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._source = None
+        self._rules = []
+
+    def current(self, conn):
+        row = conn.execute("SELECT setting_value FROM app_settings WHERE setting_name = ?",
+                           (RULES_SETTING,)).fetchone()
+        text = row[0] if row is not None and row[0] else ''
+        with self._lock:
+            if text == self._source:
+                return self._rules
+        try:
+            rules = validate_rules(json.loads(text) if text else DEFAULT_RULES)
+        except ValueError as e:
+            print(f"[RISK] Stored rules are invalid ({e}); using the defaults")
+            rules = validate_rules(DEFAULT_RULES)
+        with self._lock:
+            self._source, self._rules = text, rules
+        return rules
+
+rule_set = RuleSet()
+
+def load_rule_specs(conn):
+    row = conn.execute("SELECT setting_value FROM app_settings WHERE setting_name = ?",
+                       (RULES_SETTING,)).fetchone()
+    if row is not None and row[0]:
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            pass
+    return DEFAULT_RULES
+
+def save_rule_specs(conn, specs):
+    """Validate and store the rules. The caller commits."""
+    validate_rules(specs)
+    text = json.dumps(specs, indent=2)
+    cursor = conn.execute("UPDATE app_settings SET setting_value = ? WHERE setting_name = ?", (text, RULES_SETTING))
+    if cursor.rowcount == 0:
+        conn.execute("INSERT INTO app_settings (setting_name, setting_value) VALUES (?, ?)", (RULES_SETTING, text))
+
+# ---------- Evaluation ----------
+
+RECORD_QUERIES = {
+    'dass21': "SELECT student_id, COALESCE(created_at, completion_date) AS taken_at FROM DASS21 WHERE id = ?",
+    'oq': "SELECT student_id, COALESCE(created_at, completion_date) AS taken_at FROM OutcomeQuestionnaire "
+          "WHERE id = ?",
+    'appointment': "SELECT student_id, created_at AS taken_at, urgency FROM Appointment WHERE id = ?",
+    'session': "SELECT a.student_id, s.created_at AS taken_at, s.notes, s.outcome FROM session s "
+               "JOIN Appointment a ON s.appointment_id = a.id WHERE s.id = ?",
+    'case_note': "SELECT a.student_id, cm.created_at AS taken_at, cm.client_appearance, cm.problems, "
+                 "cm.interventions, cm.recommendations FROM CaseManagement cm "
+                 "JOIN session s ON cm.session_id = s.id JOIN Appointment a ON s.appointment_id = a.id "
+                 "WHERE cm.id = ?",
+}
+
+TEXT_FIELDS = {
+    'session': ('notes', 'outcome'),
+    'case_note': ('client_appearance', 'problems', 'interventions', 'recommendations'),
+}
+
+SOURCE_TITLES = {'session': 'Session notes', 'case_note': 'Case note'}
+
+def _scores(conn, source, source_id):
+    return conn.execute(
+        "SELECT scale, score, band, band_rank, change, reliable FROM AssessmentScore "
+        "WHERE source = ? AND source_id = ? AND score IS NOT NULL", (source, source_id)
+    ).fetchall()
+
+def _number(value):
+    return int(value) if float(value).is_integer() else round(value, 1)
+
+def _match(rule, source, record, scores):
+    """What the rule found in the record (a short description), or None"""
+    if rule.type == 'threshold' and source in ('dass21', 'oq'):
+        for row in scores:
+            if row['scale'] not in rule.scales:
+                continue
+            hit = rule.min_score is not None and row['score'] >= rule.min_score
+            hit = hit or (row['scale'] in rule.min_rank and row['band_rank'] >= rule.min_rank[row['scale']])
+            if hit:
+                return f"{SCALE_TITLES[row['scale']]} {_number(row['score'])} ({row['band']})"
+    elif rule.type == 'delta' and source in ('dass21', 'oq'):
+        for row in scores:
+            if row['scale'] not in rule.scales or row['change'] is None:
+                continue
+            hit = rule.min_change is not None and row['change'] >= rule.min_change
+            hit = hit or (rule.reliable and row['reliable'] == -1)
+            if hit:
+                return f"{SCALE_TITLES[row['scale']]} up {_number(row['change'])} since the last assessment"
+    elif rule.type == 'urgency' and source == 'appointment':
+        urgency = record['urgency']
+        if urgency and urgency.lower() in rule.values:
+            return f"{urgency} appointment"
+    elif rule.type == 'keyword' and source in rule.sources and rule.pattern is not None:
+        for field in TEXT_FIELDS.get(source, ()):
+            text = record[field]
+            if not text:
+                continue
+            found = rule.pattern.search(str(text)[:MAX_TEXT_CHARS])
+            if found:
+                return f"{SOURCE_TITLES[source]} mention \"{found.group(0)}\""
+    return None
+
+def evaluate(conn, source, source_id, notify=True):
+    """
+    Run the rules over one written record. New flags go into RiskFlag and
+    the at-risk list (and, with notify, the staff notifications) on conn;
+    the caller commits. Returns the new flags' details. A failure here is
+    logged and leaves the caller's own write alone.
+    """
+    if source_id in (None, ''):
+        return []
+    conn.execute("SAVEPOINT risk_evaluate")
+    try:
+        raised = _evaluate(conn, source, int(source_id), notify)
+        conn.execute("RELEASE risk_evaluate")
+        return raised
+    except Exception as e:
+        conn.execute("ROLLBACK TO risk_evaluate")
+        conn.execute("RELEASE risk_evaluate")
+        print(f"[RISK] Evaluating {source} {source_id} failed: {e}")
+        return []
+
+def _evaluate(conn, source, source_id, notify):
+    record = conn.execute(RECORD_QUERIES[source], (source_id,)).fetchone()
+    if record is None or record['student_id'] is None:
+        return []
+    scores = _scores(conn, source, source_id) if source in ('dass21', 'oq') else ()
+    raised_at = record['taken_at'] or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    raised = []
+    for rule in rule_set.current(conn):
+        detail = _match(rule, source, record, scores)
+        if detail is None:
+            continue
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO RiskFlag (student_id, rule_id, source, source_id, severity, detail, raised_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (record['student_id'], rule.id, source, source_id, rule.severity, detail, raised_at)
+        )
+        if cursor.rowcount:
+            raised.append((rule, detail))
+    if raised:
+        recount(conn, record['student_id'])
+        if notify:
+            _notify(conn, record['student_id'], raised)
+    return [detail for _, detail in raised]
+
+def _notify(conn, student_id, raised):
+    student = conn.execute("SELECT name FROM Student WHERE id = ?", (student_id,)).fetchone()
+    name = student['name'] if student is not None else f"Student {student_id}"
+    details = [detail for rule, detail in raised if rule.notify]
+    if not details:
+        return
+    severity = max((rule.severity for rule, _ in raised if rule.notify), key=SEVERITIES.get)
+    message = f"Risk alert ({severity}): {name} - {'; '.join(details)}"
+    users = conn.execute(
+        f"SELECT id FROM users WHERE LOWER(role) IN ({', '.join(['?'] * len(NOTIFY_ROLES))})",
+        tuple(role.lower() for role in NOTIFY_ROLES)
+    ).fetchall()
+    conn.executemany(
+        "INSERT INTO Notification (user_id, message, link, type) VALUES (?, ?, ?, 'in_app')",
+        [(user['id'], message, f"/student_profile/{student_id}") for user in users]
+    )
+
+def recount(conn, student_id):
+    """Rebuild one student's at-risk entry from their open flags"""
+    summary = conn.execute(f'''
+        SELECT COUNT(*) AS open_flags, MAX({SEVERITY_RANK}) AS severity_rank, MAX(raised_at) AS last_raised_at
+        FROM RiskFlag WHERE student_id = ? AND resolved_at IS NULL
+    ''', (student_id,)).fetchone()
+    if not summary['open_flags']:
+        conn.execute("DELETE FROM AtRiskStudent WHERE student_id = ?", (student_id,))
+        return
+    # Shown on the list: the most serious open flag, newest first among equals
+    latest = conn.execute(
+        f"SELECT detail FROM RiskFlag WHERE student_id = ? AND resolved_at IS NULL "
+        f"ORDER BY {SEVERITY_RANK} DESC, raised_at DESC, id DESC",
+        (student_id,)
+    ).fetchone()
+    severity = next(name for name, rank in SEVERITIES.items() if rank == summary['severity_rank'])
+    conn.execute(
+        "INSERT OR REPLACE INTO AtRiskStudent "
+        "(student_id, severity, severity_rank, open_flags, last_raised_at, last_detail) VALUES (?, ?, ?, ?, ?, ?)",
+        (student_id, severity, summary['severity_rank'], summary['open_flags'], summary['last_raised_at'],
+         latest['detail'])
+    )
+
+def resolve_student(conn, student_id, resolved_by=None):
+    """Mark a student's open flags reviewed and take them off the list. The caller commits."""
+    cursor = conn.execute(
+        "UPDATE RiskFlag SET resolved_at = ?, resolved_by = ? WHERE student_id = ? AND resolved_at IS NULL",
+        (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), resolved_by, student_id)
+    )
+    recount(conn, student_id)
+    return cursor.rowcount
+
+def forget_student(conn, student_id):
+    """The student was deleted. The caller commits."""
+    conn.execute("DELETE FROM RiskFlag WHERE student_id = ?", (student_id,))
+    conn.execute("DELETE FROM AtRiskStudent WHERE student_id = ?", (student_id,))
+
+# Each evaluation source and the table its records live in
+SOURCE_TABLES = (
+    ('dass21', 'DASS21'),
+    ('oq', 'OutcomeQuestionnaire'),
+    ('appointment', 'Appointment'),
+    ('session', 'session'),
+    ('case_note', 'CaseManagement'),
+)
+
+def forget_deleted(conn, student_id=None):
+    """
+    Drop flags whose record no longer exists (a session, case note,
+    appointment or questionnaire deleted directly or by a cascade) and
+    rebuild the at-risk entries they counted towards, for one student or
+    everyone. Deleting rather than resolving keeps a reused record id from
+    being skipped by the once-per-record rule. The caller commits.
+    """
+    affected = set()
+    for source, table in SOURCE_TABLES:
+        where = f"source = ? AND NOT EXISTS (SELECT 1 FROM {table} t WHERE t.id = RiskFlag.source_id)"
+        params = (source,)
+        if student_id is not None:
+            where += " AND student_id = ?"
+            params += (student_id,)
+        affected.update(row[0] for row in conn.execute(f"SELECT DISTINCT student_id FROM RiskFlag WHERE {where}",
+                                                       params))
+        conn.execute(f"DELETE FROM RiskFlag WHERE {where}", params)
+    for affected_id in affected:
+        recount(conn, affected_id)
+    return len(affected)
+
+def prune(conn):
+    """Drop flags of students and records that no longer exist (after sync deletes). The caller commits."""
+    conn.execute("DELETE FROM RiskFlag WHERE student_id NOT IN (SELECT id FROM Student)")
+    conn.execute("DELETE FROM AtRiskStudent WHERE student_id NOT IN (SELECT id FROM Student)")
+    forget_deleted(conn)
+
+# Synced tables and the evaluation source they feed
+SYNC_SOURCES = (
+    ('DASS21', 'dass21', "SELECT id FROM DASS21 WHERE global_id = ?"),
+    ('OutcomeQuestionnaire', 'oq', "SELECT id FROM OutcomeQuestionnaire WHERE global_id = ?"),
+    ('Appointment', 'appointment', "SELECT id FROM Appointment WHERE global_id = ?"),
+    ('session', 'session', "SELECT id FROM session WHERE global_id = ?"),
+    ('CaseManagement', 'case_note', "SELECT id FROM CaseManagement WHERE global_id = ?"),
+)
+
+def apply_sync_changes(conn, changes, removed=None):
+    """
+    Flag what a sync merge brought in. The node that saved a record already
+    notified its staff (notifications sync too), so this only updates the
+    flags and the list. Run after scoring_engine; the caller commits.
+    """
+    evaluated = 0
+    for table, source, sql in SYNC_SOURCES:
+        for record in changes.get(table, []):
+            row = conn.execute(sql, (record.get('global_id'),)).fetchone()
+            if row is not None:
+                evaluate(conn, source, row[0], notify=False)
+                evaluated += 1
+    if removed:
+        prune(conn)
+    return evaluated
+
+def backfill(conn, batch=BACKFILL_BATCH):
+    """
+    Run the rules over every existing record, committing every `batch`
+    records. Flags get the record's own date; nobody is notified.
+    Re-running only adds flags for rules or records that are new.
+    """
+    scoring_engine.refresh(conn)
+    conn.commit()
+    before = conn.execute("SELECT COUNT(*) FROM RiskFlag").fetchone()[0]
+    checked = 0
+    for source, table in SOURCE_TABLES:
+        last_id = 0
+        while True:
+            ids = [row[0] for row in conn.execute(
+                f"SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch))]
+            if not ids:
+                break
+            for record_id in ids:
+                evaluate(conn, source, record_id, notify=False)
+            conn.commit()
+            checked += len(ids)
+            last_id = ids[-1]
+    raised = conn.execute("SELECT COUNT(*) FROM RiskFlag").fetchone()[0] - before
+    print(f"[RISK] Backfill checked {checked} records, raised {raised} flags")
+    return {'checked': checked, 'raised': raised}
+
+# ---------- Reading the list ----------
+
+AT_RISK = '''
+    SELECT ar.student_id, ar.severity, ar.open_flags, ar.last_raised_at, ar.last_detail,
+           st.name, st.index_number, st.programme
+    FROM AtRiskStudent ar
+    JOIN Student st ON st.id = ar.student_id
+    ORDER BY ar.severity_rank DESC, ar.last_raised_at DESC
+    LIMIT ?
+'''
+
+def at_risk_students(conn, limit=50):
+    return [dict(row) for row in conn.execute(AT_RISK, (limit,))]
+
+def student_flags(conn, student_id):
+    return [dict(row) for row in conn.execute(
+        "SELECT id, rule_id, source, source_id, severity, detail, raised_at, resolved_at, resolved_by "
+        "FROM RiskFlag WHERE student_id = ? ORDER BY raised_at DESC, id DESC", (student_id,))]
+
+# ---------- API ----------
+
+def get_db_connection():
+    # Helper to get DB connection (reused logic)
+    import app
+    return app.get_db_connection()
+
+def _wants_json():
+    return request.is_json or request.accept_mimetypes.best == 'application/json'
+
+@risk_bp.route('/students', methods=['GET'])
+def list_at_risk():
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    conn = get_db_connection()
+    try:
+        return jsonify({'status': 'success', 'items': at_risk_students(conn, limit)})
+    finally:
+        conn.close()
+
+@risk_bp.route('/students/<int:student_id>/flags', methods=['GET'])
+def list_student_flags(student_id):
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+
+    conn = get_db_connection()
+    try:
+        return jsonify({'status': 'success', 'items': student_flags(conn, student_id)})
+    finally:
+        conn.close()
+
+@risk_bp.route('/students/<int:student_id>/review', methods=['POST'])
+def review_student(student_id):
+    """A counsellor has seen the flags: close them and drop the student from the list"""
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    if session.get('role') not in ('Admin', 'Counsellor', 'Counselor'):
+        return jsonify({'status': 'error', 'message': 'Only counsellors can review risk flags'}), 403
+
+    conn = get_db_connection()
+    try:
+        resolved = resolve_student(conn, student_id, session.get('username'))
+        conn.commit()
+    finally:
+        conn.close()
+    if _wants_json():
+        return jsonify({'status': 'success', 'resolved': resolved})
+    flash(f'{resolved} risk flag(s) marked as reviewed.', 'success')
+    return redirect(request.referrer or url_for('dashboard'))
+
+@risk_bp.route('/rules', methods=['GET', 'POST'])
+def rules():
+    """GET the rules; Admins POST a JSON list (body, or the 'rules' form field)"""
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+
+    conn = get_db_connection()
+    try:
+        if request.method == 'GET':
+            return jsonify({'status': 'success', 'rules': load_rule_specs(conn)})
+        if session.get('role') != 'Admin':
+            return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+        try:
+            specs = request.get_json() if request.is_json else json.loads(request.form.get('rules') or '[]')
+            save_rule_specs(conn, specs)
+            conn.commit()
+        except ValueError as e:
+            if _wants_json():
+                return jsonify({'status': 'error', 'message': str(e)}), 400
+            flash(f'Risk rules not saved: {e}', 'error')
+            return redirect(request.referrer or url_for('admin_settings'))
+    finally:
+        conn.close()
+    if _wants_json():
+        return jsonify({'status': 'success', 'rules': specs})
+    flash('Risk rules saved.', 'success')
+    return redirect(request.referrer or url_for('admin_settings'))
+
+@risk_bp.route('/backfill', methods=['POST'])
+def run_backfill():
+    """Flag historical records with the current rules (no notifications)"""
+    if not session.get('logged_in') or session.get('role') != 'Admin':
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+
+    conn = get_db_connection()
+    try:
+        result = backfill(conn)
+    finally:
+        conn.close()
+    if _wants_json():
+        return jsonify(dict(result, status='success'))
+    flash(f"Checked {result['checked']} records, raised {result['raised']} new risk flags.", 'success')
+    return redirect(request.referrer or url_for('admin_settings'))
+
+if __name__ == '__main__':
+    import sys
+    import app
+    if '--backfill' not in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+    db = app.get_db_connection()
+    try:
+        scoring_engine.ensure_schema(db)
+        ensure_schema(db)
+        db.commit()
+        backfill(db)
+    finally:
+        db.close()
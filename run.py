@@ -20,6 +20,7 @@ if __name__ == '__main__':
     print("\nStarting web server...")
     print("The system will be available at: http://localhost:5000")
     print("Press Ctrl+C to stop the server\n")
+    print("(--debug: Flask development server with debugger)")
     print("-" * 60)
     
     # Log available routes for debugging
@@ -29,6 +30,10 @@ if __name__ == '__main__':
     print("-" * 60)
     print()
     
-    # Run the Flask application
-    app.run(debug=True, host='127.0.0.1', port=5000)
+    if '--debug' in sys.argv:
+        app.run(debug=True, host='127.0.0.1', port=5000)
+    else:
+        # Same pooled server as app.py / the EXE
+        import server
+        server.serve('app:app', host='127.0.0.1', port=5000)
 
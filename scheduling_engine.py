@@ -0,0 +1,458 @@
+import bisect
+import re
+import threading
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, session
+
+# Create Blueprint
+schedule_bp = Blueprint('schedule', __name__, url_prefix='/api/schedule')
+
+# Appointments in these states no longer hold their slot
+FREED_STATUSES = ('Cancelled', 'cancelled', 'Postponed', 'postponed')
+
+# Defaults mirror the booking policy shown on the appointment form.
+# Each can be overridden in app_settings; per-counsellor hours use
+# 'counsellor_hours_<id>' = 'HH:MM-HH:MM'. front_desk_capacity is how many
+# intakes (no counsellor yet) may overlap; 0 means no limit.
+DEFAULT_HOURS = {
+    'working_hours_start': '08:00',
+    'working_hours_end': '17:00',
+    'lunch_break_start': '12:00',
+    'lunch_break_end': '13:00',
+    'appointment_duration_minutes': '60',
+    'working_days': '0,1,2,3,4',  # Monday..Friday
+    'front_desk_capacity': '0',
+}
+
+def get_db_connection():
+    # Helper to get DB connection (reused logic)
+    import app
+    return app.get_db_connection()
+
+def to_minutes(value):
+    """'HH:MM' or 'HH:MM:SS' -> minutes after midnight (None if unparsable)"""
+    try:
+        parts = str(value).strip().split(':')
+        return int(parts[0]) * 60 + int(parts[1])
+    except (ValueError, IndexError):
+        return None
+
+def to_hhmm(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+# A requested booking time: HH:MM (seconds allowed, as <input type=time> may send them)
+_TIME = re.compile(r'(\d{1,2}):(\d{2})(?::\d{2})?')
+
+class WorkingHours:
+    def __init__(self, settings):
+        merged = dict(DEFAULT_HOURS)
+        merged.update({k: v for k, v in settings.items() if v})
+        self.settings = merged
+        self.start = to_minutes(merged['working_hours_start'])
+        self.end = to_minutes(merged['working_hours_end'])
+        self.lunch_start = to_minutes(merged['lunch_break_start'])
+        self.lunch_end = to_minutes(merged['lunch_break_end'])
+        self.duration = int(merged['appointment_duration_minutes'])
+        self.days = {int(d) for d in str(merged['working_days']).split(',') if d.strip()}
+        self.front_desk_capacity = int(merged['front_desk_capacity'])
+
+    def for_counsellor(self, counsellor_id):
+        """Start/end for one counsellor, falling back to the office hours"""
+        override = self.settings.get(f'counsellor_hours_{counsellor_id}')
+        if override and '-' in override:
+            start, end = override.split('-', 1)
+            if to_minutes(start) is not None and to_minutes(end) is not None:
+                return to_minutes(start), to_minutes(end)
+        return self.start, self.end
+
+    def candidate_starts(self, counsellor_id):
+        start, end = self.for_counsellor(counsellor_id)
+        slot = start
+        while slot + self.duration <= end:
+            # Skip anything that would run into lunch
+            if not (slot < self.lunch_end and slot + self.duration > self.lunch_start):
+                yield slot
+            slot += self.duration
+
+class SlotIndex:
+    """
+    Per-counsellor, per-day sorted interval lists built from Appointment.
+    A counsellor's booked intervals never overlap, so a conflict check is a
+    single bisect plus a look at the two neighbours. Intakes share one
+    front-desk list whose intervals may overlap up to front_desk_capacity.
+    """
+
+    def __init__(self):
+        self._days = {}        # (counsellor_id, date) -> sorted [(start, end, appt_id)]
+        self._by_appt = {}     # appt_id -> (counsellor_id, date, start, end)
+        self._hours = None
+        self._built = False
+        self._lock = threading.RLock()
+
+    def build(self, conn):
+        """(Re)load every active booking and the working hours"""
+        rows = conn.execute(
+            f"SELECT id, Counsellor_id, date, time, status FROM Appointment "
+            f"WHERE status IS NULL OR status NOT IN ({', '.join(['?'] * len(FREED_STATUSES))})",
+            FREED_STATUSES
+        ).fetchall()
+        with self._lock:
+            self._hours = self._load_hours(conn)
+            self._days = {}
+            self._by_appt = {}
+            for row in rows:
+                self._insert(row['id'], row['Counsellor_id'], row['date'], row['time'])
+            self._built = True
+        print(f"[SCHEDULE] Indexed {len(self._by_appt)} bookings")
+
+    def ensure_built(self, conn=None):
+        if self._built:
+            return
+        if conn is not None:
+            self.build(conn)
+            return
+        conn = get_db_connection()
+        try:
+            self.build(conn)
+        finally:
+            conn.close()
+
+    def invalidate(self):
+        """Force a rebuild on next use (e.g. after a rolled-back bulk booking)"""
+        self._built = False
+
+    def refresh(self, conn, appt_id):
+        """Re-index a single appointment after it was written"""
+        self.ensure_built(conn)
+        row = conn.execute(
+            "SELECT id, Counsellor_id, date, time, status FROM Appointment WHERE id = ?", (appt_id,)
+        ).fetchone()
+        with self._lock:
+            self._remove(appt_id)
+            if row is not None and row['status'] not in FREED_STATUSES:
+                self._insert(row['id'], row['Counsellor_id'], row['date'], row['time'])
+
+    def refresh_global_ids(self, conn, global_ids):
+        for global_id in global_ids:
+            row = conn.execute("SELECT id FROM Appointment WHERE global_id = ?", (global_id,)).fetchone()
+            if row is not None:
+                self.refresh(conn, row['id'])
+
+    def remove(self, appt_id):
+        with self._lock:
+            self._remove(appt_id)
+
+    def booking(self):
+        """
+        Hold from the conflict check until the new appointment is committed
+        and refresh()ed, so two requests for one slot can't both pass the
+        check. Reentrant: find_conflict and refresh take it too.
+        """
+        return self._lock
+
+    def validate(self, counsellor_id, date, time):
+        """
+        Raise ValueError, with a message fit to show, unless date and time
+        are well formed and the slot lies inside the counsellor's working
+        hours on a working day, clear of the lunch break
+        """
+        self.ensure_built()
+        try:
+            self._key(counsellor_id)
+        except (TypeError, ValueError):
+            raise ValueError('counsellor_id must be a number')
+        try:
+            day = datetime.strptime(str(date), '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            raise ValueError('date must be YYYY-MM-DD')
+        match = _TIME.fullmatch(str(time or '').strip())
+        if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+            raise ValueError('time must be HH:MM')
+
+        hours = self._hours
+        start = int(match.group(1)) * 60 + int(match.group(2))
+        end = start + hours.duration
+        if day.weekday() not in hours.days:
+            raise ValueError(f"{day.strftime('%A')} is not a working day")
+        opens, closes = hours.for_counsellor(counsellor_id)
+        if start < opens or end > closes:
+            raise ValueError(f"Appointments must fall between {to_hhmm(opens)} and {to_hhmm(closes)}")
+        if start < hours.lunch_end and end > hours.lunch_start:
+            raise ValueError(f"{to_hhmm(hours.lunch_start)}-{to_hhmm(hours.lunch_end)} is the lunch break")
+
+    def find_conflict(self, counsellor_id, date, time, ignore_appt_id=None):
+        """Return the appointment id that overlaps the requested slot, or None"""
+        self.ensure_built()
+        start = to_minutes(time)
+        if start is None:
+            return None
+        end = start + self._hours.duration
+        with self._lock:
+            key = self._key(counsellor_id)
+            day = self._days.get((key, str(date)), [])
+            if key is None:
+                return self._front_desk_conflict(day, start, end, ignore_appt_id)
+            i = bisect.bisect_left(day, (start,))
+            # All bookings share one duration, so the nearest neighbour on
+            # each side is the only one that can overlap
+            left = i - 1
+            while left >= 0 and day[left][2] == ignore_appt_id:
+                left -= 1
+            right = i
+            while right < len(day) and day[right][2] == ignore_appt_id:
+                right += 1
+            for j in (left, right):
+                if 0 <= j < len(day):
+                    b_start, b_end, b_id = day[j]
+                    if b_start < end and start < b_end:
+                        return b_id
+        return None
+
+    def free_slots(self, counsellor_id, days=7, from_date=None, limit=None, now=None):
+        """Open slots for the next `days` working days, earliest first"""
+        self.ensure_built()
+        now = now or datetime.now()
+        day = from_date or now.date()
+        hours = self._hours
+        found = []
+        for offset in range(days):
+            current = day + timedelta(days=offset)
+            if current.weekday() not in hours.days:
+                continue
+            date_str = current.isoformat()
+            for start in hours.candidate_starts(counsellor_id):
+                if current == now.date() and start <= now.hour * 60 + now.minute:
+                    continue
+                if self.find_conflict(counsellor_id, date_str, to_hhmm(start)) is None:
+                    found.append({'date': date_str, 'time': to_hhmm(start)})
+                    if limit and len(found) >= limit:
+                        return found
+        return found
+
+    def next_free_slot(self, counsellor_id, from_date=None, days=30):
+        slots = self.free_slots(counsellor_id, days=days, from_date=from_date, limit=1)
+        return slots[0] if slots else None
+
+    def _front_desk_conflict(self, day, start, end, ignore_appt_id):
+        # Intakes may overlap each other, so count rather than bisect
+        capacity = self._hours.front_desk_capacity
+        if capacity <= 0:
+            return None
+        overlapping = [b_id for b_start, b_end, b_id in day
+                       if b_start < end and start < b_end and b_id != ignore_appt_id]
+        return overlapping[0] if len(overlapping) >= capacity else None
+
+    @staticmethod
+    def _key(counsellor_id):
+        # Intake appointments have no counsellor yet; they share one front-desk bucket
+        if counsellor_id in (None, ''):
+            return None
+        return int(counsellor_id)
+
+    def _load_hours(self, conn):
+        try:
+            rows = conn.execute("SELECT setting_name, setting_value FROM app_settings").fetchall()
+            settings = {row['setting_name']: row['setting_value'] for row in rows}
+        except Exception as e:
+            print(f"[SCHEDULE] Could not read working hours, using defaults: {e}")
+            settings = {}
+        return WorkingHours(settings)
+
+    def _insert(self, appt_id, counsellor_id, date, time):
+        start = to_minutes(time)
+        if start is None or not date:
+            return
+        end = start + self._hours.duration
+        key = (self._key(counsellor_id), str(date))
+        bisect.insort(self._days.setdefault(key, []), (start, end, appt_id))
+        self._by_appt[appt_id] = (key, start, end)
+
+    def _remove(self, appt_id):
+        entry = self._by_appt.pop(appt_id, None)
+        if entry is None:
+            return
+        key, start, end = entry
+        day = self._days.get(key, [])
+        i = bisect.bisect_left(day, (start, end, appt_id))
+        if i < len(day) and day[i] == (start, end, appt_id):
+            day.pop(i)
+
+slot_index = SlotIndex()
+
+def generate_follow_ups(conn, student_id, counsellor_id, start_date, count=1, interval_days=7,
+                        time=None, purpose='Follow-up session'):
+    """
+    Book a series of follow-up appointments. Each lands at the requested time
+    on its target day when free, otherwise at the next free slot after it.
+    Returns the created appointment rows as dicts (the caller commits).
+    """
+    if interval_days < 1:
+        raise ValueError('interval_days must be at least 1')
+    created = []
+    target = start_date
+    for _ in range(count):
+        slot = None
+        if time and _bookable(counsellor_id, target.isoformat(), time):
+            slot = {'date': target.isoformat(), 'time': time}
+        if slot is None:
+            slot = slot_index.next_free_slot(counsellor_id, from_date=target)
+        if slot is None:
+            break
+        cursor = conn.execute('''
+            INSERT INTO Appointment (student_id, date, time, purpose, Counsellor_id, status, urgency, referral_source)
+            VALUES (?, ?, ?, ?, ?, 'Scheduled', 'Normal', 'Follow-up')
+        ''', (student_id, slot['date'], slot['time'], purpose, counsellor_id))
+        slot_index.refresh(conn, cursor.lastrowid)
+        created.append(dict(slot, id=cursor.lastrowid))
+        target = datetime.strptime(slot['date'], '%Y-%m-%d').date() + timedelta(days=interval_days)
+    return created
+
+def _bookable(counsellor_id, date, time):
+    try:
+        slot_index.validate(counsellor_id, date, time)
+    except ValueError:
+        return False
+    return slot_index.find_conflict(counsellor_id, date, time) is None
+
+def follow_ups_from_case_notes(conn, from_date=None):
+    """
+    Book the next visit recorded on each case note that has no appointment
+    for that student on or after the requested date yet.
+    """
+    from_date = from_date or datetime.now().date()
+    rows = conn.execute('''
+        SELECT cm.id as case_id, cm.next_visit_date, a.student_id, a.Counsellor_id
+        FROM CaseManagement cm
+        JOIN session sess ON cm.session_id = sess.id
+        JOIN Appointment a ON sess.appointment_id = a.id
+        WHERE cm.next_visit_date >= ?
+          AND NOT EXISTS (
+              SELECT 1 FROM Appointment f
+              WHERE f.student_id = a.student_id AND f.date >= cm.next_visit_date
+          )
+    ''', (from_date.isoformat(),)).fetchall()
+
+    booked = []
+    for row in rows:
+        try:
+            start = datetime.strptime(row['next_visit_date'], '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            continue
+        created = generate_follow_ups(conn, row['student_id'], row['Counsellor_id'], start,
+                                      purpose='Follow-up (from case notes)')
+        for appt in created:
+            booked.append(dict(appt, case_id=row['case_id'], student_id=row['student_id']))
+    return booked
+
+# ==========================================
+# API ENDPOINTS
+# ==========================================
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+def _whole_number(value, name):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a whole number')
+    if number < 1:
+        raise ValueError(f'{name} must be at least 1')
+    return number
+
+@schedule_bp.route('/free_slots', methods=['GET'])
+def free_slots():
+    """Open slots for a counsellor over the next N days"""
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    try:
+        counsellor_id = request.args.get('counsellor_id')
+        days = min(int(request.args.get('days', 7)), 90)
+        limit = int(request.args.get('limit', 0)) or None
+        slots = slot_index.free_slots(counsellor_id, days=days,
+                                      from_date=_parse_date(request.args.get('from')), limit=limit)
+        return jsonify({'status': 'success', 'counsellor_id': counsellor_id, 'slots': slots})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+@schedule_bp.route('/next_free', methods=['GET'])
+def next_free():
+    """First open slot on or after a date"""
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    try:
+        slot = slot_index.next_free_slot(request.args.get('counsellor_id'),
+                                         from_date=_parse_date(request.args.get('from')))
+        return jsonify({'status': 'success', 'slot': slot})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+@schedule_bp.route('/check', methods=['GET'])
+def check_slot():
+    """Is the requested slot free for this counsellor?"""
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    counsellor_id = request.args.get('counsellor_id')
+    date = request.args.get('date')
+    time = request.args.get('time')
+    try:
+        slot_index.validate(counsellor_id, date, time)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    conflict = slot_index.find_conflict(counsellor_id, date, time)
+    response = {'status': 'success', 'available': conflict is None, 'conflict_id': conflict}
+    if conflict is not None:
+        response['suggestion'] = slot_index.next_free_slot(counsellor_id, from_date=_parse_date(date))
+    return jsonify(response)
+
+@schedule_bp.route('/follow_ups', methods=['POST'])
+def create_follow_ups():
+    """
+    Bulk-book recurring follow-ups.
+    Input: { "student_id", "counsellor_id", "start_date", "count", "interval_days", "time" }
+       or: { "from_case_notes": true } to book every pending next_visit_date
+    """
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    if session.get('role') not in ('Secretary', 'Admin', 'Counsellor', 'Counselor'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+
+    data = request.get_json() or {}
+    conn = get_db_connection()
+    try:
+        slot_index.ensure_built(conn)
+        with slot_index.booking():
+            if data.get('from_case_notes'):
+                created = follow_ups_from_case_notes(conn)
+            else:
+                if not data.get('student_id') or not data.get('start_date'):
+                    return jsonify({'status': 'error', 'message': 'student_id and start_date are required'}), 400
+                student_id = _whole_number(data['student_id'], 'student_id')
+                if conn.execute("SELECT 1 FROM Student WHERE id = ?", (student_id,)).fetchone() is None:
+                    return jsonify({'status': 'error', 'message': f'Student {student_id} not found'}), 400
+                try:
+                    start_date = _parse_date(data['start_date'])
+                except (TypeError, ValueError):
+                    raise ValueError('start_date must be YYYY-MM-DD')
+                created = generate_follow_ups(
+                    conn, student_id, data.get('counsellor_id'), start_date,
+                    count=min(_whole_number(data.get('count', 1), 'count'), 52),
+                    interval_days=_whole_number(data.get('interval_days', 7), 'interval_days'),
+                    time=data.get('time'))
+            conn.commit()
+        from queue_service import today_queue
+        from lookup_service import lookup_index
+        for appt in created:
+            today_queue.refresh(conn, appt['id'])
+            lookup_index.refresh_appointment(conn, appt['id'])
+        return jsonify({'status': 'success', 'created': created, 'count': len(created)})
+    except ValueError as e:
+        conn.rollback()
+        slot_index.invalidate()
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        conn.rollback()
+        slot_index.invalidate()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    finally:
+        conn.close()
@@ -0,0 +1,578 @@
+"""
+Psychometric scoring for DASS-21 and the outcome questionnaire.
+
+Every questionnaire row is scored once into AssessmentScore (one row per
+scale): final score, severity band, change since the student's previous
+assessment and the Jacobson-Truax reliable change index. The table is
+derived - it is not synced, and refresh() re-scores only the students
+whose questionnaires changed since it was last brought up to date.
+
+Scoring and the cohort roll-ups run as array operations when numpy is
+installed and as plain loops otherwise; both give the same results.
+"""
+
+import csv
+import io
+import math
+from flask import Blueprint, request, jsonify, session, make_response
+import oq_items
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # pure-Python scoring
+
+scores_bp = Blueprint('scores', __name__, url_prefix='/api/scores')
+
+# |RCI| at or past this is a reliable change (95%)
+RELIABLE_Z = 1.96
+
+class Scale:
+    """
+    One scored scale. `cutoffs` are the lowest final scores of each band
+    above the first; `clinical` is the first band counted as clinical range
+    and `levels` the badge colour of each band.
+    `se_diff` is the standard error of a difference between two scores,
+    SD * sqrt(2 * (1 - reliability)).
+    """
+    __slots__ = ('name', 'source', 'column', 'multiplier', 'cutoffs', 'labels', 'levels', 'clinical', 'se_diff')
+
+    def __init__(self, name, source, column, multiplier, cutoffs, labels, levels, clinical, se_diff):
+        self.name = name
+        self.source = source
+        self.column = column
+        self.multiplier = multiplier
+        self.cutoffs = cutoffs
+        self.labels = labels
+        self.levels = levels
+        self.clinical = clinical
+        self.se_diff = se_diff
+
+    def rank(self, score):
+        rank = 0
+        for cutoff in self.cutoffs:
+            if score >= cutoff:
+                rank += 1
+        return rank
+
+def _se_diff(sd, reliability):
+    return sd * math.sqrt(2 * (1 - reliability))
+
+DASS_LABELS = ('Normal', 'Mild', 'Moderate', 'Severe', 'Extremely Severe')
+DASS_LEVELS = ('success', 'success', 'warning', 'danger', 'danger')
+
+# OQ norms are published for the 45-item OQ-45.2 (total 0-180; Lambert et al.,
+# OQ-45.2 Administration and Scoring Manual, 1996): clinical cutoff 64,
+# 55 and over elevated, reliable change 14 points at a test-retest
+# reliability of .84. Our form has oq_items.ITEM_COUNT of those items (0-100),
+# so cutoffs and the standard deviation are prorated by 25/45 and the
+# reliability shortened with Spearman-Brown. Replace with local short-form
+# norms once enough questionnaires have been collected.
+OQ45_ITEMS = 45
+OQ_PRORATION = oq_items.ITEM_COUNT / OQ45_ITEMS
+
+def _spearman_brown(reliability, length_ratio):
+    return length_ratio * reliability / (1 + (length_ratio - 1) * reliability)
+
+OQ45_RETEST = 0.84
+OQ45_SD = (14 / RELIABLE_Z) / math.sqrt(2 * (1 - OQ45_RETEST))
+OQ_CUTOFFS = tuple(round(cutoff * OQ_PRORATION) for cutoff in (55, 64))
+
+# DASS21 stores the raw subscale sums (0-21); bands and norms are on the
+# doubled DASS-42 scale. Norms: Henry & Crawford (2005), doubled.
+SCALES = (
+    Scale('depression', 'dass21', 'depression_score', 2, (10, 14, 21, 28), DASS_LABELS, DASS_LEVELS, 2,
+          _se_diff(2 * 3.87, 0.88)),
+    Scale('anxiety', 'dass21', 'anxiety_score', 2, (8, 10, 15, 20), DASS_LABELS, DASS_LEVELS, 2,
+          _se_diff(2 * 2.95, 0.82)),
+    Scale('stress', 'dass21', 'stress_score', 2, (15, 19, 26, 34), DASS_LABELS, DASS_LEVELS, 2,
+          _se_diff(2 * 4.20, 0.90)),
+    # Total of the 25 items as recorded, against the prorated OQ-45 norms above
+    Scale('oq_total', 'oq', 'total_score', 1, OQ_CUTOFFS, ('Normal', 'Elevated', 'Clinical'),
+          ('success', 'warning', 'danger'), 2,
+          _se_diff(OQ45_SD * OQ_PRORATION, _spearman_brown(OQ45_RETEST, OQ_PRORATION))),
+)
+SCALES_BY_NAME = {scale.name: scale for scale in SCALES}
+DASS_SCALES = tuple(scale for scale in SCALES if scale.source == 'dass21')
+
+def ensure_schema(conn):
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS AssessmentScore (
+            source TEXT NOT NULL,
+            source_id INTEGER NOT NULL,
+            scale TEXT NOT NULL,
+            student_id INTEGER NOT NULL,
+            taken_at TIMESTAMP,
+            raw REAL,
+            score REAL,
+            band TEXT,
+            band_rank INTEGER,
+            change REAL,
+            rci REAL,
+            reliable INTEGER,
+            fingerprint TEXT,
+            PRIMARY KEY (source, source_id, scale)
+        );
+        CREATE INDEX IF NOT EXISTS idx_assessment_score_student ON AssessmentScore(student_id, scale, taken_at);
+    ''')
+
+# ---------- Reading the questionnaires ----------
+
+# What a derived row was computed from; a mismatch means the source row (or,
+# via the trailing tag, the norms it was scored against) changed
+DASS_FINGERPRINT = ("printf('%s|%s|%s|%s|%s', d.student_id, COALESCE(d.created_at, d.completion_date), "
+                    "d.depression_score, d.anxiety_score, d.stress_score)")
+OQ_FINGERPRINT = ("printf('%s|%s|%s|%s|oq25', o.student_id, COALESCE(o.created_at, o.completion_date), "
+                  "o.total_score, o.items)")
+
+DASS_SELECT = f'''
+    SELECT d.id, d.student_id, COALESCE(d.created_at, d.completion_date) AS taken_at,
+           d.depression_score, d.anxiety_score, d.stress_score, {DASS_FINGERPRINT} AS fingerprint
+    FROM DASS21 d
+    WHERE d.student_id IS NOT NULL
+'''
+
+OQ_SELECT = f'''
+    SELECT o.id, o.student_id, COALESCE(o.created_at, o.completion_date) AS taken_at, o.total_score, o.items,
+           {OQ_FINGERPRINT} AS fingerprint
+    FROM OutcomeQuestionnaire o
+    WHERE o.student_id IS NOT NULL
+'''
+
+# Students whose derived rows are missing, out of date or left over from a deleted questionnaire
+STALE_STUDENTS = f'''
+    SELECT d.student_id, s.student_id FROM DASS21 d
+    LEFT JOIN AssessmentScore s ON s.source = 'dass21' AND s.source_id = d.id AND s.scale = 'depression'
+    WHERE d.student_id IS NOT NULL AND (s.source_id IS NULL OR s.fingerprint IS NOT {DASS_FINGERPRINT})
+    UNION
+    SELECT o.student_id, s.student_id FROM OutcomeQuestionnaire o
+    LEFT JOIN AssessmentScore s ON s.source = 'oq' AND s.source_id = o.id AND s.scale = 'oq_total'
+    WHERE o.student_id IS NOT NULL AND (s.source_id IS NULL OR s.fingerprint IS NOT {OQ_FINGERPRINT})
+    UNION
+    SELECT NULL, s.student_id FROM AssessmentScore s
+    WHERE (s.source = 'dass21' AND NOT EXISTS (SELECT 1 FROM DASS21 d
+                                               WHERE d.id = s.source_id AND d.student_id IS NOT NULL))
+       OR (s.source = 'oq' AND NOT EXISTS (SELECT 1 FROM OutcomeQuestionnaire o
+                                           WHERE o.id = s.source_id AND o.student_id IS NOT NULL))
+'''
+
+def _student_filter(student_ids, alias):
+    if student_ids is None:
+        return '', ()
+    return f" AND {alias}.student_id IN ({', '.join(['?'] * len(student_ids))})", tuple(student_ids)
+
+def read_assessments(conn, student_ids=None):
+    """
+    Observations to score: (source, source_id, student_id, taken_at, scale,
+    raw, fingerprint). OQ raw is the sum of the items when all are present,
+    total_score otherwise.
+    """
+    observations = []
+    where, params = _student_filter(student_ids, 'd')
+    for row in conn.execute(DASS_SELECT + where, params):
+        for scale in DASS_SCALES:
+            observations.append(('dass21', row['id'], row['student_id'], row['taken_at'], scale.name,
+                                 row[scale.column], row['fingerprint']))
+
+    where, params = _student_filter(student_ids, 'o')
+    rows = conn.execute(OQ_SELECT + where, params).fetchall()
+    for row, raw in zip(rows, oq_raw_scores(rows)):
+        observations.append(('oq', row['id'], row['student_id'], row['taken_at'], 'oq_total', raw,
+                             row['fingerprint']))
+    return observations
+
+def oq_raw_scores(rows):
+    """Item sums for complete questionnaires, the stored total for the rest"""
+    if not rows:
+        return []
+    raws = [None if row['total_score'] is None else float(row['total_score']) for row in rows]
+    complete = [i for i, row in enumerate(rows) if oq_items.is_complete(row['items'])]
+    if np is not None and complete:
+        # Packed answers are ASCII digits: one byte per item, fixed width
+        packed = ''.join(rows[i]['items'] for i in complete).encode('ascii')
+        items = np.frombuffer(packed, dtype=np.uint8).reshape(len(complete), oq_items.ITEM_COUNT)
+        sums = (items.astype(np.int64) - ord('0')).sum(axis=1).tolist()
+        for i, total in zip(complete, sums):
+            raws[i] = float(total)
+        return raws
+    for i in complete:
+        raws[i] = float(oq_items.total(rows[i]['items']))
+    return raws
+
+# ---------- Scoring ----------
+
+def _number(value):
+    try:
+        return None if value is None or value == '' else float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _observation_order(observation):
+    return (observation[2], observation[3] or '', observation[1])
+
+def score_observations(observations):
+    """
+    Score a batch. Returns one tuple per observation in AssessmentScore
+    column order; change/RCI compare each score with the same student's
+    previous score on the scale.
+    """
+    by_scale = {scale.name: [] for scale in SCALES}
+    for observation in observations:
+        by_scale[observation[4]].append(observation)
+    results = []
+    for scale in SCALES:
+        group = by_scale[scale.name]
+        if group:
+            group.sort(key=_observation_order)
+            results.extend(_score_scale(scale, group))
+    return results
+
+def _score_scale(scale, group):
+    raws = [_number(o[5]) for o in group]
+    if np is not None:
+        columns = _score_arrays(scale, [o[2] for o in group], raws)
+    else:
+        columns = _score_loop(scale, [o[2] for o in group], raws)
+    return [
+        (o[0], o[1], scale.name, o[2], o[3], raw, score, band, rank, change, rci, reliable, o[6])
+        for o, raw, (score, band, rank, change, rci, reliable) in zip(group, raws, columns)
+    ]
+
+def _reliable(rci):
+    if rci is None:
+        return None
+    if rci <= -RELIABLE_Z:
+        return 1   # reliably improved (every scale: lower is better)
+    if rci >= RELIABLE_Z:
+        return -1  # reliably deteriorated
+    return 0
+
+def _score_arrays(scale, student_ids, raws):
+    raw = np.array([np.nan if r is None else r for r in raws], dtype=float)
+    students = np.array(student_ids)
+    scores = raw * scale.multiplier
+    ranks = np.searchsorted(np.array(scale.cutoffs, dtype=float), scores, side='right')
+
+    # Previous score of the same student, skipping unscored rows
+    scored = ~np.isnan(scores)
+    index = np.where(scored, np.arange(len(scores)), -1)
+    last_scored = np.maximum.accumulate(index)
+    previous = np.full(len(scores), -1)
+    previous[1:] = last_scored[:-1]
+    has_previous = scored & (previous >= 0)
+    has_previous[has_previous] = students[previous[has_previous]] == students[has_previous]
+    change = np.full(len(scores), np.nan)
+    change[has_previous] = scores[has_previous] - scores[previous[has_previous]]
+    rci = change / scale.se_diff
+
+    columns = []
+    for is_scored, score, rank, paired, row_change, row_rci in zip(
+            scored.tolist(), scores.tolist(), ranks.tolist(), has_previous.tolist(), change.tolist(),
+            np.round(rci, 3).tolist()):
+        if not is_scored:
+            columns.append((None, None, None, None, None, None))
+        elif paired:
+            columns.append((score, scale.labels[rank], rank, row_change, row_rci, _reliable(row_rci)))
+        else:
+            columns.append((score, scale.labels[rank], rank, None, None, None))
+    return columns
+
+def _score_loop(scale, student_ids, raws):
+    columns = []
+    previous = {}
+    for student_id, raw in zip(student_ids, raws):
+        if raw is None:
+            columns.append((None, None, None, None, None, None))
+            continue
+        score = raw * scale.multiplier
+        rank = scale.rank(score)
+        change = rci = None
+        if student_id in previous:
+            change = score - previous[student_id]
+            rci = round(change / scale.se_diff, 3)
+        previous[student_id] = score
+        columns.append((score, scale.labels[rank], rank, change, rci, _reliable(rci)))
+    return columns
+
+# ---------- The derived table ----------
+
+INSERT_SCORE = '''
+    INSERT OR REPLACE INTO AssessmentScore
+    (source, source_id, scale, student_id, taken_at, raw, score, band, band_rank, change, rci, reliable, fingerprint)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def rescore_students(conn, student_ids):
+    """Replace the derived rows of these students. The caller commits."""
+    student_ids = sorted({int(s) for s in student_ids if s not in (None, '')})
+    written = 0
+    for start in range(0, len(student_ids), 500):
+        chunk = student_ids[start:start + 500]
+        placeholders = ', '.join(['?'] * len(chunk))
+        conn.execute(f"DELETE FROM AssessmentScore WHERE student_id IN ({placeholders})", chunk)
+        rows = score_observations(read_assessments(conn, chunk))
+        conn.executemany(INSERT_SCORE, rows)
+        written += len(rows)
+    return written
+
+def refresh(conn):
+    """Bring AssessmentScore up to date; only students with changed questionnaires are re-scored"""
+    stale = set()
+    for row in conn.execute(STALE_STUDENTS):
+        stale.update(value for value in row if value is not None)
+    if stale:
+        rescore_students(conn, stale)
+    return len(stale)
+
+def refresh_student(conn, student_id):
+    if student_id not in (None, ''):
+        rescore_students(conn, [student_id])
+
+def rebuild(conn):
+    conn.execute("DELETE FROM AssessmentScore")
+    rows = score_observations(read_assessments(conn))
+    conn.executemany(INSERT_SCORE, rows)
+    return len(rows)
+
+def apply_sync_changes(conn, changes, removed=None):
+    """After a sync merge: re-score when questionnaires (or cascades) changed. The caller commits."""
+    if removed or changes.get('DASS21') or changes.get('OutcomeQuestionnaire') or changes.get('Student'):
+        return refresh(conn)
+    return 0
+
+# ---------- Per-student trajectories ----------
+
+def annotate(dass21_records, oq_records):
+    """
+    Add final scores, bands and change markers to the profile's assessment
+    lists (dicts, newest first) in place, scored the same way as the table.
+    """
+    observations = []
+    for record in dass21_records:
+        taken_at = record.get('created_at') or record.get('completion_date')
+        for scale in DASS_SCALES:
+            observations.append(('dass21', record['id'], 0, taken_at, scale.name, record.get(scale.column), None))
+    for record in oq_records:
+        taken_at = record.get('created_at') or record.get('completion_date')
+        observations.append(('oq', record['id'], 0, taken_at, 'oq_total', record.get('total_score'), None))
+
+    scored = {(row[0], row[1], row[2]): row for row in score_observations(observations)}
+    for source, records in (('dass21', dass21_records), ('oq', oq_records)):
+        for record in records:
+            for scale in SCALES:
+                if scale.source != source:
+                    continue
+                row = scored.get((source, record['id'], scale.name))
+                record[scale.name] = _result(row) if row is not None else None
+
+def _result(row):
+    scale = SCALES_BY_NAME[row[2]]
+    rank = row[8]
+    return {
+        'score': row[6], 'band': row[7], 'band_rank': rank, 'change': row[9], 'rci': row[10],
+        'reliable': row[11], 'clinical': rank is not None and rank >= scale.clinical,
+        'level': scale.levels[rank] if rank is not None else 'secondary',
+    }
+
+TRAJECTORY = '''
+    SELECT source, source_id, scale, taken_at, raw, score, band, band_rank, change, rci, reliable
+    FROM AssessmentScore
+    WHERE student_id = ? AND score IS NOT NULL
+    ORDER BY scale, taken_at, source_id
+'''
+
+def student_trajectory(conn, student_id):
+    """Every scored assessment per scale, oldest first, plus first-to-last change"""
+    scales = {scale.name: [] for scale in SCALES}
+    for row in conn.execute(TRAJECTORY, (student_id,)):
+        scales[row['scale']].append({key: row[key] for key in row.keys() if key != 'scale'})
+    summary = {}
+    for name, points in scales.items():
+        if points:
+            summary[name] = overall_change(SCALES_BY_NAME[name], points[0]['score'], points[-1]['score'],
+                                           len(points))
+    return {'student_id': student_id, 'scales': scales, 'summary': summary}
+
+def overall_change(scale, first, last, count):
+    change = last - first if count > 1 else None
+    rci = round(change / scale.se_diff, 3) if change is not None else None
+    return {
+        'assessments': count, 'first': first, 'last': last, 'change': change, 'rci': rci,
+        'reliable': _reliable(rci), 'band_first': scale.labels[scale.rank(first)],
+        'band_last': scale.labels[scale.rank(last)],
+    }
+
+# ---------- Cohorts ----------
+
+COHORT_DIMENSIONS = ('programme', 'department', 'semester')
+
+COHORT_ROWS = '''
+    SELECT s.student_id, s.scale, s.taken_at, s.score, st.programme, st.department
+    FROM AssessmentScore s
+    JOIN Student st ON st.id = s.student_id
+    WHERE s.score IS NOT NULL
+    ORDER BY s.scale, s.student_id, s.taken_at, s.source_id
+'''
+
+# Semester 1 runs August-January, semester 2 February-July
+SEMESTER_ONE_START = 8
+
+def semester_of(taken_at):
+    try:
+        year, month = int(str(taken_at)[:4]), int(str(taken_at)[5:7])
+    except (TypeError, ValueError):
+        return None
+    if month >= SEMESTER_ONE_START:
+        return f"{year}/{year + 1} Sem 1"
+    if month == 1:
+        return f"{year - 1}/{year} Sem 1"
+    return f"{year - 1}/{year} Sem 2"
+
+COHORT_FIELDS = ('group', 'scale', 'students', 'assessments', 'paired', 'mean_first', 'mean_last',
+                 'mean_change', 'pct_improved', 'pct_deteriorated', 'pct_clinical_first', 'pct_clinical_last')
+
+def cohort_summary(conn, by='programme'):
+    """
+    Outcome roll-up per group and scale, all groups in one pass. Each
+    student contributes their first and last score within the group;
+    change figures count students with at least two assessments.
+    """
+    if by not in COHORT_DIMENSIONS:
+        raise ValueError(f"Unknown cohort dimension: {by}")
+    cursor = conn.cursor()
+    cursor.row_factory = None  # plain tuples: this reads every scored assessment
+    rows = cursor.execute(COHORT_ROWS).fetchall()
+    column = {'programme': 4, 'department': 5}.get(by)
+    if column is None:
+        groups = [semester_of(row[2]) or 'Unknown' for row in rows]
+    else:
+        groups = [row[column] or 'Unknown' for row in rows]
+    students = [row[0] for row in rows]
+    scales = [row[1] for row in rows]
+    scores = [row[3] for row in rows]
+    if np is not None and rows:
+        firsts = _first_last_arrays(groups, scales, students, scores)
+    else:
+        firsts = _first_last_loop(groups, scales, students, scores)
+    return _aggregate(firsts)
+
+def _first_last_arrays(groups, scales, students, scores):
+    """(group, scale, student) -> (first, last, count), with one stable sort and boundary detection"""
+    group_names, group_codes = np.unique(np.array(groups, dtype=object).astype(str), return_inverse=True)
+    scale_names, scale_codes = np.unique(np.array(scales, dtype=str), return_inverse=True)
+    student_ids = np.array(students)
+    values = np.array(scores, dtype=float)
+    # Rows arrive in time order per student; lexsort is stable, so that order survives
+    order = np.lexsort((student_ids, group_codes, scale_codes))
+    g, s, st, v = group_codes[order], scale_codes[order], student_ids[order], values[order]
+    starts = np.ones(len(v), dtype=bool)
+    starts[1:] = (g[1:] != g[:-1]) | (s[1:] != s[:-1]) | (st[1:] != st[:-1])
+    first_index = np.flatnonzero(starts)
+    last_index = np.append(first_index[1:] - 1, len(v) - 1)
+    counts = last_index - first_index + 1
+    return {
+        (str(group_names[g[i]]), str(scale_names[s[i]]), st[i].item()): (float(v[i]), float(v[j]), int(n))
+        for i, j, n in zip(first_index, last_index, counts)
+    }
+
+def _first_last_loop(groups, scales, students, scores):
+    firsts = {}
+    for group, scale, student_id, score in zip(groups, scales, students, scores):
+        key = (group, scale, student_id)
+        if key in firsts:
+            first, _, count = firsts[key]
+            firsts[key] = (first, score, count + 1)
+        else:
+            firsts[key] = (score, score, 1)
+    return firsts
+
+def _aggregate(firsts):
+    totals = {}
+    for (group, scale_name, _), (first, last, count) in firsts.items():
+        scale = SCALES_BY_NAME[scale_name]
+        entry = totals.setdefault((group, scale_name), {
+            'students': 0, 'assessments': 0, 'paired': 0, 'sum_first': 0.0, 'sum_last': 0.0,
+            'sum_change': 0.0, 'improved': 0, 'deteriorated': 0, 'clinical_first': 0, 'clinical_last': 0,
+        })
+        entry['students'] += 1
+        entry['assessments'] += count
+        entry['sum_first'] += first
+        entry['sum_last'] += last
+        entry['clinical_first'] += scale.rank(first) >= scale.clinical
+        entry['clinical_last'] += scale.rank(last) >= scale.clinical
+        if count > 1:
+            reliable = _reliable((last - first) / scale.se_diff)
+            entry['paired'] += 1
+            entry['sum_change'] += last - first
+            entry['improved'] += reliable == 1
+            entry['deteriorated'] += reliable == -1
+
+    def pct(part, whole):
+        return round(100.0 * part / whole, 1) if whole else None
+
+    summary = []
+    for (group, scale_name), e in sorted(totals.items()):
+        summary.append({
+            'group': group, 'scale': scale_name, 'students': e['students'], 'assessments': e['assessments'],
+            'paired': e['paired'],
+            'mean_first': round(e['sum_first'] / e['students'], 2),
+            'mean_last': round(e['sum_last'] / e['students'], 2),
+            'mean_change': round(e['sum_change'] / e['paired'], 2) if e['paired'] else None,
+            'pct_improved': pct(e['improved'], e['paired']),
+            'pct_deteriorated': pct(e['deteriorated'], e['paired']),
+            'pct_clinical_first': pct(e['clinical_first'], e['students']),
+            'pct_clinical_last': pct(e['clinical_last'], e['students']),
+        })
+    return summary
+
+# ---------- API ----------
+
+def get_analytics_connection():
+    import analytics_db
+    return analytics_db.get_analytics_connection()
+
+@scores_bp.route('/students/<int:student_id>', methods=['GET'])
+def student_scores(student_id):
+    """Scored DASS-21 / OQ history of one student with reliable-change markers"""
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+
+    with get_analytics_connection() as conn:
+        return jsonify(dict(student_trajectory(conn, student_id), status='success'))
+
+def _requested_dimension():
+    by = request.args.get('by', 'programme').lower()
+    return by if by in COHORT_DIMENSIONS else None
+
+@scores_bp.route('/cohorts', methods=['GET'])
+def cohorts():
+    """?by=programme|department|semester"""
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    by = _requested_dimension()
+    if by is None:
+        return jsonify({'status': 'error', 'message': f"by must be one of {', '.join(COHORT_DIMENSIONS)}"}), 400
+
+    with get_analytics_connection() as conn:
+        return jsonify({'status': 'success', 'by': by, 'groups': cohort_summary(conn, by)})
+
+@scores_bp.route('/cohorts/export', methods=['GET'])
+def export_cohorts():
+    """The cohort roll-up as CSV (end-of-semester outcomes report)"""
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    by = _requested_dimension() or 'programme'
+
+    with get_analytics_connection() as conn:
+        summary = cohort_summary(conn, by)
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow([by.title() if field == 'group' else field.replace('_', ' ').title() for field in COHORT_FIELDS])
+    for entry in summary:
+        writer.writerow(['' if entry[field] is None else entry[field] for field in COHORT_FIELDS])
+
+    response = make_response(output.getvalue())
+    response.headers['Content-Type'] = 'text/csv'
+    response.headers['Content-Disposition'] = f'attachment; filename=outcomes_by_{by}.csv'
+    return response
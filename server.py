@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+"""
+AAMUSTED Counselling Management System - Production server
+
+One entry point for serving the app:
+- Linux with gunicorn installed: gunicorn gthread workers. `kill -HUP` on the
+  master (or `python server.py --reload`) swaps in fresh workers without
+  dropping connections; SIGTERM drains in-flight requests first.
+- Everywhere else (Windows EXE, service, no gunicorn): a werkzeug server with
+  a fixed thread pool and a bounded request queue. Excess connections get a
+  quick 503 instead of a new thread each; shutdown drains what is in flight.
+
+Sizes and timeouts come from node_config (see DEFAULTS).
+"""
+
+import importlib
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+import node_config
+
+# node_config keys and defaults
+DEFAULTS = {
+    'server_host': '0.0.0.0',
+    'server_port': 5000,
+    'server_workers': 1,             # gunicorn processes; only 1 is supported (see worker_count)
+    'server_threads': 16,            # requests handled at once per process
+    'server_backlog': 64,            # requests waiting for a thread before new ones get a 503
+    'server_keepalive_seconds': 5,   # idle keep-alive (gunicorn) / silent client (built-in) timeout
+    'server_timeout_seconds': 60,    # gunicorn kills a worker stuck this long on one request
+    'server_graceful_seconds': 15,   # how long shutdown/reload waits for in-flight requests
+}
+
+BUSY_BODY = b"Server busy, please retry in a moment.\n"
+BUSY_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n"
+    b"Content-Length: " + str(len(BUSY_BODY)).encode() + b"\r\n\r\n" + BUSY_BODY
+)
+
+def setting(config, key):
+    value = config.get(key, DEFAULTS[key])
+    return DEFAULTS[key] if value in (None, '') else value
+
+def worker_count(config):
+    """
+    Always 1. The today's queue, the slot index and its booking lock, and the
+    live dashboard streams live in process memory, so a second worker would
+    book against an index the first one keeps changing.
+    """
+    try:
+        workers = int(setting(config, 'server_workers'))
+    except (TypeError, ValueError):
+        workers = 1
+    if workers > 1:
+        print(f"[SERVER] WARNING: server_workers = {workers} is not supported (the live queue and "
+              f"booking lock are per process); running 1 worker. Raise server_threads instead.")
+    return 1
+
+def get_base_path():
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+PID_FILE = os.path.join(get_base_path(), 'server.pid')
+
+def load_app(app_uri):
+    """'module:attribute' -> the WSGI app"""
+    module_name, _, attr = app_uri.partition(':')
+    return getattr(importlib.import_module(module_name), attr or 'app')
+
+def start_background_services(app_uri):
+    """Startup warm-up and auto-sync, in the process that serves requests"""
+    module = importlib.import_module(app_uri.partition(':')[0])
+    starter = getattr(module, 'start_background_services', None)
+    if starter:
+        starter()
+
+# ---------- Built-in server ----------
+
+class BoundedWSGIServer(BaseWSGIServer):
+    """
+    werkzeug server with a fixed pool of worker threads. Accepted connections
+    wait in a bounded queue; when it is full the client gets a 503 right
+    away. shutdown() stops accepting, then in-flight requests are drained.
+    werkzeug closes the connection after each response, so there is no
+    keep-alive here; the socket timeout stops a silent client from holding
+    a pool thread.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads, backlog, keepalive_seconds, graceful_seconds, fd=None):
+        # Listen backlog for the OS, same size as our own queue
+        self.request_queue_size = backlog
+        handler = type('PooledRequestHandler', (WSGIRequestHandler,), {'timeout': keepalive_seconds})
+        super().__init__(host, port, app, handler=handler, fd=fd)
+        self.threads = threads
+        self.graceful_seconds = graceful_seconds
+        self._pending = queue.Queue(maxsize=backlog)
+        self._active = 0
+        self._lock = threading.Lock()
+        self._stats = {'handled': 0, 'rejected': 0, 'max_active': 0, 'max_pending': 0}
+        self._workers = []
+        for i in range(threads):
+            worker = threading.Thread(target=self._work, name=f'http-worker-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def process_request(self, request, client_address):
+        try:
+            self._pending.put_nowait((request, client_address))
+        except queue.Full:
+            with self._lock:
+                self._stats['rejected'] += 1
+            try:
+                request.sendall(BUSY_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        with self._lock:
+            self._stats['max_pending'] = max(self._stats['max_pending'], self._pending.qsize())
+
+    def _work(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            request, client_address = item
+            with self._lock:
+                self._active += 1
+                self._stats['max_active'] = max(self._stats['max_active'], self._active)
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with self._lock:
+                    self._active -= 1
+                    self._stats['handled'] += 1
+
+    def serve_forever(self, poll_interval=0.5):
+        try:
+            super().serve_forever(poll_interval=poll_interval)
+        finally:
+            self.drain()
+
+    def drain(self):
+        """Wait (up to graceful_seconds) for queued and running requests, then stop the pool"""
+        deadline = time.monotonic() + self.graceful_seconds
+        while time.monotonic() < deadline:
+            with self._lock:
+                busy = self._active
+            if not busy and self._pending.empty():
+                break
+            time.sleep(0.05)
+        else:
+            print(f"[SERVER] Shutdown: gave up waiting on {self._active} request(s)")
+        for _ in self._workers:
+            try:
+                self._pending.put_nowait(None)
+            except queue.Full:
+                break
+
+    def stats(self):
+        """Counters since start; pending/active are the current queue and busy threads"""
+        with self._lock:
+            return dict(self._stats, active=self._active, pending=self._pending.qsize(), threads=self.threads)
+
+def create_server(app, host=None, port=None, config=None):
+    """Built-in pooled server, not yet serving (call serve_forever)"""
+    config = config or node_config.load_config()
+    return BoundedWSGIServer(
+        host or setting(config, 'server_host'),
+        int(port or setting(config, 'server_port')),
+        app,
+        threads=max(int(setting(config, 'server_threads')), 1),
+        backlog=max(int(setting(config, 'server_backlog')), 1),
+        keepalive_seconds=float(setting(config, 'server_keepalive_seconds')),
+        graceful_seconds=float(setting(config, 'server_graceful_seconds')),
+    )
+
+def serve_builtin(app_uri, host, port, config):
+    server = create_server(load_app(app_uri), host, port, config)
+
+    def stop(signum, frame):
+        print(f"[SERVER] Signal {signum}: draining and stopping")
+        # shutdown() blocks until serve_forever returns, so not from its own thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    for name in ('SIGTERM', 'SIGINT', 'SIGBREAK'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), stop)
+
+    start_background_services(app_uri)
+    print(f"[SERVER] Serving on http://{server.host}:{server.port} "
+          f"({server.threads} threads, queue {server._pending.maxsize})")
+    server.serve_forever()
+    stats = server.stats()
+    print(f"[SERVER] Stopped after {stats['handled']} requests ({stats['rejected']} turned away while busy, "
+          f"peak {stats['max_active']} threads busy)")
+
+# ---------- gunicorn (Linux) ----------
+
+def gunicorn_available():
+    if os.name != 'posix' or getattr(sys, 'frozen', False):
+        return False
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def serve_gunicorn(app_uri, host, port, config):
+    from gunicorn.app.base import BaseApplication
+
+    threads = max(int(setting(config, 'server_threads')), 1)
+    backlog = max(int(setting(config, 'server_backlog')), 1)
+    options = {
+        'bind': f"{host}:{port}",
+        'workers': 1,  # see worker_count
+        'worker_class': 'gthread',
+        'threads': threads,
+        'worker_connections': threads + backlog,
+        'backlog': backlog,
+        'keepalive': int(setting(config, 'server_keepalive_seconds')),
+        'timeout': int(setting(config, 'server_timeout_seconds')),
+        'graceful_timeout': int(setting(config, 'server_graceful_seconds')),
+        'pidfile': PID_FILE,
+        # Workers import the app themselves, so a reload (HUP) picks up new code
+        'preload_app': False,
+        'post_worker_init': lambda worker: start_background_services(app_uri),
+    }
+
+    class CounsellingApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_app(app_uri)
+
+    print(f"[SERVER] gunicorn on http://{host}:{port} ({options['workers']} worker(s) x {threads} threads)")
+    CounsellingApplication().run()
+
+# ---------- Entry point ----------
+
+def serve(app_uri='app:app', host=None, port=None, config=None, backend=None):
+    """
+    Serve the app until stopped. backend: 'gunicorn', 'builtin' or None to
+    use gunicorn where available.
+    """
+    config = config or node_config.load_config()
+    host = host or setting(config, 'server_host')
+    port = int(port or setting(config, 'server_port'))
+    worker_count(config)
+    if backend is None:
+        backend = 'gunicorn' if gunicorn_available() else 'builtin'
+    if backend == 'gunicorn':
+        serve_gunicorn(app_uri, host, port, config)
+    else:
+        serve_builtin(app_uri, host, port, config)
+
+def reload_server():
+    """Ask a running gunicorn master to replace its workers (zero downtime)"""
+    try:
+        with open(PID_FILE) as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        print(f"[SERVER] No running server found ({PID_FILE})")
+        return False
+    os.kill(pid, signal.SIGHUP)
+    print(f"[SERVER] Reload requested (pid {pid})")
+    return True
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Run the counselling system web server')
+    parser.add_argument('--host')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--backend', choices=['gunicorn', 'builtin'])
+    parser.add_argument('--reload', action='store_true', help='gracefully reload a running gunicorn server')
+    args = parser.parse_args()
+    if args.reload:
+        sys.exit(0 if reload_server() else 1)
+    serve(host=args.host, port=args.port, backend=args.backend)
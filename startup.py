@@ -0,0 +1,120 @@
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+class ReadinessCheck:
+    """
+    Startup work that used to run at import time (database verification,
+    sync schema, in-memory indexes). Registered steps run once, in order,
+    either from a warm-up thread right after launch or from whichever caller
+    needs the database first - so the server can start listening immediately.
+    """
+
+    def __init__(self):
+        self._steps = []
+        self._lock = threading.RLock()
+        self._ready = False
+        self._running = False
+        self.elapsed_ms = None
+
+    def step(self, fn):
+        """Decorator: register fn as a startup step"""
+        self._steps.append(fn)
+        return fn
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def run(self):
+        """Run every step once; later calls return immediately"""
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready or self._running:
+                return  # already done, or called again from inside a step
+            self._running = True
+            started = time.perf_counter()
+            try:
+                for fn in self._steps:
+                    try:
+                        fn()
+                    except Exception as e:
+                        # Same as before: a failed step is logged, the app keeps going
+                        print(f"[STARTUP] {fn.__name__} failed: {e}")
+            finally:
+                self._running = False
+            self._ready = True
+            self.elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            print(f"[STARTUP] Ready in {self.elapsed_ms}ms")
+
+    def warm_up(self):
+        """Run the steps on a background thread"""
+        thread = threading.Thread(target=self.run, name='startup-readiness', daemon=True)
+        thread.start()
+        return thread
+
+readiness = ReadinessCheck()
+
+def wait_for_port(host, port, timeout=10.0):
+    """Block until something accepts connections on host:port (or timeout)"""
+    import socket
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.25):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+# ---------- Import-time profiling ----------
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def profile_imports(module='app', top=25, cwd=None):
+    """
+    Import `module` in a fresh interpreter under -X importtime and return
+    (total_ms, [(cumulative_ms, self_ms, name), ...]) with the slowest
+    modules first.
+    """
+    cwd = cwd or os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd, capture_output=True, text=True
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            depth = (len(indent) - 1) // 2
+            entries.append((int(cumulative_us) / 1000, int(self_us) / 1000, name, depth))
+    if result.returncode != 0 and not entries:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    total_ms = next((e[0] for e in entries if e[2] == module and e[3] == 0), sum(e[0] for e in entries if e[3] == 0))
+    slowest = sorted(entries, key=lambda e: e[0], reverse=True)[:top]
+    return total_ms, [(round(c, 1), round(s, 1), name) for c, s, name, _ in slowest]
+
+def print_import_profile(module='app', top=25, cwd=None):
+    total_ms, slowest = profile_imports(module, top, cwd)
+    print('=' * 60)
+    print(f"Import time for '{module}': {total_ms:.1f}ms")
+    print('=' * 60)
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative, self_ms, name in slowest:
+        print(f"{cumulative:>10.1f}ms {self_ms:>8.1f}ms  {name}")
+    print('=' * 60)
+    return total_ms
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Summarise python -X importtime for a module')
+    parser.add_argument('module', nargs='?', default='app')
+    parser.add_argument('--top', type=int, default=25)
+    args = parser.parse_args()
+    print_import_profile(args.module, args.top)
@@ -0,0 +1,154 @@
+/*
+ * Typeahead pickers backed by /api/lookup.
+ *
+ *   <input type="text" data-lookup="students" data-lookup-url="..." data-lookup-target="student_id" required>
+ *   <input type="hidden" id="student_id" name="student_id">
+ *   <select data-lookup-for="student_id" data-lookup-url=".../students/0/sessions" name="session_id">
+ *
+ * Typing searches students; picking one stores its id in the hidden field
+ * and fills every select bound to that field with the student's recent
+ * sessions or appointments (item fields become data- attributes).
+ */
+(function () {
+    'use strict'
+
+    const DEBOUNCE_MS = 150
+    const PICK_MESSAGE = 'Choose a student from the list.'
+
+    function dataName(key) {
+        return key.replace(/_([a-z])/g, (_, c) => c.toUpperCase())
+    }
+
+    function fillSelect(select, items) {
+        const placeholder = select.getAttribute('data-placeholder') || 'Choose...'
+        select.innerHTML = ''
+        select.appendChild(new Option(items.length ? placeholder : 'No records for this student', ''))
+        items.forEach(item => {
+            const option = new Option(item.label, item.id)
+            Object.keys(item).forEach(key => {
+                if (item[key] !== null && typeof item[key] !== 'object') {
+                    option.dataset[dataName(key)] = item[key]
+                }
+            })
+            select.appendChild(option)
+        })
+        select.disabled = false
+        select.dispatchEvent(new Event('change'))
+    }
+
+    function loadDependents(hidden) {
+        document.querySelectorAll(`select[data-lookup-for="${hidden.id}"]`).forEach(select => {
+            if (!hidden.value) {
+                select.innerHTML = ''
+                select.appendChild(new Option('Choose a student first', ''))
+                select.disabled = true
+                select.dispatchEvent(new Event('change'))
+                return
+            }
+            const url = select.getAttribute('data-lookup-url').replace('/0/', `/${encodeURIComponent(hidden.value)}/`)
+            fetch(url, { credentials: 'same-origin' })
+                .then(r => r.json())
+                .then(data => fillSelect(select, data.items || []))
+                .catch(() => fillSelect(select, []))
+        })
+    }
+
+    function attach(input) {
+        const hidden = document.getElementById(input.getAttribute('data-lookup-target'))
+        const menu = document.createElement('div')
+        menu.className = 'dropdown-menu w-100 shadow-sm'
+        input.parentNode.style.position = 'relative'
+        input.insertAdjacentElement('afterend', menu)
+
+        let timer = null
+        let active = -1
+        let sequence = 0
+
+        function close() {
+            menu.classList.remove('show')
+            active = -1
+        }
+
+        function choose(item) {
+            input.value = item.label
+            hidden.value = item.id
+            input.setCustomValidity('')
+            close()
+            loadDependents(hidden)
+        }
+
+        function render(items) {
+            menu.innerHTML = ''
+            if (!items.length) {
+                menu.innerHTML = '<span class="dropdown-item-text text-muted small">No matching students</span>'
+            }
+            items.forEach(item => {
+                const entry = document.createElement('button')
+                entry.type = 'button'
+                entry.className = 'dropdown-item text-truncate'
+                entry.textContent = item.label
+                if (item.index_number) {
+                    const index = document.createElement('span')
+                    index.className = 'text-muted small ms-2'
+                    index.textContent = item.index_number
+                    entry.appendChild(index)
+                }
+                entry.addEventListener('mousedown', e => {
+                    e.preventDefault()  // keep focus so blur doesn't close first
+                    choose(item)
+                })
+                menu.appendChild(entry)
+            })
+            menu.classList.add('show')
+        }
+
+        function search() {
+            const q = input.value.trim()
+            if (!q) {
+                close()
+                return
+            }
+            const mine = ++sequence
+            const url = `${input.getAttribute('data-lookup-url')}?q=${encodeURIComponent(q)}`
+            fetch(url, { credentials: 'same-origin' })
+                .then(r => r.json())
+                .then(data => {
+                    if (mine === sequence) render(data.items || [])
+                })
+                .catch(() => close())
+        }
+
+        input.addEventListener('input', () => {
+            if (hidden.value) {
+                hidden.value = ''
+                loadDependents(hidden)
+            }
+            input.setCustomValidity(input.value ? PICK_MESSAGE : '')
+            clearTimeout(timer)
+            timer = setTimeout(search, DEBOUNCE_MS)
+        })
+
+        input.addEventListener('keydown', e => {
+            const entries = menu.querySelectorAll('.dropdown-item')
+            if (!menu.classList.contains('show') || !entries.length) return
+            if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+                e.preventDefault()
+                active = (active + (e.key === 'ArrowDown' ? 1 : entries.length - 1)) % entries.length
+                entries.forEach((el, i) => el.classList.toggle('active', i === active))
+            } else if (e.key === 'Enter' && active >= 0) {
+                e.preventDefault()
+                entries[active].dispatchEvent(new Event('mousedown'))
+            } else if (e.key === 'Escape') {
+                close()
+            }
+        })
+
+        input.addEventListener('blur', () => setTimeout(close, 100))
+
+        if (!hidden.value && input.value) {
+            input.setCustomValidity(PICK_MESSAGE)
+        }
+    }
+
+    document.querySelectorAll('input[data-lookup="students"]').forEach(attach)
+})()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+"""
+Static asset pipeline: content-hashed copies of everything under static/,
+with gzip (and brotli, when installed) variants written next to them.
+
+    python static_assets.py        # rebuild static/build/
+
+Templates link assets through asset_url('css/modern_theme.css'), which
+points at /assets/css/modern_theme.<hash>.css. A changed file gets a new
+name, so those URLs are served as immutable and browsers never revalidate.
+Without a build, asset_url() falls back to the plain /static/ URL.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+import threading
+from flask import Blueprint, request, send_from_directory, url_for, abort
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # gzip only
+
+assets_bp = Blueprint('assets', __name__, url_prefix='/assets')
+
+BUILD_DIR_NAME = 'build'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 10
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Worth compressing; images and fonts already are
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.map', '.html')
+
+# url(...) references inside CSS (fonts, images), minus data: URIs and absolute URLs
+CSS_URL = re.compile(r'''url\(\s*(['"]?)(?!data:|https?:|//|#)([^'")?#]+)([?#][^'")]*)?\1\s*\)''')
+
+def get_static_dir():
+    try:
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_path, 'static')
+
+def get_build_dir(static_dir=None):
+    return os.path.join(static_dir or get_static_dir(), BUILD_DIR_NAME)
+
+# ---------- Build ----------
+
+def source_files(static_dir):
+    """Logical names ('css/x.css') of every file under static/, build output excluded"""
+    names = []
+    for root, dirs, files in os.walk(static_dir):
+        rel_root = os.path.relpath(root, static_dir)
+        if rel_root == BUILD_DIR_NAME or rel_root.startswith(BUILD_DIR_NAME + os.sep):
+            dirs[:] = []
+            continue
+        for file_name in files:
+            names.append(os.path.normpath(os.path.join(rel_root, file_name)).replace(os.sep, '/'))
+    return sorted(names)
+
+def fingerprint(name, content):
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+def rewrite_css_urls(name, content, manifest):
+    """Point url() references at the hashed names so fonts/images are immutable too"""
+    css_dir = os.path.dirname(name)
+
+    def replace(match):
+        quote, target, suffix = match.group(1), match.group(2), match.group(3) or ''
+        logical = os.path.normpath(os.path.join(css_dir, target)).replace(os.sep, '/')
+        hashed = manifest.get(logical)
+        if not hashed:
+            return match.group(0)
+        relative = os.path.relpath(hashed, css_dir or '.').replace(os.sep, '/')
+        # The hash replaces cache-busting query strings; keep #fragments (svg sprites)
+        fragment = suffix if suffix.startswith('#') else ''
+        return f"url({quote}{relative}{fragment}{quote})"
+
+    return CSS_URL.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+def write_variants(path, content):
+    """path.gz / path.br next to path, only when they are actually smaller"""
+    written = []
+    packed = gzip.compress(content, compresslevel=9, mtime=0)
+    if len(packed) < len(content):
+        with open(path + '.gz', 'wb') as f:
+            f.write(packed)
+        written.append('gz')
+    if brotli is not None:
+        packed = brotli.compress(content, quality=11)
+        if len(packed) < len(content):
+            with open(path + '.br', 'wb') as f:
+                f.write(packed)
+            written.append('br')
+    return written
+
+def build_assets(static_dir=None, verbose=True):
+    """
+    Rebuild static/build/ from scratch and return the manifest
+    {logical name: hashed name}. CSS is processed last so its url()s can
+    point at the hashed fonts/images.
+    """
+    static_dir = static_dir or get_static_dir()
+    build_dir = get_build_dir(static_dir)
+    if os.path.exists(build_dir):
+        shutil.rmtree(build_dir)
+    os.makedirs(build_dir)
+
+    names = source_files(static_dir)
+    names.sort(key=lambda n: n.endswith('.css'))
+    manifest = {}
+    total_in = total_gz = 0
+    for name in names:
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            content = f.read()
+        if name.endswith('.css'):
+            content = rewrite_css_urls(name, content, manifest)
+        hashed = fingerprint(name, content)
+        target = os.path.join(build_dir, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(content)
+        variants = write_variants(target, content) if name.endswith(COMPRESSIBLE) else []
+        manifest[name] = hashed
+
+        total_in += len(content)
+        total_gz += os.path.getsize(target + '.gz') if 'gz' in variants else len(content)
+        if verbose:
+            print(f"[ASSETS] {name} -> {hashed} ({len(content) // 1024} KB{', ' + '+'.join(variants) if variants else ''})")
+
+    with open(os.path.join(build_dir, MANIFEST_NAME), 'w') as f:
+        json.dump({'sources': source_stamp(static_dir), 'files': manifest}, f, indent=2, sort_keys=True)
+    if verbose:
+        print(f"[ASSETS] Built {len(manifest)} files: {total_in // 1024} KB, {total_gz // 1024} KB gzipped"
+              f"{'' if brotli else ' (install brotli for .br variants)'}")
+    asset_manifest.reload()
+    return manifest
+
+def source_stamp(static_dir):
+    """Cheap change detector: (name, size, mtime) of every source file"""
+    stamp = hashlib.sha256()
+    for name in source_files(static_dir):
+        st = os.stat(os.path.join(static_dir, name))
+        stamp.update(f"{name}:{st.st_size}:{int(st.st_mtime)}\n".encode('utf-8'))
+    return stamp.hexdigest()
+
+def ensure_built(static_dir=None):
+    """Rebuild when static/ changed since the last build (dev); the EXE ships a prebuilt copy"""
+    static_dir = static_dir or get_static_dir()
+    if getattr(sys, 'frozen', False):
+        return False
+    try:
+        with open(os.path.join(get_build_dir(static_dir), MANIFEST_NAME)) as f:
+            if json.load(f).get('sources') == source_stamp(static_dir):
+                return False
+    except (OSError, ValueError):
+        pass
+    build_assets(static_dir, verbose=False)
+    return True
+
+# ---------- Serving ----------
+
+class AssetManifest:
+    """Logical name -> hashed name, loaded from the build on first use"""
+
+    def __init__(self):
+        self._files = None
+        self._lock = threading.Lock()
+
+    def reload(self):
+        with self._lock:
+            self._files = None
+
+    def get(self, name):
+        files = self._files
+        if files is None:
+            with self._lock:
+                if self._files is None:
+                    try:
+                        with open(os.path.join(get_build_dir(), MANIFEST_NAME)) as f:
+                            self._files = json.load(f).get('files', {})
+                    except (OSError, ValueError):
+                        self._files = {}
+                files = self._files
+        return files.get(name)
+
+asset_manifest = AssetManifest()
+
+@assets_bp.app_template_global()
+def asset_url(filename):
+    """Fingerprinted URL for a static file, or the plain static URL if it isn't built"""
+    hashed = asset_manifest.get(filename)
+    if hashed:
+        return url_for('assets.serve_asset', filename=hashed)
+    return url_for('static', filename=filename)
+
+@assets_bp.route('/<path:filename>')
+def serve_asset(filename):
+    build_dir = get_build_dir()
+    accepted = request.headers.get('Accept-Encoding', '').lower()
+    encoding = None
+    for suffix, name in (('.br', 'br'), ('.gz', 'gzip')):
+        if name in accepted and os.path.isfile(os.path.join(build_dir, filename + suffix)):
+            encoding, served = name, filename + suffix
+            break
+    else:
+        served = filename
+    if not os.path.isfile(os.path.join(build_dir, served)):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_from_directory(build_dir, served, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return response
+
+if __name__ == '__main__':
+    build_assets()
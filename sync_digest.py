@@ -0,0 +1,171 @@
+import hashlib
+import threading
+
+# Buckets are keyed by the first characters of global_id (uuid4 hex):
+# 16 top-level buckets, each split into 16 leaf buckets.
+BUCKET_DEPTH = 2
+
+EMPTY = 0
+
+def leaf_hash(global_id, updated_at):
+    """One row's version. Equal on both peers iff LWW would treat them as the same."""
+    digest = hashlib.blake2b(f"{global_id}|{updated_at}".encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest, 'big')
+
+def to_hex(value):
+    return format(value, '032x')
+
+def bucket_of(global_id, depth=BUCKET_DEPTH):
+    return str(global_id)[:depth].lower()
+
+class TableDigest:
+    """
+    Hash tree over one table's (global_id, updated_at) pairs. Bucket hashes
+    are the XOR of their rows' hashes, so a row can be added, replaced or
+    removed in O(1) and parents are the XOR of their children.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self._leaves = {}       # global_id -> (updated_at, hash)
+        self._buckets = {}      # leaf bucket prefix -> XOR of row hashes
+        self._watermark = None  # highest updated_at folded in
+        self._count = 0         # rows counted by the last signature check
+        self._built = False
+
+    def build(self, conn):
+        self._leaves = {}
+        self._buckets = {}
+        rows = conn.execute(
+            f"SELECT global_id, updated_at FROM {self.table} WHERE global_id IS NOT NULL"
+        ).fetchall()
+        for row in rows:
+            self._set(row[0], row[1])
+        self._watermark = max((row[1] for row in rows if row[1] is not None), default=None)
+        self._count = len(rows)
+        self._built = True
+
+    def catch_up(self, conn):
+        """
+        Fold in rows written since the last check. Local writes bump
+        updated_at, so only rows at or past the watermark are re-read; a row
+        count that still disagrees means a delete, and the table is rebuilt.
+        """
+        if not self._built:
+            self.build(conn)
+            return
+        count, newest = conn.execute(
+            f"SELECT COUNT(*), MAX(updated_at) FROM {self.table} WHERE global_id IS NOT NULL"
+        ).fetchone()
+        if count == self._count and newest == self._watermark:
+            return
+        if newest is not None:
+            since = self._watermark or ''
+            for row in conn.execute(
+                f"SELECT global_id, updated_at FROM {self.table} WHERE global_id IS NOT NULL AND updated_at >= ?",
+                (since,)
+            ).fetchall():
+                self._set(row[0], row[1])
+            self._watermark = newest
+        if count != len(self._leaves):
+            self.build(conn)
+            return
+        self._count = count
+
+    def refresh_ids(self, conn, global_ids):
+        """Re-read specific rows (used after sync merges, which may write older timestamps)"""
+        ids = [g for g in global_ids if g]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            found = {}
+            for row in conn.execute(
+                f"SELECT global_id, updated_at FROM {self.table} WHERE global_id IN ({', '.join(['?'] * len(chunk))})",
+                chunk
+            ).fetchall():
+                found[row[0]] = row[1]
+            for global_id in chunk:
+                if global_id in found:
+                    self._set(global_id, found[global_id])
+                else:
+                    self._unset(global_id)
+        self._count = len(self._leaves)
+
+    def root(self):
+        value = EMPTY
+        for bucket_hash in self._buckets.values():
+            value ^= bucket_hash
+        return value
+
+    def children(self, prefix):
+        """Hashes one level below prefix ('' -> top-level buckets)"""
+        depth = len(prefix) + 1
+        result = {}
+        for bucket, bucket_hash in self._buckets.items():
+            if bucket.startswith(prefix):
+                key = bucket[:depth]
+                result[key] = result.get(key, EMPTY) ^ bucket_hash
+        return {key: to_hex(value) for key, value in result.items() if value != EMPTY}
+
+    def rows(self, prefix):
+        """global_id -> updated_at for every row in a leaf bucket"""
+        return {gid: leaf[0] for gid, leaf in self._leaves.items() if bucket_of(gid) == prefix}
+
+    def _set(self, global_id, updated_at):
+        new_hash = leaf_hash(global_id, updated_at)
+        old = self._leaves.get(global_id)
+        if old is not None and old[1] == new_hash:
+            return
+        bucket = bucket_of(global_id)
+        value = self._buckets.get(bucket, EMPTY)
+        if old is not None:
+            value ^= old[1]
+        self._buckets[bucket] = value ^ new_hash
+        self._leaves[global_id] = (updated_at, new_hash)
+
+    def _unset(self, global_id):
+        old = self._leaves.pop(global_id, None)
+        if old is None:
+            return
+        bucket = bucket_of(global_id)
+        self._buckets[bucket] = self._buckets.get(bucket, EMPTY) ^ old[1]
+
+class DigestStore:
+    """Digests for every synced table, shared by the endpoint and the checker"""
+
+    def __init__(self):
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def table(self, conn, name):
+        with self._lock:
+            digest = self._tables.get(name)
+            if digest is None:
+                digest = self._tables[name] = TableDigest(name)
+            digest.catch_up(conn)
+            return digest
+
+    def roots(self, conn, tables):
+        result = {}
+        for name in tables:
+            try:
+                result[name] = to_hex(self.table(conn, name).root())
+            except Exception as e:
+                print(f"[DIGEST] Skipping {name}: {e}")
+        return result
+
+    def apply_sync_changes(self, conn, changes):
+        """Fold rows touched by a sync merge back into their digests"""
+        with self._lock:
+            for name, records in changes.items():
+                digest = self._tables.get(name)
+                if digest is not None and digest._built:
+                    digest.refresh_ids(conn, [r.get('global_id') for r in records])
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._tables = {}
+            else:
+                self._tables.pop(name, None)
+
+digest_store = DigestStore()
@@ -1,9 +1,25 @@
 import sqlite3
 import json
-import requests
-from flask import Blueprint, request, jsonify
+import gzip
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, request, jsonify, Response
 from datetime import datetime
 import node_config
+from queue_service import today_queue
+from scheduling_engine import slot_index
+from lookup_service import lookup_index
+from profile_service import profile_cache
+import scoring_engine
+import risk_engine
+import oq_items
+from sync_digest import digest_store, BUCKET_DEPTH
+from sync_snapshot import snapshot_builder, local_is_empty, download_snapshot, adopt_snapshot
+import sync_tombstones
+import sync_versions
+from sync_versions import TOMBSTONES
+from sync_transport import get_transport, peer_base_url, decode_body, setting, TransportError
 
 # Create Blueprint
 sync_bp = Blueprint('sync', __name__, url_prefix='/api/sync')
@@ -16,11 +32,36 @@ SYNC_TABLES = [
     'app_settings'
 ]
 
+# Pulls cover every synced table plus the deletes
+PULL_TABLES = SYNC_TABLES + [TOMBSTONES]
+
+# Advertised in the handshake so older peers keep getting plain requests
+SYNC_FEATURES = ['gzip', 'table_pull', 'changelog']
+
 def get_db_connection():
     # Helper to get DB connection (reused logic)
     import app
     return app.get_db_connection()
 
+def read_payload():
+    """JSON body of a sync request, which peers may send gzipped"""
+    return decode_body(request.get_data(), request.headers.get('Content-Encoding')) or {}
+
+@sync_bp.after_request
+def compress_response(response):
+    """Gzip JSON responses for peers that ask for it (pulls are mostly repetitive text)"""
+    if (response.mimetype != 'application/json' or response.direct_passthrough
+            or 'gzip' not in request.headers.get('Accept-Encoding', '')
+            or response.headers.get('Content-Encoding')):
+        return response
+    body = response.get_data()
+    if len(body) < setting(node_config.load_config(), 'sync_compress_min_bytes'):
+        return response
+    response.set_data(gzip.compress(body, compresslevel=5))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
 # ==========================================
 # API ENDPOINTS (Server Side)
 # ==========================================
@@ -33,45 +74,63 @@ def handshake():
         "status": "ok",
         "node_id": config.get('node_id'),
         "role": config.get('node_role'),
+        "features": SYNC_FEATURES,
         "timestamp": datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
     })
 
 @sync_bp.route('/pull', methods=['POST'])
 def pull_changes():
     """
-    Peer is asking for our changes since a specific timestamp.
-    Input: { "last_sync_timestamp": "2024-01-01..." }
+    Peer is asking for what changed since its cursors into our change log.
+    Input: { "node_id": "NODE_...", "cursors": { "Student": 120, ... },
+             "tables": ["Student", ...] (optional, default all tables and deletes) }
+    Rows that came from the requesting node are left out, but its cursors move past them.
     """
-    data = request.json
-    last_sync = data.get('last_sync_timestamp', '1970-01-01 00:00:00')
+    data = read_payload()
+    requester = data.get('node_id')
+    cursors = data.get('cursors') or {}
+    tables = [t for t in data.get('tables') or PULL_TABLES if t in PULL_TABLES]
+    limit = int(setting(node_config.load_config(), 'sync_page_size'))
     
     conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
     
     changes = {}
+    tombstones = []
+    new_cursors = {}
+    more = []
     
     try:
         total_count = 0
-        for table in SYNC_TABLES:
-            # Get records updated since last_sync
-            # Logic: updated_at > last_sync
-            query = f"SELECT * FROM {table} WHERE updated_at > ?"
-            rows = cursor.execute(query, (last_sync,)).fetchall()
-            
-            table_changes = []
-            for row in rows:
-                # Convert row to dict
-                record = dict(row)
-                table_changes.append(record)
-            
-            if table_changes:
-                changes[table] = table_changes
-                total_count += len(table_changes)
+        for table in tables:
+            since = int(cursors.get(table) or 0)
+            entries = sync_versions.changes_since(conn, table, since, limit)
+            new_cursors[table] = entries[-1][0] if entries else since
+            if len(entries) == limit:
+                more.append(table)
+
+            global_ids = [entry[1] for entry in entries if entry[2] != requester]
+            if not global_ids:
+                continue
+            if table == TOMBSTONES:
+                tombstones = sync_tombstones.fetch_tombstones(conn, global_ids)
+                total_count += len(tombstones)
+            else:
+                records = fetch_records(conn, table, global_ids)
+                if records:
+                    changes[table] = records
+                    total_count += len(records)
+
+        if cursors.get(TOMBSTONES):
+            # The peer has applied our deletes up to the cursor it sent
+            sync_tombstones.record_ack(conn, requester, cursors[TOMBSTONES])
+            conn.commit()
                 
         return jsonify({
             "status": "success",
             "changes": changes,
+            "tombstones": tombstones,
+            "cursors": new_cursors,
+            "more": more,
             "count": total_count,
             "node_id": node_config.get_node_id()
         })
@@ -84,87 +143,237 @@ def pull_changes():
 def receive_push():
     """
     Peer is sending us their changes. We need to merge them.
-    Input: { "changes": { "Student": [ ... ] } }
+    Input: { "node_id": "NODE_...", "changes": { "Student": [ ... ] }, "tombstones": [ ... ] }
     """
-    data = request.json
+    data = read_payload()
     changes = data.get('changes', {})
+    tombstones = data.get('tombstones', [])
     
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    processed_count = 0
     errors = []
     
     try:
-        for table, records in changes.items():
-            if table not in SYNC_TABLES:
-                continue
-                
-            for record in records:
-                try:
-                    merge_record(cursor, table, record)
-                    processed_count += 1
-                except Exception as e:
-                    errors.append(f"Error processing {table} record {record.get('global_id')}: {str(e)}")
-        
+        processed_count, removed = apply_changes(conn, changes, tombstones, data.get('node_id'), errors)
         conn.commit()
+        after_merge(conn, changes, removed)
         return jsonify({
             "status": "success",
             "processed": processed_count,
             "errors": errors
         })
     except Exception as e:
+        conn.rollback()
         return jsonify({"status": "error", "message": str(e)}), 500
     finally:
         conn.close()
 
+@sync_bp.route('/digest', methods=['POST'])
+def digest():
+    """
+    Anti-entropy hash tree.
+    Input: {}                                   -> root hash per table
+           { "table": "Student", "prefix": "" }  -> child bucket hashes under prefix
+           { "table": "Student", "prefix": "4d" } -> global_id/updated_at of a leaf bucket
+    """
+    data = read_payload()
+    table = data.get('table')
+    prefix = str(data.get('prefix', '')).lower()
+
+    if table is not None and table not in SYNC_TABLES:
+        return jsonify({"status": "error", "message": f"Unknown table: {table}"}), 400
+    if len(prefix) > BUCKET_DEPTH:
+        return jsonify({"status": "error", "message": "Prefix too long"}), 400
+
+    conn = get_db_connection()
+    try:
+        if table is None:
+            return jsonify({"status": "success", "roots": digest_store.roots(conn, SYNC_TABLES)})
+        table_digest = digest_store.table(conn, table)
+        if len(prefix) == BUCKET_DEPTH:
+            return jsonify({"status": "success", "table": table, "prefix": prefix,
+                            "rows": table_digest.rows(prefix)})
+        return jsonify({"status": "success", "table": table, "prefix": prefix,
+                        "buckets": table_digest.children(prefix)})
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        conn.close()
+
+@sync_bp.route('/rows', methods=['POST'])
+def get_rows():
+    """
+    Full records for specific rows (used to repair mismatched buckets).
+    Input: { "table": "Student", "global_ids": [ ... ] }
+    """
+    data = read_payload()
+    table = data.get('table')
+    if table not in SYNC_TABLES:
+        return jsonify({"status": "error", "message": f"Unknown table: {table}"}), 400
+
+    conn = get_db_connection()
+    try:
+        records = fetch_records(conn, table, data.get('global_ids') or [])
+        return jsonify({"status": "success", "table": table, "records": records})
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        conn.close()
+
+@sync_bp.route('/snapshot', methods=['POST'])
+def snapshot_manifest():
+    """
+    Bootstrap support: build (or reuse) a compressed snapshot of the synced
+    tables and describe its chunks. Output includes the change cursor the new
+    node continues from.
+    """
+    try:
+        manifest = snapshot_builder.manifest(SYNC_TABLES, node_config.get_node_id())
+        return jsonify({"status": "success", "manifest": manifest})
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@sync_bp.route('/snapshot/<snapshot_id>/<int:index>', methods=['GET'])
+def snapshot_chunk(snapshot_id, index):
+    chunk = snapshot_builder.chunk(snapshot_id, index)
+    if chunk is None:
+        return jsonify({"status": "error", "message": "Snapshot or chunk not found"}), 404
+    data, checksum = chunk
+    return Response(data, mimetype='application/octet-stream', headers={'X-Checksum-SHA256': checksum})
+
+def fetch_records(conn, table, global_ids):
+    conn.row_factory = sqlite3.Row
+    records = []
+    for start in range(0, len(global_ids), 500):
+        chunk = global_ids[start:start + 500]
+        rows = conn.execute(
+            f"SELECT * FROM {table} WHERE global_id IN ({', '.join(['?'] * len(chunk))})", chunk
+        ).fetchall()
+        records.extend(dict(r) for r in rows)
+    return records
+
+def after_merge(conn, changes, removed=None):
+    """Bring the in-memory views up to date after a committed merge"""
+    today_queue.apply_sync_changes(conn, changes)
+    slot_index.refresh_global_ids(conn, [r.get('global_id') for r in changes.get('Appointment', [])])
+    digest_store.apply_sync_changes(conn, changes)
+    lookup_index.apply_sync_changes(conn, changes)
+    profile_cache.apply_sync_changes(conn, changes)
+    try:
+        # Derived tables: re-score first, the risk rules read the scores
+        scoring_engine.apply_sync_changes(conn, changes, removed)
+        risk_engine.apply_sync_changes(conn, changes, removed)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"[SYNC] Updating scores and risk flags after merge failed: {e}")
+    if removed:
+        # Cascades may have removed more than the tombstones named; rebuild the views
+        today_queue.seed(conn)
+        slot_index.build(conn)
+        digest_store.invalidate()
+        lookup_index.invalidate()
+        profile_cache.clear()
+
+_table_columns = {}
+
+def table_columns(cursor, table):
+    """Local column names (peers may be a schema version ahead or behind)"""
+    if table not in _table_columns:
+        _table_columns[table] = {r[1] for r in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+    return _table_columns[table]
+
+def apply_changes(conn, changes, tombstones, source_node, errors=None):
+    """
+    Merge a peer's records and deletes inside the caller's transaction.
+    Returns (processed, removed). Per-record failures go to errors when given.
+    """
+    cursor = conn.cursor()
+    processed = 0
+    sync_versions.begin_merge(conn, source_node)
+    for table, records in changes.items():
+        if table not in SYNC_TABLES:
+            continue
+        for record in records:
+            try:
+                merge_record(cursor, table, record)
+                processed += 1
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors.append(f"Error processing {table} record {record.get('global_id')}: {str(e)}")
+    removed = sync_tombstones.apply_tombstones(conn, tombstones or [], SYNC_TABLES)
+    processed += sum(len(ids) for ids in removed.values())
+    sync_versions.end_merge(conn)
+    return processed, removed
+
 def merge_record(cursor, table, remote_record):
     """
-    LWW (Last Write Wins) Merge Logic
+    Version vector merge. A remote version that has seen everything the
+    local one has replaces it; concurrent edits are resolved the same way on
+    every node (newest updated_at, then writer node id) and logged to
+    sync_conflict. Rows written before versioning fall back to LWW.
     """
     global_id = remote_record.get('global_id')
     if not global_id:
         return # Skip invalid records
+    if table == oq_items.TABLE:
+        remote_record = oq_items.upgrade_record(remote_record)
+
+    # A delete newer than this version wins; don't resurrect the row
+    if sync_tombstones.is_tombstoned(cursor, global_id, remote_record.get('updated_at')):
+        return
+
+    columns = table_columns(cursor, table)
+    # We filter out 'id' (local PK) and let the local DB assign it
+    cols = [k for k in remote_record.keys() if k != 'id' and k in columns]
     
     # 1. Check if we have this record
-    local_record = cursor.execute(f"SELECT updated_at FROM {table} WHERE global_id = ?", (global_id,)).fetchone()
+    row = cursor.execute(f"SELECT * FROM {table} WHERE global_id = ?", (global_id,)).fetchone()
     
-    should_update = False
-    
-    if local_record is None:
+    if row is None:
         # INSERT
-        should_update = True
-        is_insert = True
-    else:
-        # UPDATE if remote is newer
-        local_updated_at = local_record[0]
-        remote_updated_at = remote_record.get('updated_at')
-        
-        if remote_updated_at > local_updated_at:
-            should_update = True
-            is_insert = False
-    
-    if should_update:
-        # Construct INSERT OR REPLACE query
-        # We filter out 'id' (local PK) because it might conflict or allow auto-increment
-        # Actually, for INSERT, we ignore 'id' and let local DB generate it
-        # For UPDATE, we find by global_id
-        
-        cols = [k for k in remote_record.keys() if k != 'id']
         placeholders = ', '.join(['?'] * len(cols))
-        col_names = ', '.join(cols)
-        
-        values = [remote_record[k] for k in cols]
-        
-        if is_insert:
-            query = f"INSERT INTO {table} ({col_names}) VALUES ({placeholders})"
-            cursor.execute(query, values)
-        else:
-            # Dynamic Update
-            set_clause = ', '.join([f"{col}=?" for col in cols])
-            query = f"UPDATE {table} SET {set_clause} WHERE global_id=?"
-            values.append(global_id)
-            cursor.execute(query, values)
+        cursor.execute(f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({placeholders})",
+                       [remote_record[k] for k in cols])
+        return
+
+    local_record = dict(zip([d[0] for d in cursor.description], row))
+    local_vector = sync_versions.parse_vector(local_record.get('version_vector'))
+    remote_vector = sync_versions.parse_vector(remote_record.get('version_vector'))
+
+    # 2. Decide
+    if not local_vector and not remote_vector:
+        newer = (remote_record.get('updated_at') or '') > (local_record.get('updated_at') or '')
+        relation = 'newer' if newer else 'older'
+    else:
+        relation = sync_versions.compare(remote_vector, local_vector)
+
+    if relation in ('equal', 'older'):
+        return
+    if relation == 'newer':
+        _update_record(cursor, table, cols, remote_record, global_id)
+        return
+
+    # 3. Concurrent edits: deterministic winner, both histories folded into the vector
+    merged = sync_versions.dump_vector(sync_versions.merge_vectors(local_vector, remote_vector))
+    remote_key = sync_versions.conflict_key(remote_record.get('updated_at'), remote_record.get('last_modified_by'), remote_vector)
+    local_key = sync_versions.conflict_key(local_record.get('updated_at'), local_record.get('last_modified_by'), local_vector)
+    if remote_key > local_key:
+        winner, loser = dict(remote_record, version_vector=merged), local_record
+        if 'version_vector' in columns and 'version_vector' not in cols:
+            cols.append('version_vector')
+        _update_record(cursor, table, cols, winner, global_id)
+    else:
+        winner, loser = local_record, remote_record
+        cursor.execute(f"UPDATE {table} SET version_vector = ? WHERE global_id = ?", (merged, global_id))
+    sync_versions.record_conflict(cursor, table, global_id, winner.get('last_modified_by'),
+                                  loser.get('last_modified_by'), loser)
+    # The source has the losing side or an older vector; make sure it gets ours back
+    sync_versions.claim_change(cursor, global_id)
+
+def _update_record(cursor, table, cols, record, global_id):
+    set_clause = ', '.join([f"{col}=?" for col in cols])
+    cursor.execute(f"UPDATE {table} SET {set_clause} WHERE global_id=?", [record[k] for k in cols] + [global_id])
 
 # ==========================================
 # CLIENT LOGIC (Client Side)
@@ -172,94 +381,341 @@ def merge_record(cursor, table, remote_record):
 
 def trigger_sync():
     """
-    Called periodically or manually to run a sync cycle.
+    Called periodically or manually to run a sync cycle with every peer
+    (or only the hub, when one is configured).
     """
     config = node_config.load_config()
-    peer_ip = config.get('peer_ip')
+    targets = node_config.get_sync_targets(config)
     
-    if not peer_ip:
+    if not targets:
         return {"status": "skipped", "message": "No peer IP configured"}
+
+    results = {address: sync_with_peer(address, config) for address in targets}
+    if len(results) == 1:
+        return next(iter(results.values()))
+
+    succeeded = [r for r in results.values() if r.get('status') == 'success']
+    if succeeded:
+        status = 'success'
+    elif all(r.get('status') == 'offline' for r in results.values()):
+        status = 'offline'
+    else:
+        status = 'error'
+    return {
+        "status": status,
+        "message": f"Synced with {len(succeeded)} of {len(results)} peers",
+        "count": sum(r.get('count', 0) for r in succeeded),
+        "peers": results
+    }
+
+def sync_with_peer(address, config=None):
+    """One handshake / (bootstrap) / pull / push cycle against a single peer"""
+    config = config or node_config.load_config()
+    node_id = config.get('node_id')
+    peer_url = peer_base_url(address, config)
+    transport = get_transport(peer_url)
+    transport.reset_timings()
     
-    peer_url = f"http://{peer_ip}:5000/api/sync"
-    
-    # 1. Handshake
+    # 1. Handshake (single attempt: an offline peer is the common case, not an error)
     try:
-        resp = requests.post(f"{peer_url}/handshake", timeout=2)
-        if resp.status_code != 200:
+        with transport.phase('handshake'):
+            handshake_data = transport.post('/handshake', retries=1)
+        if handshake_data.get('status') != 'ok':
             return {"status": "error", "message": "Handshake failed"}
+        peer_node_id = handshake_data.get('node_id')
+        transport.peer_features = handshake_data.get('features', [])
     except Exception as e:
         return {"status": "offline", "message": f"Peer unreachable: {str(e)}"}
+
+    if 'changelog' not in transport.peer_features:
+        return {"status": "error", "message": f"{address} runs an older sync version; update it first"}
+    if peer_node_id == node_id:
+        return {"status": "error", "message": f"{address} is this machine"}
+
+    conn = get_db_connection()
+    try:
+        first_contact = not sync_versions.has_cursors(conn, peer_node_id)
+    finally:
+        conn.close()
         
-    # 2. Pull (Get their changes)
-    # We need to know when we last synced with THEM.
-    # For simplicity, we can store 'last_sync_time' in config or DB.
-    last_sync = config.get(f'last_sync_with_{peer_ip}', '1970-01-01 00:00:00')
-    
+    # 1.5. Bootstrap: a node that has never synced and holds no records adopts
+    # a snapshot in bulk instead of replaying every row as JSON
+    if first_contact and config.get('snapshot_bootstrap', True):
+        with transport.phase('bootstrap'):
+            bootstrap_from_peer(peer_url)
+
+    # 2. Pull (Get their changes since our cursors into their change log)
+    pulled = 0
     try:
-        print(f"Pulling changes since {last_sync}...")
-        pull_resp = requests.post(f"{peer_url}/pull", json={"last_sync_timestamp": last_sync}, timeout=10)
-        pull_data = pull_resp.json()
+        conn = get_db_connection()
+        try:
+            cursors = sync_versions.get_cursors(conn, peer_node_id, 'pull')
+        finally:
+            conn.close()
+
+        with transport.phase('pull'):
+            changes, tombstones, cursors = pull_from_peer(transport, cursors, node_id)
+        pulled = sum(len(v) for v in changes.values()) + len(tombstones)
         
-        if pull_data['status'] == 'success' and pull_data['count'] > 0:
-            # Apply their changes locally using OUR push logic (reusing local API or direct function)
-            # Better to call the function directly
-            
-            # Since we are running in the same app context, we can misuse the 'receive_push' logic 
-            # OR refactor merge_record to be usable directly.
-            # Let's call the local API helper manually or refactor.
-            # I will refactor 'receive_push' logic into a helper 'apply_incoming_changes'.
-            
-            apply_incoming_changes(pull_data['changes'])
-            print(f"Applied {pull_data['count']} incoming changes.")
-            
-        # Update last sync time
-        config[f'last_sync_with_{peer_ip}'] = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-        node_config.save_config(config)
+        with transport.phase('apply'):
+            if pulled > 0:
+                apply_incoming_changes(changes, tombstones, source_node=peer_node_id)
+                print(f"Applied {pulled} incoming changes from {address}.")
+            conn = get_db_connection()
+            try:
+                sync_versions.save_cursors(conn, peer_node_id, 'pull', cursors, address)
+                conn.commit()
+            finally:
+                conn.close()
         
     except Exception as e:
         print(f"Error during PULL: {e}")
-        return {"status": "error", "message": f"Pull failed: {e}"}
+        return {"status": "error", "message": f"Pull failed: {e}", "timings": transport.timings()}
 
-    # 3. Push (Send our changes)
-    # This is tricky: we only want to send changes THEY haven't seen.
-    # But simpler: just send everything changed since last sync time.
-    # Same timestamp 'last_sync' applies.
-    
+    # 3. Push (Send our changes the peer hasn't seen, minus what it sent us)
+    pushed = 0
     try:
-        # Get local changes
-        local_changes = get_local_changes(last_sync)
-        if local_changes:
-            print(f"Pushing {sum(len(v) for v in local_changes.values())} records...")
-            requests.post(f"{peer_url}/push", json={"changes": local_changes}, timeout=10)
+        with transport.phase('push'):
+            pushed = push_to_peer(transport, peer_node_id, node_id, address)
     except Exception as e:
         print(f"Error during PUSH: {e}")
 
-    return {"status": "success", "message": "Sync completed"}
+    timings = transport.timings()
+    if pulled or pushed:
+        print(f"[SYNC] {address}: pulled {pulled}, pushed {pushed}, timings (ms): {timings}")
+    return {"status": "success", "message": "Sync completed", "count": pulled + pushed, "timings": timings}
 
-def apply_incoming_changes(changes):
+def pull_from_peer(transport, cursors, node_id):
+    """
+    Fetch the peer's change log past our cursors, each table on its own
+    request (several at a time over the pooled connections), page by page.
+    Returns (changes, tombstones, new cursors).
+    """
+    def pull(table):
+        table_cursors = {table: cursors.get(table, 0)}
+        records, tombs = [], []
+        while True:
+            body = transport.post('/pull', {"node_id": node_id, "tables": [table], "cursors": table_cursors})
+            if body.get('status') != 'success':
+                raise TransportError(body.get('message', 'Pull failed'))
+            records.extend(body.get('changes', {}).get(table, []))
+            tombs.extend(body.get('tombstones', []))
+            table_cursors.update(body.get('cursors', {}))
+            if table not in body.get('more', []):
+                return table, records, tombs, table_cursors[table]
+
+    changes, tombstones, new_cursors = {}, [], {}
+    with ThreadPoolExecutor(max_workers=min(transport.workers, len(PULL_TABLES))) as pool:
+        for table, records, tombs, seq in pool.map(pull, PULL_TABLES):
+            if records:
+                changes[table] = records
+            tombstones.extend(tombs)
+            new_cursors[table] = seq
+    return changes, tombstones, new_cursors
+
+def push_to_peer(transport, peer_node_id, node_id, address=None):
+    """
+    Send our change log past the peer's push cursor, a page at a time.
+    Rows that came from the peer itself are skipped. Returns records sent.
+    """
+    limit = int(setting(node_config.load_config(), 'sync_page_size'))
+    conn = get_db_connection()
+    try:
+        since = sync_versions.get_cursors(conn, peer_node_id, 'push').get('*', 0)
+    finally:
+        conn.close()
+
+    pushed = 0
+    while True:
+        conn = get_db_connection()
+        try:
+            entries = sync_versions.all_changes_since(conn, since, limit)
+            if not entries:
+                break
+            by_table = {}
+            for seq, table, global_id, source_node in entries:
+                if source_node != peer_node_id:
+                    by_table.setdefault(table, []).append(global_id)
+            tombstones = sync_tombstones.fetch_tombstones(conn, by_table.pop(TOMBSTONES, []))
+            changes = {}
+            for table, global_ids in by_table.items():
+                if table in SYNC_TABLES:
+                    records = fetch_records(conn, table, global_ids)
+                    if records:
+                        changes[table] = records
+        finally:
+            conn.close()
+
+        count = sum(len(v) for v in changes.values()) + len(tombstones)
+        if count:
+            body = transport.post('/push', {"node_id": node_id, "changes": changes, "tombstones": tombstones})
+            if body.get('status') != 'success':
+                raise TransportError(body.get('message', 'Push failed'))
+            pushed += count
+
+        since = entries[-1][0]
+        conn = get_db_connection()
+        try:
+            sync_versions.save_cursors(conn, peer_node_id, 'push', {'*': since}, address)
+            # The peer now holds every delete we logged up to here
+            sync_tombstones.record_ack(conn, peer_node_id, since)
+            conn.commit()
+        finally:
+            conn.close()
+        if len(entries) < limit:
+            break
+    return pushed
+
+def bootstrap_from_peer(peer_url, force=False):
+    """
+    Download the peer's snapshot, verify it chunk by chunk, adopt it and
+    record its change log position so the next pull is incremental.
+    """
     conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        for table, records in changes.items():
-            if table not in SYNC_TABLES: continue
-            for r in records:
-                merge_record(cursor, table, r)
+        if not force and not local_is_empty(conn, SYNC_TABLES):
+            return {"status": "skipped", "message": "Local database already has records"}
+    finally:
+        conn.close()
+
+    started = time.time()
+    snapshot_path = None
+    transport = get_transport(peer_url)
+    try:
+        body = transport.post('/snapshot', timeout=60)
+        if body.get('status') != 'success':
+            return {"status": "error", "message": body.get('message', 'Snapshot request failed')}
+        manifest = body['manifest']
+        snapshot_path = download_snapshot(transport.session, peer_url, manifest)
+
+        conn = get_db_connection()
+        try:
+            adopted = adopt_snapshot(conn, snapshot_path, SYNC_TABLES, source_node=manifest['node_id'])
+            sync_versions.save_cursors(conn, manifest['node_id'], 'pull',
+                                       {table: manifest['cursor'] for table in PULL_TABLES})
+            conn.commit()
+            today_queue.seed(conn)
+            slot_index.build(conn)
+            # Flags for everything adopted (the peer already sent its notifications)
+            risk_engine.backfill(conn)
+        finally:
+            conn.close()
+        digest_store.invalidate()
+        lookup_index.invalidate()
+        profile_cache.clear()
+    except Exception as e:
+        print(f"[SNAPSHOT] Bootstrap failed: {e}")
+        return {"status": "error", "message": f"Bootstrap failed: {e}"}
+    finally:
+        if snapshot_path and os.path.exists(snapshot_path):
+            try:
+                os.remove(snapshot_path)
+            except OSError:
+                pass
+
+    total = sum(adopted.values())
+    print(f"[SNAPSHOT] Adopted {total} records from {manifest['node_id']} in {time.time() - started:.2f}s")
+    return {"status": "success", "count": total, "tables": adopted, "cursor": manifest['cursor']}
+
+def apply_incoming_changes(changes, tombstones=None, source_node=None):
+    conn = get_db_connection()
+    try:
+        processed, removed = apply_changes(conn, changes, tombstones, source_node)
         conn.commit()
+        after_merge(conn, changes, removed)
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         conn.close()
 
-def get_local_changes(timestamp):
+def check_consistency(peer_url=None, repair=True):
+    """
+    Compare digests with each peer (or the given one) and repair only the
+    rows that differ.
+    """
+    if peer_url is not None:
+        return check_peer_consistency(peer_url, repair)
+
+    targets = node_config.get_sync_targets()
+    if not targets:
+        return {"status": "skipped", "message": "No peer IP configured"}
+    results = [check_peer_consistency(peer_base_url(address), repair) for address in targets]
+    if len(results) == 1:
+        return results[0]
+    succeeded = [r for r in results if r.get('status') == 'success']
+    return {"status": "success" if succeeded else results[0].get('status'),
+            "message": "; ".join(r['message'] for r in results if r.get('message')),
+            "count": sum(r.get('count', 0) for r in succeeded)}
+
+def check_peer_consistency(peer_url, repair=True):
+    """
+    Roots are compared first; the walk descends only into mismatching buckets.
+    """
+    transport = get_transport(peer_url)
+    node_id = node_config.get_node_id()
+
+    def remote_digest(payload):
+        body = transport.post('/digest', payload)
+        if body.get('status') != 'success':
+            raise RuntimeError(body.get('message', 'Digest request failed'))
+        return body
+
+    try:
+        remote_roots = remote_digest({})['roots']
+    except Exception as e:
+        return {"status": "offline", "message": f"Peer unreachable: {str(e)}"}
+
     conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    changes = {}
-    total = 0
+    report = {}
     try:
+        local_roots = digest_store.roots(conn, SYNC_TABLES)
         for table in SYNC_TABLES:
-            rows = cursor.execute(f"SELECT * FROM {table} WHERE updated_at > ?", (timestamp,)).fetchall()
-            if rows:
-                changes[table] = [dict(r) for r in rows]
-                total += len(rows)
+            if table not in local_roots or table not in remote_roots:
+                continue
+            if local_roots[table] == remote_roots[table]:
+                continue
+
+            table_digest = digest_store.table(conn, table)
+            pull_ids, push_ids = [], []
+            pending = ['']
+            while pending:
+                prefix = pending.pop()
+                if len(prefix) == BUCKET_DEPTH:
+                    local_rows = table_digest.rows(prefix)
+                    remote_rows = remote_digest({"table": table, "prefix": prefix})['rows']
+                    for gid in set(local_rows) | set(remote_rows):
+                        local_ts = local_rows.get(gid)
+                        remote_ts = remote_rows.get(gid)
+                        if gid not in local_rows or (gid in remote_rows and (remote_ts or '') > (local_ts or '')):
+                            pull_ids.append(gid)
+                        elif gid not in remote_rows or (local_ts or '') > (remote_ts or ''):
+                            push_ids.append(gid)
+                    continue
+                local_children = table_digest.children(prefix)
+                remote_children = remote_digest({"table": table, "prefix": prefix})['buckets']
+                for child in set(local_children) | set(remote_children):
+                    if local_children.get(child) != remote_children.get(child):
+                        pending.append(child)
+
+            report[table] = {"pull": len(pull_ids), "push": len(push_ids)}
+            if not repair:
+                continue
+            if pull_ids:
+                records = transport.post('/rows', {"table": table, "global_ids": pull_ids}).get('records', [])
+                if records:
+                    apply_incoming_changes({table: records})
+            if push_ids:
+                records = fetch_records(conn, table, push_ids)
+                if records:
+                    transport.post('/push', {"node_id": node_id, "changes": {table: records}})
+    except Exception as e:
+        print(f"[DIGEST] Consistency check failed: {e}")
+        return {"status": "error", "message": str(e), "tables": report}
     finally:
         conn.close()
-    return changes if total > 0 else None
+
+    if report:
+        print(f"[DIGEST] {'Repaired' if repair else 'Found'} divergence: {report}")
+    return {"status": "success", "tables": report,
+            "count": sum(t['pull'] + t['push'] for t in report.values())}
@@ -0,0 +1,392 @@
+"""
+Sync simulator and benchmark.
+
+Starts N copies of the app on localhost ports, each with its own database
+and node_config, generates concurrent edits on all of them while they sync
+(optionally through injected latency, dropped requests and partitions), then
+measures how long the nodes take to converge.
+
+    python sync_simulator.py --nodes 3 --topology hub --duration 20 --rate 5
+    python sync_simulator.py --latency-ms 50 --drop-rate 0.05 --partition 1 --json report.json
+
+Exits with status 1 if the nodes did not converge (or took longer than
+--max-convergence-seconds), so it can run as a CI step on Linux.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import requests
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ==========================================
+# NODE SIDE (runs inside each app process)
+# ==========================================
+
+def serve_node(port):
+    """Import the app from this directory, add simulator controls and serve it"""
+    import logging
+    sys.path.insert(0, BASE_DIR)
+    import app as app_module
+    import sync_engine
+    import sync_tombstones
+    from flask import request, jsonify
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    flask_app = app_module.app
+    faults = {'latency_ms': 0, 'drop_rate': 0.0, 'partitioned': False}
+    traffic = {'requests': 0, 'bytes_in': 0, 'bytes_out': 0, 'dropped': 0}
+    traffic_lock = threading.Lock()
+
+    @flask_app.before_request
+    def inject_faults():
+        if not request.path.startswith('/api/sync'):
+            return None
+        if faults['partitioned']:
+            return jsonify({"status": "error", "message": "partitioned"}), 503
+        if faults['latency_ms']:
+            time.sleep(faults['latency_ms'] / 1000.0 * random.uniform(0.5, 1.5))
+        if faults['drop_rate'] and random.random() < faults['drop_rate']:
+            with traffic_lock:
+                traffic['dropped'] += 1
+            return jsonify({"status": "error", "message": "dropped"}), 503
+        return None
+
+    @flask_app.after_request
+    def count_traffic(response):
+        if request.path.startswith('/api/sync') and not response.direct_passthrough:
+            with traffic_lock:
+                traffic['requests'] += 1
+                traffic['bytes_in'] += request.content_length or 0
+                traffic['bytes_out'] += len(response.get_data())
+        return response
+
+    @flask_app.route('/_sim/fault', methods=['POST'])
+    def sim_fault():
+        faults.update(request.get_json() or {})
+        return jsonify(faults)
+
+    @flask_app.route('/_sim/sync', methods=['POST'])
+    def sim_sync():
+        started = time.perf_counter()
+        result = sync_engine.trigger_sync()
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return jsonify(result)
+
+    @flask_app.route('/_sim/edit', methods=['POST'])
+    def sim_edit():
+        """Apply a batch of random local edits: inserts, updates and deletes of students"""
+        data = request.get_json() or {}
+        counts = {'insert': 0, 'update': 0, 'delete': 0}
+        conn = app_module.get_db_connection()
+        try:
+            ids = [r[0] for r in conn.execute("SELECT id FROM Student").fetchall()]
+            for _ in range(int(data.get('count', 1))):
+                roll = random.random()
+                if ids and roll < data.get('delete_ratio', 0.05):
+                    student_id = ids.pop(random.randrange(len(ids)))
+                    sync_tombstones.cascade_delete(conn, 'Student', 'id = ?', (student_id,))
+                    counts['delete'] += 1
+                elif ids and roll < data.get('delete_ratio', 0.05) + data.get('update_ratio', 0.5):
+                    conn.execute("UPDATE Student SET department = ? WHERE id = ?",
+                                 (f"dept-{uuid.uuid4().hex[:6]}", random.choice(ids)))
+                    counts['update'] += 1
+                else:
+                    conn.execute(
+                        "INSERT INTO Student (name, index_number, department, programme) VALUES (?, ?, ?, ?)",
+                        (f"sim-{uuid.uuid4().hex}", uuid.uuid4().hex[:10], 'sim', 'sim'))
+                    counts['insert'] += 1
+            conn.commit()
+        finally:
+            conn.close()
+        return jsonify(counts)
+
+    @flask_app.route('/_sim/state', methods=['GET'])
+    def sim_state():
+        conn = app_module.get_db_connection()
+        try:
+            roots = sync_engine.digest_store.roots(conn, sync_engine.SYNC_TABLES)
+            conflicts = conn.execute("SELECT COUNT(*) FROM sync_conflict").fetchone()[0]
+            students = conn.execute("SELECT COUNT(*) FROM Student").fetchone()[0]
+        finally:
+            conn.close()
+        with traffic_lock:
+            stats = dict(traffic)
+        return jsonify({"roots": roots, "conflicts": conflicts, "students": students, "traffic": stats})
+
+    flask_app.run(host='127.0.0.1', port=port, threaded=True, use_reloader=False)
+
+# ==========================================
+# CONTROLLER SIDE
+# ==========================================
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class SimNode:
+    def __init__(self, index, root):
+        self.index = index
+        self.name = f"node{index}"
+        self.node_id = f"NODE_SIM{index:02d}"
+        self.dir = os.path.join(root, self.name)
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.address = f"127.0.0.1:{self.port}"
+        self.process = None
+        self.http = requests.Session()
+
+    def prepare(self, seed_db, config):
+        """Private copy of the code and database; the app locates its data next to app.py"""
+        os.makedirs(self.dir)
+        for name in os.listdir(BASE_DIR):
+            if name.endswith('.py'):
+                shutil.copy2(os.path.join(BASE_DIR, name), self.dir)
+        shutil.copytree(os.path.join(BASE_DIR, 'templates'), os.path.join(self.dir, 'templates'))
+        shutil.copy2(seed_db, os.path.join(self.dir, 'counseling.db'))
+        config = dict(config, node_id=self.node_id, node_role='SIMULATED')
+        with open(os.path.join(self.dir, 'node_config.json'), 'w') as f:
+            json.dump(config, f, indent=4)
+
+    def start(self):
+        log = open(os.path.join(self.dir, 'node.log'), 'w')
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(self.dir, 'sync_simulator.py'), '--serve-node', str(self.port)],
+            cwd=self.dir, stdout=log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout=60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited; see {self.dir}/node.log")
+            try:
+                self.http.post(f"{self.url}/api/sync/handshake", timeout=1)
+                return
+            except requests.RequestException:
+                time.sleep(0.2)
+        raise RuntimeError(f"{self.name} did not start within {timeout}s")
+
+    def call(self, method, path, payload=None, timeout=120):
+        resp = self.http.request(method, f"{self.url}{path}", json=payload, timeout=timeout)
+        return resp.json()
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+class Simulation:
+    def __init__(self, args):
+        self.args = args
+        self.root = tempfile.mkdtemp(prefix='sync_sim_')
+        self.nodes = [SimNode(i, self.root) for i in range(args.nodes)]
+        self.sync_results = []
+        self.edits = {'insert': 0, 'update': 0, 'delete': 0}
+        self.lock = threading.Lock()
+
+    def configure(self):
+        seed_db = self.args.seed_db or os.path.join(BASE_DIR, 'counseling.db')
+        for node in self.nodes:
+            config = {
+                "peer_ip": "",
+                "peers": [],
+                "sync_hub": "",
+                "sync_enabled": True,
+                "snapshot_bootstrap": True,
+                "sync_retries": 3,
+                "sync_read_timeout": 30,
+                "consistency_check_interval_seconds": 0,
+            }
+            if self.args.topology == 'hub':
+                if node.index != 0:
+                    config["sync_hub"] = self.nodes[0].address
+            else:
+                config["peers"] = [other.address for other in self.nodes if other is not node]
+            node.prepare(seed_db, config)
+
+    def sync(self, node):
+        result = node.call('POST', '/_sim/sync')
+        with self.lock:
+            self.sync_results.append(result)
+        return result
+
+    def syncing_nodes(self):
+        if self.args.topology == 'hub':
+            return self.nodes[1:]
+        return self.nodes
+
+    def set_faults(self, node, **faults):
+        node.call('POST', '/_sim/fault', faults)
+
+    def run_load(self):
+        """Edits and syncs on every node concurrently for --duration seconds"""
+        stop_at = time.time() + self.args.duration
+        partitioned = self.nodes[-self.args.partition:] if self.args.partition else []
+        heal_at = time.time() + self.args.duration / 2
+
+        for node in partitioned:
+            self.set_faults(node, partitioned=True)
+
+        def worker(node):
+            next_sync = time.time() + random.uniform(0, self.args.sync_interval)
+            while time.time() < stop_at:
+                if partitioned and time.time() >= heal_at and node in partitioned:
+                    self.set_faults(node, partitioned=False)
+                counts = node.call('POST', '/_sim/edit', {
+                    'count': max(1, int(self.args.rate * self.args.tick)),
+                    'update_ratio': self.args.update_ratio,
+                    'delete_ratio': self.args.delete_ratio,
+                })
+                with self.lock:
+                    for key, value in counts.items():
+                        self.edits[key] += value
+                if node in self.syncing_nodes() and time.time() >= next_sync:
+                    if not (node in partitioned and time.time() < heal_at):
+                        self.sync(node)
+                    next_sync = time.time() + self.args.sync_interval
+                time.sleep(self.args.tick)
+
+        threads = [threading.Thread(target=worker, args=(node,), daemon=True) for node in self.nodes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for node in partitioned:
+            self.set_faults(node, partitioned=False)
+
+    def converge(self):
+        """Sync rounds until every node reports the same digest roots; returns (seconds, rounds)"""
+        started = time.time()
+        for rounds in range(1, self.args.max_rounds + 1):
+            for node in self.syncing_nodes():
+                self.sync(node)
+            roots = [json.dumps(node.call('GET', '/_sim/state')['roots'], sort_keys=True) for node in self.nodes]
+            if len(set(roots)) == 1:
+                return time.time() - started, rounds
+        return None, self.args.max_rounds
+
+    def cycle_timings(self):
+        """Per-peer timings of every sync cycle (multi-peer results nest them)"""
+        for result in self.sync_results:
+            peers = result.get('peers')
+            for peer_result in (peers.values() if peers else [result]):
+                yield peer_result.get('timings', {})
+
+    def report(self, convergence, rounds, load_seconds):
+        states = {node.name: node.call('GET', '/_sim/state') for node in self.nodes}
+        merged = sum(r.get('count', 0) for r in self.sync_results if r.get('status') == 'success')
+        apply_ms = sum(timings.get('apply', 0) for timings in self.cycle_timings())
+        sync_ms = sum(r.get('elapsed_ms', 0) for r in self.sync_results)
+        return {
+            "nodes": self.args.nodes,
+            "topology": self.args.topology,
+            "faults": {"latency_ms": self.args.latency_ms, "drop_rate": self.args.drop_rate,
+                       "partitioned_nodes": self.args.partition},
+            "load_seconds": round(load_seconds, 2),
+            "edits": self.edits,
+            "converged": convergence is not None,
+            "convergence_seconds": round(convergence, 3) if convergence is not None else None,
+            "convergence_rounds": rounds,
+            "sync_cycles": len(self.sync_results),
+            "failed_cycles": sum(1 for r in self.sync_results if r.get('status') != 'success'),
+            "rows_transferred": merged,
+            "rows_per_second": round(merged / (sync_ms / 1000.0), 1) if sync_ms else 0,
+            "apply_rows_per_second": round(merged / (apply_ms / 1000.0), 1) if apply_ms else 0,
+            "bytes_in": sum(s['traffic']['bytes_in'] for s in states.values()),
+            "bytes_out": sum(s['traffic']['bytes_out'] for s in states.values()),
+            "requests": sum(s['traffic']['requests'] for s in states.values()),
+            "dropped_requests": sum(s['traffic']['dropped'] for s in states.values()),
+            "conflicts": {name: s['conflicts'] for name, s in states.items()},
+            "students": {name: s['students'] for name, s in states.items()},
+        }
+
+    def run(self):
+        try:
+            print(f"[SIM] Starting {self.args.nodes} nodes ({self.args.topology}) in {self.root}")
+            self.configure()
+            for node in self.nodes:
+                node.start()
+            for node in self.nodes:
+                node.wait_ready()
+            for node in self.nodes:
+                self.set_faults(node, latency_ms=self.args.latency_ms, drop_rate=self.args.drop_rate)
+
+            print(f"[SIM] Generating load for {self.args.duration}s")
+            load_started = time.time()
+            self.run_load()
+            load_seconds = time.time() - load_started
+
+            # Converge on a healthy network so the number measures sync, not the faults
+            for node in self.nodes:
+                self.set_faults(node, latency_ms=self.args.latency_ms, drop_rate=0.0)
+            print("[SIM] Waiting for convergence")
+            convergence, rounds = self.converge()
+            return self.report(convergence, rounds, load_seconds)
+        finally:
+            for node in self.nodes:
+                node.stop()
+            if not self.args.keep:
+                shutil.rmtree(self.root, ignore_errors=True)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate and benchmark sync between local app instances")
+    parser.add_argument('--serve-node', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    parser.add_argument('--nodes', type=int, default=2)
+    parser.add_argument('--topology', choices=['mesh', 'hub'], default='mesh')
+    parser.add_argument('--duration', type=float, default=10, help="seconds of concurrent edits")
+    parser.add_argument('--rate', type=float, default=5, help="edits per second per node")
+    parser.add_argument('--tick', type=float, default=0.2, help="seconds between edit batches")
+    parser.add_argument('--sync-interval', type=float, default=2, help="seconds between syncs per node")
+    parser.add_argument('--update-ratio', type=float, default=0.5)
+    parser.add_argument('--delete-ratio', type=float, default=0.05)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="share of sync requests answered with 503")
+    parser.add_argument('--partition', type=int, default=0, help="nodes cut off for the first half of the run")
+    parser.add_argument('--max-rounds', type=int, default=10)
+    parser.add_argument('--max-convergence-seconds', type=float, default=None)
+    parser.add_argument('--seed-db', help="database every node starts from (default: counseling.db)")
+    parser.add_argument('--json', help="write the report to this file")
+    parser.add_argument('--keep', action='store_true', help="keep node directories for inspection")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.serve_node:
+        serve_node(args.serve_node)
+        return 0
+    if args.nodes < 2:
+        print("[SIM] Need at least two nodes")
+        return 2
+
+    report = Simulation(args).run()
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if not report['converged']:
+        print(f"[SIM] FAILED: nodes did not converge within {args.max_rounds} rounds")
+        return 1
+    if args.max_convergence_seconds is not None and report['convergence_seconds'] > args.max_convergence_seconds:
+        print(f"[SIM] FAILED: convergence took {report['convergence_seconds']}s "
+              f"(limit {args.max_convergence_seconds}s)")
+        return 1
+    print(f"[SIM] Converged in {report['convergence_seconds']}s over {report['convergence_rounds']} rounds")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
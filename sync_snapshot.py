@@ -0,0 +1,237 @@
+import os
+import sys
+import glob
+import time
+import uuid
+import zlib
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+import sync_versions
+import oq_items
+
+CHUNK_SIZE = 1024 * 1024        # compressed bytes per transfer chunk
+SNAPSHOT_TTL_SECONDS = 600      # reuse a snapshot for peers bootstrapping close together
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def get_base_path():
+    """Get base path for data files"""
+    try:
+        if getattr(sys, 'frozen', False):
+            return os.path.dirname(sys.executable)
+        else:
+            return os.path.dirname(os.path.abspath(__file__))
+    except:
+        return os.path.dirname(os.path.abspath(__file__))
+
+SNAPSHOT_DIR = os.path.join(get_base_path(), "app_data", "snapshots")
+
+def get_db_connection():
+    # Helper to get DB connection (reused logic)
+    import app
+    return app.get_db_connection()
+
+def _sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(block)
+    return h.hexdigest()
+
+# ==========================================
+# SERVER SIDE: produce snapshots
+# ==========================================
+
+class SnapshotBuilder:
+    """Builds and serves compressed, chunked copies of the synced tables"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = None
+
+    def manifest(self, tables, node_id):
+        """Manifest of a fresh (or recently built) snapshot"""
+        with self._lock:
+            current = self._current
+            if current and time.time() - current['built_at'] < SNAPSHOT_TTL_SECONDS \
+                    and os.path.exists(current['path']):
+                return current['manifest']
+            self._current = self._build(tables, node_id)
+            return self._current['manifest']
+
+    def chunk(self, snapshot_id, index):
+        """(bytes, sha256) of one chunk, or None if the snapshot is gone"""
+        current = self._current
+        if not current or current['manifest']['snapshot_id'] != snapshot_id:
+            return None
+        manifest = current['manifest']
+        if index < 0 or index >= len(manifest['chunks']):
+            return None
+        with open(current['path'], 'rb') as f:
+            f.seek(index * CHUNK_SIZE)
+            data = f.read(CHUNK_SIZE)
+        return data, manifest['chunks'][index]
+
+    def _build(self, tables, node_id):
+        started = time.time()
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        for old in glob.glob(os.path.join(SNAPSHOT_DIR, 'snapshot_*')):
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+        snapshot_id = uuid.uuid4().hex
+        db_copy = os.path.join(SNAPSHOT_DIR, f'snapshot_{snapshot_id}.db')
+        packed = os.path.join(SNAPSHOT_DIR, f'snapshot_{snapshot_id}.z')
+
+        # 1. Consistent copy of the live database (readers and writers keep going)
+        source = get_db_connection()
+        target = sqlite3.connect(db_copy)
+        try:
+            source.backup(target, pages=1024)
+        finally:
+            source.close()
+
+        try:
+            # 2. Change log position: everything after this is picked up incrementally
+            try:
+                cursor = target.execute("SELECT COALESCE(MAX(seq), 0) FROM sync_changelog").fetchone()[0]
+            except sqlite3.OperationalError:
+                cursor = 0
+
+            # 3. Keep only synced tables (users, audit logs etc. never leave the node)
+            # SQLite table names are case-insensitive ('Session' vs 'session')
+            existing = {r[0].lower(): r[0] for r in target.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")}
+            synced = {name.lower() for name in tables}
+            for key, name in existing.items():
+                if key not in synced:
+                    target.execute(f'DELETE FROM "{name}"')
+            target.commit()
+            target.execute("VACUUM")
+        finally:
+            target.close()
+
+        # 4. Compress and checksum per chunk
+        raw_size = os.path.getsize(db_copy)
+        compressor = zlib.compressobj(6)
+        with open(db_copy, 'rb') as src, open(packed, 'wb') as dst:
+            for block in iter(lambda: src.read(CHUNK_SIZE), b''):
+                dst.write(compressor.compress(block))
+            dst.write(compressor.flush())
+        os.remove(db_copy)
+
+        chunks = []
+        with open(packed, 'rb') as f:
+            for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+                chunks.append(hashlib.sha256(block).hexdigest())
+
+        manifest = {
+            'snapshot_id': snapshot_id,
+            'node_id': node_id,
+            'created_at': datetime.utcnow().strftime(TIMESTAMP_FORMAT),
+            'cursor': cursor,
+            'tables': list(tables),
+            'raw_size': raw_size,
+            'compressed_size': os.path.getsize(packed),
+            'chunk_size': CHUNK_SIZE,
+            'chunks': chunks,
+            'sha256': _sha256_file(packed),
+        }
+        print(f"[SNAPSHOT] Built {snapshot_id[:8]} ({raw_size // 1024} KB -> "
+              f"{manifest['compressed_size'] // 1024} KB, {len(chunks)} chunks) in {time.time() - started:.2f}s")
+        return {'manifest': manifest, 'path': packed, 'built_at': time.time()}
+
+snapshot_builder = SnapshotBuilder()
+
+# ==========================================
+# CLIENT SIDE: download and adopt
+# ==========================================
+
+def local_is_empty(conn, tables):
+    """A node is bootstrappable if it holds no synced records of its own yet"""
+    for name in tables:
+        if name == 'app_settings':
+            continue  # seeded with defaults on every install
+        try:
+            if conn.execute(f"SELECT 1 FROM {name} LIMIT 1").fetchone():
+                return False
+        except sqlite3.OperationalError:
+            continue
+    return True
+
+def download_snapshot(session, peer_url, manifest, retries=3, timeout=30):
+    """Fetch every chunk, verify it, and return the path of the decompressed database"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    snapshot_id = manifest['snapshot_id']
+    packed = os.path.join(SNAPSHOT_DIR, f'incoming_{snapshot_id}.z')
+    db_path = os.path.join(SNAPSHOT_DIR, f'incoming_{snapshot_id}.db')
+
+    with open(packed, 'wb') as out:
+        for index, expected in enumerate(manifest['chunks']):
+            for attempt in range(1, retries + 1):
+                resp = session.get(f"{peer_url}/snapshot/{snapshot_id}/{index}", timeout=timeout)
+                if resp.status_code == 200 and hashlib.sha256(resp.content).hexdigest() == expected:
+                    out.write(resp.content)
+                    break
+                print(f"[SNAPSHOT] Chunk {index} failed verification (attempt {attempt})")
+            else:
+                raise RuntimeError(f"Chunk {index} could not be downloaded intact")
+
+    if _sha256_file(packed) != manifest['sha256']:
+        raise RuntimeError("Snapshot checksum mismatch")
+
+    decompressor = zlib.decompressobj()
+    with open(packed, 'rb') as src, open(db_path, 'wb') as dst:
+        for block in iter(lambda: src.read(CHUNK_SIZE), b''):
+            dst.write(decompressor.decompress(block))
+        dst.write(decompressor.flush())
+    os.remove(packed)
+    return db_path
+
+def adopt_snapshot(conn, snapshot_path, tables, source_node=None):
+    """
+    Replace the synced tables with the snapshot's rows in one transaction.
+    Local row ids are kept from the peer so foreign keys stay consistent, and
+    versions are kept as they are (the rows are logged as coming from the peer).
+    Returns {table: rows adopted}.
+    """
+    adopted = {}
+    previous_isolation = conn.isolation_level
+    conn.isolation_level = None  # explicit transaction below
+    conn.execute("ATTACH DATABASE ? AS snap", (snapshot_path,))
+    try:
+        snap_tables = {r[0].lower() for r in conn.execute("SELECT name FROM snap.sqlite_master WHERE type='table'")}
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            sync_versions.begin_merge(conn, source_node)
+            for name in tables:
+                if name.lower() not in snap_tables:
+                    continue
+                local_cols = [r[1] for r in conn.execute(f"PRAGMA main.table_info({name})")]
+                snap_cols = {r[1] for r in conn.execute(f"PRAGMA snap.table_info({name})")}
+                cols = [c for c in local_cols if c in snap_cols]
+                if not cols:
+                    continue
+                values = list(cols)
+                if name == oq_items.TABLE and 'items' in local_cols and 'items' not in snap_cols:
+                    # Peer still stores one column per item
+                    legacy = [c for c in oq_items.LEGACY_COLUMNS if c in snap_cols]
+                    if legacy:
+                        cols.append('items')
+                        values.append(oq_items.pack_sql(legacy))
+                conn.execute(f"DELETE FROM main.{name}")
+                cur = conn.execute(f"INSERT INTO main.{name} ({', '.join(cols)}) "
+                                   f"SELECT {', '.join(values)} FROM snap.{name}")
+                adopted[name] = cur.rowcount
+            sync_versions.end_merge(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.execute("DETACH DATABASE snap")
+        conn.isolation_level = previous_isolation
+    return adopted
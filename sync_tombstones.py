@@ -0,0 +1,146 @@
+from datetime import datetime
+import node_config
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Parent -> [(child table, foreign key)] for synced tables. Deleting a parent
+# removes (and tombstones) everything below it, children first.
+CASCADE = {
+    'Student': [('Appointment', 'student_id'), ('DASS21', 'student_id'), ('OutcomeQuestionnaire', 'student_id')],
+    'Appointment': [('session', 'appointment_id')],
+    'session': [('Referral', 'session_id'), ('CaseManagement', 'session_id'),
+                ('Feedback', 'session_id'), ('SessionIssue', 'session_id')],
+}
+
+def now_timestamp():
+    return datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+
+def ensure_schema(conn):
+    """Tombstones record deletes so peers can replay them; acks say who has seen them"""
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS sync_tombstone (
+            global_id TEXT PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            deleted_at TIMESTAMP NOT NULL,
+            origin_node TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_sync_tombstone_deleted_at ON sync_tombstone(deleted_at);
+
+        CREATE TABLE IF NOT EXISTS sync_peer_ack (
+            node_id TEXT PRIMARY KEY,
+            acked_through INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        -- Acks used to be timestamps; they are change log positions now
+        DELETE FROM sync_peer_ack WHERE typeof(acked_through) != 'integer';
+    ''')
+
+def cascade_delete(conn, table, where, params=(), deleted_at=None, origin_node=None):
+    """
+    Tombstone and delete every row of `table` matching `where`, plus all
+    dependent rows, with one INSERT ... SELECT and one DELETE per table.
+    Returns {table: rows deleted}. The caller commits.
+    """
+    deleted_at = deleted_at or now_timestamp()
+    origin_node = origin_node or node_config.get_node_id()
+    counts = {}
+    _cascade(conn, table, where, tuple(params), deleted_at, origin_node, counts)
+    return counts
+
+def _cascade(conn, table, where, params, deleted_at, origin_node, counts):
+    parent_ids = f"SELECT id FROM {table} WHERE {where}"
+    for child, foreign_key in CASCADE.get(table, []):
+        _cascade(conn, child, f"{foreign_key} IN ({parent_ids})", params, deleted_at, origin_node, counts)
+
+    conn.execute(f'''
+        INSERT OR REPLACE INTO sync_tombstone (global_id, table_name, deleted_at, origin_node)
+        SELECT global_id, ?, ?, ? FROM {table} WHERE global_id IS NOT NULL AND ({where})
+    ''', (table, deleted_at, origin_node) + params)
+    removed = conn.execute(f"DELETE FROM {table} WHERE {where}", params).rowcount
+    if removed:
+        counts[table] = counts.get(table, 0) + removed
+
+def fetch_tombstones(conn, global_ids):
+    tombstones = []
+    for start in range(0, len(global_ids), 500):
+        chunk = global_ids[start:start + 500]
+        rows = conn.execute(
+            "SELECT global_id, table_name, deleted_at, origin_node FROM sync_tombstone "
+            f"WHERE global_id IN ({', '.join(['?'] * len(chunk))})", chunk
+        ).fetchall()
+        tombstones.extend(dict(global_id=r[0], table_name=r[1], deleted_at=r[2], origin_node=r[3]) for r in rows)
+    return tombstones
+
+def is_tombstoned(cursor, global_id, updated_at):
+    """True if a delete at or after updated_at exists (LWW: the delete wins)"""
+    row = cursor.execute("SELECT deleted_at FROM sync_tombstone WHERE global_id = ?", (global_id,)).fetchone()
+    if row is None:
+        return False
+    if updated_at and updated_at > row[0]:
+        # Edited after the delete on the other node: the edit wins, forget the delete
+        cursor.execute("DELETE FROM sync_tombstone WHERE global_id = ?", (global_id,))
+        return False
+    return True
+
+def apply_tombstones(conn, tombstones, tables):
+    """
+    Replay a peer's deletes. Rows edited locally after the delete survive.
+    Returns {table: [global_id, ...]} of rows actually removed. The caller commits.
+    """
+    removed = {}
+    for tomb in tombstones:
+        table = tomb.get('table_name')
+        global_id = tomb.get('global_id')
+        deleted_at = tomb.get('deleted_at')
+        if table not in tables or not global_id or not deleted_at:
+            continue
+        local = conn.execute(f"SELECT updated_at FROM {table} WHERE global_id = ?", (global_id,)).fetchone()
+        if local is not None and local[0] and local[0] > deleted_at:
+            continue
+        if local is None:
+            # Nothing to delete, but remember the delete so the row can't come back
+            conn.execute('''
+                INSERT INTO sync_tombstone (global_id, table_name, deleted_at, origin_node)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(global_id) DO UPDATE SET deleted_at = MAX(deleted_at, excluded.deleted_at)
+            ''', (global_id, table, deleted_at, tomb.get('origin_node')))
+            continue
+        cascade_delete(conn, table, "global_id = ?", (global_id,), deleted_at, tomb.get('origin_node'))
+        removed.setdefault(table, []).append(global_id)
+    return removed
+
+def record_ack(conn, node_id, acked_through):
+    """Peer node_id has received our deletes up to change log position acked_through"""
+    if not node_id or not acked_through:
+        return
+    conn.execute('''
+        INSERT INTO sync_peer_ack (node_id, acked_through, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(node_id) DO UPDATE SET
+            acked_through = MAX(acked_through, excluded.acked_through),
+            updated_at = CURRENT_TIMESTAMP
+    ''', (node_id, int(acked_through)))
+
+def purge_acknowledged(conn, targets=None):
+    """
+    Drop tombstones every peer has already received: each configured sync
+    target (node_config.get_sync_targets()) and any other node that has
+    acknowledged. A target that has never acknowledged blocks the purge.
+    """
+    targets = node_config.get_sync_targets() if targets is None else targets
+    acks = {row[0]: row[1] for row in conn.execute("SELECT node_id, acked_through FROM sync_peer_ack")}
+    for address in targets:
+        # Acks are per node id; the cursors remember which node answered at an address
+        row = conn.execute(
+            "SELECT peer_node_id FROM sync_peer_cursor WHERE peer_address = ? ORDER BY updated_at DESC LIMIT 1",
+            (address,)
+        ).fetchone()
+        if row is None or row[0] not in acks:
+            return 0  # that peer may still need every delete we hold
+    if not acks or not min(acks.values()):
+        return 0  # no peer has ever acknowledged anything; keep them all
+    cutoff = min(acks.values())
+    acked = "SELECT global_id FROM sync_changelog WHERE table_name = 'sync_tombstone' AND seq <= ?"
+    purged = conn.execute(f"DELETE FROM sync_tombstone WHERE global_id IN ({acked})", (cutoff,)).rowcount
+    conn.execute(f"DELETE FROM sync_changelog WHERE global_id IN ({acked})", (cutoff,))
+    return purged
@@ -0,0 +1,144 @@
+import gzip
+import json
+import time
+import random
+import threading
+from contextlib import contextmanager
+import node_config
+# requests is imported on first use: most launches never talk to a peer
+# before the login page is up
+
+# node_config keys and defaults
+DEFAULTS = {
+    'peer_port': 5000,
+    'sync_connect_timeout': 3,      # seconds
+    'sync_read_timeout': 15,        # seconds
+    'sync_retries': 3,              # attempts per request
+    'sync_pull_workers': 4,         # tables pulled concurrently
+    'sync_compress_min_bytes': 1024,
+    'sync_page_size': 2000,         # change log entries per pull/push request
+}
+
+RETRY_STATUSES = (502, 503, 504)
+BACKOFF_BASE_SECONDS = 0.25
+
+class TransportError(Exception):
+    pass
+
+def setting(config, key):
+    value = config.get(key, DEFAULTS[key])
+    return DEFAULTS[key] if value in (None, '') else value
+
+def peer_base_url(peer_ip, config=None):
+    """http://<peer>:<peer_port>/api/sync (peer_ip may already carry a port)"""
+    config = config or node_config.load_config()
+    host = str(peer_ip).strip()
+    if ':' not in host:
+        host = f"{host}:{int(setting(config, 'peer_port'))}"
+    return f"http://{host}/api/sync"
+
+def compress_body(payload, min_bytes):
+    """JSON-encode a request body, gzipping it when it is worth it"""
+    body = json.dumps(payload).encode('utf-8')
+    headers = {'Content-Type': 'application/json'}
+    if len(body) >= min_bytes:
+        body = gzip.compress(body, compresslevel=5)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
+
+def decode_body(raw, content_encoding):
+    """Inverse of compress_body, used by the sync endpoints"""
+    if raw and (content_encoding or '').lower() == 'gzip':
+        raw = gzip.decompress(raw)
+    return json.loads(raw) if raw else {}
+
+class SyncTransport:
+    """
+    Keep-alive HTTP client for one peer. Every call is retried with jittered
+    exponential backoff and its time is added to the phase it ran in.
+    """
+
+    def __init__(self, base_url, config=None):
+        config = config or node_config.load_config()
+        self.base_url = base_url
+        self.timeout = (float(setting(config, 'sync_connect_timeout')), float(setting(config, 'sync_read_timeout')))
+        self.retries = max(int(setting(config, 'sync_retries')), 1)
+        self.workers = max(int(setting(config, 'sync_pull_workers')), 1)
+        self.compress_min = int(setting(config, 'sync_compress_min_bytes'))
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers + 1, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip'})
+        self.peer_features = []  # filled in from the handshake
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    # ---------- Requests ----------
+
+    def post(self, path, payload=None, timeout=None, retries=None):
+        # Peers that predate compression can't read gzipped bodies
+        min_bytes = self.compress_min if 'gzip' in self.peer_features else float('inf')
+        body, headers = compress_body(payload or {}, min_bytes)
+        resp = self._send('POST', path, data=body, headers=headers, timeout=timeout, retries=retries)
+        try:
+            return resp.json()
+        except ValueError:
+            raise TransportError(f"{path}: invalid response (HTTP {resp.status_code})")
+
+    def get(self, path, timeout=None, retries=None):
+        return self._send('GET', path, timeout=timeout, retries=retries)
+
+    def _send(self, method, path, timeout=None, retries=None, **kwargs):
+        import requests
+        url = f"{self.base_url}{path}"
+        retries = retries or self.retries
+        last_error = None
+        for attempt in range(retries):
+            try:
+                resp = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+                if resp.status_code not in RETRY_STATUSES:
+                    return resp
+                last_error = TransportError(f"{path}: HTTP {resp.status_code}")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+            if attempt < retries - 1:
+                # Full jitter keeps both PCs from retrying in lockstep
+                time.sleep(random.uniform(0, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+        raise TransportError(f"{path} failed after {retries} attempts: {last_error}")
+
+    # ---------- Timings ----------
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._timings[name] = round(self._timings.get(name, 0) + elapsed, 1)
+
+    def reset_timings(self):
+        with self._lock:
+            self._timings = {}
+
+    def timings(self):
+        with self._lock:
+            return dict(self._timings)
+
+    def close(self):
+        self.session.close()
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+def get_transport(base_url):
+    """Shared transport per peer, so the keep-alive pool survives between cycles"""
+    config = node_config.load_config()
+    with _transports_lock:
+        transport = _transports.get(base_url)
+        if transport is None:
+            transport = _transports[base_url] = SyncTransport(base_url, config)
+        return transport
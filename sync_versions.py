@@ -0,0 +1,284 @@
+import json
+import re
+import uuid
+import node_config
+
+# Pseudo table name under which deletes appear in the change log
+TOMBSTONES = 'sync_tombstone'
+
+# Columns every synced table needs for versioning
+VERSION_COLUMNS = [
+    ('global_id', 'TEXT'),
+    ('updated_at', 'TIMESTAMP'),
+    ('last_modified_by', 'TEXT'),
+    ('version_vector', 'TEXT'),
+]
+
+# Sync bookkeeping columns, left out when deriving ids for legacy rows
+SYNC_COLUMNS = {'global_id', 'updated_at', 'last_modified_by', 'version_vector', 'sync_status'}
+
+LEGACY_ID_NAMESPACE = uuid.UUID('5b0c6a52-3f1e-4d57-9a55-2f0f3c1d7e10')
+
+# uuid4-shaped id generated inside SQLite (rows inserted by the app carry none)
+UUID_SQL = ("lower(hex(randomblob(4)) || '-' || hex(randomblob(2)) || '-4' || substr(hex(randomblob(2)), 2) || '-' || "
+            "substr('89ab', 1 + (abs(random()) % 4), 1) || substr(hex(randomblob(2)), 2) || '-' || hex(randomblob(6)))")
+
+NOW_SQL = "strftime('%Y-%m-%d %H:%M:%S', 'now')"
+
+GUARD_SQL = "EXISTS (SELECT 1 FROM sync_merge_guard)"
+
+def ensure_schema(conn, tables, node_id=None):
+    """
+    Change log, per-peer cursors, conflict log and the triggers that stamp
+    local writes. Triggers embed the node id, so they are recreated on
+    every start. The caller commits.
+    """
+    node_id = node_id or node_config.get_node_id()
+    if not re.fullmatch(r'[A-Za-z0-9_\-]+', str(node_id)):
+        raise ValueError(f"Unsupported node id for sync triggers: {node_id!r}")
+
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS sync_changelog (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            global_id TEXT NOT NULL UNIQUE,
+            table_name TEXT NOT NULL,
+            source_node TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_sync_changelog_table_seq ON sync_changelog(table_name, seq);
+
+        CREATE TABLE IF NOT EXISTS sync_merge_guard (source_node TEXT);
+        DELETE FROM sync_merge_guard;
+
+        CREATE TABLE IF NOT EXISTS sync_peer_cursor (
+            peer_node_id TEXT NOT NULL,
+            direction TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            seq INTEGER NOT NULL DEFAULT 0,
+            peer_address TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (peer_node_id, direction, table_name)
+        );
+
+        CREATE TABLE IF NOT EXISTS sync_conflict (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            global_id TEXT NOT NULL,
+            winner_node TEXT,
+            loser_node TEXT,
+            loser_record TEXT,
+            resolved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+
+    seed = conn.execute("SELECT COUNT(*) FROM sync_changelog").fetchone()[0] == 0
+    for table in tables:
+        existing = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+        if not existing:
+            continue
+        for column, column_type in VERSION_COLUMNS:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        _create_triggers(conn, table, node_id)
+        if seed:
+            # First run with a change log: every existing row counts as changed once
+            conn.execute(f'''
+                INSERT OR IGNORE INTO sync_changelog (global_id, table_name)
+                SELECT global_id, ? FROM {table} WHERE global_id IS NOT NULL ORDER BY updated_at
+            ''', (table,))
+        backfill_global_ids(conn, table)
+
+    _create_tombstone_triggers(conn, node_id)
+    if seed:
+        conn.execute(f'''
+            INSERT OR IGNORE INTO sync_changelog (global_id, table_name)
+            SELECT global_id, '{TOMBSTONES}' FROM sync_tombstone ORDER BY deleted_at
+        ''')
+
+def backfill_global_ids(conn, table):
+    """
+    Rows the app inserted before the triggers existed have no global_id.
+    Their ids are derived from the row itself, so machines that started from
+    a copy of the same database agree on them instead of syncing duplicates.
+    """
+    cursor = conn.execute(f"SELECT rowid, * FROM {table} WHERE global_id IS NULL")
+    columns = [d[0] for d in cursor.description]
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+    # Not a local edit: leave versions alone, just log the rows
+    begin_merge(conn, None)
+    for row in rows:
+        content = {k: v for k, v in zip(columns[1:], row[1:]) if k not in SYNC_COLUMNS}
+        key = f"{table}:{json.dumps(content, sort_keys=True, default=str)}"
+        conn.execute(f"UPDATE {table} SET global_id = ? WHERE rowid = ?",
+                     (str(uuid.uuid5(LEGACY_ID_NAMESPACE, key)), row[0]))
+    end_merge(conn)
+    return len(rows)
+
+def _log_sql(table, node_id, global_id_expr):
+    # DELETE + INSERT rather than INSERT OR REPLACE: an outer statement's
+    # conflict clause (e.g. INSERT OR IGNORE) would override ours
+    return f'''
+            DELETE FROM sync_changelog WHERE global_id = {global_id_expr};
+            INSERT INTO sync_changelog (global_id, table_name, source_node)
+            SELECT {global_id_expr}, '{table}', COALESCE((SELECT source_node FROM sync_merge_guard LIMIT 1), '{node_id}')
+            WHERE {global_id_expr} IS NOT NULL;'''
+
+def _create_triggers(conn, table, node_id):
+    stamp = f'''
+            UPDATE {table} SET
+                updated_at = {NOW_SQL},
+                last_modified_by = '{node_id}',
+                global_id = COALESCE(global_id, {UUID_SQL}),
+                version_vector = json_set(COALESCE(version_vector, '{{}}'), '$."{node_id}"',
+                                          COALESCE(json_extract(version_vector, '$."{node_id}"'), 0) + 1)
+            WHERE rowid = NEW.rowid;'''
+    conn.executescript(f'''
+        DROP TRIGGER IF EXISTS sync_local_insert_{table};
+        DROP TRIGGER IF EXISTS sync_local_update_{table};
+        DROP TRIGGER IF EXISTS sync_log_insert_{table};
+        DROP TRIGGER IF EXISTS sync_log_update_{table};
+
+        -- Local writes: stamp time, writer and bump this node's counter.
+        -- The stamp changes version_vector, which fires the log trigger.
+        CREATE TRIGGER sync_local_insert_{table} AFTER INSERT ON {table}
+        WHEN NOT {GUARD_SQL}
+        BEGIN {stamp}
+        END;
+
+        CREATE TRIGGER sync_local_update_{table} AFTER UPDATE ON {table}
+        WHEN NEW.version_vector IS OLD.version_vector AND NOT {GUARD_SQL}
+        BEGIN {stamp}
+        END;
+
+        -- Anything that changed a version (local stamp or merge) goes to the change log
+        CREATE TRIGGER sync_log_insert_{table} AFTER INSERT ON {table}
+        WHEN {GUARD_SQL}
+        BEGIN {_log_sql(table, node_id, 'NEW.global_id')}
+        END;
+
+        CREATE TRIGGER sync_log_update_{table} AFTER UPDATE ON {table}
+        WHEN NEW.version_vector IS NOT OLD.version_vector OR {GUARD_SQL}
+        BEGIN {_log_sql(table, node_id, 'NEW.global_id')}
+        END;
+    ''')
+
+def _create_tombstone_triggers(conn, node_id):
+    conn.executescript(f'''
+        DROP TRIGGER IF EXISTS sync_log_insert_{TOMBSTONES};
+        DROP TRIGGER IF EXISTS sync_log_update_{TOMBSTONES};
+
+        CREATE TRIGGER sync_log_insert_{TOMBSTONES} AFTER INSERT ON sync_tombstone
+        BEGIN {_log_sql(TOMBSTONES, node_id, 'NEW.global_id')}
+        END;
+
+        CREATE TRIGGER sync_log_update_{TOMBSTONES} AFTER UPDATE ON sync_tombstone
+        BEGIN {_log_sql(TOMBSTONES, node_id, 'NEW.global_id')}
+        END;
+    ''')
+
+# ==========================================
+# MERGE GUARD
+# ==========================================
+
+def begin_merge(conn, source_node):
+    """
+    Mark the current transaction as applying a peer's changes: triggers then
+    leave versions alone and log rows as coming from source_node. The guard
+    row never commits, so other connections don't see it.
+    """
+    conn.execute("INSERT INTO sync_merge_guard (source_node) VALUES (?)", (source_node,))
+
+def end_merge(conn):
+    conn.execute("DELETE FROM sync_merge_guard")
+
+def claim_change(conn, global_id, node_id=None):
+    """Log a merged row as our own change so it is sent back to its source too"""
+    conn.execute("UPDATE sync_changelog SET source_node = ? WHERE global_id = ?",
+                 (node_id or node_config.get_node_id(), global_id))
+
+# ==========================================
+# VERSION VECTORS
+# ==========================================
+
+def parse_vector(value):
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return value
+    try:
+        vector = json.loads(value)
+        return vector if isinstance(vector, dict) else {}
+    except (TypeError, ValueError):
+        return {}
+
+def dump_vector(vector):
+    return json.dumps(vector, sort_keys=True, separators=(',', ':'))
+
+def compare(a, b):
+    """'equal', 'newer' (a dominates b), 'older' or 'concurrent'"""
+    a_covers = all(a.get(node, 0) >= count for node, count in b.items())
+    b_covers = all(b.get(node, 0) >= count for node, count in a.items())
+    if a_covers and b_covers:
+        return 'equal'
+    if a_covers:
+        return 'newer'
+    if b_covers:
+        return 'older'
+    return 'concurrent'
+
+def merge_vectors(a, b):
+    return {node: max(a.get(node, 0), b.get(node, 0)) for node in set(a) | set(b)}
+
+def conflict_key(updated_at, writer, vector):
+    """Total order for concurrent versions; every node picks the same winner"""
+    return (updated_at or '', writer or '', dump_vector(vector))
+
+def record_conflict(conn, table, global_id, winner_node, loser_node, loser_record):
+    conn.execute('''
+        INSERT INTO sync_conflict (table_name, global_id, winner_node, loser_node, loser_record)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (table, global_id, winner_node, loser_node, json.dumps(loser_record, default=str)))
+
+# ==========================================
+# CHANGE LOG AND CURSORS
+# ==========================================
+
+def changes_since(conn, table, seq, limit):
+    """[(seq, global_id, source_node)] logged for table after seq"""
+    return conn.execute('''
+        SELECT seq, global_id, source_node FROM sync_changelog
+        WHERE table_name = ? AND seq > ? ORDER BY seq LIMIT ?
+    ''', (table, seq, limit)).fetchall()
+
+def all_changes_since(conn, seq, limit):
+    """[(seq, table_name, global_id, source_node)] across tables, in one consistent read"""
+    return conn.execute('''
+        SELECT seq, table_name, global_id, source_node FROM sync_changelog
+        WHERE seq > ? ORDER BY seq LIMIT ?
+    ''', (seq, limit)).fetchall()
+
+def latest_seq(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM sync_changelog").fetchone()[0]
+
+def get_cursors(conn, peer_node_id, direction):
+    rows = conn.execute(
+        "SELECT table_name, seq FROM sync_peer_cursor WHERE peer_node_id = ? AND direction = ?",
+        (peer_node_id, direction)
+    ).fetchall()
+    return {r[0]: r[1] for r in rows}
+
+def save_cursors(conn, peer_node_id, direction, cursors, peer_address=None):
+    for table, seq in cursors.items():
+        conn.execute('''
+            INSERT INTO sync_peer_cursor (peer_node_id, direction, table_name, seq, peer_address, updated_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(peer_node_id, direction, table_name) DO UPDATE SET
+                seq = MAX(seq, excluded.seq),
+                peer_address = COALESCE(excluded.peer_address, peer_address),
+                updated_at = CURRENT_TIMESTAMP
+        ''', (peer_node_id, direction, table, int(seq), peer_address))
+
+def has_cursors(conn, peer_node_id):
+    return conn.execute("SELECT 1 FROM sync_peer_cursor WHERE peer_node_id = ? LIMIT 1",
+                        (peer_node_id,)).fetchone() is not None
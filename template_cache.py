@@ -0,0 +1,106 @@
+import hashlib
+import os
+import sys
+import time
+from jinja2 import FileSystemBytecodeCache
+
+CACHE_PATTERN = '%s.jinja'
+PRECOMPILED_DIR = 'template_cache'  # next to templates/ in the source tree and in the EXE bundle
+
+def get_base_path():
+    """App folder (next to the EXE or app.py) - persists between runs"""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+def get_bundle_path():
+    """Where the build put its precompiled copy (_MEIPASS in the EXE)"""
+    return getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+
+def get_cache_dir():
+    return os.path.join(get_base_path(), 'app_data', 'template_cache')
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """
+    Jinja bytecode on disk, keyed by template name only: the EXE unpacks
+    templates to a new _MEIPASS folder on every start, so the default
+    path-based key would never hit. Jinja still compares a checksum of the
+    source (and the Python version), so an edited template just recompiles.
+
+    Reads fall back to the copy precompiled at build time; compiles done at
+    runtime are written to the app folder.
+    """
+
+    def __init__(self, directory, fallback_directory=None):
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(directory, CACHE_PATTERN)
+        self.fallback_directory = fallback_directory
+
+    def get_cache_key(self, name, filename=None):
+        return hashlib.sha1(name.encode('utf-8')).hexdigest()
+
+    def load_bytecode(self, bucket):
+        super().load_bytecode(bucket)
+        if bucket.code is None and self.fallback_directory:
+            path = os.path.join(self.fallback_directory, self.pattern % (bucket.key,))
+            try:
+                with open(path, 'rb') as f:
+                    bucket.load_bytecode(f)
+            except OSError:
+                pass
+
+def init_app(app):
+    """Call right after Flask(): the Jinja environment is created on first use"""
+    fallback = os.path.join(get_bundle_path(), PRECOMPILED_DIR)
+    try:
+        cache = TemplateBytecodeCache(get_cache_dir(), fallback if os.path.isdir(fallback) else None)
+    except OSError as e:
+        print(f"[TEMPLATES] Bytecode cache disabled: {e}")
+        return
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=cache)
+
+def load_all(env):
+    """Compile (or load from the bytecode cache) every template; returns (count, failures)"""
+    loaded, failed = 0, []
+    for name in env.list_templates(extensions=('html', 'htm', 'txt')):
+        try:
+            env.get_template(name)
+            loaded += 1
+        except Exception as e:
+            failed.append((name, str(e)))
+    return loaded, failed
+
+def warm_templates(app):
+    """Background: get every template into memory before anyone asks for it"""
+    started = time.perf_counter()
+    loaded, failed = load_all(app.jinja_env)
+    for name, error in failed:
+        print(f"[TEMPLATES] {name} failed to compile: {error}")
+    print(f"[TEMPLATES] {loaded} templates ready in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+def precompile(app, target_dir=None):
+    """
+    Build step: compile every template into target_dir (shipped with the EXE
+    as template_cache/). Uses the app's own environment so filters, globals
+    and options match what runs later.
+    """
+    target_dir = target_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), PRECOMPILED_DIR)
+    env = app.jinja_env
+    previous = env.bytecode_cache
+    cache = TemplateBytecodeCache(target_dir)
+    cache.clear()
+    env.bytecode_cache = cache
+    if env.cache is not None:
+        env.cache.clear()
+    try:
+        loaded, failed = load_all(env)
+    finally:
+        env.bytecode_cache = previous
+    for name, error in failed:
+        print(f"[TEMPLATES] {name} failed to compile: {error}")
+    print(f"[TEMPLATES] Precompiled {loaded} templates into {target_dir}")
+    return loaded, failed
+
+if __name__ == '__main__':
+    import app
+    precompile(app.app)
@@ -0,0 +1,99 @@
+"""
+Shared fixtures. Every test gets its own copy of counseling.db in a temp
+directory, brought up to the current schema the way the app does at
+start-up, so nothing here touches the live database.
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import node_config
+import oq_items
+import report_cache
+import report_rollup
+import risk_engine
+import scoring_engine
+import sync_tombstones
+import sync_versions
+from sync_engine import SYNC_TABLES
+
+NODE_ID = 'NODE_TEST'
+
+def connect(path, timeout=10.0):
+    conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def migrate(conn):
+    """The schema steps of app.prepare_sync_and_queues"""
+    sync_tombstones.ensure_schema(conn)
+    sync_versions.ensure_schema(conn, SYNC_TABLES, node_id=NODE_ID)
+    oq_items.ensure_schema(conn)
+    scoring_engine.ensure_schema(conn)
+    risk_engine.ensure_schema(conn)
+    report_rollup.ensure_schema(conn)
+    report_cache.ensure_schema(conn)
+    conn.commit()
+
+@pytest.fixture(autouse=True)
+def config(monkeypatch):
+    """An in-memory node_config: tests never read or write node_config.json"""
+    values = {'node_id': NODE_ID}
+    monkeypatch.setattr(node_config, 'load_config', lambda: values)
+    monkeypatch.setattr(node_config, 'save_config', values.update)
+    return values
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'counseling.db')
+    shutil.copyfile(os.path.join(ROOT, 'counseling.db'), path)
+    return path
+
+# Modules that open their own connection through app.get_db_connection()
+CONNECTING_MODULES = ('auto_report_writer', 'lookup_service', 'print_service', 'queue_service', 'risk_engine',
+                      'scheduling_engine', 'sync_engine', 'sync_snapshot', 'write_queue')
+
+@pytest.fixture(autouse=True)
+def own_connections(db_path, monkeypatch):
+    """Point every module's connection helper at the test copy, never the live database"""
+    for module in CONNECTING_MODULES:
+        monkeypatch.setattr(f'{module}.get_db_connection', lambda: connect(db_path))
+
+@pytest.fixture
+def legacy_conn(db_path):
+    """The database as shipped, before any start-up migration"""
+    conn = connect(db_path)
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def conn(db_path):
+    conn = connect(db_path)
+    migrate(conn)
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def student_id(conn):
+    cursor = conn.execute("INSERT INTO Student (name, programme) VALUES ('Test Student', 'BSc Testing')")
+    conn.commit()
+    return cursor.lastrowid
+
+def add_appointment(conn, student_id, date, time='09:00', counsellor_id=1, status='Scheduled', urgency='Normal'):
+    return conn.execute(
+        "INSERT INTO Appointment (student_id, Counsellor_id, date, time, status, urgency) VALUES (?, ?, ?, ?, ?, ?)",
+        (student_id, counsellor_id, date, time, status, urgency)
+    ).lastrowid
+
+def add_session(conn, appointment_id, created_at, notes='', session_type='Individual'):
+    return conn.execute(
+        "INSERT INTO session (appointment_id, session_type, notes, created_at) VALUES (?, ?, ?, ?)",
+        (appointment_id, session_type, notes, created_at)
+    ).lastrowid
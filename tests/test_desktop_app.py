@@ -0,0 +1,95 @@
+import os
+import time
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+pytest.importorskip('PyQt5')
+
+from PyQt5.QtWidgets import QApplication
+
+import desktop_app
+import repository
+from conftest import add_appointment, add_session
+
+@pytest.fixture(scope='module')
+def qt_app():
+    return QApplication.instance() or QApplication([])
+
+@pytest.fixture
+def db(qt_app, db_path):
+    db = desktop_app.DatabaseManager()
+    db.db_path = db_path
+    yield db
+    db.pool.waitForDone()
+
+def settle(model, timeout=10):
+    """Let pool results reach the model through the event loop"""
+    deadline = time.time() + timeout
+    while model._loading and time.time() < deadline:
+        QApplication.processEvents()
+        time.sleep(0.01)
+    QApplication.processEvents()
+    assert not model._loading
+
+@pytest.fixture
+def sessions(conn, student_id, monkeypatch):
+    """Seven sessions, read three at a time"""
+    monkeypatch.setattr(repository, 'PAGE_SIZE', 3)
+    conn.execute("DELETE FROM session")
+    appt_id = add_appointment(conn, student_id, '2030-01-07')
+    ids = [add_session(conn, appt_id, f'2030-01-07 09:0{n}:00', f'note\n{n}') for n in range(7)]
+    conn.commit()
+    return ids[::-1]
+
+def loaded_ids(model):
+    return [model.row_id(row) for row in range(model.rowCount())]
+
+def test_pages_load_as_the_view_asks_for_more(db, sessions):
+    model = desktop_app.PagedTableModel(db, repository.page_sessions, desktop_app.SESSION_COLUMNS)
+    assert model.rowCount() == 0 and model.canFetchMore()
+    pages = 0
+    while model.canFetchMore():
+        model.fetchMore()
+        assert not model.canFetchMore()  # one page in flight at a time
+        settle(model)
+        pages += 1
+    assert pages == 3
+    assert loaded_ids(model) == sessions
+    assert model.index(0, 3).data() == 'note 6'
+    assert model.index(0, 1).data() == '2030-01-07'
+    assert model.headerData(2, desktop_app.Qt.Horizontal) == 'Student'
+
+def test_refresh_drops_pages_still_in_flight(db, sessions):
+    model = desktop_app.PagedTableModel(db, repository.page_sessions, desktop_app.SESSION_COLUMNS)
+    model.fetchMore()
+    settle(model)
+    model.fetchMore()
+    model.refresh()  # the second page's answer must not land after the reset
+    settle(model)
+    db.pool.waitForDone()
+    QApplication.processEvents()
+    assert loaded_ids(model) == sessions[:3]
+
+def test_a_failed_page_is_reported_and_stops_loading(db):
+    def broken(conn, after, limit):
+        conn.execute("SELECT * FROM no_such_table")
+
+    model = desktop_app.PagedTableModel(db, broken, desktop_app.SESSION_COLUMNS)
+    errors = []
+    model.load_failed.connect(errors.append)
+    model.fetchMore()
+    settle(model)
+    assert errors and 'no_such_table' in errors[0]
+    assert not model.canFetchMore() and model.rowCount() == 0
+
+def test_dashboard_counts(db, conn):
+    results = []
+    db.submit(desktop_app._dashboard_counts, done=results.append)
+    deadline = time.time() + 10
+    while not results and time.time() < deadline:
+        QApplication.processEvents()
+        time.sleep(0.01)
+    students, appointments, _today = results[0]
+    assert students == conn.execute("SELECT COUNT(*) FROM Student").fetchone()[0]
+    assert appointments == conn.execute("SELECT COUNT(*) FROM Appointment").fetchone()[0]
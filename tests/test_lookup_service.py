@@ -0,0 +1,74 @@
+import pytest
+
+import repository
+from analytics_db import ChangeWatch
+from conftest import add_appointment, add_session, connect
+from lookup_service import LookupIndex
+
+@pytest.fixture
+def index(db_path, conn):
+    watch = ChangeWatch(db_path)
+    index = LookupIndex(watch)
+    index.build(conn)
+    yield index
+    watch.close()
+
+def names(rows):
+    return [row['name'] for row in rows]
+
+def test_search_by_name_words_index_number_and_professional_id(conn, index):
+    student_id = conn.execute("INSERT INTO Student (name, index_number) VALUES ('Ama Serwaa Mensah', 'UEW-4417')"
+                              ).lastrowid
+    conn.commit()
+    index.refresh_student(conn, student_id)
+
+    assert names(index.search('serw')) == ['Ama Serwaa Mensah']
+    assert names(index.search('mensah ama')) == ['Ama Serwaa Mensah']
+    assert names(index.search('ama serwaa m')) == ['Ama Serwaa Mensah']
+    assert names(index.search('uew-44')) == ['Ama Serwaa Mensah']
+    assert names(index.search(repository.professional_id(student_id).lower())) == ['Ama Serwaa Mensah']
+    assert index.search('ama kofi') == []
+    assert index.search('  ') == []
+
+def test_recent_sessions_and_appointments_are_newest_first(conn, index, student_id):
+    first = add_appointment(conn, student_id, '2030-01-07', '09:00')
+    second = add_appointment(conn, student_id, '2030-01-08', '09:00')
+    add_appointment(conn, student_id, '2030-01-09', '09:00', status='Cancelled')
+    older = add_session(conn, first, '2030-01-07 09:30:00')
+    newer = add_session(conn, second, '2030-01-08 09:30:00')
+    conn.commit()
+    index.refresh_student(conn, student_id)
+
+    assert [row['id'] for row in index.recent_sessions(student_id)] == [newer, older]
+    # Cancelled appointments can't take a session
+    assert [row['id'] for row in index.recent_appointments(student_id)] == [second, first]
+
+def test_refresh_drops_a_deleted_student(conn, index, student_id):
+    index.refresh_student(conn, student_id)
+    assert names(index.search('test stud')) == ['Test Student']
+    conn.execute("DELETE FROM Student WHERE id = ?", (student_id,))
+    conn.commit()
+    index.refresh_student(conn, student_id)
+    assert index.search('test stud') == []
+    assert index.student(student_id) is None
+
+def test_writes_from_another_connection_are_picked_up(db_path, index, student_id):
+    """The desktop app and other processes don't call refresh_*"""
+    assert names(index.search('test stud')) == ['Test Student']
+    elsewhere = connect(db_path)
+    try:
+        elsewhere.execute("UPDATE Student SET name = 'Kwesi Arthur' WHERE id = ?", (student_id,))
+        appt_id = add_appointment(elsewhere, student_id, '2030-01-07')
+        elsewhere.commit()
+    finally:
+        elsewhere.close()
+
+    assert index.search('test stud') == []
+    assert names(index.search('kwesi')) == ['Kwesi Arthur']
+    assert [row['id'] for row in index.recent_appointments(student_id)] == [appt_id]
+
+def test_unchanged_database_is_not_rebuilt(index, capsys):
+    capsys.readouterr()
+    index.search('a')
+    index.search('b')
+    assert '[LOOKUP] Indexed' not in capsys.readouterr().out
@@ -0,0 +1,70 @@
+import pytest
+
+import oq_items
+from conftest import migrate
+
+def test_pack_unpack_round_trip():
+    answers = [0, 1, 2, 3, 4] * 5
+    packed = oq_items.pack(answers)
+    assert packed == '0123401234012340123401234'
+    assert oq_items.unpack(packed) == answers
+    assert oq_items.is_complete(packed)
+    assert oq_items.total(packed) == sum(answers)
+
+def test_blank_answers_round_trip():
+    answers = [3, None, 1] + [None] * 22
+    packed = oq_items.pack(answers)
+    assert packed.startswith('3-1')
+    assert oq_items.unpack(packed) == answers
+    assert not oq_items.is_complete(packed)
+    assert oq_items.total(packed) is None
+
+def test_short_value_unpacks_to_the_form_width():
+    assert oq_items.unpack('42') == [4, 2] + [None] * 23
+    assert oq_items.unpack(None) == [None] * oq_items.ITEM_COUNT
+
+def test_nothing_answered_packs_to_null():
+    assert oq_items.pack([None, '', None]) is None
+
+@pytest.mark.parametrize('answers', [[5], [-1], [2.5], ['x'], [1] * (oq_items.MAX_ITEMS + 1)])
+def test_pack_rejects_bad_answers(answers):
+    with pytest.raises(ValueError):
+        oq_items.pack(answers)
+
+def test_upgrade_record_from_an_old_peer():
+    record = {'id': 1, 'total_score': 3, 'item1': 1, 'item2': 2, 'item3': None}
+    upgraded = oq_items.upgrade_record(record)
+    assert 'item1' not in upgraded
+    assert oq_items.unpack(upgraded['items'])[:3] == [1, 2, None]
+
+def test_migration_packs_legacy_columns(legacy_conn):
+    conn = legacy_conn
+    complete = [i % 5 for i in range(oq_items.ITEM_COUNT)]
+    partial = [4, None, 0] + [None] * (oq_items.ITEM_COUNT - 3)
+    rows = {}
+    for name, answers in (('complete', complete), ('partial', partial), ('empty', [None] * oq_items.ITEM_COUNT)):
+        columns = ', '.join(oq_items.LEGACY_COLUMNS)
+        placeholders = ', '.join('?' * oq_items.ITEM_COUNT)
+        rows[name] = conn.execute(
+            f"INSERT INTO OutcomeQuestionnaire (student_id, total_score, {columns}) VALUES (1, 0, {placeholders})",
+            answers
+        ).lastrowid
+    conn.commit()
+
+    migrate(conn)
+
+    columns = [r[1] for r in conn.execute("PRAGMA table_info(OutcomeQuestionnaire)")]
+    assert 'items' in columns
+    stored = {row['id']: row for row in conn.execute("SELECT id, items, version_vector FROM OutcomeQuestionnaire")}
+    assert oq_items.unpack(stored[rows['complete']]['items']) == complete
+    assert oq_items.unpack(stored[rows['partial']]['items']) == partial
+    assert stored[rows['empty']]['items'] is None
+    # Reshaping is not an edit: no version bump, nothing queued for sync
+    assert all(row['version_vector'] is None for row in stored.values())
+
+    # The compatibility view gives the old columns back
+    view = conn.execute(f"SELECT * FROM {oq_items.VIEW} WHERE id = ?", (rows['partial'],)).fetchone()
+    assert [view[column] for column in oq_items.LEGACY_COLUMNS] == partial
+
+    # Running the start-up migration again changes nothing
+    assert oq_items.ensure_schema(conn) == 0
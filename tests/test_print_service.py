@@ -0,0 +1,93 @@
+from datetime import datetime
+
+import pytest
+
+import print_service
+import sync_versions
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Stub the template render (and start from an empty cache); returns the templates rendered"""
+    rendered = []
+
+    def render_template(template, **context):
+        rendered.append(template)
+        dass21 = context.get('dass21', {})
+        return (f"<html><head><style>.score {{ color: red; }}</style></head>"
+                f"<body class=\"print\"><p class=\"score\">{dass21.get('final_depression'):g} "
+                f"{dass21.get('student_name')}</p></body></html>")
+
+    monkeypatch.setattr(print_service, 'render_template', render_template)
+    monkeypatch.setattr(print_service, 'fragment_cache', print_service.FragmentCache())
+    return rendered
+
+@pytest.fixture
+def dass21_id(conn, student_id):
+    cursor = conn.execute("INSERT INTO DASS21 (student_id, depression_score, anxiety_score, stress_score, created_at) "
+                          "VALUES (?, 5, 4, 3, '2025-03-03 10:00:00')", (student_id,))
+    conn.commit()
+    return cursor.lastrowid
+
+def render(conn, record_id):
+    [(kind, record, student)] = print_service.prefetch(conn, {'documents': [('dass21', record_id)]})
+    return print_service.render_document(kind, record, student, datetime(2025, 3, 10))
+
+def test_unchanged_document_comes_from_the_cache(conn, dass21_id, renders):
+    first, cached = render(conn, dass21_id)
+    assert not cached and '10 Test Student' in first
+    again, cached = render(conn, dass21_id)
+    assert cached and again == first
+    assert renders == ['print_dass21.html']
+
+def test_edit_within_the_same_second_re_renders(conn, dass21_id, renders):
+    render(conn, dass21_id)
+    updated_at = conn.execute("SELECT updated_at FROM DASS21 WHERE id = ?", (dass21_id,)).fetchone()[0]
+    conn.execute("UPDATE DASS21 SET depression_score = 14 WHERE id = ?", (dass21_id,))
+    # Pin updated_at to the earlier second: only the version vector moved
+    sync_versions.begin_merge(conn, None)
+    conn.execute("UPDATE DASS21 SET updated_at = ? WHERE id = ?", (updated_at, dass21_id))
+    sync_versions.end_merge(conn)
+    conn.commit()
+    body, cached = render(conn, dass21_id)
+    assert not cached and '28 Test Student' in body
+
+def test_student_edit_re_renders(conn, dass21_id, student_id, renders):
+    render(conn, dass21_id)
+    conn.execute("UPDATE Student SET name = 'Renamed Student' WHERE id = ?", (student_id,))
+    conn.commit()
+    body, cached = render(conn, dass21_id)
+    assert not cached and 'Renamed Student' in body
+
+def test_stamp_carries_the_version_vector(conn, dass21_id):
+    def stamp():
+        [(_kind, record, _student)] = print_service.prefetch(conn, {'documents': [('dass21', dass21_id)]})
+        return record['stamp']
+    before = stamp()
+    conn.execute("UPDATE DASS21 SET stress_score = 9 WHERE id = ?", (dass21_id,))
+    assert stamp() != before
+
+# ---------- parse_spec ----------
+
+def test_parse_spec_normalizes():
+    spec = print_service.parse_spec({'student_id': '7', 'date_from': '2025-03-01', 'kinds': 'dass21,session',
+                                     'documents': ['dass21:12', {'kind': 'referral', 'id': 3}]})
+    assert spec == {'student_id': 7, 'date_from': '2025-03-01', 'kinds': ['session', 'dass21'],
+                    'documents': [('dass21', 12), ('referral', 3)]}
+
+@pytest.mark.parametrize('data, message', [
+    ({}, 'Choose a student, a date range or documents'),
+    ({'student_id': 'abc'}, 'student_id must be a record number'),
+    ({'student_id': 0}, 'student_id must be a record number'),
+    ({'date_from': '2025-02-30'}, 'date_from must be a date'),
+    ({'date_from': '2025-03-02', 'date_to': '2025-03-01'}, 'date_from must not be after date_to'),
+    ({'student_id': 1, 'kinds': 'dass21,letters'}, 'Unknown document type: letters'),
+    ({'student_id': 1, 'kinds': 3}, 'kinds must be a list'),
+    ({'documents': 'dass21:1'}, 'documents must be a list'),
+    ({'documents': ['dass21']}, 'kind:id'),
+    ({'documents': ['dass21:x']}, 'dass21 id must be a record number'),
+    ({'documents': [{'kind': 'letter', 'id': 1}]}, 'Unknown document type: letter'),
+    (['dass21:1'], 'must be a JSON object'),
+])
+def test_parse_spec_rejects_with_a_clear_message(data, message):
+    with pytest.raises(ValueError, match=message):
+        print_service.parse_spec(data)
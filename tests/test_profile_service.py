@@ -0,0 +1,67 @@
+import pytest
+
+from analytics_db import ChangeWatch
+from conftest import add_appointment, add_session, connect
+from profile_service import ProfileCache
+
+@pytest.fixture
+def cache(db_path):
+    watch = ChangeWatch(db_path)
+    yield ProfileCache(watch)
+    watch.close()
+
+@pytest.fixture
+def history(conn, student_id):
+    appt_id = add_appointment(conn, student_id, '2030-01-07', status='Completed')
+    session_id = add_session(conn, appt_id, '2030-01-07 09:30:00', 'first visit')
+    referral_id = conn.execute("INSERT INTO Referral (session_id, referred_by, created_at) "
+                               "VALUES (?, 'Counsellor', '2030-01-07 10:00:00')", (session_id,)).lastrowid
+    conn.execute("INSERT INTO DASS21 (student_id, depression_score, anxiety_score, stress_score, created_at) "
+                 "VALUES (?, 5, 4, 3, '2030-01-07 11:00:00')", (student_id,))
+    conn.commit()
+    return {'appointment': appt_id, 'session': session_id, 'referral': referral_id}
+
+def test_snapshot_gathers_the_student_timeline(conn, cache, student_id, history):
+    snapshot = cache.get(conn, student_id)
+    assert snapshot.student['name'] == 'Test Student'
+    assert [s['id'] for s in snapshot.sessions] == [history['session']]
+    assert snapshot.sessions[0]['notes'] == 'first visit'
+    assert [r['id'] for r in snapshot.referrals] == [history['referral']]
+    assert snapshot.referrals[0]['session_date'] == '2030-01-07 09:30:00'
+    assert len(snapshot.dass21_scores) == 1
+    assert snapshot.has('appointment', history['appointment'])
+    assert snapshot.print_referral(history['referral'])['student_name'] == 'Test Student'
+    assert cache.get(conn, -1) is None
+
+def test_repeat_views_come_from_the_cache(conn, cache, student_id, history):
+    first = cache.get(conn, student_id)
+    assert cache.get(conn, student_id) is first
+    assert cache.stats() == {'cached': 1, 'hits': 1, 'misses': 1}
+
+def test_invalidating_a_record_drops_its_student(conn, cache, student_id, history):
+    first = cache.get(conn, student_id)
+    cache.invalidate(conn, 'referral', history['referral'])
+    assert cache.get(conn, student_id) is not first
+
+def test_writes_nobody_reported_are_still_seen(db_path, conn, cache, student_id, history):
+    """The desktop app and other processes never call invalidate()"""
+    cache.get(conn, student_id)
+    elsewhere = connect(db_path)
+    try:
+        elsewhere.execute("UPDATE session SET notes = 'edited elsewhere' WHERE id = ?", (history['session'],))
+        elsewhere.commit()
+    finally:
+        elsewhere.close()
+    assert cache.get(conn, student_id).sessions[0]['notes'] == 'edited elsewhere'
+
+def test_cache_size_comes_from_node_config(conn, cache, config, student_id):
+    config['profile_cache_size'] = 1
+    other = conn.execute("INSERT INTO Student (name) VALUES ('Other Student')").lastrowid
+    conn.commit()
+    cache.get(conn, student_id)
+    cache.get(conn, other)
+    assert cache.stats()['cached'] == 1
+    config['profile_cache_size'] = 0
+    cache.clear()
+    cache.get(conn, student_id)
+    assert cache.stats()['cached'] == 0
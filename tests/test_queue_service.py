@@ -0,0 +1,130 @@
+import pytest
+
+from conftest import add_appointment
+from queue_service import TodayQueue
+
+TODAY = '2030-01-07'
+
+@pytest.fixture(autouse=True)
+def empty_office(conn):
+    """Close out the appointments already in the database copy"""
+    conn.execute("UPDATE Appointment SET status = 'Completed'")
+    conn.commit()
+
+@pytest.fixture
+def queue(conn):
+    queue = TodayQueue()
+    queue.seed(conn)
+    return queue
+
+def ids(queue, lane):
+    return [entry['id'] for entry in queue.lane(lane)]
+
+def check_in(conn, appt_id, at, status='Checked In'):
+    conn.execute("UPDATE Appointment SET status = ?, checked_in_at = ? WHERE id = ?", (status, at, appt_id))
+
+def test_urgency_comes_before_booking_time(conn, student_id):
+    normal = add_appointment(conn, student_id, TODAY, '08:00')
+    crisis = add_appointment(conn, student_id, TODAY, '15:00', urgency='Crisis')
+    urgent = add_appointment(conn, student_id, TODAY, '10:00', urgency='urgent')
+    blank = add_appointment(conn, student_id, TODAY, '09:00', urgency=None)
+    conn.commit()
+    queue = TodayQueue()
+    queue.seed(conn)
+    # Urgency is matched case-insensitively; no urgency counts as Normal
+    assert ids(queue, 'secretary') == [crisis, urgent, normal, blank]
+
+def test_longest_wait_first_within_an_urgency(conn, student_id):
+    early_slot = add_appointment(conn, student_id, TODAY, '09:00')
+    late_slot = add_appointment(conn, student_id, TODAY, '11:00')
+    not_here = add_appointment(conn, student_id, TODAY, '08:00', status='Sent to Counsellor')
+    check_in(conn, early_slot, '2030-01-07 09:20:00')
+    check_in(conn, late_slot, '2030-01-07 08:45:00')
+    conn.commit()
+    queue = TodayQueue()
+    queue.seed(conn)
+    # A student who has not arrived yet has no wait start and goes last
+    assert ids(queue, 'counsellor') == [late_slot, early_slot, not_here]
+
+def test_sent_to_counsellor_time_wins_over_check_in(conn, student_id):
+    first = add_appointment(conn, student_id, TODAY, '09:00')
+    second = add_appointment(conn, student_id, TODAY, '09:30')
+    check_in(conn, first, '2030-01-07 08:50:00')
+    check_in(conn, second, '2030-01-07 09:00:00')
+    conn.execute("UPDATE Appointment SET status = 'Sent to Counsellor', sent_to_counsellor_at = ? WHERE id = ?",
+                 ('2030-01-07 09:40:00', first))
+    conn.commit()
+    queue = TodayQueue()
+    queue.seed(conn)
+    assert ids(queue, 'counsellor') == [second, first]
+
+def test_ties_fall_back_to_date_time_then_id(conn, student_id):
+    tomorrow = add_appointment(conn, student_id, '2030-01-08', '08:00')
+    late = add_appointment(conn, student_id, TODAY, '10:00')
+    first_booked = add_appointment(conn, student_id, TODAY, '09:00')
+    second_booked = add_appointment(conn, student_id, TODAY, '09:00')
+    conn.commit()
+    queue = TodayQueue()
+    queue.seed(conn)
+    assert ids(queue, 'secretary') == [first_booked, second_booked, late, tomorrow]
+
+def test_refresh_moves_an_appointment_between_lanes(conn, queue, student_id):
+    appt_id = add_appointment(conn, student_id, TODAY)
+    conn.commit()
+    version = queue.version
+    queue.refresh(conn, appt_id)
+    assert ids(queue, 'secretary') == [appt_id]
+    assert queue.version == version + 1
+
+    check_in(conn, appt_id, '2030-01-07 08:55:00')
+    conn.commit()
+    queue.refresh(conn, appt_id)
+    assert ids(queue, 'secretary') == []
+    assert ids(queue, 'counsellor') == [appt_id]
+
+    conn.execute("UPDATE Appointment SET status = 'In Session' WHERE id = ?", (appt_id,))
+    conn.commit()
+    queue.refresh(conn, appt_id)
+    assert ids(queue, 'counsellor') == []
+    assert ids(queue, 'in_session') == [appt_id]
+
+def test_refresh_reorders_on_urgency_change(conn, queue, student_id):
+    first = add_appointment(conn, student_id, TODAY, '09:00')
+    second = add_appointment(conn, student_id, TODAY, '10:00')
+    conn.commit()
+    for appt_id in (first, second):
+        queue.refresh(conn, appt_id)
+    assert ids(queue, 'secretary') == [first, second]
+
+    conn.execute("UPDATE Appointment SET urgency = 'Urgent' WHERE id = ?", (second,))
+    conn.commit()
+    queue.refresh(conn, second)
+    assert ids(queue, 'secretary') == [second, first]
+
+def test_refresh_drops_finished_and_deleted_appointments(conn, queue, student_id):
+    done = add_appointment(conn, student_id, TODAY, '09:00')
+    gone = add_appointment(conn, student_id, TODAY, '10:00')
+    conn.commit()
+    for appt_id in (done, gone):
+        queue.refresh(conn, appt_id)
+
+    conn.execute("UPDATE Appointment SET status = 'Completed' WHERE id = ?", (done,))
+    conn.execute("DELETE FROM Appointment WHERE id = ?", (gone,))
+    conn.commit()
+    queue.refresh(conn, done)
+    queue.refresh(conn, gone)
+    assert ids(queue, 'secretary') == []
+
+    # Nothing left to drop: the version doesn't move
+    version = queue.version
+    queue.refresh(conn, gone)
+    assert queue.version == version
+
+def test_refresh_student_picks_up_a_rename(conn, queue, student_id):
+    appt_id = add_appointment(conn, student_id, TODAY)
+    conn.commit()
+    queue.refresh(conn, appt_id)
+    conn.execute("UPDATE Student SET name = 'Renamed Student' WHERE id = ?", (student_id,))
+    conn.commit()
+    queue.refresh_student(conn, student_id)
+    assert [entry['student_name'] for entry in queue.lane('secretary')] == ['Renamed Student']
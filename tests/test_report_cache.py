@@ -0,0 +1,125 @@
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+import report_cache
+from conftest import add_appointment, add_session
+
+SPAN = ('2025-03-03 00:00:00', '2025-03-09 23:59:59')
+DAY = 86400
+
+@pytest.fixture
+def reports(tmp_path, monkeypatch):
+    directory = tmp_path / 'reports'
+    directory.mkdir()
+    monkeypatch.setattr(report_cache, 'reports_dir', lambda: str(directory))
+    return directory
+
+def add_report(conn, path, key=None):
+    return conn.execute(
+        "INSERT INTO reports (title, date_generated, report_type, file_path, cache_key) VALUES ('Weekly', ?, 'weekly', ?, ?)",
+        ('2025-03-10 08:00:00', str(path), key)
+    ).lastrowid
+
+def cached_file(reports, n, age_days=0, size=10):
+    key = f"{n:016x}" + '0' * 48
+    path = reports / report_cache.file_name(key, datetime(2025, 3, 10))
+    path.write_bytes(b'x' * size)
+    stamp = time.time() - age_days * DAY
+    os.utime(path, (stamp, stamp))
+    return path
+
+def report_ids(conn):
+    return {row[0] for row in conn.execute("SELECT id FROM reports")}
+
+def test_cache_key_is_stable_until_the_data_changes(conn, student_id):
+    session_id = add_session(conn, add_appointment(conn, student_id, '2025-03-04', status='Completed'),
+                             '2025-03-04 10:00:00', 'exam stress')
+    key = report_cache.cache_key(conn, 'weekly', SPAN)
+    assert report_cache.cache_key(conn, 'weekly', SPAN) == key
+
+    conn.execute("UPDATE session SET notes = 'edited' WHERE id = ?", (session_id,))
+    changed = report_cache.cache_key(conn, 'weekly', SPAN)
+    assert changed != key
+
+    conn.execute("INSERT INTO Referral (session_id, referred_by, created_at) VALUES (?, 'x', '2024-01-01 10:00:00')",
+                 (session_id,))
+    assert report_cache.cache_key(conn, 'weekly', SPAN) != changed
+
+def test_cache_key_depends_on_type_span_and_template(conn):
+    key = report_cache.cache_key(conn, 'weekly', SPAN)
+    assert report_cache.cache_key(conn, 'monthly', SPAN) != key
+    assert report_cache.cache_key(conn, 'weekly', ('2025-03-03 00:00:00', '2025-03-10 23:59:59')) != key
+    assert report_cache.cache_key(conn, 'weekly', SPAN, template_stamp='v2') != key
+
+def test_lookup_only_returns_reports_whose_file_exists(conn, tmp_path):
+    key = report_cache.cache_key(conn, 'weekly', SPAN)
+    path = tmp_path / report_cache.file_name(key, datetime(2025, 3, 10))
+    path.write_bytes(b'docx')
+    report_id = add_report(conn, path, key)
+
+    assert report_cache.lookup(conn, key) == (report_id, str(path))
+    assert report_cache.lookup(conn, report_cache.cache_key(conn, 'monthly', SPAN)) is None
+
+    path.unlink()
+    assert report_cache.lookup(conn, key) is None
+
+# ---------- retention ----------
+
+def test_retention_leaves_legacy_reports_alone(conn, reports, config):
+    config[report_cache.MAX_AGE_DAYS_KEY] = 1
+    config[report_cache.MAX_MB_KEY] = 0
+    legacy = report_ids(conn)
+    assert legacy  # rows from before the cache, pointing at another install's Windows paths
+    old_file = reports / 'report_2024-01-12_19-2929.docx'
+    old_file.write_bytes(b'docx')
+    os.utime(old_file, (time.time() - 30 * DAY,) * 2)
+    add_report(conn, old_file)
+    hand_placed = reports / 'report_final.docx'
+    hand_placed.write_bytes(b'docx')
+    os.utime(hand_placed, (time.time() - 30 * DAY,) * 2)
+
+    report_cache.enforce_retention(conn)
+    assert legacy <= report_ids(conn)
+    assert old_file.exists() and hand_placed.exists()
+    assert conn.execute("SELECT COUNT(*) FROM reports WHERE file_path = ?", (str(old_file),)).fetchone()[0] == 1
+
+def test_retention_drops_cached_rows_without_files_and_orphans(conn, reports):
+    missing = cached_file(reports, 1)
+    gone = add_report(conn, missing)
+    missing.unlink()
+    orphan = cached_file(reports, 2, age_days=1)
+    fresh_orphan = cached_file(reports, 3)
+
+    counts = report_cache.enforce_retention(conn)
+    assert counts['rows'] == 1 and counts['orphans'] == 1
+    assert gone not in report_ids(conn)
+    assert not orphan.exists() and fresh_orphan.exists()
+
+def test_retention_expires_cached_reports_by_age(conn, reports, config):
+    config[report_cache.MAX_AGE_DAYS_KEY] = 10
+    old = cached_file(reports, 1, age_days=11)
+    kept = cached_file(reports, 2, age_days=11)
+    recent = cached_file(reports, 3, age_days=9)
+    old_id, kept_id, recent_id = (add_report(conn, path) for path in (old, kept, recent))
+
+    counts = report_cache.enforce_retention(conn, keep=[str(kept)])
+    assert counts['expired'] == 1
+    assert not old.exists() and kept.exists() and recent.exists()
+    assert report_ids(conn) & {old_id, kept_id, recent_id} == {kept_id, recent_id}
+
+def test_retention_evicts_least_recently_used_for_space(conn, reports, config):
+    config[report_cache.MAX_MB_KEY] = 2.5
+    size = 1024 * 1024
+    oldest, middle, newest = (cached_file(reports, n, age_days=3 - n, size=size) for n in range(3))
+    ids = [add_report(conn, path) for path in (oldest, middle, newest)]
+    # Legacy files don't count towards the limit and are never evicted
+    legacy = reports / 'report_2024-01-12_19-2929.docx'
+    legacy.write_bytes(b'x' * size)
+
+    counts = report_cache.enforce_retention(conn)
+    assert counts['evicted'] == 1
+    assert not oldest.exists() and middle.exists() and newest.exists() and legacy.exists()
+    assert ids[0] not in report_ids(conn)
@@ -0,0 +1,95 @@
+from datetime import date, datetime
+
+import pytest
+
+import report_rollup
+from conftest import add_appointment, add_session
+
+TODAY = date(2025, 3, 10)
+
+@pytest.fixture
+def activity(conn, student_id):
+    """A week of appointments, sessions and referrals, edges of days included"""
+    other = conn.execute("INSERT INTO Student (name, programme) VALUES ('Second Student', NULL)").lastrowid
+    plan = [
+        (student_id, '2025-03-03', 'Completed', '2025-03-03 09:10:00', 'exam stress and anxiety'),
+        (student_id, '2025-03-04', 'Completed', '2025-03-04 00:00:00', 'family issues'),
+        (other, '2025-03-04', 'Cancelled', None, None),
+        (other, '2025-03-05', 'Completed', '2025-03-05 23:59:59', 'career planning'),
+        (student_id, '2025-03-06', 'Scheduled', '2025-03-06 15:30:00', ''),
+        (other, '2025-03-07', 'Completed', '2025-03-07 11:00:00', 'academic stress'),
+        (student_id, '2025-03-10', 'Scheduled', '2025-03-10 08:00:00', 'financial'),
+    ]
+    sessions = []
+    for owner, day, status, session_at, notes in plan:
+        appt_id = add_appointment(conn, owner, day, status=status)
+        if session_at:
+            sessions.append(add_session(conn, appt_id, session_at, notes))
+    for session_id, created_at in ((sessions[0], '2025-03-03 10:00:00'), (sessions[3], '2025-03-07 16:00:00')):
+        conn.execute("INSERT INTO Referral (session_id, referred_by, created_at) VALUES (?, 'Counsellor', ?)",
+                     (session_id, created_at))
+    conn.commit()
+    return sessions
+
+def raw_totals(conn, start, end):
+    """The report figures by scanning the source tables"""
+    days = (start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+    span = (start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S'))
+    appointments = dict(conn.execute(
+        "SELECT COALESCE(status, ''), COUNT(*) FROM Appointment WHERE date BETWEEN ? AND ? GROUP BY 1", days))
+    sessions, students = conn.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT a.student_id) FROM session s JOIN Appointment a ON s.appointment_id = a.id "
+        "WHERE s.created_at BETWEEN ? AND ?", span).fetchone()
+    session_types = dict(conn.execute(
+        "SELECT COALESCE(session_type, ''), COUNT(*) FROM session WHERE created_at BETWEEN ? AND ? GROUP BY 1",
+        span))
+    referrals = conn.execute("SELECT COUNT(*) FROM Referral WHERE created_at BETWEEN ? AND ?", span).fetchone()[0]
+    notes = [row[0].lower() for row in conn.execute(
+        "SELECT notes FROM session WHERE created_at BETWEEN ? AND ? AND notes IS NOT NULL AND notes != ''", span)]
+    issues = {}
+    for keyword in report_rollup.ISSUE_KEYWORDS:
+        count = sum(keyword in note for note in notes)
+        if count:
+            issues[keyword] = count
+    return {'appointments': appointments, 'sessions': sessions, 'students': students,
+            'session_types': session_types, 'referrals': referrals, 'notes': len(notes), 'issues': issues}
+
+def rolled_up(conn, start, end):
+    totals = report_rollup.period_totals(conn, start, end, today=TODAY)
+    return {'appointments': totals.appointments, 'sessions': totals.sessions,
+            'students': totals.unique_students(), 'session_types': totals.session_types,
+            'referrals': totals.referrals, 'notes': totals.notes, 'issues': totals.issues}
+
+WINDOWS = [
+    (datetime(2025, 3, 3), datetime(2025, 3, 9, 23, 59, 59)),
+    (datetime(2025, 3, 4, 0, 0, 0), datetime(2025, 3, 5, 23, 59, 59)),
+    (datetime(2025, 3, 3, 9, 30), datetime(2025, 3, 7, 12, 0)),
+    (datetime(2025, 3, 6), datetime(2025, 3, 10, 23, 59, 59)),
+    (datetime(2025, 3, 10), datetime(2025, 3, 10, 23, 59, 59)),
+]
+
+@pytest.mark.parametrize('start, end', WINDOWS)
+def test_period_totals_match_raw_sql(conn, activity, start, end):
+    assert rolled_up(conn, start, end) == raw_totals(conn, start, end)
+
+def test_period_totals_follow_edits_to_closed_days(conn, activity):
+    start, end = WINDOWS[0]
+    report_rollup.period_totals(conn, start, end, today=TODAY)
+    conn.commit()
+
+    # Move a session to another day, drop a referral, change a status, rename a programme
+    conn.execute("UPDATE session SET created_at = '2025-03-06 10:00:00' WHERE id = ?", (activity[0],))
+    conn.execute("DELETE FROM Referral WHERE created_at = '2025-03-07 16:00:00'")
+    conn.execute("UPDATE Appointment SET status = 'No Show' WHERE date = '2025-03-05'")
+    conn.execute("UPDATE Student SET programme = 'BSc Renamed' WHERE programme = 'BSc Testing'")
+    conn.commit()
+
+    for start, end in WINDOWS:
+        assert rolled_up(conn, start, end) == raw_totals(conn, start, end)
+    totals = report_rollup.period_totals(conn, *WINDOWS[0], today=TODAY)
+    assert dict(totals.top_programmes()) == {'BSc Renamed': 1, None: 1}
+
+def test_unique_students_merge_across_days(conn, activity):
+    totals = report_rollup.period_totals(conn, *WINDOWS[0], today=TODAY)
+    assert totals.unique_students() == 2
+    assert dict(totals.top_programmes()) == {'BSc Testing': 1, None: 1}
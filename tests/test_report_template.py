@@ -0,0 +1,75 @@
+import io
+import os
+
+import pytest
+from docx import Document
+
+import report_template
+
+@pytest.fixture
+def template_file(tmp_path):
+    path = str(tmp_path / report_template.TEMPLATE_NAME)
+    report_template.load_template(path)  # builds the stock template
+    return path
+
+def rendered(template, values=None, body=None):
+    data = template.render(values, {'body': body} if body is not None else None)
+    return Document(io.BytesIO(data))
+
+def texts(document):
+    return [paragraph.text for paragraph in document.paragraphs if paragraph.text]
+
+def test_stock_template_has_the_placeholders_and_styles(template_file):
+    template = report_template.load_template(template_file)
+    assert template.placeholders == ['body', 'submitted', 'title']
+    styles = {style.style_id for style in Document(template_file).styles}
+    assert {'Title', 'Heading1', 'ListBullet', 'TableText'} <= styles
+
+def test_render_fills_values_and_the_body_slot(template_file):
+    body = report_template.ReportBody()
+    body.heading('Summary')
+    body.paragraph('Line one\nLine two')
+    body.bullet('Risky <stuff> & "quotes"\x07')
+    document = rendered(report_template.load_template(template_file),
+                        {'title': 'Weekly Report', 'submitted': 'March 10, 2025'}, body)
+
+    lines = texts(document)
+    assert 'Weekly Report' in lines and 'Date of Submission: March 10, 2025' in lines
+    assert not any('{{' in line for line in lines)
+    assert lines[-3:] == ['Summary', 'Line one\nLine two', 'Risky <stuff> & "quotes"']
+    styles = [p.style.name for p in document.paragraphs if p.text in ('Summary', 'Risky <stuff> & "quotes"')]
+    assert styles == ['Heading 1', 'List Bullet']
+
+def test_table_rows_come_from_any_iterable(template_file):
+    body = report_template.ReportBody()
+    body.table(['Name', 'Sessions'], ((name, count) for name, count in [('Ama', 3), ('Kofi', None)]),
+               title='Register')
+    document = rendered(report_template.load_template(template_file), {}, body)
+    [table] = document.tables
+    assert [[cell.text for cell in row.cells] for row in table.rows] == \
+        [['Name', 'Sessions'], ['Ama', '3'], ['Kofi', 'N/A']]
+    assert table.style.name == 'Light Grid Accent 1'
+    assert 'Register' in texts(document)
+
+def test_placeholder_split_across_runs_is_still_found(tmp_path):
+    document = Document()
+    paragraph = document.add_paragraph()
+    for piece in ('Prepared by {', '{aut', 'hor}', '}.'):
+        paragraph.add_run(piece).bold = True
+    document.add_paragraph('{{body}}')
+    path = str(tmp_path / 'custom.docx')
+    document.save(path)
+
+    template = report_template.load_template(path)
+    assert template.placeholders == ['author', 'body']
+    output = rendered(template, {'author': 'The Counselling Centre'})
+    assert texts(output) == ['Prepared by The Counselling Centre.']
+    assert output.paragraphs[0].runs[0].bold
+
+def test_compiled_template_is_reused_until_the_file_changes(template_file):
+    template = report_template.load_template(template_file)
+    assert report_template.load_template(template_file) is template
+
+    stamp = os.path.getmtime(template_file) + 10
+    os.utime(template_file, (stamp, stamp))
+    assert report_template.load_template(template_file) is not template
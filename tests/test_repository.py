@@ -0,0 +1,46 @@
+import repository
+from conftest import add_appointment, add_session
+
+def all_pages(page, conn, limit):
+    rows, after, pages = [], None, 0
+    while True:
+        batch, after = page(conn, after, limit)
+        pages += 1
+        rows.extend(batch)
+        if len(batch) < limit:
+            return rows, pages
+
+def test_session_pages_walk_every_row_once_nulls_last(conn, student_id):
+    appt_id = add_appointment(conn, student_id, '2030-01-07')
+    for created_at in ('2030-01-07 09:00:00', '2030-01-07 09:00:00', None, '2030-01-08 10:00:00', None,
+                       '2030-01-06 08:00:00', '2030-01-07 09:00:00'):
+        add_session(conn, appt_id, created_at)
+    expected = [row[0] for row in conn.execute(
+        "SELECT id FROM session ORDER BY created_at IS NULL, created_at DESC, id DESC")]
+
+    for limit in (1, 2, 3, len(expected), len(expected) + 5):
+        rows, _pages = all_pages(repository.page_sessions, conn, limit)
+        assert [row[0] for row in rows] == expected
+
+def test_appointment_pages_seek_on_date_then_time(conn, student_id):
+    for day, time in (('2030-01-07', '09:00'), ('2030-01-07', '14:00'), ('2030-01-08', '08:00'),
+                      ('2030-01-07', '14:00'), ('2030-01-06', '16:00')):
+        add_appointment(conn, student_id, day, time)
+    expected = [row[0] for row in conn.execute(
+        "SELECT id FROM Appointment ORDER BY date IS NULL, date DESC, time DESC, id DESC")]
+
+    rows, pages = all_pages(repository.page_appointments, conn, 2)
+    assert [row[0] for row in rows] == expected
+    assert pages == len(expected) // 2 + 1
+    # (id, date, time, student, counsellor, status, purpose)
+    assert rows[0][1:3] == ('2030-01-08', '08:00') and rows[0][3] == 'Test Student'
+
+def test_a_page_continues_from_the_key_it_returned(conn):
+    first, after = repository.page_students(conn, limit=2)
+    second, _after = repository.page_students(conn, after, limit=2)
+    assert after == repository.STUDENT_PAGES.key(first[-1])
+    assert not {row[0] for row in first} & {row[0] for row in second}
+
+def test_an_empty_listing_keeps_the_cursor(conn):
+    conn.execute("DELETE FROM session")
+    assert repository.page_sessions(conn, ('2030-01-01 00:00:00', 5)) == ([], ('2030-01-01 00:00:00', 5))
@@ -0,0 +1,84 @@
+import risk_engine
+import scoring_engine
+from conftest import add_appointment, add_session
+
+def open_flags(conn, student_id):
+    return {row['rule_id']: row['severity'] for row in conn.execute(
+        "SELECT rule_id, severity FROM RiskFlag WHERE student_id = ? AND resolved_at IS NULL", (student_id,))}
+
+def at_risk(conn, student_id):
+    row = conn.execute("SELECT severity, open_flags FROM AtRiskStudent WHERE student_id = ?", (student_id,)).fetchone()
+    return tuple(row) if row is not None else None
+
+def notifications(conn, student_id):
+    return conn.execute("SELECT COUNT(*) FROM Notification WHERE link = ?",
+                        (f"/student_profile/{student_id}",)).fetchone()[0]
+
+def test_crisis_appointment_raises_a_flag_once(conn, student_id):
+    appt_id = add_appointment(conn, student_id, '2030-01-07', urgency='Crisis')
+    assert risk_engine.evaluate(conn, 'appointment', appt_id) == ['Crisis appointment']
+    assert open_flags(conn, student_id) == {'crisis_urgency': 'high'}
+    assert at_risk(conn, student_id) == ('high', 1)
+    # Admin and counsellor accounts are told; the secretary isn't
+    assert notifications(conn, student_id) == 2
+
+    assert risk_engine.evaluate(conn, 'appointment', appt_id) == []
+    assert at_risk(conn, student_id) == ('high', 1)
+    assert notifications(conn, student_id) == 2
+
+def test_normal_appointment_raises_nothing(conn, student_id):
+    appt_id = add_appointment(conn, student_id, '2030-01-07')
+    assert risk_engine.evaluate(conn, 'appointment', appt_id) == []
+    assert at_risk(conn, student_id) is None
+
+def test_session_keyword_flag(conn, student_id):
+    appt_id = add_appointment(conn, student_id, '2030-01-07')
+    session_id = add_session(conn, appt_id, '2030-01-07 09:30:00', 'Student reports feeling hopeless lately')
+    assert risk_engine.evaluate(conn, 'session', session_id) == ['Session notes mention "hopeless"']
+    assert open_flags(conn, student_id) == {'risk_keywords': 'high'}
+
+def test_severe_dass21_flags_from_the_stored_scores(conn, student_id):
+    dass_id = conn.execute("INSERT INTO DASS21 (student_id, depression_score, anxiety_score, stress_score, created_at) "
+                           "VALUES (?, 14, 2, 5, '2030-01-07 10:00:00')", (student_id,)).lastrowid
+    scoring_engine.refresh_student(conn, student_id)
+    assert risk_engine.evaluate(conn, 'dass21', dass_id)
+    assert open_flags(conn, student_id) == {'dass_depression_severe': 'high'}
+
+def test_resolving_takes_the_student_off_the_list(conn, student_id):
+    appt_id = add_appointment(conn, student_id, '2030-01-07', urgency='Urgent')
+    risk_engine.evaluate(conn, 'appointment', appt_id)
+    # The urgent rule doesn't notify
+    assert at_risk(conn, student_id) == ('medium', 1)
+    assert notifications(conn, student_id) == 0
+
+    assert risk_engine.resolve_student(conn, student_id, resolved_by='admin') == 1
+    assert open_flags(conn, student_id) == {}
+    assert at_risk(conn, student_id) is None
+    resolved = conn.execute("SELECT resolved_by, resolved_at FROM RiskFlag WHERE student_id = ?",
+                            (student_id,)).fetchone()
+    assert resolved['resolved_by'] == 'admin' and resolved['resolved_at']
+
+def test_deleting_the_source_drops_its_flags(conn, student_id):
+    appt_id = add_appointment(conn, student_id, '2030-01-07', urgency='Crisis')
+    session_id = add_session(conn, appt_id, '2030-01-07 09:30:00', 'talked about self-harm')
+    risk_engine.evaluate(conn, 'appointment', appt_id)
+    risk_engine.evaluate(conn, 'session', session_id)
+    assert at_risk(conn, student_id) == ('high', 2)
+
+    conn.execute("DELETE FROM session WHERE id = ?", (session_id,))
+    assert risk_engine.forget_deleted(conn, student_id) == 1
+    assert open_flags(conn, student_id) == {'crisis_urgency': 'high'}
+    assert at_risk(conn, student_id) == ('high', 1)
+
+    # After a sync delete, prune() catches it for every student
+    conn.execute("DELETE FROM Appointment WHERE id = ?", (appt_id,))
+    risk_engine.prune(conn)
+    assert open_flags(conn, student_id) == {}
+    assert at_risk(conn, student_id) is None
+
+def test_forgetting_a_deleted_student(conn, student_id):
+    appt_id = add_appointment(conn, student_id, '2030-01-07', urgency='Crisis')
+    risk_engine.evaluate(conn, 'appointment', appt_id)
+    risk_engine.forget_student(conn, student_id)
+    assert conn.execute("SELECT COUNT(*) FROM RiskFlag WHERE student_id = ?", (student_id,)).fetchone()[0] == 0
+    assert at_risk(conn, student_id) is None
@@ -0,0 +1,133 @@
+import threading
+import time
+
+import pytest
+
+from conftest import add_appointment, connect
+import scheduling_engine
+from scheduling_engine import SlotIndex
+
+MONDAY = '2030-01-07'
+SATURDAY = '2030-01-12'
+
+@pytest.fixture
+def index(conn):
+    index = SlotIndex()
+    index.build(conn)
+    return index
+
+def test_overlapping_booking_conflicts(conn, index, student_id):
+    appt_id = add_appointment(conn, student_id, MONDAY, '09:00')
+    conn.commit()
+    index.refresh(conn, appt_id)
+
+    assert index.find_conflict(1, MONDAY, '09:00') == appt_id
+    assert index.find_conflict(1, MONDAY, '09:30') == appt_id
+    assert index.find_conflict(1, MONDAY, '08:30') == appt_id
+    assert index.find_conflict(1, MONDAY, '08:00') is None
+    assert index.find_conflict(1, MONDAY, '10:00') is None
+    assert index.find_conflict(2, MONDAY, '09:00') is None
+    assert index.find_conflict(1, MONDAY, '09:00', ignore_appt_id=appt_id) is None
+
+def test_cancelled_booking_frees_the_slot(conn, index, student_id):
+    appt_id = add_appointment(conn, student_id, MONDAY, '14:00')
+    conn.commit()
+    index.refresh(conn, appt_id)
+    conn.execute("UPDATE Appointment SET status = 'Cancelled' WHERE id = ?", (appt_id,))
+    conn.commit()
+    index.refresh(conn, appt_id)
+
+    assert index.find_conflict(1, MONDAY, '14:00') is None
+
+def test_intakes_do_not_block_each_other_by_default(conn, index, student_id):
+    crisis = add_appointment(conn, student_id, MONDAY, '09:00', counsellor_id=None, urgency='Crisis')
+    conn.commit()
+    index.refresh(conn, crisis)
+    assert index.find_conflict(None, MONDAY, '09:00') is None
+    # A counsellor's own diary is unaffected
+    assert index.find_conflict(1, MONDAY, '09:00') is None
+
+def test_front_desk_capacity_limits_overlapping_intakes(conn, student_id):
+    conn.execute("INSERT INTO app_settings (setting_name, setting_value) VALUES ('front_desk_capacity', '2')")
+    first = add_appointment(conn, student_id, MONDAY, '09:00', counsellor_id=None)
+    conn.commit()
+    index = SlotIndex()
+    index.build(conn)
+    assert index.find_conflict(None, MONDAY, '09:30') is None
+
+    second = add_appointment(conn, student_id, MONDAY, '09:30', counsellor_id=None)
+    conn.commit()
+    index.refresh(conn, second)
+    assert index.find_conflict(None, MONDAY, '09:00') == first
+    assert index.find_conflict(None, MONDAY, '09:00', ignore_appt_id=first) is None
+    # Only the 09:30 intake still runs at 10:00
+    assert index.find_conflict(None, MONDAY, '10:00') is None
+    assert index.next_free_slot(None, from_date=scheduling_engine._parse_date(MONDAY)) == {'date': MONDAY, 'time': '08:00'}
+
+    index.remove(first)
+    assert index.find_conflict(None, MONDAY, '09:00') is None
+
+def test_follow_ups_need_a_positive_interval(conn, student_id):
+    with pytest.raises(ValueError, match='interval_days must be at least 1'):
+        scheduling_engine.generate_follow_ups(conn, student_id, 1, scheduling_engine._parse_date(MONDAY),
+                                              count=3, interval_days=0)
+    assert conn.execute("SELECT COUNT(*) FROM Appointment WHERE student_id = ?", (student_id,)).fetchone()[0] == 0
+
+@pytest.mark.parametrize('value', ['x', None, 0, -7])
+def test_whole_number_rejects(value):
+    with pytest.raises(ValueError, match='interval_days must be'):
+        scheduling_engine._whole_number(value, 'interval_days')
+
+@pytest.mark.parametrize('counsellor_id, date, time_, message', [
+    ('abc', MONDAY, '09:00', 'counsellor_id must be a number'),
+    (1, '2030-1-x', '09:00', 'date must be YYYY-MM-DD'),
+    (1, MONDAY, '9am', 'time must be HH:MM'),
+    (1, MONDAY, '25:00', 'time must be HH:MM'),
+    (1, SATURDAY, '09:00', 'Saturday is not a working day'),
+    (1, MONDAY, '07:00', 'Appointments must fall between 08:00 and 17:00'),
+    (1, MONDAY, '16:30', 'Appointments must fall between 08:00 and 17:00'),
+    (1, MONDAY, '12:30', '12:00-13:00 is the lunch break'),
+])
+def test_validate_rejects(index, counsellor_id, date, time_, message):
+    with pytest.raises(ValueError, match=message):
+        index.validate(counsellor_id, date, time_)
+
+def test_validate_accepts_working_hours(index):
+    index.validate(1, MONDAY, '08:00')
+    index.validate(1, MONDAY, '16:00:00')
+    index.validate(None, MONDAY, '13:00')
+
+def test_concurrent_bookings_take_the_slot_once(db_path, conn, index, student_id):
+    """Each thread runs the booking routes' check-then-insert under SlotIndex.booking()"""
+    threads_count = 6
+    barrier = threading.Barrier(threads_count)
+    results = []
+
+    def book():
+        own = connect(db_path)
+        try:
+            barrier.wait()
+            with index.booking():
+                index.validate(1, MONDAY, '10:00')
+                if index.find_conflict(1, MONDAY, '10:00') is not None:
+                    results.append('conflict')
+                    return
+                # Widen the window between check and insert
+                time.sleep(0.05)
+                appt_id = add_appointment(own, student_id, MONDAY, '10:00')
+                own.commit()
+                index.refresh(own, appt_id)
+                results.append('booked')
+        finally:
+            own.close()
+
+    threads = [threading.Thread(target=book) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert sorted(results) == ['booked'] + ['conflict'] * (threads_count - 1)
+    booked = conn.execute("SELECT COUNT(*) FROM Appointment WHERE Counsellor_id = 1 AND date = ? AND time = '10:00'",
+                          (MONDAY,)).fetchone()[0]
+    assert booked == 1
@@ -0,0 +1,155 @@
+import pytest
+
+import oq_items
+import scoring_engine
+from scoring_engine import SCALES_BY_NAME
+
+@pytest.fixture(params=['loop', 'arrays'], autouse=True)
+def scoring_path(request, monkeypatch):
+    """Every test runs on the plain loops and, when numpy is installed, on the array code"""
+    if request.param == 'loop':
+        monkeypatch.setattr(scoring_engine, 'np', None)
+    else:
+        monkeypatch.setattr(scoring_engine, 'np', pytest.importorskip('numpy'))
+    return request.param
+
+def add_dass(conn, student_id, depression, anxiety, stress, created_at):
+    return conn.execute("INSERT INTO DASS21 (student_id, depression_score, anxiety_score, stress_score, created_at) "
+                        "VALUES (?, ?, ?, ?, ?)", (student_id, depression, anxiety, stress, created_at)).lastrowid
+
+def add_oq(conn, student_id, total, created_at, answers=None):
+    return conn.execute("INSERT INTO OutcomeQuestionnaire (student_id, total_score, items, created_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        (student_id, total, oq_items.pack(answers) if answers else None, created_at)).lastrowid
+
+def stored(conn, source, source_id, scale):
+    row = conn.execute("SELECT score, band, change, rci, reliable FROM AssessmentScore "
+                       "WHERE source = ? AND source_id = ? AND scale = ?", (source, source_id, scale)).fetchone()
+    return tuple(row) if row is not None else None
+
+@pytest.mark.parametrize('scale, raw, band', [
+    ('depression', 4, 'Normal'),
+    ('depression', 5, 'Mild'),
+    ('depression', 7, 'Moderate'),
+    ('depression', 14, 'Extremely Severe'),
+    ('anxiety', 5, 'Moderate'),
+    ('stress', 17, 'Extremely Severe'),
+    ('oq_total', 30, 'Normal'),
+    ('oq_total', 31, 'Elevated'),
+    ('oq_total', 36, 'Clinical'),
+])
+def test_bands_on_the_doubled_and_prorated_scales(scale, raw, band):
+    source = SCALES_BY_NAME[scale].source
+    [row] = scoring_engine.score_observations([(source, 1, 1, '2025-03-03', scale, raw, None)])
+    assert row[6] == raw * SCALES_BY_NAME[scale].multiplier
+    assert row[7] == band
+
+def test_oq_cutoffs_are_prorated_from_the_oq45():
+    assert scoring_engine.OQ_CUTOFFS == (31, 36)
+    assert 0 < scoring_engine._spearman_brown(0.84, 25 / 45) < 0.84
+
+def test_change_and_reliable_change_index():
+    observations = [
+        ('dass21', 1, 7, '2025-03-03 10:00:00', 'depression', 14, None),
+        ('dass21', 2, 7, '2025-03-10 10:00:00', 'depression', 5, None),
+        ('dass21', 3, 7, '2025-03-17 10:00:00', 'depression', 6, None),
+    ]
+    rows = {row[1]: row for row in scoring_engine.score_observations(observations)}
+    se_diff = SCALES_BY_NAME['depression'].se_diff
+    # First assessment has nothing to compare with
+    assert rows[1][9:12] == (None, None, None)
+    assert rows[2][9] == -18 and rows[2][10] == round(-18 / se_diff, 3) and rows[2][11] == 1
+    assert rows[3][9] == 2 and rows[3][11] == 0
+
+def test_change_is_per_student_in_time_order():
+    observations = [
+        ('dass21', 4, 2, '2025-03-10', 'stress', 20, None),
+        ('dass21', 1, 1, '2025-03-03', 'stress', 5, None),
+        ('dass21', 3, 2, '2025-03-03', 'stress', 2, None),
+        ('dass21', 2, 1, '2025-03-10', 'stress', None, None),
+        ('dass21', 5, 1, '2025-03-17', 'stress', 10, None),
+    ]
+    rows = {row[1]: row for row in scoring_engine.score_observations(observations)}
+    assert rows[3][9] is None
+    assert rows[4][9] == 36 and rows[4][11] == -1
+    # An unanswered assessment is skipped, not compared against
+    assert rows[2][6] is None
+    assert rows[5][9] == 10
+
+def test_refresh_rescores_only_changed_students(conn, student_id):
+    scoring_engine.refresh(conn)
+    first = add_dass(conn, student_id, 14, 2, 5, '2025-03-03 10:00:00')
+    assert scoring_engine.refresh(conn) == 1
+    assert stored(conn, 'dass21', first, 'depression') == (28, 'Extremely Severe', None, None, None)
+    assert scoring_engine.refresh(conn) == 0
+
+    second = add_dass(conn, student_id, 5, 2, 5, '2025-03-10 10:00:00')
+    assert scoring_engine.refresh(conn) == 1
+    assert stored(conn, 'dass21', second, 'depression')[2] == -18
+
+    conn.execute("UPDATE DASS21 SET depression_score = 7 WHERE id = ?", (first,))
+    assert scoring_engine.refresh(conn) == 1
+    assert stored(conn, 'dass21', second, 'depression')[2] == -4
+
+    conn.execute("DELETE FROM DASS21 WHERE id = ?", (first,))
+    assert scoring_engine.refresh(conn) == 1
+    assert stored(conn, 'dass21', first, 'depression') is None
+    assert stored(conn, 'dass21', second, 'depression')[2] is None
+
+def test_oq_scores_the_item_sum_when_every_item_is_answered(conn, student_id):
+    complete = add_oq(conn, student_id, 99, '2025-03-03 10:00:00', [2] * oq_items.ITEM_COUNT)
+    partial = add_oq(conn, student_id, 33, '2025-03-10 10:00:00', [1, None, 2])
+    scoring_engine.refresh_student(conn, student_id)
+    assert stored(conn, 'oq', complete, 'oq_total')[:2] == (50, 'Clinical')
+    assert stored(conn, 'oq', partial, 'oq_total')[:3] == (33, 'Elevated', -17)
+
+def test_student_trajectory(conn, student_id):
+    add_dass(conn, student_id, 14, 2, 5, '2025-03-03 10:00:00')
+    add_dass(conn, student_id, 3, 2, 5, '2025-04-03 10:00:00')
+    scoring_engine.refresh_student(conn, student_id)
+    trajectory = scoring_engine.student_trajectory(conn, student_id)
+    assert [point['score'] for point in trajectory['scales']['depression']] == [28, 6]
+    assert trajectory['scales']['oq_total'] == []
+    summary = trajectory['summary']['depression']
+    assert (summary['band_first'], summary['band_last'], summary['change'], summary['reliable']) == \
+        ('Extremely Severe', 'Normal', -22, 1)
+    assert summary == scoring_engine.overall_change(SCALES_BY_NAME['depression'], 28, 6, 2)
+
+def test_annotate_matches_the_stored_scores(conn, student_id):
+    records = [{'id': add_dass(conn, student_id, 5, 6, 9, '2025-03-10 10:00:00'), 'depression_score': 5,
+                'anxiety_score': 6, 'stress_score': 9, 'created_at': '2025-03-10 10:00:00'},
+               {'id': add_dass(conn, student_id, 14, 2, 5, '2025-03-03 10:00:00'), 'depression_score': 14,
+                'anxiety_score': 2, 'stress_score': 5, 'created_at': '2025-03-03 10:00:00'}]
+    scoring_engine.refresh_student(conn, student_id)
+    scoring_engine.annotate(records, [])
+    newest = records[0]['depression']
+    assert (newest['score'], newest['band'], newest['change']) == stored(conn, 'dass21', records[0]['id'],
+                                                                         'depression')[:3]
+    assert newest['reliable'] == 1 and newest['level'] == 'success' and not newest['clinical']
+    assert records[1]['depression']['clinical'] and records[1]['depression']['level'] == 'danger'
+
+def test_cohort_summary_by_programme(conn, student_id):
+    other = conn.execute("INSERT INTO Student (name, programme) VALUES ('Other Student', 'BSc Testing')").lastrowid
+    add_dass(conn, student_id, 14, 2, 5, '2025-03-03 10:00:00')
+    add_dass(conn, student_id, 4, 2, 5, '2025-04-03 10:00:00')
+    add_dass(conn, other, 8, 2, 5, '2025-03-05 10:00:00')
+    scoring_engine.rescore_students(conn, [student_id, other])
+
+    summary = {(row['group'], row['scale']): row for row in scoring_engine.cohort_summary(conn)}
+    depression = summary[('BSc Testing', 'depression')]
+    assert (depression['students'], depression['assessments'], depression['paired']) == (2, 3, 1)
+    assert depression['mean_first'] == 22 and depression['mean_last'] == 12
+    assert depression['mean_change'] == -20 and depression['pct_improved'] == 100.0
+    assert depression['pct_clinical_first'] == 100.0 and depression['pct_clinical_last'] == 50.0
+    with pytest.raises(ValueError):
+        scoring_engine.cohort_summary(conn, by='hall')
+
+@pytest.mark.parametrize('taken_at, semester', [
+    ('2024-08-01', '2024/2025 Sem 1'),
+    ('2025-01-31 23:00:00', '2024/2025 Sem 1'),
+    ('2025-02-01', '2024/2025 Sem 2'),
+    ('2025-07-31', '2024/2025 Sem 2'),
+    (None, None),
+])
+def test_semester_of(taken_at, semester):
+    assert scoring_engine.semester_of(taken_at) == semester
@@ -0,0 +1,82 @@
+import http.client
+import threading
+
+import pytest
+
+import server
+
+@pytest.fixture
+def pooled(config):
+    """A built-in server on a free port with 1 thread and room for 1 waiting request"""
+    release = threading.Event()
+    entered = threading.Event()
+
+    def app(environ, start_response):
+        if environ['PATH_INFO'] == '/slow':
+            entered.set()
+            release.wait(5)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+
+    config.update({'server_host': '127.0.0.1', 'server_port': 0, 'server_threads': 1, 'server_backlog': 1,
+                   'server_graceful_seconds': 2})
+    httpd = server.create_server(app, config=config)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd, entered, release
+    release.set()
+    httpd.shutdown()
+    thread.join(5)
+
+def get(port, path='/'):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+def test_serves_requests_on_the_configured_address(pooled):
+    httpd, _entered, _release = pooled
+    assert httpd.host == '127.0.0.1'
+    assert get(httpd.port) == (200, b'ok')
+
+def test_turns_requests_away_when_the_pool_and_queue_are_full(pooled):
+    httpd, entered, release = pooled
+    results = []
+    slow = threading.Thread(target=lambda: results.append(get(httpd.port, '/slow')))
+    slow.start()
+    assert entered.wait(5)
+    waiting = threading.Thread(target=lambda: results.append(get(httpd.port)))
+    waiting.start()
+    # Wait until the second request sits in the queue
+    for _ in range(100):
+        if httpd.stats()['pending']:
+            break
+        threading.Event().wait(0.02)
+
+    status, body = get(httpd.port)
+    assert status == 503 and body == server.BUSY_BODY
+
+    release.set()
+    slow.join(5)
+    waiting.join(5)
+    assert sorted(results) == [(200, b'ok'), (200, b'ok')]
+    assert httpd.stats()['rejected'] == 1
+
+def test_serve_uses_the_configured_host_and_port(config, monkeypatch):
+    calls = []
+    monkeypatch.setattr(server, 'serve_builtin', lambda *args: calls.append(args))
+    config.update({'server_host': '127.0.0.2', 'server_port': '8123'})
+    server.serve('app:app', backend='builtin', config=config)
+    server.serve('app:app', port=9000, backend='builtin', config=config)
+    assert [call[1:3] for call in calls] == [('127.0.0.2', 8123), ('127.0.0.2', 9000)]
+
+def test_more_than_one_worker_is_refused(config, capsys):
+    config['server_workers'] = 4
+    assert server.worker_count(config) == 1
+    assert 'server_workers = 4 is not supported' in capsys.readouterr().out
+    config['server_workers'] = 1
+    assert server.worker_count(config) == 1
+    assert capsys.readouterr().out == ''
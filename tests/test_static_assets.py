@@ -0,0 +1,82 @@
+import gzip
+import json
+import os
+
+import pytest
+from flask import Flask, render_template_string
+
+import static_assets
+
+CSS = b"body { background: url('../img/bg.png?v=3'); } .icon { background: url(\"../img/icons.svg#home\"); } " * 20
+
+@pytest.fixture
+def static_dir(tmp_path, monkeypatch):
+    root = tmp_path / 'static'
+    for name, content in (('css/site.css', CSS), ('img/bg.png', b'\x89PNG tiny'),
+                          ('img/icons.svg', b'<svg>' + b'<path d="M0 0"/>' * 50 + b'</svg>'),
+                          ('js/app.js', b'console.log(1);')):
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+    monkeypatch.setattr(static_assets, 'get_static_dir', lambda: str(root))
+    static_assets.asset_manifest.reload()
+    yield root
+    static_assets.asset_manifest.reload()
+
+@pytest.fixture
+def client(static_dir):
+    app = Flask(__name__, static_folder=str(static_dir))
+    app.register_blueprint(static_assets.assets_bp)
+    app.add_url_rule('/page', 'page', lambda: render_template_string("{{ asset_url('css/site.css') }}"))
+    return app.test_client()
+
+def built(static_dir, name):
+    return (static_dir / 'build' / name).read_bytes()
+
+def test_build_fingerprints_and_rewrites_css_urls(static_dir):
+    manifest = static_assets.build_assets(verbose=False)
+    assert set(manifest) == {'css/site.css', 'img/bg.png', 'img/icons.svg', 'js/app.js'}
+    assert manifest['img/bg.png'] == static_assets.fingerprint('img/bg.png', b'\x89PNG tiny')
+
+    css = built(static_dir, manifest['css/site.css']).decode()
+    png, svg = (os.path.basename(manifest[name]) for name in ('img/bg.png', 'img/icons.svg'))
+    # The cache-busting query gives way to the hash; the svg fragment stays
+    assert f"url('../img/{png}')" in css and f'url("../img/{svg}#home")' in css
+    assert manifest['css/site.css'] == static_assets.fingerprint('css/site.css', css.encode())
+
+def test_gzip_variants_only_when_smaller(static_dir):
+    manifest = static_assets.build_assets(verbose=False)
+    build = static_dir / 'build'
+    css = build / manifest['css/site.css']
+    assert gzip.decompress((build / (manifest['css/site.css'] + '.gz')).read_bytes()) == css.read_bytes()
+    # Too small to shrink, or not a compressible type
+    assert not (build / (manifest['js/app.js'] + '.gz')).exists()
+    assert not (build / (manifest['img/bg.png'] + '.gz')).exists()
+
+def test_ensure_built_rebuilds_only_after_a_change(static_dir):
+    assert static_assets.ensure_built()
+    assert not static_assets.ensure_built()
+    (static_dir / 'js' / 'app.js').write_bytes(b'console.log(2); // changed')
+    assert static_assets.ensure_built()
+    with open(static_dir / 'build' / static_assets.MANIFEST_NAME) as f:
+        files = json.load(f)['files']
+    assert files['js/app.js'] == static_assets.fingerprint('js/app.js', b'console.log(2); // changed')
+
+def test_asset_url_falls_back_to_static_without_a_build(client):
+    assert client.get('/page').get_data(as_text=True) == '/static/css/site.css'
+
+def test_assets_are_served_immutable_and_precompressed(client):
+    manifest = static_assets.build_assets(verbose=False)
+    url = client.get('/page').get_data(as_text=True)
+    assert url == f"/assets/{manifest['css/site.css']}"
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Content-Type'].startswith('text/css')
+    assert 'immutable' in response.headers['Cache-Control'] and response.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(response.get_data()).startswith(b'body {')
+
+    plain = client.get(url)
+    assert 'Content-Encoding' not in plain.headers and plain.get_data().startswith(b'body {')
+    assert client.get('/assets/css/site.0000000000.css').status_code == 404
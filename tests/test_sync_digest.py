@@ -0,0 +1,104 @@
+import shutil
+
+import pytest
+
+import sync_engine
+import sync_versions
+from conftest import connect, migrate
+from sync_digest import BUCKET_DEPTH, DigestStore, TableDigest, bucket_of
+
+@pytest.fixture
+def peer(conn, db_path, tmp_path):
+    """A second node that starts out holding exactly what we hold"""
+    conn.commit()
+    path = str(tmp_path / 'peer.db')
+    shutil.copyfile(db_path, path)
+    peer = connect(path)
+    migrate(peer)
+    yield peer
+    peer.close()
+
+def built(conn, table='Student'):
+    digest = TableDigest(table)
+    digest.build(conn)
+    return digest
+
+def add_student(conn, name):
+    row_id = conn.execute("INSERT INTO Student (name) VALUES (?)", (name,)).lastrowid
+    return conn.execute("SELECT global_id FROM Student WHERE id = ?", (row_id,)).fetchone()[0]
+
+def test_equal_tables_have_equal_roots(conn, peer):
+    assert built(conn).root() == built(peer).root()
+    add_student(peer, 'Only On The Peer')
+    assert built(conn).root() != built(peer).root()
+
+def test_catch_up_matches_a_full_build(conn):
+    digest = built(conn)
+    gid = add_student(conn, 'New Student')
+    conn.execute("UPDATE Student SET department = 'Edited' WHERE global_id != ?", (gid,))
+    digest.catch_up(conn)
+    assert digest.root() == built(conn).root()
+    assert gid in digest.rows(bucket_of(gid))
+
+def test_catch_up_notices_a_delete(conn):
+    gid = add_student(conn, 'Short Lived')
+    digest = built(conn)
+    conn.execute("DELETE FROM Student WHERE global_id = ?", (gid,))
+    digest.catch_up(conn)
+    assert gid not in digest.rows(bucket_of(gid))
+    assert digest.root() == built(conn).root()
+
+def test_refresh_ids_takes_an_older_merged_timestamp(conn):
+    gid = add_student(conn, 'Merged Student')
+    digest = built(conn)
+    # A sync merge can write an updated_at below the watermark, which catch_up would not re-read
+    sync_versions.begin_merge(conn, None)
+    conn.execute("UPDATE Student SET updated_at = '2000-01-01 00:00:00' WHERE global_id = ?", (gid,))
+    sync_versions.end_merge(conn)
+    digest.refresh_ids(conn, [gid, None])
+    assert digest.rows(bucket_of(gid))[gid] == '2000-01-01 00:00:00'
+    assert digest.root() == built(conn).root()
+
+def test_children_lead_to_the_diverged_bucket(conn, peer):
+    gid = add_student(peer, 'Only On The Peer')
+    ours, theirs = built(conn), built(peer)
+    prefix = ''
+    while len(prefix) < BUCKET_DEPTH:
+        mine, other = ours.children(prefix), theirs.children(prefix)
+        [prefix] = [key for key in set(mine) | set(other) if mine.get(key) != other.get(key)]
+    assert prefix == bucket_of(gid)
+    assert set(theirs.rows(prefix)) - set(ours.rows(prefix)) == {gid}
+
+class PeerTransport:
+    """Answers /digest from the peer's database the way the sync endpoint does"""
+
+    def __init__(self, peer):
+        self.peer = peer
+        self.store = DigestStore()
+        self.digests = 0
+
+    def post(self, path, payload):
+        assert path == '/digest'
+        self.digests += 1
+        if 'table' not in payload:
+            return {'status': 'success', 'roots': self.store.roots(self.peer, sync_engine.SYNC_TABLES)}
+        digest = self.store.table(self.peer, payload['table'])
+        if len(payload['prefix']) == BUCKET_DEPTH:
+            return {'status': 'success', 'rows': digest.rows(payload['prefix'])}
+        return {'status': 'success', 'buckets': digest.children(payload['prefix'])}
+
+def test_consistency_check_finds_only_the_diverged_rows(conn, peer, monkeypatch):
+    transport = PeerTransport(peer)
+    monkeypatch.setattr(sync_engine, 'get_transport', lambda peer_url: transport)
+    monkeypatch.setattr(sync_engine, 'digest_store', DigestStore())
+
+    assert sync_engine.check_peer_consistency('http://peer', repair=False) == \
+        {'status': 'success', 'tables': {}, 'count': 0}
+    assert transport.digests == 1  # roots agree: nothing below them is fetched
+
+    add_student(peer, 'Only On The Peer')
+    add_student(conn, 'Only Here')
+    peer.commit()
+    conn.commit()
+    result = sync_engine.check_peer_consistency('http://peer', repair=False)
+    assert result['tables'] == {'Student': {'pull': 1, 'push': 1}}
@@ -0,0 +1,43 @@
+import json
+import os
+import shutil
+
+import sync_simulator
+
+def node_configs(args):
+    simulation = sync_simulator.Simulation(sync_simulator.parse_args(args))
+    try:
+        simulation.configure()
+        configs = []
+        for node in simulation.nodes:
+            with open(os.path.join(node.dir, 'node_config.json')) as f:
+                configs.append(json.load(f))
+            assert os.path.exists(os.path.join(node.dir, 'counseling.db'))
+        return simulation.nodes, configs
+    finally:
+        shutil.rmtree(simulation.root, ignore_errors=True)
+
+def test_hub_topology_points_every_node_at_the_first():
+    nodes, configs = node_configs(['--nodes', '3', '--topology', 'hub'])
+    assert [config['sync_hub'] for config in configs] == ['', nodes[0].address, nodes[0].address]
+    assert len({config['node_id'] for config in configs}) == 3
+
+def test_mesh_topology_lists_every_other_node():
+    nodes, configs = node_configs(['--nodes', '3'])
+    for node, config in zip(nodes, configs):
+        assert sorted(config['peers']) == sorted(other.address for other in nodes if other is not node)
+        assert config['sync_hub'] == ''
+
+def test_needs_two_nodes():
+    assert sync_simulator.main(['--nodes', '1']) == 2
+
+def test_nodes_converge_after_a_partition(tmp_path):
+    """Runs real app processes on localhost; takes a few seconds"""
+    report_path = tmp_path / 'report.json'
+    status = sync_simulator.main(['--nodes', '3', '--topology', 'hub', '--duration', '2', '--rate', '5',
+                                  '--sync-interval', '0.5', '--partition', '1', '--delete-ratio', '0.1',
+                                  '--json', str(report_path)])
+    report = json.loads(report_path.read_text())
+    assert status == 0 and report['converged']
+    assert len(set(report['students'].values())) == 1
+    assert sum(report['edits'].values()) > 0 and report['rows_transferred'] > 0
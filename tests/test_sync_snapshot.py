@@ -0,0 +1,80 @@
+import shutil
+
+import pytest
+
+import sync_snapshot
+from conftest import NODE_ID, connect, migrate
+from sync_engine import SYNC_TABLES
+
+class ChunkSession:
+    """Serves chunk downloads straight from the snapshot builder; `corrupt` chunk indexes come back damaged"""
+
+    def __init__(self, builder, corrupt=()):
+        self.builder = builder
+        self.corrupt = set(corrupt)
+        self.requests = 0
+
+    def get(self, url, timeout=None):
+        self.requests += 1
+        snapshot_id, index = url.split('/')[-2:]
+        data, _sha = self.builder.chunk(snapshot_id, int(index))
+        if int(index) in self.corrupt:
+            data = data[::-1]
+        return type('Response', (), {'status_code': 200, 'content': data})()
+
+@pytest.fixture
+def builder(conn, tmp_path, monkeypatch):
+    monkeypatch.setattr(sync_snapshot, 'SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    # Small chunks so a snapshot of the test database spans several
+    monkeypatch.setattr(sync_snapshot, 'CHUNK_SIZE', 4096)
+    conn.commit()
+    return sync_snapshot.SnapshotBuilder()
+
+@pytest.fixture
+def fresh(db_path, tmp_path):
+    """A new node: the same schema, none of the records"""
+    path = str(tmp_path / 'fresh.db')
+    shutil.copyfile(db_path, path)
+    fresh = connect(path)
+    migrate(fresh)
+    for table in SYNC_TABLES:
+        fresh.execute(f"DELETE FROM {table}")
+    fresh.execute("DELETE FROM sync_changelog")
+    fresh.commit()
+    yield fresh
+    fresh.close()
+
+def rows(conn, table):
+    return [tuple(row) for row in conn.execute(f"SELECT id, global_id, updated_at FROM {table} ORDER BY id")]
+
+def test_bootstrap_round_trip(conn, builder, fresh):
+    assert sync_snapshot.local_is_empty(fresh, SYNC_TABLES)
+    assert not sync_snapshot.local_is_empty(conn, SYNC_TABLES)
+
+    manifest = builder.manifest(SYNC_TABLES, NODE_ID)
+    assert len(manifest['chunks']) > 1
+    assert manifest['cursor'] == conn.execute("SELECT COALESCE(MAX(seq), 0) FROM sync_changelog").fetchone()[0]
+    path = sync_snapshot.download_snapshot(ChunkSession(builder), 'http://peer/api/sync', manifest)
+
+    # Only synced tables leave the node
+    snapshot = connect(path)
+    assert snapshot.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
+    snapshot.close()
+
+    adopted = sync_snapshot.adopt_snapshot(fresh, path, SYNC_TABLES, source_node=NODE_ID)
+    assert adopted['Student'] == conn.execute("SELECT COUNT(*) FROM Student").fetchone()[0]
+    for table in ('Student', 'Appointment', 'session'):
+        assert rows(fresh, table) == rows(conn, table)
+
+def test_manifest_is_reused_while_fresh(builder):
+    first = builder.manifest(SYNC_TABLES, NODE_ID)
+    assert builder.manifest(SYNC_TABLES, NODE_ID)['snapshot_id'] == first['snapshot_id']
+    assert builder.chunk('another-snapshot', 0) is None
+    assert builder.chunk(first['snapshot_id'], len(first['chunks'])) is None
+
+def test_damaged_chunk_is_retried_then_refused(builder):
+    manifest = builder.manifest(SYNC_TABLES, NODE_ID)
+    session = ChunkSession(builder, corrupt={1})
+    with pytest.raises(RuntimeError, match='Chunk 1 could not be downloaded intact'):
+        sync_snapshot.download_snapshot(session, 'http://peer/api/sync', manifest, retries=3)
+    assert session.requests == 1 + 3
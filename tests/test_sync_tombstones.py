@@ -0,0 +1,86 @@
+import sync_tombstones
+import sync_versions
+from conftest import add_appointment, add_session
+
+def global_id(conn, table, row_id):
+    return conn.execute(f"SELECT global_id FROM {table} WHERE id = ?", (row_id,)).fetchone()[0]
+
+def tombstoned(conn):
+    return {row[0]: row[1] for row in conn.execute("SELECT global_id, table_name FROM sync_tombstone")}
+
+def tombstone_seq(conn, gid):
+    return conn.execute("SELECT seq FROM sync_changelog WHERE global_id = ?", (gid,)).fetchone()[0]
+
+def test_cascade_delete_tombstones_the_whole_tree(conn, student_id):
+    appt_id = add_appointment(conn, student_id, '2030-01-07')
+    session_id = add_session(conn, appt_id, '2030-01-07 09:30:00')
+    ids = {'Student': global_id(conn, 'Student', student_id), 'Appointment': global_id(conn, 'Appointment', appt_id),
+           'session': global_id(conn, 'session', session_id)}
+
+    counts = sync_tombstones.cascade_delete(conn, 'Student', 'id = ?', (student_id,), origin_node='NODE_TEST')
+    assert counts == {'Student': 1, 'Appointment': 1, 'session': 1}
+    assert tombstoned(conn) == {gid: table for table, gid in ids.items()}
+    assert conn.execute("SELECT COUNT(*) FROM Appointment WHERE id = ?", (appt_id,)).fetchone()[0] == 0
+
+def test_replayed_delete_loses_to_a_later_edit(conn, student_id):
+    gid = global_id(conn, 'Student', student_id)
+    updated_at = conn.execute("SELECT updated_at FROM Student WHERE id = ?", (student_id,)).fetchone()[0]
+    tomb = {'global_id': gid, 'table_name': 'Student', 'deleted_at': '2000-01-01 00:00:00', 'origin_node': 'NODE_B'}
+    assert updated_at > tomb['deleted_at']
+    assert sync_tombstones.apply_tombstones(conn, [tomb], ['Student']) == {}
+
+    tomb['deleted_at'] = '2999-01-01 00:00:00'
+    assert sync_tombstones.apply_tombstones(conn, [tomb], ['Student']) == {'Student': [gid]}
+    assert conn.execute("SELECT COUNT(*) FROM Student WHERE id = ?", (student_id,)).fetchone()[0] == 0
+
+def test_delete_of_an_unseen_row_is_remembered(conn):
+    tomb = {'global_id': 'gone-elsewhere', 'table_name': 'Student', 'deleted_at': '2030-01-01 00:00:00'}
+    assert sync_tombstones.apply_tombstones(conn, [tomb], ['Student']) == {}
+    assert tombstoned(conn) == {'gone-elsewhere': 'Student'}
+    # Unknown tables are ignored
+    sync_tombstones.apply_tombstones(conn, [dict(tomb, global_id='x', table_name='users')], ['Student'])
+    assert 'x' not in tombstoned(conn)
+
+def test_purge_waits_for_every_configured_peer(conn, student_id):
+    gid = global_id(conn, 'Student', student_id)
+    sync_tombstones.cascade_delete(conn, 'Student', 'id = ?', (student_id,))
+    seq = tombstone_seq(conn, gid)
+    targets = ['10.0.0.2', '10.0.0.3']
+
+    # Nobody has acknowledged yet
+    assert sync_tombstones.purge_acknowledged(conn, targets) == 0
+
+    # One peer has, the other has never synced at all
+    sync_versions.save_cursors(conn, 'NODE_B', 'push', {'*': seq}, '10.0.0.2')
+    sync_tombstones.record_ack(conn, 'NODE_B', seq)
+    assert sync_tombstones.purge_acknowledged(conn, targets) == 0
+
+    # The other has synced, but not acknowledged any deletes
+    sync_versions.save_cursors(conn, 'NODE_C', 'pull', {'Student': 1}, '10.0.0.3')
+    assert sync_tombstones.purge_acknowledged(conn, targets) == 0
+
+    sync_tombstones.record_ack(conn, 'NODE_C', seq)
+    assert sync_tombstones.purge_acknowledged(conn, targets) == 1
+    assert tombstoned(conn) == {}
+
+def test_purge_stops_at_the_slowest_ack(conn, student_id):
+    other = conn.execute("INSERT INTO Student (name) VALUES ('Other Student')").lastrowid
+    first, second = global_id(conn, 'Student', student_id), global_id(conn, 'Student', other)
+    sync_tombstones.cascade_delete(conn, 'Student', 'id = ?', (student_id,))
+    sync_tombstones.cascade_delete(conn, 'Student', 'id = ?', (other,))
+    sync_versions.save_cursors(conn, 'NODE_B', 'push', {'*': 1}, '10.0.0.2')
+    sync_tombstones.record_ack(conn, 'NODE_B', tombstone_seq(conn, second))
+    # A node that syncs with us but isn't in our targets still holds the purge back
+    sync_tombstones.record_ack(conn, 'NODE_D', tombstone_seq(conn, first))
+
+    assert sync_tombstones.purge_acknowledged(conn, ['10.0.0.2']) == 1
+    assert tombstoned(conn) == {second: 'Student'}
+
+def test_purge_reads_the_targets_from_node_config(conn, config, student_id):
+    gid = global_id(conn, 'Student', student_id)
+    sync_tombstones.cascade_delete(conn, 'Student', 'id = ?', (student_id,))
+    sync_tombstones.record_ack(conn, 'NODE_B', tombstone_seq(conn, gid))
+    config['peer_ip'] = '10.0.0.9'
+    assert sync_tombstones.purge_acknowledged(conn) == 0
+    config['peer_ip'] = ''
+    assert sync_tombstones.purge_acknowledged(conn) == 1
@@ -0,0 +1,108 @@
+import gzip
+import json
+
+import pytest
+import requests
+
+import sync_engine
+import sync_transport
+from sync_transport import SyncTransport, TransportError
+
+class Response:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self._body = body if body is not None else {'status': 'success'}
+
+    def json(self):
+        return self._body
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(sync_transport.time, 'sleep', lambda seconds: None)
+
+def scripted(transport, *outcomes):
+    """Answer the transport's requests in turn; an exception outcome is raised. Returns the requests seen."""
+    outcomes = list(outcomes)
+    seen = []
+
+    def request(method, url, timeout=None, **kwargs):
+        seen.append(dict(kwargs, method=method, url=url, timeout=timeout))
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    transport.session.request = request
+    return seen
+
+def test_peer_base_url_adds_the_configured_port(config):
+    assert sync_transport.peer_base_url('10.0.0.2') == 'http://10.0.0.2:5000/api/sync'
+    assert sync_transport.peer_base_url(' 10.0.0.2:6000 ') == 'http://10.0.0.2:6000/api/sync'
+    config['peer_port'] = 8080
+    assert sync_transport.peer_base_url('10.0.0.2') == 'http://10.0.0.2:8080/api/sync'
+
+def test_large_bodies_are_gzipped_small_ones_are_not():
+    small, headers = sync_transport.compress_body({'a': 1}, 1024)
+    assert 'Content-Encoding' not in headers
+    payload = {'records': ['x' * 50] * 100}
+    body, headers = sync_transport.compress_body(payload, 1024)
+    assert headers['Content-Encoding'] == 'gzip' and len(body) < len(json.dumps(payload))
+    assert sync_transport.decode_body(body, 'gzip') == payload
+    assert sync_transport.decode_body(small, None) == {'a': 1}
+    assert sync_transport.decode_body(b'', 'gzip') == {}
+
+def test_only_peers_that_announce_gzip_get_compressed_bodies(config):
+    config['sync_compress_min_bytes'] = 10
+    transport = SyncTransport('http://peer/api/sync')
+    seen = scripted(transport, Response(), Response())
+    payload = {'records': ['x' * 50] * 10}
+    transport.post('/push', payload)
+    transport.peer_features = ['changelog', 'gzip']
+    transport.post('/push', payload)
+    assert json.loads(seen[0]['data']) == payload and 'Content-Encoding' not in seen[0]['headers']
+    assert json.loads(gzip.decompress(seen[1]['data'])) == payload
+
+def test_busy_and_unreachable_peers_are_retried(config):
+    config['sync_retries'] = 3
+    transport = SyncTransport('http://peer/api/sync')
+    seen = scripted(transport, Response(503), requests.ConnectionError('refused'), Response(body={'n': 1}))
+    assert transport.post('/pull') == {'n': 1}
+    assert len(seen) == 3
+    assert seen[0]['timeout'] == (3.0, 15.0)
+
+def test_retries_give_up_with_a_transport_error(config):
+    config['sync_retries'] = 2
+    transport = SyncTransport('http://peer/api/sync')
+    scripted(transport, Response(504), Response(502))
+    with pytest.raises(TransportError, match='/pull failed after 2 attempts: /pull: HTTP 502'):
+        transport.post('/pull')
+
+def test_client_errors_are_not_retried():
+    transport = SyncTransport('http://peer/api/sync')
+    seen = scripted(transport, Response(400, {'status': 'error', 'message': 'Unknown table'}))
+    assert transport.post('/rows', retries=5)['message'] == 'Unknown table'
+    assert len(seen) == 1
+
+def test_one_transport_per_peer():
+    first = sync_transport.get_transport('http://test-peer-a/api/sync')
+    assert sync_transport.get_transport('http://test-peer-a/api/sync') is first
+    assert sync_transport.get_transport('http://test-peer-b/api/sync') is not first
+
+def test_pull_pages_through_every_table(config):
+    config['sync_pull_workers'] = 4
+    transport = SyncTransport('http://peer/api/sync')
+
+    def post(path, payload):
+        [table] = payload['tables']
+        seq = payload['cursors'][table]
+        if table != 'Student':
+            return {'status': 'success', 'changes': {}, 'cursors': {table: seq}}
+        # Two pages of Student changes
+        return {'status': 'success', 'changes': {table: [{'seq': seq + 1}]}, 'cursors': {table: seq + 1},
+                'more': [table] if seq == 0 else []}
+    transport.post = post
+
+    changes, tombstones, cursors = sync_engine.pull_from_peer(transport, {'Appointment': 7}, 'NODE_TEST')
+    assert changes == {'Student': [{'seq': 1}, {'seq': 2}]}
+    assert tombstones == []
+    assert cursors['Student'] == 2 and cursors['Appointment'] == 7
+    assert set(cursors) == set(sync_engine.PULL_TABLES)
@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+import node_config
+import sync_engine
+import sync_versions
+from conftest import NODE_ID
+
+def student(conn, student_id):
+    return dict(conn.execute("SELECT * FROM Student WHERE id = ?", (student_id,)).fetchone())
+
+def vector(conn, student_id):
+    return json.loads(student(conn, student_id)['version_vector'])
+
+def logged_source(conn, global_id):
+    return conn.execute("SELECT source_node FROM sync_changelog WHERE global_id = ?", (global_id,)).fetchone()[0]
+
+def remote(record, **changes):
+    """The record as a peer would send it"""
+    record = dict(record, **changes)
+    record['version_vector'] = sync_versions.dump_vector(record['version_vector'])
+    return record
+
+@pytest.mark.parametrize('a, b, relation', [
+    ({'A': 1}, {'A': 1}, 'equal'),
+    ({}, {}, 'equal'),
+    ({'A': 2}, {'A': 1}, 'newer'),
+    ({'A': 1, 'B': 1}, {'A': 1}, 'newer'),
+    ({'A': 1}, {'A': 1, 'B': 1}, 'older'),
+    ({'A': 2}, {'A': 1, 'B': 1}, 'concurrent'),
+])
+def test_compare(a, b, relation):
+    assert sync_versions.compare(a, b) == relation
+
+def test_merge_vectors_takes_the_highest_counters():
+    assert sync_versions.merge_vectors({'A': 3, 'B': 1}, {'B': 2, 'C': 1}) == {'A': 3, 'B': 2, 'C': 1}
+
+def test_local_writes_bump_our_counter_and_are_logged_as_ours(conn, student_id):
+    assert vector(conn, student_id) == {NODE_ID: 1}
+    conn.execute("UPDATE Student SET department = 'Edited' WHERE id = ?", (student_id,))
+    assert vector(conn, student_id) == {NODE_ID: 2}
+    record = student(conn, student_id)
+    assert record['last_modified_by'] == NODE_ID
+    assert logged_source(conn, record['global_id']) == NODE_ID
+
+def test_a_dominating_remote_version_replaces_ours(conn, student_id):
+    record = student(conn, student_id)
+    incoming = remote(record, name='Edited Elsewhere', last_modified_by='NODE_B',
+                      version_vector={NODE_ID: 1, 'NODE_B': 1})
+    sync_engine.apply_changes(conn, {'Student': [incoming]}, [], 'NODE_B')
+    assert student(conn, student_id)['name'] == 'Edited Elsewhere'
+    assert vector(conn, student_id) == {NODE_ID: 1, 'NODE_B': 1}
+    # Logged as the peer's change, so it isn't echoed back to it
+    assert logged_source(conn, record['global_id']) == 'NODE_B'
+
+    # Replaying an older version changes nothing
+    stale = remote(record, name='Stale', version_vector={NODE_ID: 1})
+    sync_engine.apply_changes(conn, {'Student': [stale]}, [], 'NODE_B')
+    assert student(conn, student_id)['name'] == 'Edited Elsewhere'
+
+def test_concurrent_edits_pick_the_same_winner_and_log_a_conflict(conn, student_id):
+    conn.execute("UPDATE Student SET name = 'Edited Here' WHERE id = ?", (student_id,))
+    record = student(conn, student_id)
+    incoming = remote(record, name='Edited There', last_modified_by='NODE_B', updated_at='2999-01-01 00:00:00',
+                      version_vector={NODE_ID: 1, 'NODE_B': 1})
+    sync_engine.apply_changes(conn, {'Student': [incoming]}, [], 'NODE_B')
+
+    # The later edit wins and the vector covers both histories
+    assert student(conn, student_id)['name'] == 'Edited There'
+    assert vector(conn, student_id) == {NODE_ID: 2, 'NODE_B': 1}
+    conflict = conn.execute("SELECT winner_node, loser_node, loser_record FROM sync_conflict").fetchone()
+    assert (conflict['winner_node'], conflict['loser_node']) == ('NODE_B', NODE_ID)
+    assert json.loads(conflict['loser_record'])['name'] == 'Edited Here'
+    # The peer hasn't seen the merged vector yet: it goes back out as ours
+    assert logged_source(conn, record['global_id']) == NODE_ID
+
+def test_unversioned_rows_fall_back_to_last_write_wins(conn, student_id):
+    sync_versions.begin_merge(conn, None)
+    conn.execute("UPDATE Student SET version_vector = NULL, updated_at = '2030-01-01 00:00:00' WHERE id = ?",
+                 (student_id,))
+    sync_versions.end_merge(conn)
+    record = student(conn, student_id)
+    older = dict(record, name='Older', updated_at='2029-01-01 00:00:00')
+    sync_engine.apply_changes(conn, {'Student': [older]}, [], 'NODE_B')
+    assert student(conn, student_id)['name'] == 'Test Student'
+    newer = dict(record, name='Newer', updated_at='2031-01-01 00:00:00')
+    sync_engine.apply_changes(conn, {'Student': [newer]}, [], 'NODE_B')
+    assert student(conn, student_id)['name'] == 'Newer'
+
+def test_cursors_only_move_forward(conn):
+    sync_versions.save_cursors(conn, 'NODE_B', 'pull', {'Student': 5, 'Appointment': 2}, '10.0.0.2')
+    sync_versions.save_cursors(conn, 'NODE_B', 'pull', {'Student': 3})
+    assert sync_versions.get_cursors(conn, 'NODE_B', 'pull') == {'Student': 5, 'Appointment': 2}
+    assert sync_versions.get_cursors(conn, 'NODE_B', 'push') == {}
+    assert sync_versions.has_cursors(conn, 'NODE_B') and not sync_versions.has_cursors(conn, 'NODE_C')
+    address = conn.execute("SELECT DISTINCT peer_address FROM sync_peer_cursor WHERE peer_node_id = 'NODE_B'")
+    assert [row[0] for row in address] == ['10.0.0.2']
+
+def test_changes_since_pages_through_the_log(conn, student_id):
+    other = conn.execute("INSERT INTO Student (name) VALUES ('Other Student')").lastrowid
+    conn.execute("UPDATE Student SET department = 'Edited' WHERE id = ?", (student_id,))
+    start = sync_versions.latest_seq(conn) - 2
+    entries = sync_versions.changes_since(conn, 'Student', start, 10)
+    assert [entry[1] for entry in entries] == [student(conn, other)['global_id'], student(conn, student_id)['global_id']]
+    assert len(sync_versions.changes_since(conn, 'Student', start, 1)) == 1
+
+@pytest.mark.parametrize('config, targets', [
+    ({'sync_hub': ' hub:5000 ', 'peer_ip': '10.0.0.2', 'peers': ['10.0.0.3']}, ['hub:5000']),
+    ({'peer_ip': '10.0.0.2', 'peers': ['10.0.0.3', ' 10.0.0.2 ', '']}, ['10.0.0.2', '10.0.0.3']),
+    ({'peer_ip': '', 'peers': None}, []),
+])
+def test_sync_targets(config, targets):
+    assert node_config.get_sync_targets(config) == targets
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+from flask import Flask
+
+import template_cache
+
+@pytest.fixture
+def templates(tmp_path):
+    root = tmp_path / 'templates'
+    root.mkdir()
+    (root / 'page.html').write_text("<p>{{ name|upper }}</p>")
+    (root / 'other.html').write_text("{% for n in items %}{{ n }}{% endfor %}")
+    return root
+
+def make_app(templates, cache_dir, fallback=None):
+    app = Flask(__name__, template_folder=str(templates))
+    app.jinja_options = dict(app.jinja_options,
+                             bytecode_cache=template_cache.TemplateBytecodeCache(str(cache_dir), fallback))
+    return app
+
+def count_compiles(app, monkeypatch):
+    compiled = []
+    env = app.jinja_env
+    original = env.compile
+
+    def compile(source, name=None, filename=None, *args, **kwargs):
+        compiled.append(name)
+        return original(source, name, filename, *args, **kwargs)
+    monkeypatch.setattr(env, 'compile', compile)
+    return compiled
+
+def test_precompiled_bytecode_is_used_from_another_folder(templates, tmp_path, monkeypatch):
+    precompiled = tmp_path / 'precompiled'
+    loaded, failed = template_cache.precompile(make_app(templates, tmp_path / 'unused'), str(precompiled))
+    assert (loaded, failed) == (2, [])
+    assert len(os.listdir(precompiled)) == 2
+
+    # The EXE unpacks templates somewhere new each start: the key is the name, not the path
+    moved = tmp_path / 'unpacked' / 'templates'
+    moved.parent.mkdir()
+    templates.rename(moved)
+    app = make_app(moved, tmp_path / 'runtime', str(precompiled))
+    compiled = count_compiles(app, monkeypatch)
+    assert app.jinja_env.get_template('page.html').render(name='x') == '<p>X</p>'
+    assert compiled == []
+
+def test_edited_template_recompiles_and_is_cached_at_runtime(templates, tmp_path, monkeypatch):
+    precompiled = tmp_path / 'precompiled'
+    template_cache.precompile(make_app(templates, tmp_path / 'unused'), str(precompiled))
+    (templates / 'page.html').write_text("<b>{{ name }}</b>")
+
+    runtime = tmp_path / 'runtime'
+    app = make_app(templates, runtime, str(precompiled))
+    compiled = count_compiles(app, monkeypatch)
+    assert app.jinja_env.get_template('page.html').render(name='x') == '<b>x</b>'
+    assert compiled == ['page.html']
+    assert len(os.listdir(runtime)) == 1
+
+def test_load_all_reports_broken_templates(templates, tmp_path):
+    (templates / 'broken.html').write_text("{% if %}")
+    (templates / 'notes.md').write_text("not a template")
+    loaded, failed = template_cache.load_all(make_app(templates, tmp_path / 'cache').jinja_env)
+    assert loaded == 2
+    assert [name for name, _error in failed] == ['broken.html']
+
+def test_init_app_uses_the_bundled_copy_when_present(tmp_path, monkeypatch):
+    monkeypatch.setattr(template_cache, 'get_base_path', lambda: str(tmp_path / 'app'))
+    monkeypatch.setattr(template_cache, 'get_bundle_path', lambda: str(tmp_path / 'bundle'))
+    app = Flask(__name__)
+    template_cache.init_app(app)
+    cache = app.jinja_options['bytecode_cache']
+    assert cache.directory == template_cache.get_cache_dir() and cache.fallback_directory is None
+
+    (tmp_path / 'bundle' / template_cache.PRECOMPILED_DIR).mkdir(parents=True)
+    template_cache.init_app(app)
+    assert app.jinja_options['bytecode_cache'].fallback_directory == \
+        str(tmp_path / 'bundle' / template_cache.PRECOMPILED_DIR)
@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+import write_queue
+from conftest import connect
+
+@pytest.fixture
+def writer(config):
+    config.update({'write_batch_window_ms': 50, 'write_batch_max': 100})
+    writer = write_queue.GroupCommitWriter()
+    yield writer
+    writer.stop()
+
+def add_audit(details):
+    return lambda conn: conn.execute("INSERT INTO audit_logs (user_id, action, details) VALUES (1, 'TEST', ?)",
+                                     (details,)).lastrowid
+
+def audit_details(conn):
+    return {row[0] for row in conn.execute("SELECT details FROM audit_logs WHERE action = 'TEST'")}
+
+def test_writes_inside_the_window_share_one_commit(conn, writer):
+    futures = [writer.submit(add_audit(f'write {i}')) for i in range(20)]
+    ids = [future.result(5) for future in futures]
+    assert len(set(ids)) == 20
+    assert audit_details(conn) == {f'write {i}' for i in range(20)}
+    stats = writer.stats()
+    assert stats['committed'] == 20 and stats['batches'] < 20 and stats['max_batch'] > 1
+
+def test_a_failing_write_only_rolls_back_itself(conn, writer):
+    def broken(conn):
+        conn.execute("INSERT INTO audit_logs (user_id, action, details) VALUES (1, 'TEST', 'half done')")
+        conn.execute("INSERT INTO no_such_table VALUES (1)")
+
+    futures = [writer.submit(add_audit('before')), writer.submit(broken), writer.submit(add_audit('after'))]
+    assert futures[0].result(5) and futures[2].result(5)
+    with pytest.raises(Exception, match='no such table'):
+        futures[1].result(5)
+    assert audit_details(conn) == {'before', 'after'}
+    assert writer.stats()['failed'] == 1
+
+def test_execute_resolves_to_the_row_count(conn, writer, student_id):
+    future = writer.execute("UPDATE Student SET hall_of_residence = 'Hall A' WHERE id = ?", (student_id,))
+    assert future.result(5) == 1
+    assert writer.execute("UPDATE Student SET age = 1 WHERE id = -1").result(5) == 0
+
+def test_a_locked_database_fails_the_write_instead_of_hanging(db_path, writer, monkeypatch):
+    monkeypatch.setattr(write_queue, 'get_db_connection', lambda: connect(db_path, timeout=0.2))
+    blocker = connect(db_path)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        future = writer.submit(add_audit('blocked'))
+        with pytest.raises(Exception, match='locked'):
+            future.result(5)
+    finally:
+        blocker.rollback()
+        blocker.close()
+    # The writer recovers once the lock is gone
+    assert writer.submit(add_audit('after the lock')).result(5)
+
+def test_stop_drains_what_is_queued(conn, writer):
+    gate = threading.Event()
+    first = writer.submit(lambda conn: gate.wait(5))
+    queued = [writer.submit(add_audit(f'queued {i}')) for i in range(5)]
+    gate.set()
+    writer.stop()
+    assert first.result(0) is True
+    assert all(future.done() for future in queued)
+    assert audit_details(conn) == {f'queued {i}' for i in range(5)}
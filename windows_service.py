@@ -122,9 +122,9 @@ class AAMUSTEDCounsellingService(win32serviceutil.ServiceFramework):
             app.config['DEBUG'] = False
             app.config['TESTING'] = False
             
-            # Create Flask server
-            from werkzeug.serving import make_server
-            self.server = make_server('127.0.0.1', 5000, app, threaded=True)
+            # Pooled server: bounded threads, drains in-flight requests on shutdown()
+            import server
+            self.server = server.create_server(app, '127.0.0.1', 5000)
             
             # Start server in a separate thread
             self.flask_thread = threading.Thread(target=self.run_flask_server, daemon=True)
@@ -0,0 +1,198 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import node_config
+
+# node_config keys (defaults used when absent)
+BATCH_WINDOW_KEY = 'write_batch_window_ms'   # how long to gather writes into one commit
+BATCH_MAX_KEY = 'write_batch_max'            # most operations per transaction
+
+DEFAULT_BATCH_WINDOW_MS = 5
+DEFAULT_BATCH_MAX = 100
+
+_STOP = object()
+
+def get_db_connection():
+    # Helper to get DB connection (reused logic)
+    import app
+    return app.get_db_connection()
+
+class _Op:
+    __slots__ = ('fn', 'future', 'label', 'queued_at')
+
+    def __init__(self, fn, label):
+        self.fn = fn
+        self.future = Future()
+        self.label = label
+        self.queued_at = time.monotonic()
+
+class GroupCommitWriter:
+    """
+    One thread owns the write connection. Small writes from request threads
+    are queued, run together inside a single transaction (each under its own
+    savepoint so one failure doesn't sink the rest) and committed once.
+    Every caller gets a Future that resolves after the commit is durable.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._conn = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'committed': 0,
+            'failed': 0,
+            'batches': 0,
+            'max_batch': 0,
+            'max_depth': 0,
+            'last_commit_ms': 0.0,
+            'total_wait_ms': 0.0,
+        }
+
+    # ---------- Public API ----------
+
+    def submit(self, fn, label=None):
+        """Queue fn(conn); returns a Future with fn's return value"""
+        self._ensure_started()
+        op = _Op(fn, label or getattr(fn, '__name__', 'write'))
+        self._queue.put(op)
+        with self._stats_lock:
+            self._stats['submitted'] += 1
+            self._stats['max_depth'] = max(self._stats['max_depth'], self._queue.qsize())
+        return op.future
+
+    def execute(self, sql, params=(), label=None):
+        """Queue a single statement; the Future resolves to the affected row count"""
+        return self.submit(lambda conn: conn.execute(sql, params).rowcount, label=label or sql.split(None, 1)[0])
+
+    def stats(self):
+        with self._stats_lock:
+            data = dict(self._stats)
+        data['depth'] = self._queue.qsize()
+        data['running'] = self._thread is not None and self._thread.is_alive()
+        data['avg_batch'] = round(data['committed'] / data['batches'], 2) if data['batches'] else 0
+        data['avg_wait_ms'] = round(data['total_wait_ms'] / data['committed'], 2) if data['committed'] else 0
+        data['total_wait_ms'] = round(data['total_wait_ms'], 2)
+        return data
+
+    def stop(self, timeout=5):
+        """Drain what is queued, commit it and stop the writer thread"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    # ---------- Writer thread ----------
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='GroupCommitWriter', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        config = node_config.load_config()
+        window = max(float(config.get(BATCH_WINDOW_KEY, DEFAULT_BATCH_WINDOW_MS)), 0) / 1000.0
+        max_batch = max(int(config.get(BATCH_MAX_KEY, DEFAULT_BATCH_MAX)), 1)
+        print(f"[WRITE_QUEUE] Writer started (window {window * 1000:.0f}ms, batch <= {max_batch})")
+
+        stopping = False
+        while not stopping:
+            op = self._queue.get()
+            if op is _STOP:
+                break
+            batch = [op]
+            deadline = time.monotonic() + window
+            while len(batch) < max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    op = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if op is _STOP:
+                    stopping = True
+                    break
+                batch.append(op)
+            self._commit_batch(batch)
+
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+        print("[WRITE_QUEUE] Writer stopped")
+
+    def _connection(self):
+        if self._conn is None:
+            conn = get_db_connection()
+            # Transactions are managed explicitly below
+            conn.isolation_level = None
+            self._conn = conn
+        return self._conn
+
+    def _commit_batch(self, batch):
+        started = time.monotonic()
+        outcomes = []
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            for op in batch:
+                conn.execute("SAVEPOINT queued_write")
+                try:
+                    result = op.fn(conn)
+                    conn.execute("RELEASE queued_write")
+                    outcomes.append((op, result, None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO queued_write")
+                    conn.execute("RELEASE queued_write")
+                    outcomes.append((op, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            print(f"[WRITE_QUEUE] Batch of {len(batch)} failed: {e}")
+            self._reset_connection()
+            for op in batch:
+                if not op.future.done():
+                    op.future.set_exception(e)
+            with self._stats_lock:
+                self._stats['failed'] += len(batch)
+            return
+
+        finished = time.monotonic()
+        failed = 0
+        for op, result, error in outcomes:
+            if error is not None:
+                failed += 1
+                print(f"[WRITE_QUEUE] {op.label} failed: {error}")
+                op.future.set_exception(error)
+            else:
+                op.future.set_result(result)
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['committed'] += len(batch) - failed
+            self._stats['failed'] += failed
+            self._stats['max_batch'] = max(self._stats['max_batch'], len(batch))
+            self._stats['last_commit_ms'] = round((finished - started) * 1000, 2)
+            self._stats['total_wait_ms'] += sum((finished - op.queued_at) * 1000 for op in batch)
+
+    def _reset_connection(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.execute("ROLLBACK")
+            except Exception:
+                pass
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+write_queue = GroupCommitWriter()
+atexit.register(write_queue.stop)